@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Backtest the analysis models against the canonical telemetry store.
+
+Replays rolling windows over the combined ``initial`` + ``validation``
+history: for each cutoff the model sees only readings up to the cutoff,
+and its forecast is scored against the readings in the following
+``horizon``. Cutoffs start at the first validation reading, so the first
+window is the "train on Mar-May, validate on Jun-Aug" split and later
+windows roll forward through the validation period.
+
+Windows run in parallel over a process pool. Per-field errors (MAE, RMSE,
+bias, MAPE and, for the local model, 95% band coverage) are computed over
+all windows at once as masked arrays. The measured confidence is saved to
+``data/analysis/backtest.json`` and reported by /api/ai/predict in place of
+the fixed per-model defaults.
+
+The LLM model types score whatever their endpoint returns, so run them
+against the mock server (``--mock-llm local``) to measure the pipeline
+rather than the model.
+
+Usage (from the server directory):
+    python -m ai.backtest --model local --workers 4 --save
+    python -m ai.backtest --model deepseek-r1 --mock-llm local --max-windows 20
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from storage.loader import DATA_DIR, load_canonical
+from storage.quality import flag_column, suppress_flagged
+
+logger = logging.getLogger(__name__)
+
+DAY_NS = 24 * 3600 * 10**9
+
+MODEL_TYPES = ['local', 'deepseek-r1', 'o1-mini', 'ensemble']
+# API keys a model type needs to call the real LLMs (without them it uses canned responses)
+MODEL_API_KEYS = {'local': [], 'deepseek-r1': ['DEEPSEEK_API_KEY'],
+                  'o1-mini': ['DEEPSEEK_API_KEY', 'O1_API_KEY'], 'ensemble': ['DEEPSEEK_API_KEY', 'O1_API_KEY']}
+
+# Parameters scored, with the span that one unit of "full error" means when
+# turning MAE into a 0-1 confidence (the width of each optimal range)
+SCORED_FIELDS = {
+    'pH': 1.0,
+    'temperature': 6.0,
+    'ammonia': 0.5,
+    'ec': 0.8,
+    'height': 40.0,
+}
+
+# Canonical columns the backtest reads: the scored readings and their fault flags
+HISTORY_COLUMNS = list(SCORED_FIELDS) + [flag_column(param) for param in SCORED_FIELDS]
+
+# Readings sent to an LLM per window (the tail of the training data)
+PROMPT_ROWS = 60
+
+BACKTEST_FILE = 'backtest.json'
+
+# Worker state, set once per process by _init_worker
+_history = None
+_models = None
+
+def backtest_path(data_dir=DATA_DIR):
+    """Path of the saved backtest report."""
+    return Path(data_dir) / 'analysis' / BACKTEST_FILE
+
+def load_history(data_dir=DATA_DIR):
+    """
+    Load the combined history and the timestamp where validation starts.
+
+    Returns:
+        tuple: (DataFrame sorted by int64 ``timestamp``, validation start ns or None)
+    """
+    # float64: training rows are also sent to the LLMs as JSON
+    initial = load_canonical('initial', data_dir, columns=HISTORY_COLUMNS, dtype=np.float64)
+    validation = load_canonical('validation', data_dir, columns=HISTORY_COLUMNS, dtype=np.float64)
+    frames = [frame for frame in (initial, validation) if not frame.empty]
+    if not frames:
+        raise ValueError(f"No canonical telemetry in {data_dir}; run python -m storage.ingest first")
+    history = pd.concat(frames, ignore_index=True)
+    history = history.sort_values('timestamp', kind='stable').drop_duplicates('timestamp', keep='last')
+    # Score against the readings the models would see, without sensor faults
+    history = suppress_flagged(history)
+    validation_start = int(validation['timestamp'].min()) if not validation.empty else None
+    return history.reset_index(drop=True), validation_start
+
+def window_cutoffs(timestamps, start_ns, horizon_ns, stride_ns, min_train_ns):
+    """
+    Cutoff timestamps for rolling windows.
+
+    Each cutoff leaves at least ``min_train_ns`` of history before it and a
+    full ``horizon_ns`` after it.
+    """
+    first = max(start_ns, timestamps[0] + min_train_ns)
+    last = timestamps[-1] - horizon_ns
+    if first > last:
+        return np.array([], dtype=np.int64)
+    return np.arange(first, last + 1, stride_ns, dtype=np.int64)
+
+def linear_trajectory(start, end, days, timestamps, cutoff):
+    """Values along a straight line from ``start`` at the cutoff to ``end`` after ``days``."""
+    fraction = (timestamps - cutoff) / (days * DAY_NS)
+    return start + (end - start) * np.clip(fraction, 0.0, 1.0)
+
+def parse_trend(text):
+    """Parse an LLM trend string such as "7.2 → 6.9" into (start, end)."""
+    numbers = re.findall(r'-?\d+(?:\.\d+)?', str(text))
+    if len(numbers) < 2:
+        return None
+    return float(numbers[0]), float(numbers[1])
+
+def trajectories_from_results(results, test_timestamps, cutoff):
+    """
+    Turn an analysis result (LLM schema) into per-field predicted values.
+
+    Uses the numeric ``forecast`` section when present; otherwise the pH
+    trend string, which is the only numeric trend the LLM schema carries.
+    """
+    predictions = {}
+    for param, forecast in (results.get('forecast') or {}).items():
+        if param in SCORED_FIELDS and isinstance(forecast, dict):
+            try:
+                start, end = float(forecast['current']), float(forecast['next_30d'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            predictions[param] = (linear_trajectory(start, end, 30, test_timestamps, cutoff), None)
+
+    if 'pH' not in predictions:
+        trend = parse_trend(results.get('Goldfish_Health', {}).get('pH_Trend', {}).get('next_30d'))
+        if trend:
+            predictions['pH'] = (linear_trajectory(*trend, 30, test_timestamps, cutoff), None)
+    return predictions
+
+def to_records(frame):
+    """Canonical rows as JSON-friendly dicts for an LLM prompt."""
+    records = frame.copy()
+    records['timestamp'] = np.datetime_as_string(
+        records['timestamp'].to_numpy(dtype=np.int64).view('datetime64[ns]'), unit='s')
+    columns = [column for column in ['timestamp'] + list(SCORED_FIELDS) if column in records.columns]
+    return json.loads(records[columns].to_json(orient='records'))
+
+def _init_worker(history, model_type):
+    """Process pool initializer: keep the history and fresh model clients per process."""
+    global _history, _models
+    from ai.models import DeepseekModel, LocalForecastModel, O1Model
+
+    _history = history
+    if model_type == 'local':
+        _models = {'local': LocalForecastModel()}
+    else:
+        # Built here so the clients pick up the API base/key env of this run
+        _models = {'deepseek': DeepseekModel(), 'o1': O1Model()}
+
+def _run_window(task):
+    """
+    Forecast one window and align predictions with the actual readings.
+
+    Returns:
+        dict: {param: (predicted, stderr or None, actual)} for the test rows,
+        or None when the model could not produce a forecast
+    """
+    model_type, cutoff, horizon_ns = task
+    timestamps = _history['timestamp'].to_numpy(dtype=np.int64)
+    train = _history[timestamps <= cutoff]
+    test = _history[(timestamps > cutoff) & (timestamps <= cutoff + horizon_ns)]
+    test_timestamps = test['timestamp'].to_numpy(dtype=np.int64)
+
+    try:
+        if model_type == 'local':
+            prediction = _models['local'].predict(train)
+            predictions = {}
+            for param, forecast in prediction['forecasts'].items():
+                if param in SCORED_FIELDS:
+                    predicted = np.interp(test_timestamps, prediction['future'], forecast['path'])
+                    stderr = np.interp(test_timestamps, prediction['future'], forecast['stderr'])
+                    predictions[param] = (predicted, stderr)
+        else:
+            payload = {'fish': to_records(train.tail(PROMPT_ROWS))}
+            results = _models['deepseek'].analyze_telemetry(payload, {})
+            if model_type != 'deepseek-r1':
+                results = _models['o1'].validate_analysis(payload, {}, results)
+            if 'error' in results:
+                return None
+            predictions = trajectories_from_results(results, test_timestamps, cutoff)
+    except ValueError:
+        return None
+
+    return {
+        param: (predicted, stderr, test[param].to_numpy(dtype=np.float64))
+        for param, (predicted, stderr) in predictions.items() if param in test.columns
+    }
+
+def stack_windows(outcomes, param):
+    """
+    Stack one field across windows into NaN-padded (windows, rows) arrays.
+
+    Returns:
+        tuple: (predicted, stderr or None, actual)
+    """
+    rows = [outcome[param] for outcome in outcomes if outcome and param in outcome]
+    if not rows:
+        return None
+    width = max(len(actual) for _, _, actual in rows)
+    predicted = np.full((len(rows), width), np.nan)
+    actual = np.full((len(rows), width), np.nan)
+    has_stderr = all(stderr is not None for _, stderr, _ in rows)
+    stderr = np.full((len(rows), width), np.nan) if has_stderr else None
+    for i, (p, s, a) in enumerate(rows):
+        predicted[i, :len(p)] = p
+        actual[i, :len(a)] = a
+        if has_stderr:
+            stderr[i, :len(s)] = s
+    return predicted, stderr, actual
+
+def field_metrics(predicted, stderr, actual):
+    """Error metrics for one field over every window and test row at once."""
+    errors = predicted - actual
+    valid = ~np.isnan(errors)
+    if not valid.any():
+        return None
+    absolute = np.abs(errors)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        relative = np.where(actual != 0, absolute / np.abs(actual), np.nan)
+
+    metrics = {
+        'mae': float(np.nanmean(absolute)),
+        'rmse': float(np.sqrt(np.nanmean(errors ** 2))),
+        'bias': float(np.nanmean(errors)),
+        'mape': float(np.nanmean(relative) * 100) if np.isfinite(relative).any() else None,
+        'points': int(valid.sum()),
+        'windows': int(valid.any(axis=1).sum()),
+    }
+    if stderr is not None:
+        inside = absolute <= 1.96 * stderr
+        metrics['coverage_95'] = float(inside[valid].mean())
+    return {key: round(value, 4) if isinstance(value, float) else value for key, value in metrics.items()}
+
+def confidence_from_metrics(metrics):
+    """Mean per-field skill, where skill = 1 - MAE / field span, clipped to [0, 1]."""
+    skills = [min(1.0, max(0.0, 1.0 - field['mae'] / SCORED_FIELDS[param]))
+              for param, field in metrics.items()]
+    return round(float(np.mean(skills)), 3) if skills else None
+
+def run_backtest(model_type='local', data_dir=DATA_DIR, horizon_days=7, stride_days=1,
+                 min_train_days=14, workers=None, max_windows=None):
+    """
+    Run a rolling-window backtest of ``model_type`` over the canonical store.
+
+    Returns:
+        dict: report with per-field metrics, confidence and runs per second
+    """
+    history, validation_start = load_history(data_dir)
+    timestamps = history['timestamp'].to_numpy(dtype=np.int64)
+    horizon_ns = int(horizon_days * DAY_NS)
+    start = validation_start if validation_start is not None else int(np.median(timestamps))
+    cutoffs = window_cutoffs(timestamps, start, horizon_ns, int(stride_days * DAY_NS),
+                             int(min_train_days * DAY_NS))
+    if max_windows:
+        cutoffs = cutoffs[:max_windows]
+    if not len(cutoffs):
+        raise ValueError("History too short for a single backtest window")
+
+    tasks = [(model_type, int(cutoff), horizon_ns) for cutoff in cutoffs]
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    if workers == 1:
+        _init_worker(history, model_type)
+        outcomes = [_run_window(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(history, model_type)) as executor:
+            outcomes = list(executor.map(_run_window, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+    elapsed = time.perf_counter() - started
+
+    metrics = {}
+    for param in SCORED_FIELDS:
+        stacked = stack_windows(outcomes, param)
+        if stacked is not None:
+            field = field_metrics(*stacked)
+            if field is not None:
+                metrics[param] = field
+
+    return {
+        'model_type': model_type,
+        'generated_at': datetime.now().isoformat(),
+        'windows': len(tasks),
+        'failed_windows': sum(1 for outcome in outcomes if outcome is None),
+        'horizon_days': horizon_days,
+        'stride_days': stride_days,
+        'workers': workers,
+        'elapsed_seconds': round(elapsed, 3),
+        'runs_per_second': round(len(tasks) / elapsed, 2) if elapsed > 0 else None,
+        'confidence': confidence_from_metrics(metrics),
+        'metrics': metrics,
+    }
+
+def save_report(report, data_dir=DATA_DIR):
+    """Merge a report into the saved backtest file, keyed by model type."""
+    path = backtest_path(data_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    reports = {}
+    if path.exists():
+        with open(path, 'r') as f:
+            reports = json.load(f)
+    reports[report['model_type']] = report
+    tmp_path = path.with_suffix('.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(reports, f, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+_saved_reports = {'mtime': None, 'reports': {}}
+
+def measured_confidence(model_type, data_dir=DATA_DIR):
+    """
+    Confidence measured by the last saved backtest of ``model_type``.
+
+    The report file is only re-read when it changes.
+
+    Returns:
+        float | None: the confidence, or None if that model was never backtested
+    """
+    path = backtest_path(data_dir)
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    if mtime != _saved_reports['mtime']:
+        try:
+            with open(path, 'r') as f:
+                _saved_reports['reports'] = json.load(f)
+            _saved_reports['mtime'] = mtime
+        except (OSError, ValueError) as e:
+            logger.error("Error loading backtest report: %s", e)
+            return None
+    return _saved_reports['reports'].get(model_type, {}).get('confidence')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Backtest analysis models against the validation data')
+    parser.add_argument('--model', choices=MODEL_TYPES, default='local')
+    parser.add_argument('--data-dir', default=str(DATA_DIR))
+    parser.add_argument('--horizon-days', type=float, default=7)
+    parser.add_argument('--stride-days', type=float, default=1)
+    parser.add_argument('--min-train-days', type=float, default=14)
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--max-windows', type=int)
+    parser.add_argument('--mock-llm', metavar='URL',
+                        help='Send LLM calls to a mock server at URL, or "local" to start one in-process')
+    parser.add_argument('--save', action='store_true',
+                        help='Save the report so /api/ai/predict reports the measured confidence')
+    args = parser.parse_args(argv)
+    # A saved report becomes the confidence /predict serves for the real model
+    if args.save and args.mock_llm:
+        parser.error('--save cannot be used with --mock-llm: the scores would be the mock server\'s')
+    missing = [key for key in MODEL_API_KEYS[args.model] if not os.environ.get(key)]
+    if args.save and missing:
+        parser.error(f"--save needs {', '.join(missing)}: without it the model returns canned responses")
+
+    mock_server, mock_llm_url = None, args.mock_llm
+    if args.mock_llm == 'local':
+        from benchmarks.mock_llm_server import MockLLMConfig, serve_in_thread
+        mock_server, mock_llm_url = serve_in_thread(MockLLMConfig())
+    if mock_llm_url:
+        from benchmarks.mock_llm_server import api_bases
+        os.environ.update(api_bases(mock_llm_url))
+        for key in ('O1_API_KEY', 'DEEPSEEK_API_KEY'):
+            os.environ.setdefault(key, 'backtest')
+
+    try:
+        report = run_backtest(args.model, args.data_dir, args.horizon_days, args.stride_days,
+                              args.min_train_days, args.workers, args.max_windows)
+    finally:
+        if mock_server:
+            mock_server.shutdown()
+
+    print(json.dumps(report, indent=2))
+    if args.save:
+        print(f"Saved to {save_report(report, args.data_dir)}")
+
+if __name__ == '__main__':
+    main()
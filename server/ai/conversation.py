@@ -0,0 +1,184 @@
+"""
+Token-budgeted conversation context for the chatbot.
+
+Sending a session's whole history with every message makes each request
+slower and dearer than the last, so each request is built within
+``CHAT_CONTEXT_TOKENS``:
+
+    recent turns    verbatim, newest first, as many as fit the budget left
+                    after the summary
+    older turns     folded into a rolling summary, one short line per
+                    exchange, maintained incrementally off the request path
+                    (a background worker picks up the turns that left the
+                    recent window after each reply)
+    boilerplate     lines repeated from the instructions or from a newer
+                    message (e.g. the same fallback reply twice) are sent once
+
+The summary is extractive (the first sentence of each question and answer),
+so keeping it up to date costs no model calls. It is capped at
+``CHAT_SUMMARY_TOKENS``; the oldest lines are dropped past that.
+"""
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from monitoring import registry
+from .tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Tokens for the history part of a request (summary plus recent turns)
+CHAT_CONTEXT_TOKENS = int(os.environ.get('CHAT_CONTEXT_TOKENS', 2000))
+# Tokens for the rolling summary of older turns
+CHAT_SUMMARY_TOKENS = int(os.environ.get('CHAT_SUMMARY_TOKENS', 500))
+# Exchanges (question and answer) that stay out of the summary
+CHAT_RECENT_TURNS = int(os.environ.get('CHAT_RECENT_TURNS', 4))
+
+# Characters of a question or answer kept in its summary line
+SUMMARY_CLIP = 160
+# Lines shorter than this (list markers, "Yes.") are never deduplicated
+MIN_DEDUP_LENGTH = 12
+
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+PROMPT_TOKENS = registry.histogram(
+    'aquaponics_chat_prompt_tokens', 'Prompt tokens sent per chatbot turn', buckets=TOKEN_BUCKETS)
+SUMMARIZED_TURNS = registry.counter(
+    'aquaponics_chat_summarized_messages_total', 'Chat messages folded into rolling summaries')
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s')
+_WHITESPACE = re.compile(r'\s+')
+
+# One worker: summaries are cheap, and a session's jobs then run in order
+_summarizer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chat-summary')
+
+def normalize_line(line):
+    return _WHITESPACE.sub(' ', line).strip().lower()
+
+def clip(text, limit=SUMMARY_CLIP):
+    """First sentence (or line) of ``text``, at most ``limit`` characters."""
+    text = text.strip().split('\n', 1)[0]
+    text = _SENTENCE_END.split(text, 1)[0]
+    return text if len(text) <= limit else text[:limit - 3].rstrip() + '...'
+
+class Conversation:
+    """
+    One chat session: the full history plus the state for building requests.
+
+    ``messages`` is the complete history as returned by the history endpoint;
+    only the request built from it is budgeted.
+    """
+
+    def __init__(self, instructions):
+        self.messages = []
+        self.summary_lines = []
+        self.summarized = 0  # messages[:summarized] are covered by the summary
+        self.omitted = 0  # exchanges dropped from the front of the summary
+        self._boilerplate = {normalize_line(line) for line in instructions.splitlines()
+                             if len(normalize_line(line)) >= MIN_DEDUP_LENGTH}
+        self._last_reply = None
+        self._lock = threading.Lock()
+
+    def append(self, message):
+        with self._lock:
+            self.messages.append(message)
+
+    def summary(self):
+        """The rolling summary text ('' while nothing is summarized)."""
+        with self._lock:
+            return self._summary_text()
+
+    def _summary_text(self):
+        # Called with the lock held
+        if not self.summary_lines:
+            return ''
+        header = 'Summary of earlier conversation'
+        if self.omitted:
+            header += f' ({self.omitted} older exchanges omitted)'
+        return header + ':\n' + '\n'.join(self.summary_lines)
+
+    def build_context(self, budget=CHAT_CONTEXT_TOKENS):
+        """
+        The history for the next request: the summary and recent turns.
+
+        The latest message (the one being answered) is not included; it is
+        sent on its own.
+
+        Returns:
+            tuple: (context text, or '' for a new session; verbatim messages used)
+        """
+        # One critical section: a background summary moving ``summarized``
+        # in between would drop its turns from both parts
+        with self._lock:
+            summary = self._summary_text()
+            history = self.messages[self.summarized:-1]
+            latest = self.messages[-1]['content'] if self.messages else ''
+        remaining = budget - count_tokens(summary)
+
+        seen = set(self._boilerplate)
+        seen.update(normalize_line(line) for line in latest.splitlines())
+        turns = []
+        # Newest first, so a repeated line is kept where it was last said
+        for message in reversed(history):
+            kept = []
+            for line in message['content'].splitlines():
+                key = normalize_line(line)
+                if not key:
+                    continue
+                if len(key) >= MIN_DEDUP_LENGTH:
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                kept.append(line.rstrip())
+            speaker = 'User' if message['role'] == 'user' else 'Assistant'
+            text = f"{speaker}: " + ('\n'.join(kept) if kept else '[repeated]')
+            tokens = count_tokens(text)
+            if tokens > remaining:
+                break
+            remaining -= tokens
+            turns.append(text)
+        if len(turns) < len(history):
+            logger.debug("Sending %d of %d unsummarized messages", len(turns), len(history))
+
+        parts = [summary] if summary else []
+        if turns:
+            parts.append('Recent conversation:\n' + '\n'.join(reversed(turns)))
+        return '\n\n'.join(parts), len(turns)
+
+    def schedule_summary(self):
+        """Fold the turns that left the recent window into the summary, in the background."""
+        _summarizer.submit(self._summarize)
+
+    def _summarize(self):
+        try:
+            with self._lock:
+                end = len(self.messages) - 2 * CHAT_RECENT_TURNS
+                # Don't split a question from its answer
+                if self.summarized < end < len(self.messages) and self.messages[end]['role'] != 'user':
+                    end -= 1
+                pending = self.messages[self.summarized:end]
+            if not pending:
+                return
+            lines = []
+            for message in pending:
+                if message['role'] == 'user':
+                    lines.append(f"- Q: {clip(message['content'])}")
+                    continue
+                reply = clip(message['content'])
+                key = normalize_line(reply)
+                # Skip instruction echoes and a reply repeated from the last exchange
+                if lines and key not in self._boilerplate and key != self._last_reply:
+                    lines[-1] += f" A: {reply}"
+                self._last_reply = key
+            with self._lock:
+                self.summary_lines.extend(lines)
+                self.summarized = end
+                while (len(self.summary_lines) > 1
+                       and count_tokens('\n'.join(self.summary_lines)) > CHAT_SUMMARY_TOKENS):
+                    self.summary_lines.pop(0)
+                    self.omitted += 1
+            SUMMARIZED_TURNS.inc(len(pending))
+        except Exception:
+            logger.exception("Failed to update conversation summary")
@@ -0,0 +1,313 @@
+"""
+Local knowledge base of aquaponics playbooks for the chatbot.
+
+Many chat questions ("my pH is 6.3, what do I do?") have a fixed answer
+that was spread across the prompts and the hard-coded fallbacks. Those
+playbooks are collected in ``PLAYBOOKS`` and indexed at startup in an
+inverted index, scored with BM25:
+
+    score(q, d) = sum over terms t of q:
+                  idf(t) * tf(t, d) * (k1 + 1) / (tf(t, d) + k1 * (1 - b + b * |d| / avgdl))
+
+The score is normalized by its upper bound for the query (every term
+saturated, ``tf -> inf``, in an average-length document) to a confidence
+in [0, 1):
+
+    confident   at least ``CHAT_KB_DIRECT_SCORE`` and ``CHAT_KB_MARGIN``
+                times the runner-up: the playbook is the answer, and no LLM
+                call is made
+    related     at least ``CHAT_KB_GROUNDING_SCORE``: the top
+                ``CHAT_KB_PASSAGES`` passages go to the LLM as grounding
+    miss        otherwise, the LLM answers on its own
+
+Readings in the question are compared with the optimal ranges and add a
+``low`` or ``high`` term, so "pH is 6.3" finds the low-pH playbook rather
+than both pH playbooks equally. Asking to change a parameter works the same
+way: "raise the pH" means it is low.
+"""
+import math
+import os
+import re
+import time
+from collections import Counter
+
+from monitoring import registry
+
+CHAT_KB_ENABLED = os.environ.get('CHAT_KB_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+CHAT_KB_DIRECT_SCORE = float(os.environ.get('CHAT_KB_DIRECT_SCORE', 0.55))
+CHAT_KB_MARGIN = float(os.environ.get('CHAT_KB_MARGIN', 1.3))
+CHAT_KB_GROUNDING_SCORE = float(os.environ.get('CHAT_KB_GROUNDING_SCORE', 0.15))
+CHAT_KB_PASSAGES = int(os.environ.get('CHAT_KB_PASSAGES', 3))
+
+# BM25 parameters (the usual defaults)
+K1 = 1.2
+B = 0.75
+
+KNOWLEDGE_LOOKUPS = registry.counter(
+    'aquaponics_chat_knowledge_total',
+    'Chat messages by knowledge-base outcome (direct = answered without an LLM call)')
+KNOWLEDGE_SECONDS = registry.histogram(
+    'aquaponics_chat_knowledge_seconds', 'Knowledge-base retrieval time per chat message',
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01))
+
+# Fixed playbooks: the advice of the prompts' warnings and advisories and the
+# chatbot's fallbacks, one passage per situation. ``params`` are the readings
+# the passage is about; ``keywords`` are extra index terms (synonyms, symptoms).
+PLAYBOOKS = [
+    {
+        'id': 'ph-low',
+        'title': 'pH too low (below 6.5)',
+        'params': ['pH'],
+        'keywords': 'low acidic dropping drop falling acid raise increase',
+        'text': ("Keep pH between 6.5 and 7.5. If pH drops below 6.5:\n"
+                 "1. Add crushed coral (about 500g per 1000L once pH is under 6.8)\n"
+                 "2. Increase aeration by 30%\n"
+                 "3. Check pH every 12hrs and keep ammonia under 0.5ppm\n"
+                 "4. If pH stays low for more than 48hrs, do a 20% water change and check fish health - "
+                 "goldfish mortality risk rises when pH <6.5 persists.\n"
+                 "Never use chemical pH adjusters: the system is organic."),
+    },
+    {
+        'id': 'ph-high',
+        'title': 'pH too high (above 7.5)',
+        'params': ['pH'],
+        'keywords': 'high alkaline rising rise lower reduce decrease',
+        'text': ("Keep pH between 6.5 and 7.5. If pH rises above 7.5:\n"
+                 "1. Stop adding crushed coral or other buffers\n"
+                 "2. Check pH every 12hrs; nitrification lowers it gradually\n"
+                 "3. Watch ammonia closely - it is more toxic at high pH\n"
+                 "4. Spearmint absorbs iron and other nutrients poorly at high pH; yellowing leaves are an early sign.\n"
+                 "Never use chemical pH adjusters: the system is organic."),
+    },
+    {
+        'id': 'ammonia-high',
+        'title': 'Ammonia above 0.5ppm',
+        'params': ['ammonia'],
+        'keywords': 'high toxic spike nh3 nitrite gasping',
+        'text': ("Ammonia must stay below 0.5ppm; above that it stresses fish and spearmint roots.\n"
+                 "1. Reduce feeding (skip a feeding if it is above 1ppm)\n"
+                 "2. Do a 20% water change\n"
+                 "3. Increase aeration and check the biofilter is not clogged\n"
+                 "4. Remove uneaten food and any dead fish\n"
+                 "5. Re-test within 12hrs."),
+    },
+    {
+        'id': 'temperature',
+        'title': 'Water temperature outside 18-24°C',
+        'params': ['temperature'],
+        'keywords': 'hot cold warm heat heatwave cool heater temp',
+        'text': ("Goldfish do best at 18-24°C.\n"
+                 "- Too warm: shade the tank, increase aeration (warm water holds less oxygen) and reduce "
+                 "feeding; fish were stressed during the July 2024 heatwave.\n"
+                 "- Too cold: fish eat and grow less; reduce feeding and insulate the tank.\n"
+                 "Change temperature gradually, by no more than 2°C a day."),
+    },
+    {
+        'id': 'ec',
+        'title': 'EC outside 1.2-2.0 mS/cm',
+        'params': ['ec'],
+        'keywords': 'conductivity nutrients salts tds electrical',
+        'text': ("Keep EC between 1.2 and 2.0 mS/cm.\n"
+                 "- Low EC means a nutrient deficit: increase fish feeding by 10%.\n"
+                 "- High EC: spearmint flavour degrades above 2.2 mS/cm; reduce feeding by 5% "
+                 "and top up with fresh water."),
+    },
+    {
+        'id': 'yellow-leaves',
+        'title': 'Spearmint leaves yellowing',
+        'params': ['pH', 'ec'],
+        'keywords': 'yellow yellowing turning pale chlorosis mint leaf leaves nitrogen deficiency color colour',
+        'text': ("Yellowing spearmint leaves despite a good pH usually mean a nitrogen deficit:\n"
+                 "1. Test leaf colour weekly\n"
+                 "2. If leaves are yellow, increase fish feeding by 10%\n"
+                 "3. If nitrates are high and leaves stay green, reduce feeding by 5% and add companion basil\n"
+                 "4. Check EC is at least 1.2 mS/cm and pH is not above 7.5 (nutrient lockout)."),
+    },
+    {
+        'id': 'growth',
+        'title': 'Spearmint growth and harvest',
+        'params': ['height', 'growth_rate'],
+        'keywords': 'harvest ready slow growing growth height trim cut tall mint',
+        'text': ("Healthy spearmint grows 0.8-1.5cm/day and is harvested between 20 and 60cm.\n"
+                 "- Trim the tips every Tuesday to stimulate bushier growth.\n"
+                 "- Slow growth: check EC (1.2-2.0 mS/cm), pH (6.5-7.5) and leaf colour.\n"
+                 "- Harvest from the top, leaving at least a third of the plant."),
+    },
+    {
+        'id': 'oxygen',
+        'title': 'Dissolved oxygen and aeration',
+        'params': ['temperature'],
+        'keywords': 'oxygen o2 dissolved aeration air stone pump surface gasping night dawn',
+        'text': ("Oxygen is lowest just before dawn.\n"
+                 "- Test dissolved oxygen before dawn every Tuesday.\n"
+                 "- If fish gasp at the surface, or a nighttime O2 drop is predicted, add an air stone "
+                 "and increase aeration by 30%.\n"
+                 "- Warm water holds less oxygen: aerate more during heat."),
+    },
+    {
+        'id': 'feeding',
+        'title': 'Feeding the goldfish',
+        'params': ['ammonia', 'ec'],
+        'keywords': 'feed feeding food fish eat much',
+        'text': ("Feed the 200 goldfish what they eat in about 2 minutes, once or twice a day.\n"
+                 "- Increase feeding by 10% when spearmint shows a nitrogen deficit or EC is low.\n"
+                 "- Reduce feeding by 5% when nitrates or EC are high, and skip feedings while ammonia is "
+                 "above 0.5ppm.\n"
+                 "- Remove food left after 5 minutes."),
+    },
+    {
+        'id': 'pests',
+        'title': 'Spearmint pests',
+        'params': [],
+        'keywords': 'pest pests aphids insects bugs mites ladybugs spray mint',
+        'text': ("Do not spray pesticides: they reach the fish.\n"
+                 "- Release ladybugs against aphids.\n"
+                 "- Hose pests off the leaves and remove badly affected stems.\n"
+                 "- Companion basil helps deter pests."),
+    },
+    {
+        'id': 'testing',
+        'title': 'Water testing schedule',
+        'params': ['pH', 'ammonia', 'temperature', 'ec'],
+        'keywords': 'test testing often schedule routine check monitor weekly daily',
+        'text': ("Routine checks:\n"
+                 "- pH, temperature and EC: continuously by the probes; check the dashboard daily.\n"
+                 "- Ammonia: test twice a week, and every 12hrs while it is above 0.5ppm or pH is out of range.\n"
+                 "- Dissolved oxygen: before dawn every Tuesday.\n"
+                 "- Leaf colour: weekly."),
+    },
+]
+
+_TOKEN = re.compile(r'[a-z0-9]+(?:\.[0-9]+)?')
+STOPWORDS = frozenset(
+    'a an and are as at be but by can do does for from how i if in is it its me my of on or our should '
+    'so than that the their then there this to too was what when where which while who why will with '
+    'you your'.split())
+# Spellings of the parameters in questions -> their index term
+PARAM_TERMS = {'ph': 'ph', 'temperature': 'temperature', 'temp': 'temperature', 'ammonia': 'ammonia',
+               'ec': 'ec', 'conductivity': 'ec'}
+# "<parameter> is 6.3", "pH of 6.3", "temp at 27C"
+_READING = re.compile(r'\b(ph|temperature|temp|ammonia|ec|conductivity)\b\D{0,15}?(-?\d+(?:\.\d+)?)')
+# "raise the pH", "lower the water temperature": the reading is on the other side
+# of its range. Ammonia only has an upper limit, so its playbook has no twin.
+CHANGE_STATES = {'raise': 'low', 'increase': 'low', 'boost': 'low',
+                 'lower': 'high', 'reduce': 'high', 'decrease': 'high'}
+_CHANGE = re.compile(r'\b(raise|increase|boost|lower|reduce|decrease)\s+(?:[a-z]+\s+){0,2}?'
+                     r'(ph|temperature|temp|ec|conductivity)\b')
+
+def stem(term):
+    """Crude plural folding, so 'leaves'/'leaf' and 'pests'/'pest' meet."""
+    if term.endswith('ves') and len(term) > 4:
+        return term[:-3] + 'f'
+    if term.endswith('s') and not term.endswith('ss') and len(term) > 3:
+        return term[:-1]
+    return term
+
+def tokenize(text):
+    """Lower-cased, stop-word-free, stemmed terms of ``text``."""
+    # Numbers are left to the reading check in ``query_terms``
+    return [stem(token) for token in _TOKEN.findall(text.lower())
+            if token not in STOPWORDS and not token[0].isdigit()]
+
+class KnowledgeBase:
+    """BM25 inverted index over the playbook passages."""
+
+    def __init__(self, passages=PLAYBOOKS, ranges=None):
+        """
+        Args:
+            passages (list): Dicts with ``id``, ``title``, ``text`` and
+                optional ``params`` and ``keywords``
+            ranges (dict): {param: {'min': ..., 'max': ...}} optimal ranges,
+                for telling low readings in a question from high ones
+        """
+        self.passages = list(passages)
+        self.ranges = ranges or {}
+        self.index = {}  # term -> [(passage position, term frequency)]
+        self.lengths = []
+        for position, passage in enumerate(self.passages):
+            # The title counts twice: it names the situation the passage is for
+            terms = tokenize(' '.join([passage['title']] * 2 + [passage.get('keywords', ''), passage['text']]))
+            self.lengths.append(len(terms))
+            for term, count in Counter(terms).items():
+                self.index.setdefault(term, []).append((position, count))
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        count = len(self.passages)
+        self.idf = {term: math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for term, postings in self.index.items()}
+
+    def query_terms(self, question):
+        """
+        Terms of ``question``, plus ``low``/``high`` for readings outside
+        their range; "raise"/"lower" applied to a parameter become the
+        ``low``/``high`` the reading must be.
+        """
+        terms = tokenize(question)
+        for verb, _ in _CHANGE.findall(question.lower()):
+            # The verb alone would match whichever playbook happens to use it
+            terms = [term for term in terms if term != verb] + [CHANGE_STATES[verb]]
+        for name, value in _READING.findall(question.lower()):
+            param = PARAM_TERMS[name]
+            limits = next((limits for key, limits in self.ranges.items() if key.lower() == param), None)
+            if limits is None:
+                continue
+            value = float(value)
+            if limits.get('min') is not None and value < limits['min']:
+                terms.append('low')
+            elif limits.get('max') is not None and value > limits['max']:
+                terms.append('high')
+        # Repeated words in a question don't make it more specific
+        return list(dict.fromkeys(terms))
+
+    def search(self, question, limit=CHAT_KB_PASSAGES):
+        """
+        The best-matching passages.
+
+        Returns:
+            list: (confidence in [0, 1), passage) pairs, best first, for
+                  passages sharing at least one term with the question
+        """
+        terms = [term for term in self.query_terms(question) if term in self.index]
+        if not terms:
+            return []
+        scores = {}
+        for term in terms:
+            idf = self.idf[term]
+            for position, frequency in self.index[term]:
+                norm = K1 * (1 - B + B * self.lengths[position] / self.average_length)
+                scores[position] = scores.get(position, 0.0) + idf * frequency * (K1 + 1) / (frequency + norm)
+        # Upper bound: every query term (known or not) saturated in an average-length passage
+        bound = sum(self.idf.get(term, math.log(1 + (len(self.passages) + 0.5) / 0.5))
+                    for term in self.query_terms(question)) * (K1 + 1)
+        ranked = sorted(scores.items(), key=lambda item: -item[1])[:limit]
+        return [(score / bound, self.passages[position]) for position, score in ranked]
+
+    def lookup(self, question):
+        """
+        Classify a question against the knowledge base.
+
+        Returns:
+            tuple: (outcome, matches) where outcome is 'direct' (answer with
+                   ``matches[0]``), 'grounded' (pass ``matches`` to the
+                   LLM) or 'miss', and matches are as from ``search``
+        """
+        started = time.perf_counter()
+        matches = self.search(question)
+        outcome = 'miss'
+        if matches and matches[0][0] >= CHAT_KB_DIRECT_SCORE and (
+                len(matches) == 1 or matches[0][0] >= CHAT_KB_MARGIN * matches[1][0]):
+            outcome = 'direct'
+        elif matches and matches[0][0] >= CHAT_KB_GROUNDING_SCORE:
+            outcome = 'grounded'
+            matches = [match for match in matches if match[0] >= CHAT_KB_GROUNDING_SCORE]
+        else:
+            matches = []
+        KNOWLEDGE_SECONDS.observe(time.perf_counter() - started)
+        KNOWLEDGE_LOOKUPS.inc(outcome=outcome)
+        return outcome, matches
+
+def describe_for_prompt(matches):
+    """Grounding passages for an LLM request."""
+    lines = ['Relevant playbooks from the local knowledge base (prefer these over general advice):']
+    for _, passage in matches:
+        lines.append(f"[{passage['title']}]\n{passage['text']}")
+    return '\n\n'.join(lines)
@@ -3,9 +3,17 @@ Aquaponics AI Models Module
 """
 from .deepseek_model import DeepseekModel
 from .o1_model import O1Model
+from .local_model import LocalForecastModel
+from ..routing import llm_router
 
 # Create model instances for easy import
 deepseek_model = DeepseekModel()
 o1_model = O1Model()
+local_model = LocalForecastModel()
 
-__all__ = ['DeepseekModel', 'O1Model', 'deepseek_model', 'o1_model']
+# Either provider can answer any prompt; the router picks and hedges between them
+for _model in (deepseek_model, o1_model):
+    if _model.api_key:
+        llm_router.register(_model.model, _model.complete)
+
+__all__ = ['DeepseekModel', 'O1Model', 'LocalForecastModel', 'deepseek_model', 'o1_model', 'local_model']
@@ -2,32 +2,48 @@
 Deepseek model implementation for aquaponics AI analysis.
 """
 import json
+import logging
 import os
+import threading
 import requests
-from ..prompts.deepseek_prompt import DEEPSEEK_SYSTEM_PROMPT
+from monitoring import log_body, record_backoff, span
+from ..parsing import ResponseParseError, conform_analysis, parse_analysis
+from ..prompts import prompt_registry
+from ..routing import LLMUnavailableError, llm_router
+from ..tokens import TOKEN_BUDGETS, fit_records
+
+# Default Azure AI models endpoint (override with DEEPSEEK_API_BASE, e.g. for a local mock)
+DEFAULT_API_BASE = "https://suzarilshah.services.ai.azure.com/models/chat/completions?api-version=2024-05-01-preview"
+
+logger = logging.getLogger(__name__)
 
 class DeepseekModel:
     """DeepseekModel handles interactions with the Deepseek API for aquaponics analysis."""
     
-    def __init__(self, api_key=None):
-        """Initialize the Deepseek model with API key."""
+    def __init__(self, api_key=None, api_base=None):
+        """Initialize the Deepseek model with API key and optional endpoint override."""
         self.api_key = api_key or os.environ.get("DEEPSEEK_API_KEY")
-        self.api_base = "https://suzarilshah.services.ai.azure.com/models/chat/completions?api-version=2024-05-01-preview"
+        self.api_base = api_base or os.environ.get("DEEPSEEK_API_BASE", DEFAULT_API_BASE)
         #self.api_url = "https://api.deepseek.com/v1/chat/completions"
         self.model = "deepseek-r1"
-        self.system_prompt = DEEPSEEK_SYSTEM_PROMPT
+        self.prompt = prompt_registry.get('deepseek-system')
+        self.system_prompt = self.prompt.text
+        self.token_budget = TOKEN_BUDGETS[self.model]
         
         # Check if API key is available
         if not self.api_key:
-            print("Warning: DEEPSEEK_API_KEY not set. Using mock responses.")
+            logger.warning("DEEPSEEK_API_KEY not set. Using mock responses.")
         
-    def analyze_telemetry(self, initial_data, validation_data):
+    def analyze_telemetry(self, initial_data, validation_data, baseline=None, correlations=''):
         """
         Analyze telemetry data using Deepseek model.
         
         Args:
             initial_data (dict): Initial telemetry data (Mar-May 2024)
             validation_data (dict): Validation telemetry data (Jun-Aug 2024)
+            baseline (dict): Optional local forecast for the model to refine
+            correlations (str): Optional summary of lagged fish/plant
+                correlations (see storage.correlations)
             
         Returns:
             dict: Analysis results
@@ -40,18 +56,25 @@ class DeepseekModel:
             plant_validation = validation_data.get('plant', [])
             
             # Create a user message with the data
-            user_message = self._format_data_for_prompt(
-                fish_initial, plant_initial, fish_validation, plant_validation
-            )
+            with span('prompt_format', model=self.model):
+                # Thin the telemetry if the prompt would exceed the model's context budget
+                user_message, _, _ = fit_records(
+                    lambda *records: self._format_data_for_prompt(*records, baseline, correlations),
+                    [fish_initial, plant_initial, fish_validation, plant_validation],
+                    self.token_budget, fixed_tokens=self.prompt.tokens
+                )
             
             # Make API request to Deepseek
-            response = self._call_api(user_message)
+            provider, response = self._call_api(user_message)
             
             # Parse and validate the response
-            return self._parse_response(response)
+            results = self._parse_response(response)
+            # Routing may have sent the request to the other model
+            results['provider'] = provider
+            return results
             
         except Exception as e:
-            print(f"Error in Deepseek analysis: {str(e)}")
+            logger.exception("Error in Deepseek analysis: %s", e)
             # Return a fallback response with error information
             return {
                 "error": str(e),
@@ -72,9 +95,10 @@ class DeepseekModel:
                 }
             }
     
-    def _format_data_for_prompt(self, fish_initial, plant_initial, fish_validation, plant_validation):
+    def _format_data_for_prompt(self, fish_initial, plant_initial, fish_validation, plant_validation, baseline=None,
+                                correlations=''):
         """Format the telemetry data for the prompt."""
-        return f"""
+        message = f"""
 Please analyze the following aquaponics telemetry data:
 
 INITIAL DATA (Mar-May 2024):
@@ -93,69 +117,107 @@ Plant Telemetry:
 
 Based on this data, please provide analysis and recommendations in the format specified.
 """
+        if correlations:
+            message += f"""
+CROSS-PARAMETER CORRELATIONS (over all posted readings, detrended; a positive lag means the fish parameter leads):
+{correlations}
+"""
+        if baseline:
+            message += f"""
+LOCAL STATISTICAL FORECAST (ridge autoregression over the same data):
+{json.dumps(baseline, indent=2)}
+
+Use this forecast as your starting point: keep the fields you agree with and
+refine the ones the telemetry suggests are wrong, in the same format.
+"""
+        return message
     
     def _call_api(self, user_message):
-        """Call the Deepseek API with the formatted message."""
+        """
+        Call the Azure AI models API with the formatted message.
+
+        Returns:
+            tuple: (provider that answered, or 'mock'; parsed response)
+        """
         # If no API key is available, return a mock response
         if not self.api_key:
-            return self._get_mock_response()
+            return 'mock', self._get_mock_response()
+        
+        messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": user_message}
+        ]
+        
+        def parse(ai_response):
+            # Recover the analysis even from fenced, chatty or slightly malformed JSON
+            try:
+                with span('llm_response_parse', model=self.model):
+                    return parse_analysis(ai_response, model=self.model)
+            except ResponseParseError as e:
+                # The other provider's answer is used instead, if it has one
+                logger.warning("Could not parse API response (%s)", e, extra={"model": self.model})
+                log_body(logger, "Unparseable API response", ai_response, level=logging.WARNING, sample_rate=1.0, model=self.model)
+                raise
         
         try:
-            # Azure API headers
-            headers = {
-                "api-key": self.api_key,  # Azure uses api-key instead of Bearer token
-                "Content-Type": "application/json"
-            }
-            
-            # Azure API payload
-            payload = {
-                "messages": [
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
-                "temperature": 0.3,
-                "max_tokens": 1000
-            }
-            
-            # Make API request with retry logic
-            max_retries = 3
-            retry_delay = 2  # seconds
+            # Routed to the healthier provider, hedged if it is slow (see ai/routing.py)
+            return llm_router.complete(messages, prefer=self.model, validate=parse, with_provider=True)
+        except LLMUnavailableError as e:
+            # Fall back to mock response if no provider gave a usable answer
+            logger.error("No usable API response (%s). Using mock response.", e, extra={"model": self.model})
+            return 'mock', self._get_mock_response()
+        except Exception as e:
+            logger.exception("Unexpected error calling API: %s", e)
+            return 'mock', self._get_mock_response()
+    
+    def complete(self, messages, cancel=None):
+        """
+        Send chat messages to this provider, retrying transient failures.
+        
+        Args:
+            messages (list): Chat messages
+            cancel (Event): Set when another provider's answer was taken;
+                no further retries are made once it is set
             
-            for attempt in range(max_retries):
-                try:
-                    response = requests.post(self.api_base, headers=headers, json=payload, timeout=30)
-                    response.raise_for_status()
-                    
-                    # Parse JSON response
-                    ai_response = response.json()["choices"][0]["message"]["content"]
-                    
-                    # Try to parse as JSON
-                    try:
-                        return json.loads(ai_response)
-                    except json.JSONDecodeError:
-                        # If not valid JSON, try to extract JSON from text
-                        import re
-                        json_match = re.search(r'```json\n(.+?)\n```', ai_response, re.DOTALL)
-                        if json_match:
-                            return json.loads(json_match.group(1))
-                        else:
-                            # Fall back to mock response if can't parse JSON
-                            print("Warning: Could not parse API response as JSON. Using mock response.")
-                            return self._get_mock_response()
-                            
-                except (requests.RequestException, json.JSONDecodeError) as e:
-                    if attempt < max_retries - 1:
-                        print(f"API request failed, retrying in {retry_delay} seconds: {str(e)}")
-                        import time
-                        time.sleep(retry_delay)
-                        retry_delay *= 2  # Exponential backoff
-                    else:
-                        print(f"API request failed after {max_retries} attempts: {str(e)}")
-                        return self._get_mock_response()
+        Returns:
+            str: The reply text
+        """
+        cancel = cancel or threading.Event()
+        # Azure AI models API headers
+        headers = {
+            "api-key": self.api_key,
+            "Content-Type": "application/json"
+        }
         
-        except Exception as e:
-            print(f"Unexpected error calling API: {str(e)}")
-            return self._get_mock_response()
+        # Azure AI models API payload
+        payload = {
+            "messages": messages,
+            "temperature": 0.3,
+            "max_tokens": 1000
+        }
+        
+        # Make API request with retry logic
+        max_retries = 3
+        retry_delay = 2  # seconds
+        
+        for attempt in range(max_retries):
+            try:
+                with span('llm_attempt', model=self.model):
+                    response = requests.post(self.api_base, headers=headers, json=payload, timeout=30)
+                response.raise_for_status()
+                
+                # Parse JSON response
+                return response.json()["choices"][0]["message"]["content"]
+                        
+            except (requests.RequestException, json.JSONDecodeError, KeyError, IndexError) as e:
+                if attempt == max_retries - 1 or cancel.is_set():
+                    logger.error("API request failed after %s attempts: %s", attempt + 1, e, extra={"model": self.model})
+                    raise
+                logger.warning("API request failed, retrying in %s seconds: %s", retry_delay, e, extra={"model": self.model, "attempt": attempt + 1})
+                if cancel.wait(retry_delay):
+                    raise
+                record_backoff(self.model, retry_delay)
+                retry_delay *= 2  # Exponential backoff
     
     def _get_mock_response(self):
         """Return a mock response for development or when API calls fail."""
@@ -184,7 +246,8 @@ Based on this data, please provide analysis and recommendations in the format sp
         }
     
     def _parse_response(self, response):
-        """Parse and validate the response from the API."""
-        # In a real implementation, this would parse JSON from the API response
-        # For now, we're just returning the mock response
-        return response
+        """Validate the response against the analysis schema, coercing field types."""
+        result, problems = conform_analysis(response)
+        if problems:
+            logger.warning("API response deviates from schema: %s", '; '.join(problems), extra={"model": self.model})
+        return result
@@ -0,0 +1,370 @@
+"""
+Local statistical forecasting model for aquaponics analysis.
+
+Fills the same JSON schema as the LLM models (``Goldfish_Health``,
+``Spearmint_Growth``, ``System_Risk``...) in milliseconds, without any
+network call. Each parameter is resampled onto a regular grid and fitted
+with a ridge-regularized autoregression on its lagged values; all
+parameters are fitted and forecast together as batched NumPy operations.
+"""
+import logging
+import math
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from monitoring import span
+from storage.ingest import join_streams, normalize_records
+from storage.loader import load_canonical
+from storage.quality import flag_column, suppress_flagged
+
+logger = logging.getLogger(__name__)
+
+DAY_NS = 24 * 3600 * 10**9
+
+# Optimal ranges, as given to the LLMs in ai/prompts
+OPTIMAL_RANGES = {
+    'pH': (6.5, 7.5),
+    'temperature': (18, 24),
+    'ammonia': (0, 0.5),
+    'ec': (1.2, 2.0),
+    'height': (20, 60),
+}
+
+FORECAST_PARAMS = ['pH', 'temperature', 'ammonia', 'ec', 'height']
+# Canonical columns read for a forecast from the store (readings and their fault flags)
+HISTORY_COLUMNS = FORECAST_PARAMS + [flag_column(param) for param in FORECAST_PARAMS]
+FORECAST_DAYS = 30
+LAGS = 6
+RIDGE_ALPHA = 1.0
+HARVEST_HEIGHT_CM = OPTIMAL_RANGES['height'][0]
+GROWTH_FIT_DAYS = 14
+# Upper bound on recursive forecast steps. Dense series are resampled coarser
+# (while keeping enough points to fit); short, dense payloads get a shorter horizon
+MAX_STEPS = 720
+MIN_FIT_POINTS = 4 * LAGS
+
+def _normal_sf(z):
+    """Survival function of the standard normal distribution."""
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+def resample(frame, params, step_ns):
+    """
+    Interpolate each parameter onto a shared regular time grid.
+
+    Returns:
+        tuple: (grid timestamps, matrix of shape (len(params), len(grid)))
+    """
+    timestamps = frame['timestamp'].to_numpy(dtype=np.int64)
+    grid = np.arange(timestamps[0], timestamps[-1] + 1, step_ns, dtype=np.int64)
+    matrix = np.empty((len(params), len(grid)))
+    for i, param in enumerate(params):
+        values = frame[param].to_numpy(dtype=np.float64)
+        ok = ~np.isnan(values)
+        matrix[i] = np.interp(grid, timestamps[ok], values[ok])
+    return grid, matrix
+
+def fit_ridge_ar(series, lags=LAGS, alpha=RIDGE_ALPHA):
+    """
+    Fit one ridge-regularized AR(lags) model per row of ``series``.
+
+    All rows are solved at once as a batch of (lags+1)x(lags+1) systems.
+    Series are standardized first so one ``alpha`` suits every parameter.
+
+    Returns:
+        dict: coefficients (P, lags+1), mean/scale (P,), residual std (P,)
+    """
+    mean = series.mean(axis=1, keepdims=True)
+    scale = series.std(axis=1, keepdims=True)
+    scale[scale == 0] = 1.0
+    z = (series - mean) / scale
+
+    windows = np.lib.stride_tricks.sliding_window_view(z, lags, axis=1)[:, :-1]
+    design = np.concatenate([windows, np.ones(windows.shape[:2] + (1,))], axis=2)
+    target = z[:, lags:]
+
+    penalty = alpha * np.eye(lags + 1)
+    penalty[-1, -1] = 0.0  # don't shrink the intercept
+    gram = np.einsum('pni,pnj->pij', design, design) + penalty
+    moment = np.einsum('pni,pn->pi', design, target)
+    coefficients = np.linalg.solve(gram, moment[..., None])[..., 0]
+
+    residuals = target - np.einsum('pni,pi->pn', design, coefficients)
+    return {
+        'coefficients': coefficients,
+        'mean': mean[:, 0],
+        'scale': scale[:, 0],
+        'residual_std': residuals.std(axis=1)
+    }
+
+def forecast_ridge_ar(series, model, steps, lags=LAGS):
+    """
+    Recursively forecast every parameter ``steps`` points ahead.
+
+    Returns:
+        tuple: (forecast (P, steps), standard error (P, steps)) in original units
+    """
+    coefficients = model['coefficients']
+    state = (series[:, -lags:] - model['mean'][:, None]) / model['scale'][:, None]
+    path = np.empty((series.shape[0], steps))
+    for step in range(steps):
+        next_value = np.einsum('pi,pi->p', state, coefficients[:, :lags]) + coefficients[:, lags]
+        path[:, step] = next_value
+        state = np.concatenate([state[:, 1:], next_value[:, None]], axis=1)
+
+    # Error grows with the horizon but, for a stationary series, never beyond
+    # its own spread (1 in standardized units)
+    horizon = np.sqrt(np.arange(1, steps + 1))
+    stderr = np.minimum(model['residual_std'][:, None] * horizon[None, :], 1.0) * model['scale'][:, None]
+    return path * model['scale'][:, None] + model['mean'][:, None], stderr
+
+class LocalForecastModel:
+    """LocalForecastModel produces fast statistical forecasts in the LLM result schema."""
+
+    def __init__(self, forecast_days=FORECAST_DAYS, lags=LAGS, alpha=RIDGE_ALPHA):
+        """Initialize the local model with its forecast horizon and AR settings."""
+        self.model = "local-ridge-ar"
+        self.forecast_days = forecast_days
+        self.lags = lags
+        self.alpha = alpha
+
+    def analyze_telemetry(self, initial_data, validation_data):
+        """
+        Forecast from telemetry data using local ridge regression.
+
+        Args:
+            initial_data (dict): Initial telemetry data (Mar-May 2024)
+            validation_data (dict): Validation telemetry data (Jun-Aug 2024)
+
+        Returns:
+            dict: Analysis results in the same format as the LLM models
+        """
+        try:
+            with span('local_forecast'):
+                history = self._build_history(initial_data, validation_data)
+                return self.forecast(history)
+        except Exception as e:
+            logger.exception("Error in local forecast: %s", e)
+            return {
+                "error": str(e),
+                "Goldfish_Health": {
+                    "pH_Trend": {"next_30d": "Error in analysis", "action": "Check system manually"},
+                    "Ammonia_Risk": {"probability": "Unknown", "peak_day": "Unknown"}
+                },
+                "Spearmint_Growth": {
+                    "Harvest_Readiness": {"optimal_date": "Unknown due to error"},
+                    "Nutrient_Deficit": {"nitrogen": "Unknown", "fix": "Check system manually"}
+                },
+                "System_Risk": {
+                    "pH-EC_Imbalance": {"severity": "Unknown", "impact": "Unknown"}
+                },
+                "urgent": {
+                    "title": "Analysis Error",
+                    "action": "Check system manually and retry analysis"
+                }
+            }
+
+    def _build_history(self, initial_data, validation_data):
+        """Combine the request telemetry (or the canonical store) into one frame."""
+        frames = []
+        for data in (initial_data, validation_data):
+            fish = normalize_records(data.get('fish', []))
+            plant = normalize_records(data.get('plant', []))
+            if not fish.empty and not plant.empty:
+                frames.append(join_streams(fish, plant))
+            elif not fish.empty or not plant.empty:
+                frames.append(fish if not fish.empty else plant)
+
+        if not frames:
+            # Nothing posted: forecast from the ingested store instead
+            frames = [suppress_flagged(load_canonical(dataset_type, columns=HISTORY_COLUMNS))
+                      for dataset_type in ('initial', 'validation')]
+            frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            raise ValueError("No telemetry data available for local forecast")
+
+        history = pd.concat(frames, ignore_index=True)
+        return history.sort_values('timestamp', kind='stable').drop_duplicates('timestamp', keep='last')
+
+    def forecast(self, history):
+        """Fit, forecast and render results for a canonical history frame."""
+        prediction = self.predict(history)
+        return self._render(prediction['forecasts'], prediction['future'], history,
+                            horizon_days=prediction['horizon_days'])
+
+    def predict(self, history):
+        """
+        Fit and forecast a canonical history frame, without rendering.
+
+        Returns:
+            dict: ``future`` timestamps (int64 ns), ``forecasts`` as
+            {param: {'current', 'path', 'stderr'}} and ``horizon_days``
+        """
+        params = [p for p in FORECAST_PARAMS if p in history.columns and history[p].notna().sum() > self.lags + 1]
+        if not params:
+            raise ValueError("Not enough readings to fit a forecast")
+
+        timestamps = history['timestamp'].to_numpy(dtype=np.int64)
+        step_ns = int(np.median(np.diff(timestamps))) if len(timestamps) > 1 else DAY_NS
+        span_ns = int(timestamps[-1] - timestamps[0])
+        step_ns = max(step_ns, 60 * 10**9,
+                      min(self.forecast_days * DAY_NS // MAX_STEPS, span_ns // MIN_FIT_POINTS))
+        grid, series = resample(history, params, step_ns)
+        if series.shape[1] <= self.lags + 1:
+            raise ValueError("Not enough readings to fit a forecast")
+
+        model = fit_ridge_ar(series, self.lags, self.alpha)
+        steps = min(MAX_STEPS, max(1, int(math.ceil(self.forecast_days * DAY_NS / step_ns))))
+        path, stderr = forecast_ridge_ar(series, model, steps, self.lags)
+
+        return {
+            'future': grid[-1] + step_ns * np.arange(1, steps + 1, dtype=np.int64),
+            'forecasts': {param: {
+                'current': float(series[i, -1]),
+                'path': path[i],
+                'stderr': stderr[i]
+            } for i, param in enumerate(params)},
+            'horizon_days': steps * step_ns / DAY_NS
+        }
+
+    def _render(self, forecasts, future, history, horizon_days):
+        """Turn numeric forecasts into the shared results schema."""
+        def date_of(index):
+            return datetime.fromtimestamp(int(future[index]) / 1e9, tz=timezone.utc).strftime('%Y-%m-%d')
+
+        results = {
+            "Goldfish_Health": {
+                "pH_Trend": self._ph_trend(forecasts.get('pH')),
+                "Ammonia_Risk": self._ammonia_risk(forecasts.get('ammonia'), date_of)
+            },
+            "Spearmint_Growth": {
+                "Harvest_Readiness": self._harvest_readiness(history),
+                "Nutrient_Deficit": self._nutrient_deficit(forecasts.get('ec'))
+            },
+            "System_Risk": {
+                "pH-EC_Imbalance": self._ph_ec_imbalance(forecasts.get('pH'), forecasts.get('ec')),
+                "Temperature_Fluctuation": self._temperature_risk(forecasts.get('temperature'))
+            },
+            "forecast": {
+                param: {
+                    "current": round(f['current'], 3),
+                    "next_30d": round(float(f['path'][-1]), 3),
+                    "low": round(float(f['path'][-1] - 1.96 * f['stderr'][-1]), 3),
+                    "high": round(float(f['path'][-1] + 1.96 * f['stderr'][-1]), 3)
+                } for param, f in forecasts.items()
+            },
+            "method": f"ridge AR({self.lags}) on {len(history)} readings, {horizon_days:.1f}-day horizon"
+        }
+
+        urgent, watch = self._priorities(results)
+        if urgent:
+            results["urgent"] = urgent
+        if watch:
+            results["watch"] = watch
+        return results
+
+    def _ph_trend(self, forecast):
+        if forecast is None:
+            return {"next_30d": "Unknown (no pH readings)", "action": "Check pH probe"}
+        low, high = OPTIMAL_RANGES['pH']
+        end = float(forecast['path'][-1])
+        trend = f"{forecast['current']:.1f} → {end:.1f}"
+        if end < low:
+            action = "Add crushed coral; pH forecast to fall below 6.5"
+        elif end > high:
+            action = "Partial water change; pH forecast to rise above 7.5"
+        else:
+            action = "No action needed; pH forecast within 6.5-7.5"
+        return {"next_30d": trend, "action": action}
+
+    def _ammonia_risk(self, forecast, date_of):
+        if forecast is None:
+            return {"probability": "Unknown (no ammonia readings)", "peak_day": "N/A"}
+        limit = OPTIMAL_RANGES['ammonia'][1]
+        stderr = np.maximum(forecast['stderr'], 1e-9)
+        exceed = [_normal_sf((limit - m) / s) for m, s in zip(forecast['path'], stderr)]
+        peak = int(np.argmax(forecast['path']))
+        return {"probability": f"{round(100 * max(exceed))}%", "peak_day": date_of(peak)}
+
+    def _harvest_readiness(self, history):
+        if 'height' not in history.columns or history['height'].notna().sum() < 2:
+            return {"optimal_date": "Unknown (no height readings)"}
+        recent = history[history['timestamp'] >= history['timestamp'].iloc[-1] - GROWTH_FIT_DAYS * DAY_NS]
+        recent = recent[recent['height'].notna()]
+        days = (recent['timestamp'].to_numpy(dtype=np.int64) - recent['timestamp'].iloc[0]) / DAY_NS
+        heights = recent['height'].to_numpy(dtype=np.float64)
+        if len(recent) < 2 or days[-1] == 0:
+            return {"optimal_date": "Unknown (not enough recent height readings)"}
+
+        slope, intercept = np.polyfit(days, heights, 1)
+        current = intercept + slope * days[-1]
+        last_ts = int(recent['timestamp'].iloc[-1])
+        if current >= HARVEST_HEIGHT_CM:
+            return {"optimal_date": "Ready now", "growth_rate": f"{slope:.2f} cm/day"}
+        if slope <= 0:
+            return {"optimal_date": "Not before growth resumes", "growth_rate": f"{slope:.2f} cm/day"}
+
+        days_left = (HARVEST_HEIGHT_CM - current) / slope
+        residual = float(np.std(heights - (intercept + slope * days)))
+        uncertainty = max(1, round(residual / slope)) if slope > 0 else 0
+        date = datetime.fromtimestamp(last_ts / 1e9 + days_left * 86400, tz=timezone.utc).strftime('%Y-%m-%d')
+        return {"optimal_date": f"{date} ±{uncertainty}d", "growth_rate": f"{slope:.2f} cm/day"}
+
+    def _nutrient_deficit(self, forecast):
+        if forecast is None:
+            return {"nitrogen": "Unknown (no EC readings)", "fix": "Check EC probe"}
+        low, high = OPTIMAL_RANGES['ec']
+        level = float(np.mean(forecast['path']))
+        if level < low:
+            return {"nitrogen": "low", "fix": "Increase fish feeding 10%"}
+        if level > high:
+            return {"nitrogen": "high", "fix": "Dilute with fresh water and reduce feeding"}
+        return {"nitrogen": "adequate", "fix": "No change needed"}
+
+    def _ph_ec_imbalance(self, ph, ec):
+        out_of_range = 0.0
+        for forecast, param in ((ph, 'pH'), (ec, 'ec')):
+            if forecast is not None:
+                low, high = OPTIMAL_RANGES[param]
+                out_of_range += float(np.mean((forecast['path'] < low) | (forecast['path'] > high)))
+        severity = 'high' if out_of_range >= 1.0 else 'medium' if out_of_range >= 0.3 else 'low'
+        impact = {
+            'high': "Stunted spearmint + fish stress",
+            'medium': "Reduced nutrient uptake likely",
+            'low': "No significant impact expected"
+        }[severity]
+        return {"severity": severity, "impact": impact}
+
+    def _temperature_risk(self, forecast):
+        if forecast is None:
+            return {"severity": "Unknown", "impact": "No temperature readings"}
+        low, high = OPTIMAL_RANGES['temperature']
+        outside = float(np.mean((forecast['path'] < low) | (forecast['path'] > high)))
+        severity = 'high' if outside > 0.5 else 'medium' if outside > 0.1 else 'low'
+        impact = {
+            'high': "Fish stress and reduced appetite",
+            'medium': "Reduced fish appetite",
+            'low': "Stable temperature expected"
+        }[severity]
+        return {"severity": severity, "impact": impact}
+
+    def _priorities(self, results):
+        """Pick the most pressing finding as ``urgent`` and the next as ``watch``."""
+        findings = []
+        ph_action = results["Goldfish_Health"]["pH_Trend"]["action"]
+        if not ph_action.startswith("No action"):
+            findings.append({"title": "pH Drift Forecast", "action": ph_action})
+        ammonia = results["Goldfish_Health"]["Ammonia_Risk"]["probability"]
+        if ammonia.endswith('%') and int(ammonia[:-1]) >= 50:
+            findings.append({"title": "Ammonia Spike Likely",
+                             "action": f"Reduce feeding and test ammonia daily until {results['Goldfish_Health']['Ammonia_Risk']['peak_day']}"})
+        if results["System_Risk"]["Temperature_Fluctuation"]["severity"] == 'high':
+            findings.append({"title": "Temperature Outside 18-24°C",
+                             "action": "Add shading or a chiller for the tank"})
+        if results["Spearmint_Growth"]["Nutrient_Deficit"]["nitrogen"] == 'low':
+            findings.append({"title": "Low Nutrient Levels",
+                             "action": results["Spearmint_Growth"]["Nutrient_Deficit"]["fix"]})
+        urgent = findings[0] if findings else None
+        watch = findings[1] if len(findings) > 1 else None
+        return urgent, watch
@@ -2,27 +2,40 @@
 O1 model implementation for aquaponics AI analysis validation.
 """
 import json
+import logging
 import os
+import threading
 import requests
-from ..prompts.o1_prompt import O1_SYSTEM_PROMPT
+from monitoring import log_body, record_backoff, span
+from ..parsing import ResponseParseError, conform_analysis, parse_analysis
+from ..prompts import prompt_registry
+from ..routing import LLMUnavailableError, llm_router
+from ..tokens import TOKEN_BUDGETS, fit_records
+
+# Default Azure OpenAI endpoint (override with O1_API_BASE, e.g. for a local mock)
+DEFAULT_API_BASE = "https://suzarilshah.services.ai.azure.com/openai/deployments/o1-mini/chat/completions?api-version=2024-05-01-preview"
+
+logger = logging.getLogger(__name__)
 
 class O1Model:
     """O1Model handles interactions with the Anthropic Claude API for aquaponics analysis validation."""
     
-    def __init__(self, api_key=None):
-        """Initialize the O1 model with API key."""
+    def __init__(self, api_key=None, api_base=None):
+        """Initialize the O1 model with API key and optional endpoint override."""
         self.api_key = api_key or os.environ.get("O1_API_KEY")
         
         # Azure OpenAI API configuration
-        self.api_base = "https://suzarilshah.services.ai.azure.com/openai/deployments/o1-mini/chat/completions?api-version=2024-05-01-preview"
+        self.api_base = api_base or os.environ.get("O1_API_BASE", DEFAULT_API_BASE)
         self.model = "o1-mini"
-        self.system_prompt = O1_SYSTEM_PROMPT
+        self.prompt = prompt_registry.get('o1-system')
+        self.system_prompt = self.prompt.text
+        self.token_budget = TOKEN_BUDGETS[self.model]
         
         # Check if API key is available
         if not self.api_key:
-            print("Warning: O1_API_KEY not set. Using mock responses.")
+            logger.warning("O1_API_KEY not set. Using mock responses.")
         
-    def validate_analysis(self, initial_data, validation_data, deepseek_results):
+    def validate_analysis(self, initial_data, validation_data, deepseek_results, correlations=''):
         """
         Validate analysis results from Deepseek using O1 model.
         
@@ -30,6 +43,8 @@ class O1Model:
             initial_data (dict): Initial telemetry data (Mar-May 2024)
             validation_data (dict): Validation telemetry data (Jun-Aug 2024)
             deepseek_results (dict): Results from Deepseek analysis
+            correlations (str): Optional summary of lagged fish/plant
+                correlations (see storage.correlations)
             
         Returns:
             dict: Validated and enhanced analysis results
@@ -42,24 +57,36 @@ class O1Model:
             plant_validation = validation_data.get('plant', [])
             
             # Create a user message with the data and Deepseek results
-            user_message = self._format_data_for_prompt(
-                fish_initial, plant_initial, fish_validation, plant_validation, deepseek_results
-            )
+            with span('prompt_format', model=self.model):
+                # Thin the telemetry if the prompt would exceed the model's context budget
+                user_message, _, _ = fit_records(
+                    lambda *records: self._format_data_for_prompt(*records, deepseek_results, correlations),
+                    [fish_initial, plant_initial, fish_validation, plant_validation],
+                    self.token_budget, fixed_tokens=self.prompt.tokens
+                )
             
-            # Make API request to Anthropic Claude
-            response = self._call_api(user_message)
+            # Make API request to Anthropic Claude; the provider that wrote the
+            # analysis may not validate it, even if o1 is unhealthy
+            analysed_by = deepseek_results.get('provider')
+            provider, response = self._call_api(user_message, exclude=(analysed_by,) if analysed_by else ())
             
             # Parse and validate the response
-            return self._parse_response(response)
+            results = self._parse_response(response)
+            results['provider'] = provider
+            return results
             
         except Exception as e:
-            print(f"Error in O1 validation: {str(e)}")
+            logger.exception("Error in O1 validation: %s", e)
             # Return the original Deepseek results with a validation error note
-            deepseek_results["validation_error"] = str(e)
-            return deepseek_results
+            return dict(deepseek_results, validation_error=str(e), provider=None)
     
-    def _format_data_for_prompt(self, fish_initial, plant_initial, fish_validation, plant_validation, deepseek_results):
+    def _format_data_for_prompt(self, fish_initial, plant_initial, fish_validation, plant_validation, deepseek_results,
+                                correlations=''):
         """Format the telemetry data and Deepseek results for the prompt."""
+        correlation_section = f"""
+CROSS-PARAMETER CORRELATIONS (over all posted readings, detrended; a positive lag means the fish parameter leads):
+{correlations}
+""" if correlations else ''
         return f"""
 Please validate the following aquaponics analysis results:
 
@@ -76,79 +103,107 @@ Fish Telemetry:
 
 Plant Telemetry:
 {json.dumps(plant_validation, indent=2)}
-
+{correlation_section}
 DEEPSEEK ANALYSIS RESULTS:
-{json.dumps(deepseek_results, indent=2)}
+{json.dumps({key: value for key, value in deepseek_results.items() if key != 'provider'}, indent=2)}
 
 Please validate these results, provide confidence scores, and enhance the recommendations if needed. Return your response in the same format as the Deepseek results, but with any corrections or additions you deem necessary.
 """
     
-    def _call_api(self, user_message):
-        """Call the Azure OpenAI API with the formatted message."""
+    def _call_api(self, user_message, exclude=()):
+        """
+        Call the Azure OpenAI API with the formatted message.
+
+        Args:
+            user_message (str): The formatted prompt
+            exclude (tuple): Providers that must not answer
+
+        Returns:
+            tuple: (provider that answered, or 'mock'; parsed response)
+        """
         # If no API key is available, return a mock response
         if not self.api_key:
-            return self._get_mock_response()
+            return 'mock', self._get_mock_response()
+        
+        messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": user_message}
+        ]
+        
+        def parse(ai_response):
+            # Recover the analysis even from fenced, chatty or slightly malformed JSON
+            try:
+                with span('llm_response_parse', model=self.model):
+                    return parse_analysis(ai_response, model=self.model)
+            except ResponseParseError as e:
+                # The other provider's answer is used instead, if it has one
+                logger.warning("Could not parse API response (%s)", e, extra={"model": self.model})
+                log_body(logger, "Unparseable API response", ai_response, level=logging.WARNING, sample_rate=1.0, model=self.model)
+                raise
         
         try:
-            # Azure OpenAI API headers
-            headers = {
-                "api-key": self.api_key,
-                "Content-Type": "application/json"
-            }
-            
-            # Azure OpenAI API payload
-            payload = {
-                "messages": [
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
-                "temperature": 0.2,
-                "max_tokens": 1500,
-                "top_p": 0.95,
-                "frequency_penalty": 0,
-                "presence_penalty": 0
-            }
-            
-            # Make API request with retry logic
-            max_retries = 3
-            retry_delay = 2  # seconds
+            # Routed to the healthier provider, hedged if it is slow (see ai/routing.py)
+            return llm_router.complete(messages, prefer=self.model, validate=parse, exclude=exclude,
+                                       with_provider=True)
+        except LLMUnavailableError as e:
+            # Fall back to mock response if no provider gave a usable answer
+            logger.error("No usable API response (%s). Using mock response.", e, extra={"model": self.model})
+            return 'mock', self._get_mock_response()
+        except Exception as e:
+            logger.exception("Unexpected error calling API: %s", e)
+            return 'mock', self._get_mock_response()
+    
+    def complete(self, messages, cancel=None):
+        """
+        Send chat messages to this provider, retrying transient failures.
+        
+        Args:
+            messages (list): Chat messages
+            cancel (Event): Set when another provider's answer was taken;
+                no further retries are made once it is set
             
-            for attempt in range(max_retries):
-                try:
-                    response = requests.post(self.api_base, headers=headers, json=payload, timeout=30)
-                    response.raise_for_status()
-                    
-                    # Parse JSON response
-                    response_data = response.json()
-                    ai_response = response_data['choices'][0]['message']['content']
-                    
-                    # Try to parse as JSON
-                    try:
-                        return json.loads(ai_response)
-                    except json.JSONDecodeError:
-                        # If not valid JSON, try to extract JSON from text
-                        import re
-                        json_match = re.search(r'```json\n(.+?)\n```', ai_response, re.DOTALL)
-                        if json_match:
-                            return json.loads(json_match.group(1))
-                        else:
-                            # Fall back to mock response if can't parse JSON
-                            print("Warning: Could not parse API response as JSON. Using mock response.")
-                            return self._get_mock_response()
-                            
-                except (requests.RequestException, json.JSONDecodeError) as e:
-                    if attempt < max_retries - 1:
-                        print(f"API request failed, retrying in {retry_delay} seconds: {str(e)}")
-                        import time
-                        time.sleep(retry_delay)
-                        retry_delay *= 2  # Exponential backoff
-                    else:
-                        print(f"API request failed after {max_retries} attempts: {str(e)}")
-                        return self._get_mock_response()
+        Returns:
+            str: The reply text
+        """
+        cancel = cancel or threading.Event()
+        # Azure OpenAI API headers
+        headers = {
+            "api-key": self.api_key,
+            "Content-Type": "application/json"
+        }
         
-        except Exception as e:
-            print(f"Unexpected error calling API: {str(e)}")
-            return self._get_mock_response()
+        # Azure OpenAI API payload
+        payload = {
+            "messages": messages,
+            "temperature": 0.2,
+            "max_tokens": 1500,
+            "top_p": 0.95,
+            "frequency_penalty": 0,
+            "presence_penalty": 0
+        }
+        
+        # Make API request with retry logic
+        max_retries = 3
+        retry_delay = 2  # seconds
+        
+        for attempt in range(max_retries):
+            try:
+                with span('llm_attempt', model=self.model):
+                    response = requests.post(self.api_base, headers=headers, json=payload, timeout=30)
+                response.raise_for_status()
+                
+                # Parse JSON response
+                return response.json()["choices"][0]["message"]["content"]
+                        
+            except (requests.RequestException, json.JSONDecodeError, KeyError, IndexError) as e:
+                if attempt == max_retries - 1 or cancel.is_set():
+                    logger.error("API request failed after %s attempts: %s", attempt + 1, e, extra={"model": self.model})
+                    raise
+                logger.warning("API request failed, retrying in %s seconds: %s", retry_delay, e, extra={"model": self.model, "attempt": attempt + 1})
+                if cancel.wait(retry_delay):
+                    raise
+                record_backoff(self.model, retry_delay)
+                retry_delay *= 2  # Exponential backoff
     
     def _get_mock_response(self):
         """Return a mock response for development or when API calls fail."""
@@ -178,7 +233,8 @@ Please validate these results, provide confidence scores, and enhance the recomm
         }
     
     def _parse_response(self, response):
-        """Parse and validate the response from the API."""
-        # In a real implementation, this would parse JSON from the API response
-        # For now, we're just returning the mock response
-        return response
+        """Validate the response against the analysis schema, coercing field types."""
+        result, problems = conform_analysis(response)
+        if problems:
+            logger.warning("API response deviates from schema: %s", '; '.join(problems), extra={"model": self.model})
+        return result
@@ -0,0 +1,323 @@
+"""
+Tolerant parsing and schema validation of LLM analysis responses.
+
+Models are asked for a JSON object, but replies often wrap it in prose or
+```json fences, leave trailing commas, use single quotes or Python literals,
+or get cut off by ``max_tokens``. Throwing those replies away wastes the
+tokens already paid for, so parsing goes through increasingly forgiving
+steps, stopping at the first that works:
+
+    clean       the whole reply is valid JSON
+    extracted   a balanced {...} object found in the reply is valid JSON
+    repaired    that object parses after repair (quotes, commas, literals,
+                closing a truncated object)
+
+The result is then checked against the compiled analysis schema
+(``Goldfish_Health`` / ``Spearmint_Growth`` / ``System_Risk``), coercing
+values to the expected types. Outcomes are counted per model in
+``aquaponics_llm_parse_total``.
+"""
+import json
+import re
+from functools import lru_cache
+
+from monitoring import registry
+
+PARSE_RESULTS = registry.counter(
+    'aquaponics_llm_parse_total', 'LLM response parse outcomes by model and outcome')
+
+UNKNOWN = "Unknown"
+
+class ResponseParseError(ValueError):
+    """Raised when no usable analysis can be recovered from a response."""
+
+_STRUCTURAL = re.compile(r'[\\"\'{}\[\]]')
+
+class JsonObjectScanner:
+    """
+    Incrementally find top-level ``{...}`` objects in a stream of text.
+
+    Tracks brace depth and string state across ``feed()`` calls, so it works
+    on streamed chunks as well as on a whole reply. Braces inside strings
+    are ignored; text outside objects (prose, fences) is skipped.
+    """
+
+    def __init__(self):
+        self.buffer = []
+        self.stack = []
+        self.quote = None
+        self.escaped = False
+
+    def feed(self, chunk):
+        """Consume a chunk; returns the objects completed within it."""
+        completed = []
+        start = 0 if self.stack else None
+        # Position in this chunk of a character escaped by a backslash
+        escaped_at = 0 if self.escaped else -1
+        # Only structural characters matter, so skip straight between them
+        for match in _STRUCTURAL.finditer(chunk):
+            char, i = match.group(), match.start()
+            if not self.stack:
+                if char == '{':
+                    self.stack.append('}')
+                    start = i
+                continue
+
+            if self.quote:
+                if i == escaped_at:
+                    continue
+                if char == '\\':
+                    escaped_at = i + 1
+                elif char == self.quote:
+                    self.quote = None
+            elif char in '"\'':
+                self.quote = char
+            elif char in '{[':
+                self.stack.append('}' if char == '{' else ']')
+            elif char in '}]':
+                if char == self.stack[-1]:
+                    self.stack.pop()
+                if not self.stack:
+                    completed.append(''.join(self.buffer) + chunk[start:i + 1])
+                    self.buffer = []
+                    start = None
+
+        self.escaped = escaped_at == len(chunk)
+        if self.stack:
+            self.buffer.append(chunk[start:])
+        return completed
+
+    def pending(self):
+        """The unfinished object (if any), closed so it can be parsed."""
+        if not self.stack:
+            return None
+        text = ''.join(self.buffer)
+        if self.quote:
+            text += self.quote
+        # Drop a dangling key (with or without its colon) before closing the
+        # open brackets; trailing commas are left for repair_json
+        text = re.sub(r'"[^"]*"\s*:\s*$', '', text)
+        text = re.sub(r'([{,]\s*)"[^"]*"\s*$', r'\1', text)
+        return text + ''.join(reversed(self.stack))
+
+_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+
+# Strings (double, single or curly quoted; possibly unterminated), trailing
+# commas and Python literals. Strings are matched first, so commas and
+# literals inside them are left alone.
+_REPAIR_TOKENS = re.compile(
+    r'"(?:[^"\\]|\\.)*"?'
+    r"|'(?:[^'\\]|\\.)*'?"
+    r'|“[^”]*”?'
+    r'|,(?=\s*(?:[}\]]|$))'
+    r'|\b(?:True|False|None)\b',
+    re.DOTALL)
+
+def _repair_token(match):
+    token = match.group()
+    first = token[0]
+    if first == '"':
+        return token
+    if first in "'“":
+        closing = "'" if first == "'" else '”'
+        body = token[1:-1] if len(token) > 1 and token.endswith(closing) else token[1:]
+        body = body.replace("\\'", "'").replace('"', '\\"')
+        return f'"{body}"'
+    if first == ',':
+        return ''
+    return _LITERALS[token]
+
+def repair_json(text):
+    """
+    Repair common LLM JSON mistakes in a single regex pass.
+
+    Converts single-quoted (and curly-quoted) strings to double-quoted ones,
+    drops trailing commas before ``}``/``]`` and maps Python literals
+    (True/False/None) to JSON.
+    """
+    return _REPAIR_TOKENS.sub(_repair_token, text)
+
+def extract_json(text):
+    """
+    Recover a JSON object from an LLM reply.
+
+    Returns:
+        tuple: (parsed dict, outcome) where outcome is 'clean', 'extracted'
+        or 'repaired'
+
+    Raises:
+        ResponseParseError: if no object can be recovered
+    """
+    try:
+        parsed = json.loads(text)
+        if isinstance(parsed, dict):
+            return parsed, 'clean'
+    except (TypeError, ValueError):
+        pass
+
+    scanner = JsonObjectScanner()
+    candidates = scanner.feed(str(text))
+    truncated = scanner.pending()
+    # Largest object first: the analysis, not an example snippet inside prose
+    candidates.sort(key=len, reverse=True)
+
+    for candidate in candidates:
+        try:
+            return json.loads(candidate), 'extracted'
+        except ValueError:
+            continue
+    for candidate in candidates + ([truncated] if truncated else []):
+        try:
+            return json.loads(repair_json(candidate)), 'repaired'
+        except ValueError:
+            continue
+    raise ResponseParseError("No JSON object found in response")
+
+@lru_cache(maxsize=1024)
+def _normalize_key(key):
+    return re.sub(r'[^a-z0-9]', '', str(key).lower())
+
+def _coerce_text(value):
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise TypeError(f"expected text, got {type(value).__name__}")
+
+def _coerce_percent(value):
+    if isinstance(value, bool):
+        raise TypeError("expected a percentage, got bool")
+    if isinstance(value, (int, float)):
+        return f"{round(value * 100 if value <= 1 else value)}%"
+    text = _coerce_text(value)
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)\s*%?', text)
+    return f"{match.group(1)}%" if match else text
+
+def _coerce_number(value):
+    if isinstance(value, bool):
+        raise TypeError("expected a number, got bool")
+    return float(value)
+
+_LEVEL_SYNONYMS = {'moderate': 'medium', 'med': 'medium', 'normal': 'adequate', 'ok': 'adequate'}
+
+def _coerce_level(value):
+    level = _coerce_text(value).lower()
+    return _LEVEL_SYNONYMS.get(level, level)
+
+COERCERS = {
+    'text': _coerce_text,
+    'percent': _coerce_percent,
+    'number': _coerce_number,
+    'level': _coerce_level,
+}
+
+def compile_schema(spec, path=''):
+    """
+    Compile a schema spec into a validator function.
+
+    A spec is a dict of field name to sub-spec, or a leaf type name from
+    ``COERCERS``. Names ending in ``?`` are optional; a ``*`` entry
+    validates any extra keys. Keys are matched ignoring case and
+    punctuation, and renamed to the spec's spelling.
+
+    The validator takes a value and a list to append problems to, and
+    returns the coerced value.
+    """
+    if isinstance(spec, str):
+        coerce = COERCERS[spec]
+
+        def validate_leaf(value, problems):
+            try:
+                return coerce(value)
+            except (TypeError, ValueError) as e:
+                problems.append(f"{path}: {e}")
+                return UNKNOWN
+        return validate_leaf
+
+    fields = []
+    for name, sub_spec in spec.items():
+        if name == '*':
+            continue
+        optional = name.endswith('?')
+        name = name.rstrip('?')
+        fields.append((name, _normalize_key(name), optional, compile_schema(sub_spec, f"{path}.{name}".lstrip('.'))))
+    extra = compile_schema(spec['*'], f"{path}.*".lstrip('.')) if '*' in spec else None
+    known = {normalized for _, normalized, _, _ in fields}
+
+    def validate_object(value, problems):
+        if not isinstance(value, dict):
+            problems.append(f"{path or 'response'}: expected an object")
+            value = {}
+        by_key = {_normalize_key(key): item for key, item in value.items()}
+        result = {}
+        for name, normalized, optional, validate in fields:
+            if normalized in by_key:
+                result[name] = validate(by_key[normalized], problems)
+            elif not optional:
+                problems.append(f"{path}.{name}: missing".lstrip('.'))
+                result[name] = validate({}, [])
+        for key, item in value.items():
+            if _normalize_key(key) not in known:
+                result[key] = extra(item, problems) if extra else item
+        return result
+    return validate_object
+
+# Structure every analysis (LLM or local) follows; see ai/prompts
+ANALYSIS_SCHEMA = {
+    'Goldfish_Health': {
+        'pH_Trend': {'next_30d': 'text', 'action': 'text'},
+        'Ammonia_Risk': {'probability': 'percent', 'peak_day': 'text'},
+    },
+    'Spearmint_Growth': {
+        'Harvest_Readiness': {'optimal_date': 'text'},
+        'Nutrient_Deficit': {'nitrogen': 'level', 'fix': 'text'},
+    },
+    'System_Risk': {
+        '*': {'severity': 'level', 'impact': 'text'},
+    },
+    'urgent?': {'title': 'text', 'action': 'text'},
+    'watch?': {'title': 'text', 'action': 'text'},
+    'confidence_score?': 'number',
+}
+
+REQUIRED_SECTIONS = ['Goldfish_Health', 'Spearmint_Growth', 'System_Risk']
+
+_validate_analysis = compile_schema(ANALYSIS_SCHEMA)
+
+def conform_analysis(data):
+    """
+    Validate and coerce an analysis dict against ``ANALYSIS_SCHEMA``.
+
+    Missing leaf fields are filled with "Unknown" rather than discarding
+    the analysis.
+
+    Returns:
+        tuple: (coerced dict, list of problems found)
+
+    Raises:
+        ResponseParseError: if a required top-level section is missing
+    """
+    if not isinstance(data, dict):
+        raise ResponseParseError("Analysis is not a JSON object")
+    problems = []
+    result = _validate_analysis(data, problems)
+    missing = [section for section in REQUIRED_SECTIONS if f"{section}: missing" in problems]
+    if missing:
+        raise ResponseParseError(f"Missing sections: {', '.join(missing)}")
+    return result, problems
+
+def parse_analysis(text, model='unknown'):
+    """
+    Parse an LLM reply into a schema-conforming analysis dict.
+
+    Raises:
+        ResponseParseError: if no usable analysis can be recovered
+    """
+    try:
+        data, outcome = extract_json(text)
+        result, _ = conform_analysis(data)
+    except ResponseParseError:
+        PARSE_RESULTS.inc(model=model, outcome='failed')
+        raise
+    PARSE_RESULTS.inc(model=model, outcome=outcome)
+    return result
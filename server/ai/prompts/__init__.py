@@ -1,7 +1,14 @@
 """
 Aquaponics AI Prompts Module
 """
-from .deepseek_prompt import DEEPSEEK_SYSTEM_PROMPT
-from .o1_prompt import O1_SYSTEM_PROMPT
+from .deepseek_prompt import DEEPSEEK_PROMPT_VERSION, DEEPSEEK_SYSTEM_PROMPT
+from .o1_prompt import O1_PROMPT_VERSION, O1_SYSTEM_PROMPT
+from .registry import PromptRegistry, PromptTemplate
 
-__all__ = ['DEEPSEEK_SYSTEM_PROMPT', 'O1_SYSTEM_PROMPT']
+# Templates are hashed and token-counted once, here
+prompt_registry = PromptRegistry()
+prompt_registry.register('deepseek-system', DEEPSEEK_PROMPT_VERSION, DEEPSEEK_SYSTEM_PROMPT, label='Deepseek')
+prompt_registry.register('o1-system', O1_PROMPT_VERSION, O1_SYSTEM_PROMPT, label='O1')
+
+__all__ = ['DEEPSEEK_SYSTEM_PROMPT', 'O1_SYSTEM_PROMPT', 'PromptRegistry', 'PromptTemplate',
+           'prompt_registry']
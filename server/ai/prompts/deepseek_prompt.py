@@ -2,6 +2,9 @@
 Deepseek system prompt for aquaponics AI analysis.
 """
 
+# Bump when editing the prompt below; records reference it by version and hash
+DEEPSEEK_PROMPT_VERSION = 1
+
 DEEPSEEK_SYSTEM_PROMPT = """You are an aquaponics expert. I want you to forecast goldfish/spearmint interactions and optimize their symbiotic environment using initial data (Mar-May 2024). Validate predictions against Jun-Aug 2024 data.
 
 Core Requirements
@@ -0,0 +1,108 @@
+"""
+Versioned, content-hashed registry of prompt templates.
+
+Templates are registered once at import with a name and version, and
+hashed (SHA-256) then. Analysis records store only the template reference
+``<name>@<version>#<hash>`` instead of the full text; the text is looked up
+again when a record is read. Each template is also written once to a
+content-addressed file (``<hash>.txt``), so records keep resolving after a
+prompt is edited and its version bumped.
+"""
+import hashlib
+import logging
+from pathlib import Path
+
+from ..tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+HASH_LENGTH = 12
+
+class PromptTemplate:
+    """An immutable prompt template with its hash and token count."""
+
+    def __init__(self, name, version, text, label=None):
+        self.name = name
+        self.version = str(version)
+        self.text = text
+        self.label = label or name
+        self.hash = hashlib.sha256(text.encode('utf-8')).hexdigest()[:HASH_LENGTH]
+        self.ref = f"{name}@{self.version}#{self.hash}"
+        self.tokens = count_tokens(text)
+
+class PromptRegistry:
+    """Registry of prompt templates, addressable by name or reference."""
+
+    def __init__(self):
+        self._by_name = {}
+        self._by_ref = {}
+        self._by_hash = {}
+        self.store_dir = None
+
+    def register(self, name, version, text, label=None):
+        """Register a template; returns the ``PromptTemplate``."""
+        template = PromptTemplate(name, version, text, label)
+        current = self._by_name.get(name)
+        if current and current.version == template.version and current.hash != template.hash:
+            raise ValueError(f"Prompt {name} changed without a version bump ({current.version})")
+        self._by_name[name] = template
+        self._by_ref[template.ref] = template
+        self._by_hash[template.hash] = template
+        if self.store_dir:
+            self._persist(template)
+        return template
+
+    def get(self, name):
+        """The current template registered under ``name``."""
+        return self._by_name[name]
+
+    def resolve(self, ref):
+        """
+        Look up a template by reference (``name@version#hash``).
+
+        Falls back to the content-addressed store for templates that are no
+        longer registered.
+
+        Returns:
+            PromptTemplate | None: the template, or None if unknown
+        """
+        template = self._by_ref.get(ref)
+        if template is not None:
+            return template
+
+        name_version, _, digest = str(ref).partition('#')
+        text = self._by_hash[digest].text if digest in self._by_hash else None
+        if text is None and digest and self.store_dir:
+            path = self.store_dir / f"{digest}.txt"
+            if path.exists():
+                text = path.read_text(encoding='utf-8')
+        if text is None:
+            return None
+        name, _, version = name_version.partition('@')
+        template = self._by_ref[ref] = PromptTemplate(name, version, text)
+        return template
+
+    def persist_to(self, store_dir):
+        """Write every template (now and later registered) to ``store_dir`` once."""
+        self.store_dir = Path(store_dir)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        for template in self._by_name.values():
+            self._persist(template)
+
+    def _persist(self, template):
+        path = self.store_dir / f"{template.hash}.txt"
+        if not path.exists():
+            try:
+                path.write_text(template.text, encoding='utf-8')
+            except OSError as e:
+                logger.error("Error saving prompt template %s: %s", template.ref, e)
+
+    def describe(self, refs):
+        """Render the prompt text shown for a record's template references."""
+        templates = [self.resolve(ref) for ref in refs]
+        texts = [(template.label, template.text) if template else (ref, f"(prompt {ref} unavailable)")
+                 for ref, template in zip(refs, templates)]
+        if len(texts) == 1:
+            return texts[0][1]
+        return "Ensemble model using both:\n\n" + "\n\n".join(
+            f"{i}. {label} Prompt:\n{text}" for i, (label, text) in enumerate(texts, 1))
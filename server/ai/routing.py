@@ -0,0 +1,256 @@
+"""
+Latency-aware routing and hedged requests across LLM providers.
+
+Both providers (``deepseek-r1`` on the Azure AI models endpoint, ``o1-mini``
+on Azure OpenAI) can answer any of our prompts, so a slow or failing one
+need not hold a request for its full timeout and backoff. The router keeps a
+rolling window of each provider's latencies and errors and:
+
+    routes      each request to the preferred provider unless its health
+                score (p95 latency inflated by its error rate) is more than
+                ``ROUTE_MARGIN`` times worse than the alternate's
+    hedges      once the primary has taken longer than its p95, the request
+                is sent again to the alternate; the first valid answer wins
+    fails over  at once to the alternate when the primary errors out
+
+The losing attempt is abandoned: its result is discarded and it stops
+before any further retry or backoff. (``requests`` cannot abort a call
+mid-read, so an in-flight HTTP call runs to its timeout in the background.)
+Its elapsed time is recorded as a latency sample, so a stalled provider's
+p95 reflects the stall.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from monitoring import registry, span
+
+logger = logging.getLogger(__name__)
+
+# Rolling window per provider: the last ROUTER_WINDOW calls, at most
+# ROUTER_WINDOW_SECONDS old (so a provider recovers from an outage)
+ROUTER_WINDOW = int(os.environ.get('LLM_ROUTER_WINDOW', 200))
+ROUTER_WINDOW_SECONDS = float(os.environ.get('LLM_ROUTER_WINDOW_SECONDS', 600))
+# Calls needed before a provider's percentiles are trusted
+MIN_SAMPLES = 10
+# Hedge delay while a provider has too few samples, and its bounds
+HEDGE_DEFAULT = float(os.environ.get('LLM_HEDGE_DEFAULT_SECONDS', 8.0))
+HEDGE_MIN = float(os.environ.get('LLM_HEDGE_MIN_SECONDS', 0.25))
+HEDGE_QUANTILE = 0.95
+HEDGING_ENABLED = os.environ.get('LLM_HEDGING', 'true').lower() in ('1', 'true', 'yes')
+# Each error counts as this many p95s when scoring health
+ERROR_PENALTY = 4.0
+# The preferred provider keeps traffic until it is this much worse
+ROUTE_MARGIN = 1.5
+
+ROUTE_OUTCOMES = registry.counter(
+    'aquaponics_llm_route_total', 'LLM attempts by provider and outcome (won, failed, abandoned)')
+HEDGES = registry.counter(
+    'aquaponics_llm_hedges_total', 'Hedged or failover requests sent to an alternate provider')
+PROVIDER_P95 = registry.gauge(
+    'aquaponics_llm_provider_p95_seconds', 'Rolling p95 latency per LLM provider')
+PROVIDER_ERRORS = registry.gauge(
+    'aquaponics_llm_provider_error_rate', 'Rolling error rate per LLM provider')
+
+class LLMUnavailableError(RuntimeError):
+    """Raised when no provider returned a valid answer."""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(f"{name}: {error}" for name, error in errors.items())
+                         or 'no LLM provider available')
+        self.errors = errors
+
+class ProviderStats:
+    """Rolling latency and error samples for one provider."""
+
+    def __init__(self, window=ROUTER_WINDOW, max_age=ROUTER_WINDOW_SECONDS):
+        self.max_age = max_age
+        # (recorded at, latency seconds, ok: True/False, or None for abandoned)
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self._lock:
+            self._samples.append((time.monotonic(), latency, ok))
+
+    def _recent(self):
+        cutoff = time.monotonic() - self.max_age
+        with self._lock:
+            while self._samples and self._samples[0][0] < cutoff:
+                self._samples.popleft()
+            return list(self._samples)
+
+    def snapshot(self):
+        """{samples, p50, p95, error_rate}; percentiles are None below ``MIN_SAMPLES``."""
+        samples = self._recent()
+        latencies = sorted(latency for _, latency, _ in samples)
+        outcomes = [ok for _, _, ok in samples if ok is not None]
+        snapshot = {
+            'samples': len(samples),
+            'p50': None,
+            'p95': None,
+            'error_rate': outcomes.count(False) / len(outcomes) if outcomes else 0.0,
+        }
+        if len(latencies) >= MIN_SAMPLES:
+            snapshot['p50'] = latencies[int(0.5 * (len(latencies) - 1))]
+            snapshot['p95'] = latencies[int(HEDGE_QUANTILE * (len(latencies) - 1))]
+        return snapshot
+
+class LLMRouter:
+    """Routes LLM calls to the healthier provider and hedges slow ones."""
+
+    def __init__(self, max_workers=16):
+        self._providers = {}
+        self._stats = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='llm')
+
+    def register(self, name, send):
+        """
+        Register a provider.
+
+        Args:
+            name (str): Provider name, e.g. the model deployment
+            send (callable): ``send(messages, cancel)`` returning the reply
+                text, raising on failure; it should give up (raise) once the
+                ``cancel`` event is set
+        """
+        self._providers[name] = send
+        self.stats(name)
+
+    def providers(self):
+        return list(self._providers)
+
+    def stats(self, name):
+        if name not in self._stats:
+            self._stats.setdefault(name, ProviderStats())
+        return self._stats[name]
+
+    def health(self, name):
+        """Health score in seconds (lower is better)."""
+        snapshot = self.stats(name).snapshot()
+        p95 = snapshot['p95'] if snapshot['p95'] is not None else HEDGE_DEFAULT
+        return p95 * (1 + ERROR_PENALTY * snapshot['error_rate'])
+
+    def order(self, names, prefer=None):
+        """``names`` in the order to try them: healthiest first, ``prefer`` within the margin."""
+        ranked = sorted(names, key=self.health)
+        if prefer in ranked and self.health(prefer) <= ROUTE_MARGIN * self.health(ranked[0]):
+            ranked.remove(prefer)
+            ranked.insert(0, prefer)
+        return ranked
+
+    def hedge_delay(self, name):
+        """Seconds to wait on ``name`` before hedging: its p95, bounded."""
+        p95 = self.stats(name).snapshot()['p95']
+        return max(HEDGE_MIN, p95 if p95 is not None else HEDGE_DEFAULT)
+
+    def complete(self, messages, prefer=None, validate=None, overrides=None, exclude=(), with_provider=False):
+        """
+        Send ``messages`` to the registered providers (see ``call``).
+
+        Args:
+            messages (list): Chat messages
+            prefer (str): Provider to use while it is healthy
+            validate (callable): Turns the reply text into the result,
+                raising if it is unusable (the other provider is then tried)
+            overrides (dict): {provider: send} used instead of (or besides)
+                the registered ``send`` functions
+            exclude (iterable): Providers that must not answer this request
+            with_provider (bool): Return ``(provider, result)``
+        """
+        senders = dict(self._providers, **(overrides or {}))
+        attempts = {name: (lambda cancel, send=send: send(messages, cancel))
+                    for name, send in senders.items() if name not in exclude}
+        return self.call(attempts, prefer=prefer, validate=validate, with_provider=with_provider)
+
+    def call(self, attempts, prefer=None, validate=None, with_provider=False):
+        """
+        Run one logical request over several providers, first valid answer wins.
+
+        Args:
+            attempts (dict): {provider: callable(cancel) -> reply text}
+            prefer (str): Provider to use while it is healthy
+            validate (callable): Optional reply -> result check, run in the attempt
+            with_provider (bool): Return ``(provider, result)``
+
+        Returns:
+            The first valid result, with the provider that gave it if
+            ``with_provider`` is set
+
+        Raises:
+            LLMUnavailableError: if every provider failed
+        """
+        queue = self.order(list(attempts), prefer)
+        if not queue:
+            raise LLMUnavailableError({})
+        if not HEDGING_ENABLED:
+            queue = queue[:1]
+        running = {}  # future -> (provider, started, cancel event)
+        errors = {}
+
+        def launch(name):
+            cancel = threading.Event()
+            started = time.monotonic()
+            future = self._executor.submit(self._attempt, name, attempts[name], validate, cancel)
+            running[future] = (name, started, cancel)
+            return started + self.hedge_delay(name)
+
+        with span('llm_route', provider=queue[0]):
+            hedge_at = launch(queue.pop(0))
+            while running:
+                timeout = max(0.0, hedge_at - time.monotonic()) if queue else None
+                done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, _, _ = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        errors[name] = e
+                        continue
+                    ROUTE_OUTCOMES.inc(provider=name, outcome='won')
+                    self._abandon(running)
+                    return (name, result) if with_provider else result
+                # Hedge a slow attempt, or fail over from a failed one
+                if queue and (not running or time.monotonic() >= hedge_at):
+                    alternate = queue.pop(0)
+                    HEDGES.inc(provider=alternate, reason='hedge' if running else 'failover')
+                    logger.info("Sending request to %s (%s)", alternate, 'hedge' if running else 'failover')
+                    hedge_at = launch(alternate)
+        raise LLMUnavailableError(errors)
+
+    def _attempt(self, name, attempt, validate, cancel):
+        started = time.monotonic()
+        try:
+            reply = attempt(cancel)
+            result = validate(reply) if validate else reply
+        except Exception as e:
+            if not cancel.is_set():
+                self._record(name, time.monotonic() - started, False)
+                ROUTE_OUTCOMES.inc(provider=name, outcome='failed')
+                logger.warning("LLM provider %s failed: %s", name, e)
+            raise
+        if not cancel.is_set():
+            self._record(name, time.monotonic() - started, True)
+        return result
+
+    def _abandon(self, running):
+        for future, (name, started, cancel) in running.items():
+            cancel.set()
+            future.cancel()
+            # At least this slow; counts towards latency but not errors
+            self._record(name, time.monotonic() - started, None)
+            ROUTE_OUTCOMES.inc(provider=name, outcome='abandoned')
+
+    def _record(self, name, latency, ok):
+        stats = self.stats(name)
+        stats.record(latency, ok)
+        snapshot = stats.snapshot()
+        if snapshot['p95'] is not None:
+            PROVIDER_P95.set(snapshot['p95'], provider=name)
+        PROVIDER_ERRORS.set(snapshot['error_rate'], provider=name)
+
+# Shared by the analysis models and the chatbot (providers register in ai.models)
+llm_router = LLMRouter()
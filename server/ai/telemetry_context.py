@@ -0,0 +1,214 @@
+"""
+Live telemetry snapshot for the chatbot.
+
+Operators ask about the system as it is now ("is my pH OK?"), so every
+chat request carries a compact summary of the current state of the
+validation dataset:
+
+    latest      the newest reading of each monitored parameter, with its
+                optimal range and whether it is inside it
+    alerts      the active alerts, most severe first
+    trends      24h change, min and max, from the hourly rollup tier
+
+The snapshot is computed once per data version (the canonical file, its
+rollups and the alert state; a few ``stat`` calls to check) and shared by
+every request and session, so a chat turn reads no CSV. Its text is built
+at the same time and capped at ``CHAT_SNAPSHOT_TOKENS``: lines are added in
+the order above until the budget is used up.
+"""
+import logging
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from monitoring import span
+from storage.alerts import HOUR_NS
+from storage.loader import canonical_path, read_last_row
+from storage.quality import flag_column
+from storage.rollups import RollupStore
+from .tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Tokens for the snapshot part of a chat request
+CHAT_SNAPSHOT_TOKENS = int(os.environ.get('CHAT_SNAPSHOT_TOKENS', 300))
+# Active alerts listed by name; the rest are counted
+SNAPSHOT_ALERTS = 5
+TREND_WINDOW = 24 * HOUR_NS
+
+UNITS = {'temperature': '°C', 'ammonia': 'ppm', 'height': 'cm', 'growth_rate': 'cm/day', 'ec': 'mS/cm'}
+
+def file_version(path):
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except FileNotFoundError:
+        return None
+
+def range_status(value, low, high):
+    """'low', 'high' or 'ok' for a reading against an optimal range."""
+    if low is not None and value < low:
+        return 'low'
+    if high is not None and value > high:
+        return 'high'
+    return 'ok'
+
+def format_range(low, high, unit=''):
+    if low is None or low == 0:
+        return f'<{high}{unit}'
+    return f'{low}-{high}{unit}'
+
+class TelemetrySnapshot:
+    """The current state of one dataset, recomputed only when its data changes."""
+
+    def __init__(self, params, alert_manager, data_dir, dataset_type='validation', max_tokens=CHAT_SNAPSHOT_TOKENS):
+        """
+        Args:
+            params (dict): {parameter: {'min': ..., 'max': ...}} optimal ranges
+            alert_manager (AlertManager): Alert state of the same dataset
+            data_dir (str | Path): Data directory with ``telemetry/`` and ``rollups/``
+        """
+        self.params = params
+        self.alert_manager = alert_manager
+        self.dataset_type = dataset_type
+        self.max_tokens = max_tokens
+        self.path = canonical_path(dataset_type, data_dir)
+        self.rollups = RollupStore(dataset_type, data_dir)
+        self._lock = threading.Lock()
+        self._version = None
+        self._snapshot = None
+
+    def version(self):
+        """Changes whenever new readings, rollups or alert transitions land."""
+        return ((file_version(self.path),) + tuple(file_version(path) for path in self.rollups.version_paths())
+                + self.alert_manager.version())
+
+    def get(self):
+        """
+        The current snapshot.
+
+        Returns:
+            dict: ``as_of`` (ISO timestamp of the newest reading or None),
+                  ``latest`` {param: {value, min, max, status, flagged}},
+                  ``alerts`` (active alerts), ``trends`` {param: {change_24h,
+                  min_24h, max_24h}} and ``text``, the rendered summary
+        """
+        version = self.version()
+        if version == self._version:
+            return self._snapshot
+        with self._lock:
+            if version != self._version:
+                with span('chat_snapshot', dataset=self.dataset_type):
+                    snapshot = self._build()
+                self._snapshot = snapshot
+                # After the build: reading the alerts may have advanced their state
+                self._version = self.version()
+        return self._snapshot
+
+    def text(self):
+        """The rendered summary ('' if there is no telemetry yet)."""
+        try:
+            return self.get()['text']
+        except Exception as e:
+            # The chat still works without it
+            logger.warning("Telemetry snapshot unavailable: %s", e)
+            return ''
+
+    def _build(self):
+        snapshot = {'as_of': None, 'latest': {}, 'alerts': [], 'trends': {}}
+        if Path(self.path).exists():
+            row = read_last_row(self.path)
+            if row is not None:
+                snapshot['as_of'] = str(row['timestamp'])
+                snapshot['latest'] = self._latest(row)
+                snapshot['trends'] = self._trends(snapshot['latest'])
+        snapshot['alerts'] = [
+            {key: alert[key] for key in ('parameter', 'component', 'type', 'state', 'opened_at', 'message')}
+            for alert in self.alert_manager.active()
+        ]
+        snapshot['text'] = self._render(snapshot)
+        return snapshot
+
+    def _latest(self, row):
+        latest = {}
+        for param, limits in self.params.items():
+            value = row.get(param)
+            if value is None or np.isnan(value):
+                continue
+            low, high = limits.get('min'), limits.get('max')
+            latest[param] = {
+                'value': float(value),
+                'min': low,
+                'max': high,
+                'status': range_status(value, low, high),
+                'flagged': bool(row.get(flag_column(param), 0) or 0),
+            }
+        return latest
+
+    def _trends(self, latest):
+        watermark = self.rollups.watermark
+        columns = [param for param in latest if param in (self.rollups.columns or [])]
+        if watermark is None or not columns:
+            return {}
+        _, _, stats = self.rollups.query(watermark - TREND_WINDOW, None, HOUR_NS, columns)
+        trends = {}
+        for param in columns:
+            values = stats[param]
+            present = values['count'] > 0
+            if present.sum() < 2:
+                continue
+            means = values['sum'][present] / values['count'][present]
+            trends[param] = {
+                'change_24h': round(latest[param]['value'] - float(means[0]), 4),
+                'min_24h': float(values['min'][present].min()),
+                'max_24h': float(values['max'][present].max()),
+            }
+        return trends
+
+    def _render(self, snapshot):
+        if not snapshot['latest'] and not snapshot['alerts']:
+            return ''
+        lines = [f"CURRENT SYSTEM STATE ({self.dataset_type} telemetry, as of {snapshot['as_of'] or 'unknown'}):"]
+        readings = []
+        for param, reading in snapshot['latest'].items():
+            unit = UNITS.get(param, '')
+            text = f"{param} {reading['value']:.4g}{unit} ({format_range(reading['min'], reading['max'], unit)}"
+            text += ', ok)' if reading['status'] == 'ok' else f", {reading['status'].upper()})"
+            if reading['flagged']:
+                text += ' [suspect sensor reading]'
+            readings.append(text)
+        if readings:
+            lines.append('Latest: ' + '; '.join(readings))
+
+        alerts = snapshot['alerts']
+        if alerts:
+            lines.append(f'Active alerts ({len(alerts)}):')
+            for alert in alerts[:SNAPSHOT_ALERTS]:
+                # Range alerts repeat the latest reading above; sensor faults say more
+                if alert['parameter'] in snapshot['latest'] and alert['component'] != 'sensor':
+                    description = f"{alert['parameter']} out of range"
+                else:
+                    description = alert['message']
+                lines.append(f"- [{alert['type']}] {description} since {alert['opened_at'][:16]}")
+            if len(alerts) > SNAPSHOT_ALERTS:
+                lines.append(f'- and {len(alerts) - SNAPSHOT_ALERTS} more')
+        else:
+            lines.append('Active alerts: none')
+
+        trends = [f"{param} {trend['change_24h']:+.3g} ({trend['min_24h']:.4g} to {trend['max_24h']:.4g})"
+                  for param, trend in snapshot['trends'].items()]
+        if trends:
+            lines.append('24h change: ' + '; '.join(trends))
+
+        # Within the budget, in priority order; later lines are dropped whole
+        kept, used = [], 0
+        for line in lines:
+            tokens = count_tokens(line)
+            if used + tokens > self.max_tokens:
+                kept.append('(truncated)')
+                break
+            kept.append(line)
+            used += tokens
+        return '\n'.join(kept)
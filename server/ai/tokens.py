@@ -0,0 +1,102 @@
+"""
+Local token counting and per-model prompt budgets.
+
+Requests over a model's context window are rejected by the provider after
+the round trip (and sometimes billed), so prompts are measured before they
+are sent. ``tiktoken`` is used when it is installed; otherwise a
+BPE-like estimate is computed from a regex pre-tokenization that, like the
+real tokenizers, splits words, digit runs and punctuation and charges
+extra for long words and non-ASCII characters.
+"""
+import logging
+import math
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding('cl100k_base')
+except Exception:  # not installed, or no cached encoding offline
+    _ENCODING = None
+
+# Pre-tokenization close to the cl100k_base pattern: letters (with an
+# optional leading space), digit runs of up to 3, punctuation runs, spaces
+_PIECES = re.compile(r" ?[A-Za-z]+| ?\d{1,3}| ?[^\sA-Za-z\d]+|\s+")
+
+# Average characters per token inside long words and non-ASCII runs
+CHARS_PER_TOKEN = 4
+
+# Prompt budgets in tokens (context window minus the reply's max_tokens),
+# overridable per model
+TOKEN_BUDGETS = {
+    'deepseek-r1': int(os.environ.get('DEEPSEEK_MAX_PROMPT_TOKENS', 64000 - 1000)),
+    'o1-mini': int(os.environ.get('O1_MAX_PROMPT_TOKENS', 128000 - 1500)),
+}
+
+class TokenBudgetError(ValueError):
+    """Raised when a prompt cannot be made to fit its model's budget."""
+
+def count_tokens(text):
+    """Count (or, without tiktoken, estimate) the tokens in ``text``."""
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    tokens = 0
+    for piece in _PIECES.findall(text):
+        if piece.isascii():
+            # Common words are one token; long ones split into several
+            length = len(piece.strip() or piece)
+            tokens += 1 if length <= 2 * CHARS_PER_TOKEN else math.ceil(length / CHARS_PER_TOKEN)
+        else:
+            # Multi-byte characters (°, →, ±) typically take a token or more each
+            tokens += sum(1 for char in piece if not char.isascii()) + 1
+    return tokens
+
+def fit_records(render, record_lists, budget, fixed_tokens=0):
+    """
+    Render a prompt, thinning the telemetry records until it fits ``budget``.
+
+    Every list keeps evenly spaced records (always including the latest) at
+    the smallest stride that fits.
+
+    Args:
+        render (callable): Builds the prompt text from the record lists
+        record_lists (list): Lists of telemetry records passed to ``render``
+        budget (int): Maximum tokens for the prompt plus ``fixed_tokens``
+        fixed_tokens (int): Tokens already used, e.g. by the system prompt
+
+    Returns:
+        tuple: (prompt text, its token count, stride used)
+
+    Raises:
+        TokenBudgetError: if even the sparsest prompt does not fit
+    """
+    text = render(*record_lists)
+    tokens = count_tokens(text)
+    if tokens + fixed_tokens <= budget:
+        return text, tokens, 1
+
+    longest = max((len(records) for records in record_lists), default=0)
+    low, high = 1, max(longest, 1)
+    best = None
+    # Binary search for the smallest stride that fits
+    while low <= high:
+        stride = (low + high) // 2
+        thinned = [records[::-1][::stride][::-1] for records in record_lists]
+        candidate = render(*thinned)
+        candidate_tokens = count_tokens(candidate)
+        if candidate_tokens + fixed_tokens <= budget:
+            best = (candidate, candidate_tokens, stride)
+            high = stride - 1
+        else:
+            low = stride + 1
+
+    if best is None:
+        raise TokenBudgetError(
+            f"Prompt needs {tokens + fixed_tokens} tokens, over the budget of {budget}")
+    logger.info("Thinned telemetry to every %d record(s) to fit %d-token budget", best[2], budget,
+                extra={'tokens': best[1] + fixed_tokens, 'budget': budget})
+    return best
@@ -1,24 +1,39 @@
 """
 Main Flask application for the Aquaponics Monitoring System API.
 """
+import logging
 import os
 import time
 from datetime import datetime
 from pathlib import Path
 from flask import Flask, jsonify, request
 from flask_cors import CORS
+from monitoring import configure_logging, init_app as init_monitoring
+
+# Install the JSON-lines logging pipeline before the routes (and models) load
+configure_logging()
+logger = logging.getLogger(__name__)
+
 from routes.ai_analysis import ai_analysis_bp
+from routes.bulkhead import bulkhead
 from routes.chatbot import chatbot_bp
 from routes.telemetry import telemetry_bp
+from storage.ingest import ingest_all
 
 # Ensure data directories exist
-DATA_DIR = Path(__file__).parent / 'data'
+DATA_DIR = Path(os.environ.get('AQUAPONICS_DATA_DIR', Path(__file__).parent / 'data'))
 TELEMETRY_DIR = DATA_DIR / 'telemetry'
 CHAT_HISTORY_DIR = DATA_DIR / 'chat_history'
 
 for directory in [DATA_DIR, TELEMETRY_DIR, CHAT_HISTORY_DIR]:
     directory.mkdir(parents=True, exist_ok=True)
 
+# Normalize any new raw sensor exports into the canonical telemetry store
+try:
+    ingest_all(DATA_DIR)
+except Exception as e:
+    logger.exception("Telemetry ingestion failed: %s", e)
+
 # Create Flask app
 app = Flask(__name__)
 
@@ -31,10 +46,20 @@ else:
         r"/api/*": {
             "origins": ["http://localhost", "http://localhost:80"],
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type"]
+            "allow_headers": ["Content-Type"],
+            "expose_headers": ["X-Server-Timing", "Retry-After"]
         }
     })
 
+# Request timing middleware and /metrics endpoint
+init_monitoring(app)
+
+# Separate admission pools, so slow LLM-bound requests can't take the
+# threads the telemetry endpoints need (see routes/bulkhead.py)
+bulkhead.guard(telemetry_bp, 'telemetry')
+bulkhead.guard(chatbot_bp, 'chat')
+bulkhead.guard(ai_analysis_bp, 'analysis')
+
 # Register blueprints
 app.register_blueprint(ai_analysis_bp, url_prefix='/api/ai')
 app.register_blueprint(chatbot_bp, url_prefix='/api/chatbot')
@@ -116,13 +141,13 @@ if __name__ == '__main__':
     
     # Validate environment
     if not os.environ.get('O1_API_KEY'):
-        print("Warning: O1_API_KEY not set. O1 model will use mock responses.")
+        logger.warning("O1_API_KEY not set. O1 model will use mock responses.")
         
     if not os.environ.get('DEEPSEEK_API_KEY'):
-        print("Warning: DEEPSEEK_API_KEY not set. Deepseek model will use mock responses.")
+        logger.warning("DEEPSEEK_API_KEY not set. Deepseek model will use mock responses.")
         
     if not (os.environ.get('O1_API_KEY') or os.environ.get('DEEPSEEK_API_KEY')):
-        print("Warning: No API keys set. All AI models will use mock responses.")
+        logger.warning("No API keys set. All AI models will use mock responses.")
     
     # Start server
     app.run(host='0.0.0.0', port=port, debug=debug)
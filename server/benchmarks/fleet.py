@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Fleet aggregation refresh times: cold, unchanged, and after new readings.
+
+Writes ``--tanks`` synthetic tank files of ``--rows`` readings each, then
+times ``FleetAggregator.refresh()``:
+
+    cold         first refresh, every tank read in full
+    unchanged    nothing written since (a stat per tank)
+    incremental  after ``--append`` readings were appended to every tank
+    full         the same data read from scratch by a new aggregator
+
+The incremental and full aggregates are compared, so the benchmark also
+checks that merging appended rows gives the same statistics.
+
+Usage (from the server directory):
+    python -m benchmarks.fleet --tanks 200 --rows 50000 --append 60 --workers 4
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from routes.telemetry import FISH_PARAMS, PLANT_PARAMS
+from storage.fleet import FleetAggregator
+from .synthetic import generate_fleet
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return round(time.perf_counter() - started, 3), result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark fleet aggregation refreshes')
+    parser.add_argument('--tanks', type=int, default=200)
+    parser.add_argument('--rows', type=int, default=50_000, help='Readings per tank')
+    parser.add_argument('--append', type=int, default=60, help='Readings appended per tank')
+    parser.add_argument('--workers', type=int, help='Worker processes (default FLEET_WORKERS)')
+    parser.add_argument('--work-dir', help='Directory for synthetic data (default: temporary)')
+    parser.add_argument('--output', help='Write JSON results to this file')
+    args = parser.parse_args(argv)
+
+    ranges = {**FISH_PARAMS, **PLANT_PARAMS}
+    options = {'workers': args.workers} if args.workers else {}
+    with tempfile.TemporaryDirectory() as tmp:
+        fleet_dir = Path(args.work_dir or tmp) / 'fleet'
+        generate_fleet(fleet_dir, args.tanks, args.rows)
+
+        aggregator = FleetAggregator(ranges, fleet_dir, **options)
+        report = {'tanks': args.tanks, 'rows_per_tank': args.rows, 'workers': aggregator.workers}
+        report['cold_seconds'], _ = timed(aggregator.refresh)
+        report['unchanged_seconds'], _ = timed(aggregator.refresh)
+
+        generate_fleet(fleet_dir, args.tanks, args.append, start_row=args.rows)
+        report['incremental_seconds'], reads = timed(aggregator.refresh)
+        report['incremental_reads'] = reads
+        report['summary_seconds'], incremental = timed(aggregator.summary)
+
+        fresh = FleetAggregator(ranges, fleet_dir, **options)
+        report['full_seconds'], _ = timed(fresh.refresh)
+        full = fresh.summary()
+
+    matches = all(
+        np.isclose(incremental['history'][param][stat], full['history'][param][stat])
+        for param in full['history'] for stat in ('count', 'mean', 'std', 'min', 'max')
+    ) and incremental['now'] == full['now']
+    report['incremental_matches_full'] = bool(matches)
+    report['tanks_out_of_range'] = full['tanks_out_of_range']
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Peak memory of the telemetry statistics path, before and after the
+explicit-schema, chunked loader.
+
+Writes a synthetic dataset in the canonical layout (every column of a
+canonical file: readings, features, ``is_daytime`` and fault flags) and
+runs the work behind ``/api/telemetry/stats`` and ``/latest`` on it, each
+mode in a fresh process so its peak RSS is its own:
+
+    before   ``pd.read_csv`` of the whole file with inferred (float64 and
+             object) dtypes, ``describe()`` per parameter, ``iloc[-1]``
+    after    ``ColumnSummary`` over ``iter_canonical`` chunks of the
+             parameter columns as float32, ``read_last_row``
+
+``--memory-limit`` caps each process's address space, so a mode that
+would exhaust the machine fails with MemoryError instead of waking the
+OOM killer.
+
+Usage (from the server directory):
+    python -m benchmarks.memory --rows 1000000 10000000 --memory-limit 4096
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from storage.loader import read_header
+from storage.quality import flag_column
+from storage.schema import CANONICAL_COLUMNS
+from .synthetic import SAMPLE_INTERVAL, START_TIME
+
+DEFAULT_TEMPLATE = Path(__file__).parent.parent / 'data' / 'telemetry' / 'validation.csv'
+# Rows whose values are generated; the rest of the file repeats them
+BLOCK_ROWS = 100_000
+MODES = ('before', 'after')
+# The parameters ``/stats`` describes (FISH_PARAMS and PLANT_PARAMS)
+STATS_PARAMS = ['pH', 'temperature', 'ammonia', 'ec', 'growth_rate', 'height']
+
+def template_header(path):
+    """Canonical column names: from ``path`` if it exists, else readings only."""
+    if path and Path(path).exists():
+        return read_header(path)
+    params = [column for column in CANONICAL_COLUMNS if column != 'timestamp']
+    return ['timestamp'] + params + ['is_daytime'] + [flag_column(param) for param in params]
+
+def value_block(header, rows, rng):
+    """``rows`` CSV lines of every column but ``timestamp`` (each with a leading comma)."""
+    columns = []
+    for column in header[1:]:
+        if column.startswith(flag_column('')):
+            values = np.where(rng.random(rows) < 0.01, 1, 0).astype(str)
+        elif column == 'is_daytime':
+            values = np.where(rng.random(rows) < 0.5, 'True', 'False')
+        else:
+            values = np.char.mod('%.4f', rng.normal(10, 3, rows))
+            # Features are missing until their window fills
+            values[rng.random(rows) < 0.02] = ''
+        columns.append(values)
+    return [',' + ','.join(row) for row in zip(*columns)]
+
+def write_dataset(path, rows, header, seed=0):
+    """Write a ``rows``-row canonical-layout CSV (values repeat every ``BLOCK_ROWS``)."""
+    block = value_block(header, min(rows, BLOCK_ROWS), np.random.default_rng(seed))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(','.join(header) + '\n')
+        for start in range(0, rows, len(block)):
+            count = min(len(block), rows - start)
+            timestamps = np.datetime_as_string(
+                START_TIME + np.arange(start, start + count) * SAMPLE_INTERVAL, unit='s')
+            f.write('\n'.join(t + v for t, v in zip(timestamps, block[:count])) + '\n')
+    return path
+
+def run_before(path, params):
+    import pandas as pd
+    data = pd.read_csv(path)
+    stats = {param: data[param].describe().to_dict() for param in params if param in data.columns}
+    latest = data.iloc[-1]
+    return stats, latest
+
+def run_after(path, params):
+    from storage.loader import ColumnSummary, iter_canonical, read_last_row
+    summary = ColumnSummary(params)
+    for chunk in iter_canonical(path, params):
+        summary.update(chunk)
+    stats = {param: summary.describe(param) for param in params}
+    latest = read_last_row(path)
+    return stats, latest
+
+def peak_rss_mb():
+    """This process's peak resident set size in MB."""
+    # VmHWM starts afresh at exec; ru_maxrss keeps the forking parent's peak
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def child(mode, path, memory_limit_mb):
+    """Run one mode and print its result as JSON (in a fresh process)."""
+    if memory_limit_mb:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    params = STATS_PARAMS
+    start = time.perf_counter()
+    try:
+        stats, _ = (run_before if mode == 'before' else run_after)(path, params)
+        result = {'ok': True, 'pH_mean': stats['pH']['mean']}
+    except MemoryError:
+        result = {'ok': False, 'error': 'MemoryError'}
+    result['seconds'] = round(time.perf_counter() - start, 2)
+    result['peak_rss_mb'] = peak_rss_mb()
+    print(json.dumps(result))
+
+def measure(mode, path, memory_limit_mb):
+    command = [sys.executable, '-m', 'benchmarks.memory', '--child', mode, str(path)]
+    if memory_limit_mb:
+        command += ['--memory-limit', str(memory_limit_mb)]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {'ok': False, 'error': f'exit {completed.returncode}: {completed.stderr.strip()[-200:]}'}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark peak memory of telemetry statistics')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    parser.add_argument('--template', default=str(DEFAULT_TEMPLATE),
+                        help='Canonical file whose columns the synthetic data uses')
+    parser.add_argument('--memory-limit', type=int, metavar='MB',
+                        help='Address-space limit per measured process')
+    parser.add_argument('--work-dir', help='Directory for synthetic data (default: temporary)')
+    parser.add_argument('--output', help='Write JSON results to this file')
+    parser.add_argument('--child', nargs=2, metavar=('MODE', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child(args.child[0], args.child[1], args.memory_limit)
+        return
+
+    header = template_header(args.template)
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(args.work_dir or tmp)
+        work_dir.mkdir(parents=True, exist_ok=True)
+        for rows in args.rows:
+            path = work_dir / f'canonical_{rows}.csv'
+            if not path.exists():
+                write_dataset(path, rows, header)
+            entry = {'columns': len(header), 'file_mb': round(path.stat().st_size / 2**20, 1)}
+            for mode in MODES:
+                entry[mode] = measure(mode, path, args.memory_limit)
+            report[rows] = entry
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+    print(f"{'rows':>12}{'file MB':>10}{'before MB':>12}{'after MB':>11}{'before s':>10}{'after s':>9}")
+    for rows, entry in report.items():
+        cells = []
+        for mode in MODES:
+            result = entry[mode]
+            if result['ok']:
+                cells.append(str(result['peak_rss_mb']))
+            elif 'peak_rss_mb' in result:
+                # Ran out of memory at the limit; it would have needed more
+                cells.append(f">{result['peak_rss_mb']}")
+            else:
+                cells.append('failed')
+        print(f"{rows:>12}{entry['file_mb']:>10}{cells[0]:>12}{cells[1]:>11}"
+              f"{entry['before'].get('seconds', '-'):>10}{entry['after'].get('seconds', '-'):>9}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Azure chat-completions endpoints used by the AI models.
+
+Serves both endpoint shapes the server talks to:
+    POST /openai/deployments/<deployment>/chat/completions  (O1Model, chatbot)
+    POST /models/chat/completions                           (DeepseekModel)
+
+Latency, error and 429 injection are configurable so retries, timeouts and
+fallbacks can be exercised under load. Requests with ``"stream": true`` get
+token-by-token server-sent events, and every response carries ``usage``
+token counts. Aggregate counters are available at ``GET /stats``.
+
+Usage (from the server directory):
+    python -m benchmarks.mock_llm_server --port 8900 --latency lognormal:-1.2,0.5 \\
+        --error-rate 0.02 --rate-limit-rate 0.05
+
+Then point the server at it:
+    export DEEPSEEK_API_BASE=http://localhost:8900/models/chat/completions
+    export O1_API_BASE=http://localhost:8900/openai/deployments/o1-mini/chat/completions
+    export CHATBOT_API_BASE=$O1_API_BASE
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from flask import Flask, Response, jsonify, request
+from werkzeug.serving import make_server
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+SERVER_ERROR_CODES = [500, 502, 503, 504]
+
+CHAT_REPLY = ("Keep pH between 6.5 and 7.5. If pH drops below 6.5, add crushed coral and "
+              "check again in 12 hours. Keep ammonia under 0.5ppm and temperature between 18-24°C.")
+
+def count_tokens(text):
+    """Approximate token count: words and punctuation marks."""
+    return len(TOKEN_PATTERN.findall(text or ''))
+
+def parse_latency(spec):
+    """
+    Parse a latency distribution spec into a sampling function (seconds).
+
+    Supported specs:
+        fixed:<s>                e.g. fixed:0.2
+        uniform:<low>,<high>     e.g. uniform:0.1,0.8
+        normal:<mean>,<std>      e.g. normal:0.3,0.05 (clamped at 0)
+        lognormal:<mu>,<sigma>   e.g. lognormal:-1.2,0.5 (long tail)
+    """
+    kind, _, args = spec.partition(':')
+    values = [float(v) for v in args.split(',')] if args else []
+
+    if kind == 'fixed':
+        return lambda: values[0] if values else 0.0
+    if kind == 'uniform':
+        return lambda: random.uniform(values[0], values[1])
+    if kind == 'normal':
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if kind == 'lognormal':
+        return lambda: random.lognormvariate(values[0], values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+class MockLLMConfig:
+    """Runtime behaviour of the mock server."""
+
+    def __init__(self, latency='fixed:0', token_delay=0.0, error_rate=0.0,
+                 rate_limit_rate=0.0, retry_after=1, require_key=True, seed=None):
+        self.latency_spec = latency
+        self.sample_latency = parse_latency(latency)
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.require_key = require_key
+        if seed is not None:
+            random.seed(seed)
+
+class MockLLMStats:
+    """Thread-safe request and token counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.status_counts = {}
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+            self.streamed_requests = 0
+
+    def record(self, status, prompt_tokens=0, completion_tokens=0, streamed=False):
+        with self._lock:
+            self.requests += 1
+            self.status_counts[str(status)] = self.status_counts.get(str(status), 0) + 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.streamed_requests += int(streamed)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'status_counts': dict(self.status_counts),
+                'prompt_tokens': self.prompt_tokens,
+                'completion_tokens': self.completion_tokens,
+                'total_tokens': self.prompt_tokens + self.completion_tokens,
+                'streamed_requests': self.streamed_requests
+            }
+
+def build_reply(messages):
+    """Choose a reply: JSON analysis for system-prompted calls, prose for chat."""
+    if any(m.get('role') == 'system' for m in messages):
+        # Imported lazily: importing ai.models instantiates the model clients,
+        # which must happen after callers have configured their environment
+        from ai.models import deepseek_model
+        return json.dumps(deepseek_model._get_mock_response(), ensure_ascii=False)
+    return CHAT_REPLY
+
+def create_app(config=None):
+    """Create the mock chat-completions Flask app."""
+    config = config or MockLLMConfig()
+    stats = MockLLMStats()
+    app = Flask(__name__)
+    app.config['MOCK_LLM'] = config
+    app.config['MOCK_LLM_STATS'] = stats
+
+    def completion(model):
+        if config.require_key and not request.headers.get('api-key'):
+            stats.record(401)
+            return jsonify({"error": {"code": "401", "message": "Missing api-key header"}}), 401
+
+        payload = request.get_json(silent=True) or {}
+        messages = payload.get('messages', [])
+        prompt_tokens = sum(count_tokens(m.get('content')) for m in messages)
+
+        time.sleep(config.sample_latency())
+
+        roll = random.random()
+        if roll < config.rate_limit_rate:
+            stats.record(429, prompt_tokens)
+            response = jsonify({"error": {"code": "429", "message": "Rate limit is exceeded."}})
+            response.headers['Retry-After'] = str(config.retry_after)
+            return response, 429
+        if roll < config.rate_limit_rate + config.error_rate:
+            status = random.choice(SERVER_ERROR_CODES)
+            stats.record(status, prompt_tokens)
+            return jsonify({"error": {"code": str(status), "message": "Injected server error"}}), status
+
+        reply = build_reply(messages)
+        tokens = TOKEN_PATTERN.findall(reply)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens)
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+
+        if payload.get('stream'):
+            stats.record(200, prompt_tokens, len(tokens), streamed=True)
+            return Response(stream_tokens(reply, completion_id, model, usage, config.token_delay),
+                            mimetype='text/event-stream')
+
+        stats.record(200, prompt_tokens, len(tokens))
+        return jsonify({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": reply}
+            }],
+            "usage": usage
+        })
+
+    @app.route('/openai/deployments/<deployment>/chat/completions', methods=['POST'])
+    def azure_openai_completion(deployment):
+        return completion(deployment)
+
+    @app.route('/models/chat/completions', methods=['POST'])
+    def azure_models_completion():
+        payload = request.get_json(silent=True) or {}
+        return completion(payload.get('model', 'deepseek-r1'))
+
+    @app.route('/stats', methods=['GET'])
+    def get_stats():
+        return jsonify(stats.to_dict())
+
+    @app.route('/stats/reset', methods=['POST'])
+    def reset_stats():
+        stats.reset()
+        return jsonify({"status": "reset"})
+
+    return app
+
+def stream_tokens(reply, completion_id, model, usage, token_delay):
+    """Yield the reply as OpenAI-style server-sent event chunks, one per token."""
+    # Keep the whitespace between tokens so the concatenated deltas equal the reply
+    pieces = re.findall(r"\s*(?:\w+|[^\w\s])", reply)
+    for piece in pieces:
+        if token_delay:
+            time.sleep(token_delay)
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "model": model,
+            "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+        }
+        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+    final = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "model": model,
+        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        "usage": usage
+    }
+    yield f"data: {json.dumps(final)}\n\n"
+    yield "data: [DONE]\n\n"
+
+def serve_in_thread(config=None, host='127.0.0.1', port=0):
+    """
+    Start the mock server on a background thread.
+
+    Returns:
+        tuple: (server, base_url). Call ``server.shutdown()`` to stop it.
+    """
+    server = make_server(host, port, create_app(config), threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_port}"
+
+def api_bases(base_url):
+    """Environment variables that point every LLM client at ``base_url``."""
+    o1_base = f"{base_url}/openai/deployments/o1-mini/chat/completions?api-version=2024-05-01-preview"
+    return {
+        'DEEPSEEK_API_BASE': f"{base_url}/models/chat/completions?api-version=2024-05-01-preview",
+        'O1_API_BASE': o1_base,
+        'CHATBOT_API_BASE': o1_base
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Mock Azure chat-completions server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', default='fixed:0',
+                        help='fixed:<s> | uniform:<lo>,<hi> | normal:<mean>,<std> | lognormal:<mu>,<sigma>')
+    parser.add_argument('--token-delay', type=float, default=0.0,
+                        help='Seconds between streamed tokens')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Fraction of requests answered with a 5xx')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0,
+                        help='Fraction of requests answered with a 429')
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--no-require-key', action='store_true',
+                        help='Accept requests without an api-key header')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+
+    config = MockLLMConfig(
+        latency=args.latency,
+        token_delay=args.token_delay,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        require_key=not args.no_require_key,
+        seed=args.seed
+    )
+    base_url = f"http://{args.host}:{args.port}"
+    print("Point the server at this mock with:")
+    for name, value in api_bases(base_url).items():
+        print(f"  export {name}='{value}'")
+
+    make_server(args.host, args.port, create_app(config), threaded=True).serve_forever()
+
+if __name__ == '__main__':
+    main()
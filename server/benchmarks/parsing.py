@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of LLM response parsing over a corpus of replies.
+
+Compares the tolerant parser in ``ai.parsing`` with the previous approach
+(``json.loads``, then a single ```json fence regex) on success rate and
+time per parse. The default corpus, ``llm_responses.jsonl``, holds one
+``{"name": ..., "response": ...}`` object per line covering the reply
+shapes seen from the models; point ``--corpus`` at captured replies in
+the same format to measure on real traffic.
+
+Usage (from the server directory):
+    python -m benchmarks.parsing --iterations 2000
+"""
+import argparse
+import json
+import re
+import time
+from pathlib import Path
+
+import numpy as np
+
+from ai.parsing import ResponseParseError, conform_analysis, parse_analysis
+
+DEFAULT_CORPUS = Path(__file__).parent / 'llm_responses.jsonl'
+
+def load_corpus(path=DEFAULT_CORPUS):
+    """Load (name, response) pairs from a JSON-lines corpus."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [(entry['name'], entry['response']) for entry in map(json.loads, f) if entry]
+
+def legacy_parse(text):
+    """The parsing the model clients did before ``ai.parsing``."""
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        match = re.search(r'```json\n(.+?)\n```', text, re.DOTALL)
+        if not match:
+            raise ResponseParseError("No JSON found")
+        data = json.loads(match.group(1))
+    # Count it as a success only if it carries the analysis sections
+    conform_analysis(data)
+    return data
+
+def bench(parser, corpus, iterations):
+    """Time ``parser`` on every corpus entry; returns per-entry outcomes and timings."""
+    results = {}
+    for name, response in corpus:
+        try:
+            parser(response)
+            ok = True
+        except (ResponseParseError, ValueError):
+            ok = False
+        samples = np.empty(iterations)
+        for i in range(iterations):
+            start = time.perf_counter()
+            try:
+                parser(response)
+            except (ResponseParseError, ValueError):
+                pass
+            samples[i] = time.perf_counter() - start
+        results[name] = {'ok': ok, 'mean_us': round(float(samples.mean() * 1e6), 2)}
+    return results
+
+def summarize(results):
+    timings = np.array([entry['mean_us'] for entry in results.values()])
+    return {
+        'success_rate': round(sum(entry['ok'] for entry in results.values()) / len(results), 3),
+        'mean_us': round(float(timings.mean()), 2),
+        'max_us': round(float(timings.max()), 2),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark LLM response parsing')
+    parser.add_argument('--corpus', default=str(DEFAULT_CORPUS))
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--output', help='Write JSON results to this file')
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus(args.corpus)
+    report = {}
+    for label, func in (('legacy', legacy_parse), ('tolerant', parse_analysis)):
+        results = bench(func, corpus, args.iterations)
+        report[label] = {'summary': summarize(results), 'entries': results}
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+
+    print(f"\n{'response':<22}{'legacy':>16}{'tolerant':>16}")
+    for name, _ in corpus:
+        legacy, tolerant = report['legacy']['entries'][name], report['tolerant']['entries'][name]
+        print(f"{name:<22}{('ok ' if legacy['ok'] else 'FAIL ') + str(legacy['mean_us']) + 'us':>16}"
+              f"{('ok ' if tolerant['ok'] else 'FAIL ') + str(tolerant['mean_us']) + 'us':>16}")
+    for label in ('legacy', 'tolerant'):
+        summary = report[label]['summary']
+        print(f"{label}: {summary['success_rate']:.0%} parsed, mean {summary['mean_us']}us per reply")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,496 @@
+#!/usr/bin/env python3
+"""
+Replay recorded telemetry into the server under concurrent client load.
+
+Load and soak test: the sensor exports (``client/public/data`` by default)
+are replayed as a live feed, faster than real time and for many tanks,
+while dashboard pollers and ``/predict`` and chat clients hit the API.
+
+Feed
+    The exports are looped: pass ``k`` repeats every reading ``k`` source
+    spans later, starting just after the recorded data. Simulated time runs
+    at ``--speedup`` times wall-clock time. Each tank's copy of the feed
+    gets its own noise model: a fixed offset, a linear drift per simulated
+    day and per-reading Gaussian noise, each in units of the column's
+    standard deviation in the source.
+
+    Tank 0 feeds the ingestion path: its readings are appended to the
+    validation exports in the data directory and ``ingest_dataset`` runs
+    after each batch, so the canonical store, rollups and alerts behind
+    the dashboard grow as they would in production. Every tank's readings
+    are also appended to ``fleet/tank-NNNN.csv`` for the fleet view.
+
+Clients
+    ``--pollers`` threads cycle through the dashboard endpoints,
+    ``--predictors`` post ``/api/ai/predict`` with the latest replayed
+    readings and ``--chatters`` post ``/api/chatbot/send``, each pausing
+    for its interval between requests.
+
+The server is the app itself, served in-process on a threaded WSGI server
+over a copy of the exports (LLM calls go to the local mock server with
+``--mock-llm local``), or a running server given with ``--url``; then
+``--data-dir`` must be its ``AQUAPONICS_DATA_DIR`` and ``--server-pid`` its
+process, for the memory samples.
+
+The report has throughput, latency percentiles and status codes per
+request kind over the whole run, and a timeline with one entry per
+``--report-every`` seconds (requests, p95 latency, errors, rows replayed,
+server RSS), so slowdowns and memory growth over a soak show up.
+
+Usage (from the server directory):
+    python -m benchmarks.replay --duration 60 --tanks 20 --speedup 3600 --mock-llm local
+    python -m benchmarks.replay --duration 3600 --report-every 60 --output soak.json \\
+        --url http://localhost:5001 --data-dir data --server-pid 1234
+"""
+import argparse
+import itertools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import requests
+
+from benchmarks.mock_llm_server import MockLLMConfig, serve_in_thread
+from benchmarks.run import prepare_environment, summarize
+from benchmarks.synthetic import sample_payload
+
+DEFAULT_SOURCE = Path(__file__).parent.parent.parent / 'client' / 'public' / 'data'
+# The exports replayed, and the dataset whose exports tank 0 feeds
+SOURCE_FILES = {'fish': 'fish_validate.csv', 'plant': 'plant_validate.csv'}
+INGEST_DATASET = 'validation'
+RAW_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+DASHBOARD_ENDPOINTS = [
+    ('latest', '/api/telemetry/latest'),
+    ('stats', '/api/telemetry/stats'),
+    ('alerts', '/api/telemetry/alerts'),
+    ('series', '/api/telemetry/series/validation?points=500'),
+    ('correlations', '/api/telemetry/correlations?dataset=validation'),
+    ('fleet', '/api/telemetry/fleet'),
+]
+CHAT_MESSAGES = [
+    'My pH is 6.3, what should I do?',
+    'Is the water temperature OK for goldfish?',
+    'How often should I test ammonia?',
+    'When will the spearmint be ready to harvest?',
+]
+# Readings per stream posted to /predict (split into initial and validation data)
+PAYLOAD_ROWS = 60
+REQUEST_TIMEOUT = 120
+
+class ReplaySource:
+    """
+    One raw export, looped forward in time.
+
+    Readings keep their raw headers and units, so replayed rows can be
+    appended to an export and ingested like the sensor's own.
+    """
+
+    def __init__(self, path):
+        raw = pd.read_csv(path, encoding='utf-8-sig', dtype=str)
+        self.timestamp_column = raw.columns[0]
+        from storage.ingest import parse_timestamps
+        timestamps = parse_timestamps(raw[self.timestamp_column])
+        order = np.argsort(timestamps, kind='stable')
+        self.timestamps = timestamps[order]
+        self.columns = list(raw.columns[1:])
+        self.values = np.column_stack([
+            pd.to_numeric(raw[column], errors='coerce').to_numpy(dtype=np.float64)[order]
+            for column in self.columns
+        ])
+        scale = np.nanstd(self.values, axis=0)
+        self.scale = np.where(scale > 0, scale, 0.0)
+        self.decimals = [self._decimals(raw[column]) for column in self.columns]
+
+    @staticmethod
+    def _decimals(values):
+        fractions = values.dropna().str.partition('.')[2]
+        return int(fractions.str.len().max()) if len(fractions) else 0
+
+    def rows(self, period, base, low, high):
+        """
+        Replayed readings with timestamps in ``(low, high]``.
+
+        Returns:
+            tuple: (timestamps as int64 ns, values of shape (rows, columns))
+        """
+        first = max(int((low - base) // period), 1)
+        last = int((high - base) // period)
+        timestamps, values = [], []
+        for loop in range(first, last + 1):
+            shifted = self.timestamps + loop * period
+            selected = (shifted > low) & (shifted <= high)
+            timestamps.append(shifted[selected])
+            values.append(self.values[selected])
+        if not timestamps:
+            return np.empty(0, dtype=np.int64), np.empty((0, len(self.columns)))
+        return np.concatenate(timestamps), np.vstack(values)
+
+    def frame(self, timestamps, values):
+        """Rows in the export's own layout (headers, timestamp format, precision)."""
+        frame = pd.DataFrame({self.timestamp_column: pd.to_datetime(timestamps).strftime(RAW_TIMESTAMP_FORMAT)})
+        for i, column in enumerate(self.columns):
+            rounded = np.round(values[:, i], self.decimals[i])
+            frame[column] = pd.array(rounded).astype('Int64') if self.decimals[i] == 0 else rounded
+        return frame
+
+class NoiseModel:
+    """A tank's offset, drift and noise, in units of each column's source standard deviation."""
+
+    def __init__(self, scale, rng, noise, drift, offset):
+        self.scale = scale
+        self.rng = rng
+        self.noise = noise
+        self.offset = rng.normal(0, offset, len(scale)) * scale
+        self.drift = rng.normal(0, drift, len(scale)) * scale
+
+    def apply(self, timestamps, values, start):
+        days = ((timestamps - start) / (86400 * 10**9))[:, None]
+        noise = self.rng.normal(0, self.noise, values.shape) * self.scale
+        return values + self.offset + self.drift * days + noise
+
+class Recorder:
+    """Latency and status of every request, by kind, from all client threads."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self.events = []  # (seconds since start, kind, latency, status)
+
+    def record(self, kind, latency, status):
+        with self._lock:
+            self.events.append((time.perf_counter() - self.started, kind, latency, status))
+
+    def timed(self, kind, func):
+        started = time.perf_counter()
+        try:
+            status = func()
+        except Exception as e:
+            status = type(e).__name__
+        self.record(kind, time.perf_counter() - started, status)
+        return status
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.events)
+
+def rss_mb(pid):
+    """Resident set size of a process in MB, or None if it cannot be read."""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+def summarize_events(events, elapsed):
+    """Per-kind latency summary (as ``benchmarks.run``) plus status counts."""
+    by_kind = {}
+    for _, kind, latency, status in events:
+        by_kind.setdefault(kind, []).append((latency, status))
+    results = {}
+    for kind, samples in sorted(by_kind.items()):
+        statuses = [status for _, status in samples]
+        errors = sum(1 for status in statuses if not isinstance(status, int) or status >= 400)
+        results[kind] = summarize([latency for latency, _ in samples], elapsed, errors)
+        results[kind]['statuses'] = {str(status): statuses.count(status) for status in sorted(set(statuses), key=str)}
+    return results
+
+class Replay:
+    """The feed: replays the sources for every tank as simulated time advances."""
+
+    def __init__(self, sources, data_dir, tanks, speedup, recorder, noise=0.05, drift=0.02,
+                 offset=0.3, seed=0, ingest=True):
+        self.sources = sources
+        self.data_dir = Path(data_dir)
+        self.fleet_dir = self.data_dir / 'fleet'
+        self.tanks = tanks
+        self.speedup = speedup
+        self.recorder = recorder
+        self.ingest = ingest
+        self.base = min(int(source.timestamps[0]) for source in sources.values())
+        # One loop covers every stream, plus a typical interval so passes don't touch
+        end = max(int(source.timestamps[-1]) for source in sources.values())
+        interval = int(np.median(np.diff(sources['fish'].timestamps)))
+        self.period = end - self.base + interval
+        self.start = self.base + self.period
+        self.replayed_until = self.start - 1
+        self.rows = 0
+        self.models = {
+            (tank, stream): NoiseModel(source.scale, np.random.default_rng((seed, tank, i)), noise, drift, offset)
+            for tank in range(tanks) for i, (stream, source) in enumerate(sources.items())
+        }
+        # /predict payloads start from the end of the recorded history
+        self.recent = {
+            stream: deque(source.frame(source.timestamps[-PAYLOAD_ROWS:], source.values[-PAYLOAD_ROWS:])
+                          .to_dict(orient='records'), maxlen=PAYLOAD_ROWS)
+            for stream, source in sources.items()
+        }
+        self._wall_start = None
+
+    def simulated_now(self):
+        return self.start + int((time.perf_counter() - self._wall_start) * self.speedup * 1e9)
+
+    def step(self):
+        """Write the readings due since the last step; returns the rows written."""
+        if self._wall_start is None:
+            self._wall_start = time.perf_counter()
+        now = self.simulated_now()
+        low, self.replayed_until = self.replayed_until, now
+        due = {stream: source.rows(self.period, self.base, low, now) for stream, source in self.sources.items()}
+        if not any(len(timestamps) for timestamps, _ in due.values()):
+            return 0
+
+        from storage.ingest import join_streams, map_columns, to_canonical
+        written = 0
+        started = time.perf_counter()
+        for tank in range(self.tanks):
+            frames = {}
+            for stream, (timestamps, values) in due.items():
+                source = self.sources[stream]
+                values = self.models[tank, stream].apply(timestamps, values, self.start)
+                frames[stream] = source.frame(timestamps, values)
+                written += len(timestamps)
+                if tank == 0 and len(timestamps):
+                    if self.ingest:
+                        append_csv(frames[stream], self.data_dir / SOURCE_FILES[stream])
+                    self.recent[stream].extend(frames[stream].to_dict(orient='records'))
+            canonical = join_streams(map_columns(frames['fish'], 'replay'), map_columns(frames['plant'], 'replay'))
+            if len(canonical):
+                append_csv(to_canonical(canonical), self.fleet_dir / f'tank-{tank:04d}.csv')
+        self.recorder.record('feed_write', time.perf_counter() - started, 200)
+
+        if self.ingest and len(due['fish'][0]):
+            from storage.ingest import ingest_dataset
+            self.recorder.timed('feed_ingest', lambda: 200 if ingest_dataset(INGEST_DATASET, self.data_dir) else 404)
+        self.rows += written
+        return written
+
+    def payload(self, model_type):
+        """A /predict body from the latest replayed readings of tank 0."""
+        body = sample_payload()
+        recent = {stream: list(rows) for stream, rows in self.recent.items()}
+        body['initialData'] = {stream: rows[:len(rows) // 2] for stream, rows in recent.items()}
+        body['validationData'] = {stream: rows[len(rows) // 2:] for stream, rows in recent.items()}
+        body['modelType'] = model_type
+        return body
+
+def append_csv(frame, path):
+    """Append rows to a CSV, writing the header if the file is new."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    new = not path.exists() or path.stat().st_size == 0
+    if not new:
+        # Exports may end without a newline; the rows must not run into the last line
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                with open(path, 'ab') as out:
+                    out.write(b'\n')
+    with open(path, 'a', newline='', encoding='utf-8') as f:
+        frame.to_csv(f, header=new, index=False)
+
+def feeder(replay, stop, tick):
+    while not stop.wait(tick):
+        try:
+            replay.step()
+        except Exception as e:
+            replay.recorder.record('feed_error', 0.0, type(e).__name__)
+
+def client_loop(stop, interval, request):
+    """Call ``request`` until ``stop`` is set, pausing ``interval`` seconds in between."""
+    while not stop.is_set():
+        request()
+        stop.wait(interval)
+
+def start_clients(args, session, base_url, replay, recorder, stop):
+    """Start the dashboard, /predict and chat client threads."""
+    def call(kind, method, path, body=None):
+        def issue():
+            response = session.request(method, base_url + path, json=body, timeout=REQUEST_TIMEOUT)
+            response.content  # read the whole body
+            return response.status_code
+        return recorder.timed(kind, issue)
+
+    def poller(i):
+        # Pollers start at different endpoints, so every one gets traffic from the start
+        endpoints = itertools.islice(itertools.cycle(DASHBOARD_ENDPOINTS), i, None)
+        def poll():
+            kind, path = next(endpoints)
+            call(kind, 'GET', path)
+        return args.poll_interval, poll
+
+    def predictor(i):
+        models = itertools.islice(itertools.cycle(args.models), i, None)
+        def predict():
+            model_type = next(models)
+            call(f'predict_{model_type}', 'POST', '/api/ai/predict', replay.payload(model_type))
+        return args.predict_interval, predict
+
+    def chatter(i):
+        messages = itertools.islice(itertools.cycle(CHAT_MESSAGES), i, None)
+        def chat():
+            call('chat', 'POST', '/api/chatbot/send', {'message': next(messages), 'sessionId': f'replay-{i}'})
+        return args.chat_interval, chat
+
+    clients = ([poller(i) for i in range(args.pollers)] + [predictor(i) for i in range(args.predictors)]
+               + [chatter(i) for i in range(args.chatters)])
+    threads = [threading.Thread(target=client_loop, args=(stop, interval, request), daemon=True)
+               for interval, request in clients]
+    for thread in threads:
+        thread.start()
+    return threads
+
+def serve_app(app):
+    """Serve ``app`` on a threaded WSGI server on a free local port; returns (server, url)."""
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+def timeline_entry(events, replay, window_start, window_end, pid):
+    window = [event for event in events if window_start <= event[0] < window_end]
+    kinds = {}
+    for _, kind, latency, status in window:
+        kinds.setdefault(kind, []).append((latency, status))
+    entry = {'t': round(window_end, 1), 'rows_replayed': replay.rows, 'rss_mb': rss_mb(pid), 'kinds': {}}
+    for kind, samples in sorted(kinds.items()):
+        latencies = np.array([latency for latency, _ in samples]) * 1000.0
+        entry['kinds'][kind] = {
+            'requests': len(samples),
+            'rps': round(len(samples) / (window_end - window_start), 2),
+            'p95_ms': round(float(np.percentile(latencies, 95)), 3),
+            'errors': sum(1 for _, status in samples if not isinstance(status, int) or status >= 400),
+        }
+    return entry
+
+def run(args, base_url, data_dir, pid):
+    recorder = Recorder()
+    sources = {stream: ReplaySource(Path(args.source) / name) for stream, name in SOURCE_FILES.items()}
+    replay = Replay(sources, data_dir, args.tanks, args.speedup, recorder, args.noise, args.drift,
+                    args.offset, args.seed, ingest=not args.no_ingest)
+    replay.step()
+
+    stop = threading.Event()
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=args.pollers + args.predictors + args.chatters)
+    session.mount('http://', adapter)
+    threads = [threading.Thread(target=feeder, args=(replay, stop, args.tick), daemon=True)]
+    threads[0].start()
+    threads += start_clients(args, session, base_url, replay, recorder, stop)
+
+    timeline = []
+    window_start = 0.0
+    try:
+        while window_start < args.duration:
+            window_end = min(window_start + args.report_every, args.duration)
+            time.sleep(max(0.0, window_end - (time.perf_counter() - recorder.started)))
+            entry = timeline_entry(recorder.snapshot(), replay, window_start, window_end, pid)
+            timeline.append(entry)
+            print(f"[{entry['t']:>7.1f}s] rows={entry['rows_replayed']:<8} rss={entry['rss_mb']}MB  " +
+                  '  '.join(f"{kind}={stats['requests']}/{stats['p95_ms']:.0f}ms" + (f"/{stats['errors']}err" if stats['errors'] else '')
+                            for kind, stats in entry['kinds'].items()),
+                  file=sys.stderr)
+            window_start = window_end
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join(timeout=REQUEST_TIMEOUT)
+
+    elapsed = time.perf_counter() - recorder.started
+    rss = [entry['rss_mb'] for entry in timeline if entry['rss_mb'] is not None]
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'duration_seconds': round(elapsed, 1),
+            'server': base_url,
+            'tanks': args.tanks,
+            'speedup': args.speedup,
+            'clients': {'pollers': args.pollers, 'predictors': args.predictors, 'chatters': args.chatters},
+            'simulated_days': round((replay.replayed_until - replay.start) / (86400 * 10**9), 2),
+            'rows_replayed': replay.rows,
+            'rss_mb': {'start': rss[0], 'end': rss[-1], 'max': max(rss)} if rss else None,
+        },
+        'results': summarize_events(recorder.snapshot(), elapsed),
+        'timeline': timeline,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay telemetry into the server under concurrent client load')
+    parser.add_argument('--source', default=str(DEFAULT_SOURCE), help='Directory with the raw exports to replay')
+    parser.add_argument('--duration', type=float, default=60.0, help='Wall-clock seconds to run')
+    parser.add_argument('--speedup', type=float, default=3600.0, help='Simulated seconds per wall-clock second')
+    parser.add_argument('--tanks', type=int, default=10)
+    parser.add_argument('--tick', type=float, default=1.0, help='Seconds between feed writes')
+    parser.add_argument('--noise', type=float, default=0.05, help='Reading noise, in source standard deviations')
+    parser.add_argument('--drift', type=float, default=0.02, help='Drift spread per simulated day, in standard deviations')
+    parser.add_argument('--offset', type=float, default=0.3, help='Per-tank offset spread, in standard deviations')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-ingest', action='store_true', help='Only write the fleet files, not the exports of tank 0')
+    parser.add_argument('--pollers', type=int, default=4)
+    parser.add_argument('--poll-interval', type=float, default=0.5)
+    parser.add_argument('--predictors', type=int, default=1)
+    parser.add_argument('--predict-interval', type=float, default=5.0)
+    parser.add_argument('--models', nargs='+', default=['local', 'ensemble'], help='modelType values /predict clients rotate through')
+    parser.add_argument('--chatters', type=int, default=1)
+    parser.add_argument('--chat-interval', type=float, default=3.0)
+    parser.add_argument('--report-every', type=float, default=10.0, help='Timeline window in seconds')
+    parser.add_argument('--url', help='Server to load (default: the app, served in-process)')
+    parser.add_argument('--data-dir', help="The server's data directory (required with --url; default: temporary)")
+    parser.add_argument('--server-pid', type=int, help='Process whose RSS is sampled (with --url)')
+    parser.add_argument('--mock-llm', metavar='URL',
+                        help='In-process server only: send LLM calls to a mock server at URL, or "local" to start one')
+    parser.add_argument('--mock-latency', default='lognormal:-2,0.5',
+                        help='Latency distribution for the in-process mock server')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args(argv)
+    if args.url and not args.data_dir:
+        parser.error('--url needs --data-dir (the directory the server ingests from)')
+
+    if args.url:
+        report = run(args, args.url.rstrip('/'), args.data_dir, args.server_pid or os.getpid())
+    else:
+        mock_server, mock_llm_url = None, args.mock_llm
+        if args.mock_llm == 'local':
+            mock_server, mock_llm_url = serve_in_thread(MockLLMConfig(latency=args.mock_latency))
+        server = None
+        try:
+            with tempfile.TemporaryDirectory(prefix='aquaponics-replay-') as tmp_dir:
+                data_dir = Path(args.data_dir or tmp_dir)
+                data_dir.mkdir(parents=True, exist_ok=True)
+                # The recorded exports are the history the replay continues
+                for name in SOURCE_FILES.values():
+                    shutil.copy(Path(args.source) / name, data_dir / name)
+                app = prepare_environment(data_dir, mock_llm_url)
+                server, base_url = serve_app(app)
+                report = run(args, base_url, data_dir, os.getpid())
+        finally:
+            if server:
+                server.shutdown()
+            if mock_server:
+                mock_server.shutdown()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+
+    print(f"{'kind':<22}{'requests':>9}{'req/s':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for kind, summary in report['results'].items():
+        print(f"{kind:<22}{summary['requests']:>9}{summary['throughput_rps']:>8}{summary['p50_ms']:>10.1f}"
+              f"{summary['p95_ms']:>10.1f}{summary['p99_ms']:>10.1f}{summary['errors']:>8}")
+    meta = report['meta']
+    print(f"{meta['rows_replayed']} readings replayed over {meta['simulated_days']} simulated days; "
+          f"server RSS {meta['rss_mb']}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Benchmark the API hot paths against synthetic telemetry of increasing size.
+
+Runs fully offline: by default API keys are cleared so the AI models and
+chatbot use their mock responses; ``--mock-llm`` routes them through the
+local mock chat-completions server instead. Requests go through the Flask
+test client, so the numbers cover routing, data loading and serialization
+but not the client-side network.
+
+Usage (from the server directory):
+    python -m benchmarks.run --sizes 1000 10000 100000 --output results.json
+    python -m benchmarks.run --baseline baseline.json --tolerance 0.25
+    python -m benchmarks.run --mock-llm local --mock-latency lognormal:-2,0.5
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.mock_llm_server import MockLLMConfig, api_bases, serve_in_thread
+from benchmarks.synthetic import generate_telemetry_csv, sample_payload
+
+DEFAULT_SIZES = [10**3, 10**4, 10**5]
+PERCENTILES = [50, 90, 95, 99]
+MODEL_TYPES = ['local', 'deepseek-r1', 'o1-mini', 'ensemble']
+
+def build_endpoints():
+    """List the endpoints to benchmark as (name, method, path, json_body)."""
+    payload = sample_payload()
+    endpoints = [
+        ('telemetry_latest', 'GET', '/api/telemetry/latest', None),
+        ('telemetry_stats', 'GET', '/api/telemetry/stats', None),
+        ('telemetry_alerts', 'GET', '/api/telemetry/alerts', None),
+        ('telemetry_download', 'GET', '/api/telemetry/download/validation', None),
+        ('telemetry_series', 'GET', '/api/telemetry/series/validation?points=500', None),
+    ]
+    for model_type in MODEL_TYPES:
+        endpoints.append((f'ai_predict_{model_type}', 'POST', '/api/ai/predict',
+                          dict(payload, modelType=model_type)))
+    endpoints += [
+        ('ai_history', 'GET', '/api/ai/history', None),
+        ('chatbot_send', 'POST', '/api/chatbot/send',
+         {'message': 'My pH is 6.3, what should I do?', 'sessionId': 'benchmark'}),
+    ]
+    return endpoints
+
+def summarize(latencies, elapsed, errors):
+    """Compute latency percentiles (ms) and throughput for one endpoint."""
+    samples = np.asarray(latencies) * 1000.0
+    summary = {f'p{p}_ms': round(float(np.percentile(samples, p)), 3) for p in PERCENTILES}
+    summary.update({
+        'mean_ms': round(float(samples.mean()), 3),
+        'min_ms': round(float(samples.min()), 3),
+        'max_ms': round(float(samples.max()), 3),
+        'requests': len(samples),
+        'errors': errors,
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed > 0 else None
+    })
+    return summary
+
+def run_endpoint(client, method, path, body, iterations, warmup, max_seconds):
+    """Issue repeated requests against one endpoint and time each of them."""
+    def issue():
+        response = client.open(path, method=method, json=body)
+        # Drain the body so streamed responses (downloads) are fully measured
+        response.get_data()
+        response.close()
+        return response.status_code
+
+    for _ in range(warmup):
+        issue()
+
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for _ in range(iterations):
+        request_start = time.perf_counter()
+        status = issue()
+        latencies.append(time.perf_counter() - request_start)
+        if status >= 400:
+            errors += 1
+        if time.perf_counter() - started > max_seconds:
+            break
+    elapsed = time.perf_counter() - started
+    return summarize(latencies, elapsed, errors)
+
+def prepare_environment(work_dir, mock_llm_url=None):
+    """
+    Point the app at the work directory and configure the LLM clients.
+
+    Without ``mock_llm_url`` the API keys are cleared so the models return
+    their built-in mock responses. With it, every LLM client is pointed at the
+    local mock server so the full network path (retries, timeouts) is timed.
+    """
+    os.environ['AQUAPONICS_DATA_DIR'] = str(work_dir)
+    for key in ('O1_API_KEY', 'DEEPSEEK_API_KEY'):
+        if mock_llm_url:
+            os.environ[key] = 'benchmark'
+        else:
+            os.environ.pop(key, None)
+    if mock_llm_url:
+        os.environ.update(api_bases(mock_llm_url))
+
+    from app import app
+    app.config['TESTING'] = True
+    return app
+
+def run_benchmarks(sizes, iterations, warmup, max_seconds, work_dir, mock_llm_url=None):
+    """Run every endpoint at every dataset size and collect the results."""
+    app = prepare_environment(work_dir, mock_llm_url)
+    # Imported after prepare_environment so storage picks up the work directory
+    from storage.ingest import rebuild_rollups
+    from storage.rollups import RollupStore
+    client = app.test_client()
+    endpoints = build_endpoints()
+    telemetry_dir = Path(work_dir) / 'telemetry'
+
+    results = {}
+    for size in sizes:
+        print(f"Generating {size:,} synthetic rows per dataset...", file=sys.stderr)
+        generate_telemetry_csv(telemetry_dir / 'initial.csv', size, seed=1)
+        generate_telemetry_csv(telemetry_dir / 'validation.csv', size, seed=2)
+        for dataset_type in ('initial', 'validation'):
+            rebuild_rollups(RollupStore(dataset_type, work_dir), telemetry_dir / f'{dataset_type}.csv')
+
+        size_results = {}
+        for name, method, path, body in endpoints:
+            size_results[name] = run_endpoint(client, method, path, body,
+                                              iterations, warmup, max_seconds)
+            print(f"  {name:<28} p50={size_results[name]['p50_ms']:>10.3f}ms "
+                  f"p95={size_results[name]['p95_ms']:>10.3f}ms "
+                  f"{size_results[name]['throughput_rps']:>10} req/s",
+                  file=sys.stderr)
+        results[str(size)] = size_results
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'iterations': iterations,
+            'warmup': warmup,
+            'llm': mock_llm_url or 'built-in mock responses'
+        },
+        'results': results
+    }
+
+def compare_to_baseline(current, baseline, tolerance, metrics=('p50_ms', 'p95_ms')):
+    """
+    Compare a benchmark run against a saved baseline.
+
+    Returns:
+        list: Regressions as dicts, one per (size, endpoint, metric) that got
+        slower than the baseline by more than ``tolerance`` (a fraction).
+    """
+    regressions = []
+    for size, endpoints in current['results'].items():
+        baseline_endpoints = baseline.get('results', {}).get(size, {})
+        for name, summary in endpoints.items():
+            reference = baseline_endpoints.get(name)
+            if not reference:
+                continue
+            for metric in metrics:
+                before, after = reference.get(metric), summary.get(metric)
+                if not before or after is None:
+                    continue
+                ratio = after / before
+                if ratio > 1 + tolerance:
+                    regressions.append({
+                        'size': size,
+                        'endpoint': name,
+                        'metric': metric,
+                        'baseline': before,
+                        'current': after,
+                        'ratio': round(ratio, 3)
+                    })
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='Rows per synthetic dataset (up to 10^7)')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--max-seconds', type=float, default=30.0,
+                        help='Time budget per endpoint and size')
+    parser.add_argument('--work-dir', help='Directory for synthetic data (default: temporary)')
+    parser.add_argument('--output', help='Write JSON results to this file')
+    parser.add_argument('--baseline', help='Compare against a saved results file')
+    parser.add_argument('--save-baseline', help='Also save results as a new baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed slowdown before flagging a regression (0.2 = 20%%)')
+    parser.add_argument('--mock-llm', metavar='URL',
+                        help='Send LLM calls to a mock server at URL, or "local" to start one in-process')
+    parser.add_argument('--mock-latency', default='fixed:0',
+                        help='Latency distribution for the in-process mock server')
+    args = parser.parse_args(argv)
+
+    mock_server, mock_llm_url = None, args.mock_llm
+    if args.mock_llm == 'local':
+        mock_server, mock_llm_url = serve_in_thread(MockLLMConfig(latency=args.mock_latency))
+
+    try:
+        with tempfile.TemporaryDirectory(prefix='aquaponics-bench-') as tmp_dir:
+            results = run_benchmarks(args.sizes, args.iterations, args.warmup,
+                                     args.max_seconds, args.work_dir or tmp_dir, mock_llm_url)
+    finally:
+        if mock_server:
+            mock_server.shutdown()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        results['regressions'] = compare_to_baseline(results, baseline, args.tolerance)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(output)
+
+    for regression in results.get('regressions', []):
+        print(f"REGRESSION {regression['endpoint']} @ {regression['size']} rows: "
+              f"{regression['metric']} {regression['baseline']} -> {regression['current']} "
+              f"({regression['ratio']}x)", file=sys.stderr)
+    return 1 if results.get('regressions') else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
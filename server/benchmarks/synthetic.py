@@ -0,0 +1,107 @@
+"""
+Synthetic telemetry generator for benchmarks.
+
+Produces CSVs in the canonical column layout read by ``routes/telemetry.py``.
+Rows are generated in vectorized chunks so 10^7-row files can be written
+without holding the whole dataset in memory.
+"""
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# Sampling interval for synthetic readings (production sensors are much
+# denser than the ~5-hourly sample exports)
+SAMPLE_INTERVAL = np.timedelta64(1, 'm')
+START_TIME = np.datetime64('2024-03-01T00:00:00')
+CHUNK_SIZE = 1_000_000
+
+def generate_chunk(start_row, rows, rng):
+    """Generate one chunk of synthetic telemetry as a DataFrame."""
+    index = np.arange(start_row, start_row + rows)
+    timestamps = START_TIME + index * SAMPLE_INTERVAL
+    # Daily cycle used to give the series a realistic diurnal shape
+    daily = np.sin(2 * np.pi * (index % 1440) / 1440)
+
+    return pd.DataFrame({
+        'timestamp': np.datetime_as_string(timestamps, unit='s'),
+        'pH': np.round(7.0 + 0.3 * daily + rng.normal(0, 0.15, rows), 2),
+        'temperature': np.round(21.0 + 2.0 * daily + rng.normal(0, 0.8, rows), 2),
+        'ammonia': np.round(np.abs(0.25 + rng.normal(0, 0.12, rows)), 3),
+        'height': np.round(20 + 40 * (index / max(index[-1], 1)) + rng.normal(0, 0.5, rows), 1),
+        'growth_rate': np.round(1.1 + rng.normal(0, 0.2, rows), 2),
+        'ec': np.round(1.6 + 0.2 * daily + rng.normal(0, 0.15, rows), 2),
+    })
+
+def generate_telemetry_csv(path, rows, seed=0, chunk_size=CHUNK_SIZE):
+    """
+    Write a synthetic telemetry CSV with the given number of rows.
+
+    Args:
+        path (str | Path): Destination CSV file
+        rows (int): Number of data rows to generate
+        seed (int): Random seed, so repeated runs produce identical files
+        chunk_size (int): Rows generated per chunk
+
+    Returns:
+        Path: The written file
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    with open(path, 'w', newline='') as f:
+        for start in range(0, rows, chunk_size):
+            chunk = generate_chunk(start, min(chunk_size, rows - start), rng)
+            chunk.to_csv(f, header=(start == 0), index=False)
+
+    return path
+
+def generate_fleet(directory, tanks, rows, seed=0, start_row=0):
+    """
+    Write (or, with ``start_row``, append to) one synthetic CSV per tank.
+
+    Each tank gets its own noise and a pH/temperature offset, so some tanks
+    run outside the optimal ranges.
+
+    Returns:
+        list: The tank files
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for tank in range(tanks):
+        path = directory / f'tank-{tank:04d}.csv'
+        offsets = np.random.default_rng((seed, tank)).normal(0, [0.4, 2.0])
+        rng = np.random.default_rng((seed, tank, start_row))
+        with open(path, 'a' if start_row else 'w', newline='') as f:
+            for start in range(start_row, start_row + rows, CHUNK_SIZE):
+                chunk = generate_chunk(start, min(CHUNK_SIZE, start_row + rows - start), rng)
+                chunk['pH'] += offsets[0]
+                chunk['temperature'] += offsets[1]
+                chunk.round(3).to_csv(f, header=(start == 0), index=False)
+        paths.append(path)
+    return paths
+
+def sample_payload(rows=30, seed=0):
+    """Build a /api/ai/predict request body from a small synthetic sample."""
+    frame = generate_chunk(0, rows * 2, np.random.default_rng(seed))
+    fish_columns = ['timestamp', 'pH', 'temperature', 'ammonia']
+    plant_columns = ['timestamp', 'height', 'growth_rate', 'ec']
+    initial, validation = frame.iloc[:rows], frame.iloc[rows:]
+
+    return {
+        'initialData': {
+            'fish': initial[fish_columns].to_dict(orient='records'),
+            'plant': initial[plant_columns].to_dict(orient='records')
+        },
+        'validationData': {
+            'fish': validation[fish_columns].to_dict(orient='records'),
+            'plant': validation[plant_columns].to_dict(orient='records')
+        },
+        'systemConfig': {
+            'fishCount': 200,
+            'tankVolume': 1000,
+            'plantType': 'spearmint',
+            'growthSystem': 'raft'
+        }
+    }
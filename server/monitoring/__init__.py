@@ -0,0 +1,8 @@
+"""
+Aquaponics Monitoring and Instrumentation Module
+"""
+from .log_config import configure_logging, log_body, redact
+from .metrics import init_app, record_backoff, registry, span, timed
+
+__all__ = ['configure_logging', 'init_app', 'log_body', 'record_backoff', 'redact',
+           'registry', 'span', 'timed']
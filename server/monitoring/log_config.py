@@ -0,0 +1,154 @@
+"""
+Structured, leveled, non-blocking logging for the server.
+
+Records are handed to a bounded in-memory queue by the request thread and
+written as JSON lines by a background listener, so a slow disk or terminal
+never stalls a request. Records are dropped (and counted) rather than
+blocking when the queue is full.
+
+Configuration (environment variables):
+    LOG_LEVEL               Minimum level for the JSON log file (default INFO)
+    LOG_CONSOLE_LEVEL       Minimum level echoed to stderr (default WARNING)
+                            (unknown level names fall back to the default, with a warning)
+    LOG_DIR                 Directory for server.jsonl (default ./logs, the docker volume)
+    LOG_QUEUE_SIZE          Max queued records before dropping (default 10000)
+    LOG_BODY_MAX_CHARS      Truncation limit for logged payloads (default 2048)
+    LOG_BODY_SAMPLE_RATE    Fraction of payloads logged in full (default 0.01)
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .metrics import registry
+
+LOG_DIR = Path(os.environ.get('LOG_DIR', Path(__file__).parent.parent / 'logs'))
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_CONSOLE_LEVEL = os.environ.get('LOG_CONSOLE_LEVEL', 'WARNING').upper()
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+LOG_BODY_MAX_CHARS = int(os.environ.get('LOG_BODY_MAX_CHARS', 2048))
+LOG_BODY_SAMPLE_RATE = float(os.environ.get('LOG_BODY_SAMPLE_RATE', 0.01))
+
+# Header and field names whose values must never reach the logs
+SENSITIVE_KEYS = {'api-key', 'api_key', 'authorization', 'o1_api_key', 'deepseek_api_key'}
+SENSITIVE_PATTERN = re.compile(
+    r'(?i)("?(?:api-key|api_key|authorization)"?\s*[:=]\s*"?)([^",}\s]+)')
+REDACTED = '[REDACTED]'
+
+# Attributes every LogRecord has; anything else came in through ``extra=``
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+DROPPED_RECORDS = registry.counter(
+    'aquaponics_log_records_dropped_total', 'Log records dropped because the queue was full')
+
+_listener = None
+
+def redact(value):
+    """Recursively mask sensitive keys in dicts and key/value pairs in strings."""
+    if isinstance(value, dict):
+        return {k: (REDACTED if str(k).lower() in SENSITIVE_KEYS else redact(v))
+                for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    if isinstance(value, str):
+        return SENSITIVE_PATTERN.sub(lambda m: m.group(1) + REDACTED, value)
+    return value
+
+class JsonLinesFormatter(logging.Formatter):
+    """Format records as one redacted JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': redact(record.getMessage())
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                entry[key] = redact(value)
+        if record.exc_info:
+            entry['exc'] = redact(self.formatException(record.exc_info))
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking when full."""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DROPPED_RECORDS.inc()
+
+def log_body(logger, message, body, level=logging.DEBUG, sample_rate=None, **fields):
+    """
+    Log a potentially large payload without paying for it on every call.
+
+    Nothing is serialized unless ``level`` is enabled. Only a sampled fraction
+    of calls include the (truncated, redacted) body; the rest log its size.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    text = body if isinstance(body, str) else json.dumps(redact(body), default=str)
+    fields['body_chars'] = len(text)
+    rate = LOG_BODY_SAMPLE_RATE if sample_rate is None else sample_rate
+    if rate >= 1 or random.random() < rate:
+        fields['body'] = text[:LOG_BODY_MAX_CHARS]
+        fields['body_truncated'] = len(text) > LOG_BODY_MAX_CHARS
+    logger.log(level, message, extra=fields)
+
+def resolve_level(name, default, setting):
+    """The numeric level for ``name``, or ``default``'s if it is not a level name or number."""
+    if name.isdigit():
+        return int(name)
+    levels = logging.getLevelNamesMapping()
+    if name in levels:
+        return levels[name]
+    sys.stderr.write(f"Unknown {setting} {name!r}; using {default}\n")
+    return levels[default]
+
+def configure_logging():
+    """
+    Install the queue-based JSON logging pipeline on the root logger.
+
+    Safe to call more than once; only the first call has an effect.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    file_level = resolve_level(LOG_LEVEL, 'INFO', 'LOG_LEVEL')
+    console_level = resolve_level(LOG_CONSOLE_LEVEL, 'WARNING', 'LOG_CONSOLE_LEVEL')
+
+    handlers = []
+    try:
+        LOG_DIR.mkdir(parents=True, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            LOG_DIR / 'server.jsonl', maxBytes=50 * 1024 * 1024, backupCount=5, encoding='utf-8')
+        file_handler.setLevel(file_level)
+        file_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(file_handler)
+    except OSError as e:
+        sys.stderr.write(f"Could not open log directory {LOG_DIR}: {e}\n")
+
+    console_handler = logging.StreamHandler(sys.stderr)
+    console_handler.setLevel(console_level)
+    console_handler.setFormatter(JsonLinesFormatter())
+    handlers.append(console_handler)
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    root = logging.getLogger()
+    root.setLevel(min(file_level, console_level))
+    root.addHandler(NonBlockingQueueHandler(log_queue))
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
@@ -0,0 +1,232 @@
+"""
+Request timing and hot-path instrumentation.
+
+Keeps Prometheus-style counters and histograms in process memory and exposes
+them at ``/metrics``. Code on the request path wraps expensive steps in
+``span()``; each span is recorded in a per-span histogram and, inside a
+request, reported back to the caller in the ``X-Server-Timing`` header.
+
+Set ``METRICS_ENABLED=false`` to turn everything into no-ops.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from flask import Response, g, has_request_context, request
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+# Latency buckets in seconds, from sub-millisecond telemetry reads to LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _format_labels(key, extra=None):
+    pairs = list(key) + (list(extra.items()) if extra else [])
+    if not pairs:
+        return ''
+    body = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                    for k, v in pairs)
+    return '{' + body + '}'
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+class Gauge(Counter):
+    """Value that can go up and down (queue depths, cache sizes)."""
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+class Histogram:
+    """Fixed-bucket histogram with optional labels."""
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (plus +Inf), running sum and count
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels):
+        series = self._series.get(_label_key(labels))
+        return series[2] if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f"{self.name}_bucket{_format_labels(key, {'le': le})} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+class Registry:
+    """Collection of metrics rendered together at /metrics."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, documentation, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name, documentation):
+        return self._get_or_create(Counter, name, documentation)
+
+    def gauge(self, name, documentation):
+        return self._get_or_create(Gauge, name, documentation)
+
+    def histogram(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, buckets=buckets)
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.histogram(
+    'aquaponics_http_request_duration_seconds', 'HTTP request latency by route')
+SPAN_LATENCY = registry.histogram(
+    'aquaponics_span_duration_seconds', 'Duration of instrumented hot-path steps')
+LLM_RETRIES = registry.counter(
+    'aquaponics_llm_retries_total', 'LLM request retries by provider')
+LLM_BACKOFF = registry.counter(
+    'aquaponics_llm_backoff_seconds_total', 'Time spent sleeping between LLM retries')
+
+def _record_server_timing(name, duration):
+    if has_request_context():
+        timings = g.setdefault('server_timing', {})
+        total, count = timings.get(name, (0.0, 0))
+        timings[name] = (total + duration, count + 1)
+
+@contextmanager
+def _span(name, labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        SPAN_LATENCY.observe(duration, span=name, **labels)
+        _record_server_timing(name, duration)
+
+def span(name, **labels):
+    """
+    Time a block of code as a named span.
+
+    Example:
+        with span('csv_load', dataset='validation'):
+            df = pd.read_csv(path)
+    """
+    if not METRICS_ENABLED:
+        return nullcontext()
+    return _span(name, labels)
+
+def timed(name, **labels):
+    """Decorator form of ``span()``."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record_backoff(provider, seconds):
+    """Count a retry and the backoff time spent before it."""
+    if METRICS_ENABLED:
+        LLM_RETRIES.inc(provider=provider)
+        LLM_BACKOFF.inc(seconds, provider=provider)
+        _record_server_timing('llm_backoff', seconds)
+
+def _format_server_timing(timings, total):
+    entries = []
+    for name, (duration, count) in timings.items():
+        entry = f"{name};dur={duration * 1000:.2f}"
+        if count > 1:
+            entry += f';desc="x{count}"'
+        entries.append(entry)
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ', '.join(entries)
+
+def init_app(app):
+    """Register the timing middleware and the /metrics endpoint on ``app``."""
+    if not METRICS_ENABLED:
+        return
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop('request_start', None)
+        if start is None:
+            return response
+        duration = time.perf_counter() - start
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_LATENCY.observe(duration, method=request.method, route=route,
+                                status=response.status_code)
+        response.headers['X-Server-Timing'] = _format_server_timing(
+            g.pop('server_timing', {}), duration)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
@@ -2,6 +2,7 @@
 API routes for AI analysis functionality.
 """
 import json
+import logging
 import uuid
 from datetime import datetime
 from flask import Blueprint, request, jsonify
@@ -10,7 +11,16 @@ import os
 
 # Use absolute imports instead of relative imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from ai.models import deepseek_model, o1_model
+from ai.backtest import MODEL_TYPES, measured_confidence
+from ai.models import deepseek_model, local_model, o1_model
+from ai.prompts import prompt_registry
+from monitoring import span
+from routes.caching import response_cache
+from storage.correlations import correlate_records, describe_for_prompt
+from storage.ingest import screen_records
+from storage.results import ResultStore
+
+logger = logging.getLogger(__name__)
 
 # Create blueprint for AI analysis routes
 ai_analysis_bp = Blueprint('ai_analysis', __name__)
@@ -21,31 +31,63 @@ ai_analysis_bp = Blueprint('ai_analysis', __name__)
 from pathlib import Path
 
 # Ensure data directory exists
-DATA_DIR = Path(__file__).parent.parent / 'data'
+DATA_DIR = Path(os.environ.get('AQUAPONICS_DATA_DIR', Path(__file__).parent.parent / 'data'))
 ANALYSIS_DIR = DATA_DIR / 'analysis'
 ANALYSIS_DIR.mkdir(parents=True, exist_ok=True)
 ANALYSIS_HISTORY_FILE = ANALYSIS_DIR / 'history.json'
 
-# Initialize analysis history from file or create empty if not exists
-def load_analysis_history():
+# Keep every prompt version records refer to, even after the prompt changes
+prompt_registry.persist_to(DATA_DIR / 'prompts')
+
+# Compressed, deduplicated record store (see storage/results.py)
+result_store = ResultStore(ANALYSIS_DIR)
+
+# Records written before the store existed, until `python -m storage.results compact` is run
+def load_legacy_history():
     try:
         if ANALYSIS_HISTORY_FILE.exists():
-            with open(ANALYSIS_HISTORY_FILE, 'r') as f:
+            with span('history_load'), open(ANALYSIS_HISTORY_FILE, 'r') as f:
                 return json.load(f)
         return {}
     except Exception as e:
-        print(f"Error loading analysis history: {str(e)}")
+        logger.error("Error loading analysis history: %s", e)
         return {}
 
-def save_analysis_history(history):
-    try:
-        with open(ANALYSIS_HISTORY_FILE, 'w') as f:
-            json.dump(history, f, indent=2)
-    except Exception as e:
-        print(f"Error saving analysis history: {str(e)}")
+def with_prompt_template(record):
+    """Copy of an analysis record with ``prompt_template`` resolved from its template IDs."""
+    if 'prompt_template' in record:
+        # Stored before records referenced templates by ID
+        return record
+    refs = record.get('prompt_ids') or []
+    if refs:
+        prompt_template = prompt_registry.describe(refs)
+    else:
+        prompt_template = f"No prompt: {record.get('results', {}).get('method', 'local statistical model')}"
+    return dict(record, prompt_template=prompt_template)
+
+def screen_payload(data):
+    """
+    Blank out request telemetry readings that look like sensor faults.
+
+    Returns:
+        tuple: (screened copy of ``data``, {stream: {param: {flag: count}}})
+    """
+    screened, summary = dict(data or {}), {}
+    for stream in ('fish', 'plant'):
+        if screened.get(stream):
+            try:
+                screened[stream], flags = screen_records(screened[stream])
+            except ValueError as e:
+                # E.g. records without timestamps: passed on unscreened
+                logger.warning("Skipping sensor-fault screening of %s telemetry: %s", stream, e)
+                continue
+            if flags:
+                summary[stream] = flags
+    return screened, summary
 
-# Load history at startup
-analysis_history = load_analysis_history()
+legacy_history = load_legacy_history()
+if legacy_history:
+    logger.warning("%d analyses are in the legacy format; run python -m storage.results compact", len(legacy_history))
 
 @ai_analysis_bp.route('/predict', methods=['POST'])
 def predict():
@@ -57,32 +99,62 @@ def predict():
         validation_data = data.get('validationData', {})
         system_config = data.get('systemConfig', {})
         model_type = data.get('modelType', 'ensemble')
-        
-        # Import prompt templates
-        from ai.prompts.deepseek_prompt import DEEPSEEK_SYSTEM_PROMPT
-        from ai.prompts.o1_prompt import O1_SYSTEM_PROMPT
+        # Spikes and stuck probes are not passed to the models as real readings
+        with span('telemetry_screen'):
+            initial_data, initial_quality = screen_payload(initial_data)
+            validation_data, validation_quality = screen_payload(validation_data)
+        # Measured fish -> plant lags go into the prompts as a few lines, so the
+        # models need not infer them from the raw readings
+        correlations = ''
+        if model_type != 'local':
+            with span('correlations_compute'):
+                try:
+                    correlations = describe_for_prompt(correlate_records([initial_data, validation_data]))
+                except ValueError as e:
+                    logger.warning("Skipping correlations for the prompt: %s", e)
+        # Optionally seed the LLM prompt with the local forecast so it only refines it
+        baseline = None
+        if data.get('prefillLocalForecast') and model_type != 'local':
+            baseline = local_model.analyze_telemetry(initial_data, validation_data)
+            if 'error' in baseline:
+                baseline = None
         
         # Select model based on request
-        if model_type == 'deepseek-r1':
+        if model_type == 'local':
+            # Local statistical forecast, no LLM call
+            final_results = local_model.analyze_telemetry(initial_data, validation_data)
+            model_used = "Local Forecast (Ridge AR)"
+            confidence_score = 0.7  # Base confidence for the statistical model
+            prompt_ids = []
+            providers = {}
+        elif model_type == 'deepseek-r1':
             # Use only Deepseek model
-            final_results = deepseek_model.analyze_telemetry(initial_data, validation_data)
+            final_results = deepseek_model.analyze_telemetry(initial_data, validation_data, baseline, correlations)
             model_used = "Deepseek R1"
             confidence_score = 0.78  # Base confidence for single model
-            prompt_template = DEEPSEEK_SYSTEM_PROMPT
+            prompt_ids = [deepseek_model.prompt.ref]
+            providers = {"analysis": final_results.pop("provider", None)}
         elif model_type == 'o1-mini':
             # Use only O1 model for direct analysis
-            deepseek_results = deepseek_model.analyze_telemetry(initial_data, validation_data)
-            final_results = o1_model.validate_analysis(initial_data, validation_data, deepseek_results)
+            deepseek_results = deepseek_model.analyze_telemetry(initial_data, validation_data, baseline, correlations)
+            final_results = o1_model.validate_analysis(initial_data, validation_data, deepseek_results, correlations)
             model_used = "O1 Mini"
             confidence_score = 0.82  # Base confidence for O1
-            prompt_template = O1_SYSTEM_PROMPT
+            prompt_ids = [o1_model.prompt.ref]
+            providers = {"analysis": deepseek_results.get("provider"), "validation": final_results.pop("provider", None)}
         else:
             # Default: use ensemble (both models)
-            deepseek_results = deepseek_model.analyze_telemetry(initial_data, validation_data)
-            final_results = o1_model.validate_analysis(initial_data, validation_data, deepseek_results)
+            deepseek_results = deepseek_model.analyze_telemetry(initial_data, validation_data, baseline, correlations)
+            final_results = o1_model.validate_analysis(initial_data, validation_data, deepseek_results, correlations)
             model_used = "Deepseek R1 + Claude Opus"
             confidence_score = 0.87  # Higher confidence for ensemble
-            prompt_template = "Ensemble model using both:\n\n1. Deepseek Prompt:\n" + DEEPSEEK_SYSTEM_PROMPT + "\n\n2. O1 Prompt:\n" + O1_SYSTEM_PROMPT
+            prompt_ids = [deepseek_model.prompt.ref, o1_model.prompt.ref]
+            providers = {"analysis": deepseek_results.get("provider"), "validation": final_results.pop("provider", None)}
+        
+        # Prefer the confidence measured by the last backtest of this model
+        measured = measured_confidence(model_type if model_type in MODEL_TYPES else 'ensemble', DATA_DIR)
+        if measured is not None:
+            confidence_score = measured
         
         # Add metadata
         analysis_id = str(uuid.uuid4())
@@ -95,39 +167,41 @@ def predict():
             "systemConfig": system_config,
             "results": final_results,
             "confidence_score": confidence_score,
-            "prompt_template": prompt_template
+            "confidence_source": "backtest" if measured is not None else "default",
+            # Provider that actually answered each step ('mock' without one);
+            # routing may move a step to the other model
+            "providers": providers,
+            # Readings left out of the analysis as likely sensor faults
+            "data_quality": {"initial": initial_quality, "validation": validation_quality},
+            # Template references only; the text is filled back in when read
+            "prompt_ids": prompt_ids
         }
         
-        # Store in history
-        analysis_history[analysis_id] = complete_results
-        save_analysis_history(analysis_history)
-        
-        # Save individual analysis to its own file for better persistence
-        analysis_file = ANALYSIS_DIR / f"{analysis_id}.json"
+        # Store once, compressed, with results/config blobs shared between records
         try:
-            with open(analysis_file, 'w') as f:
-                json.dump(complete_results, f, indent=2)
+            with span('analysis_save'):
+                result_store.put(complete_results)
         except Exception as e:
-            print(f"Error saving individual analysis: {str(e)}")
+            logger.error("Error saving analysis: %s", e)
         
-        return jsonify(complete_results)
+        return jsonify(with_prompt_template(complete_results))
     
     except Exception as e:
-        print(f"Error in AI analysis: {str(e)}")
+        logger.exception("Error in AI analysis: %s", e)
         return jsonify({
             "error": str(e),
             "message": "Failed to complete AI analysis"
         }), 500
 
 @ai_analysis_bp.route('/history', methods=['GET'])
+@response_cache.cached(result_store.version)
 def get_history():
     """Get history of AI analyses."""
     try:
-        # Reload history to ensure we have the latest data
-        current_history = load_analysis_history()
-        
-        # Convert to list and sort by timestamp (newest first)
-        history_list = list(current_history.values())
+        # Metadata comes from the store's in-memory index, not the records
+        history_list = result_store.list()
+        known = {item["id"] for item in history_list}
+        history_list += [item for item in legacy_history.values() if item["id"] not in known]
         history_list.sort(key=lambda x: x['timestamp'], reverse=True)
         
         # Return only metadata, not full results
@@ -135,13 +209,13 @@ def get_history():
             "id": item["id"],
             "timestamp": item["timestamp"],
             "modelUsed": item["modelUsed"],
-            "confidence_score": item.get("confidence_score", 0.0)
+            "confidence_score": item.get("confidence_score") or 0.0
         } for item in history_list]
         
         return jsonify(simplified_history)
     
     except Exception as e:
-        print(f"Error fetching analysis history: {str(e)}")
+        logger.error("Error fetching analysis history: %s", e)
         return jsonify({
             "error": str(e),
             "message": "Failed to fetch analysis history"
@@ -151,24 +225,26 @@ def get_history():
 def get_analysis(analysis_id):
     """Get a specific analysis by ID."""
     try:
-        # First try to load from individual file (more reliable)
+        with span('analysis_load'):
+            record = result_store.get(analysis_id)
+        if record is not None:
+            return jsonify(with_prompt_template(record))
+        
+        # Fall back to records not yet moved into the store
         analysis_file = ANALYSIS_DIR / f"{analysis_id}.json"
         if analysis_file.exists():
             with open(analysis_file, 'r') as f:
-                return jsonify(json.load(f))
-        
-        # Fall back to in-memory history
-        current_history = load_analysis_history()
-        if analysis_id not in current_history:
+                return jsonify(with_prompt_template(json.load(f)))
+        if analysis_id not in legacy_history:
             return jsonify({
                 "error": "Analysis not found",
                 "message": f"No analysis found with ID: {analysis_id}"
             }), 404
         
-        return jsonify(current_history[analysis_id])
+        return jsonify(with_prompt_template(legacy_history[analysis_id]))
     
     except Exception as e:
-        print(f"Error fetching analysis: {str(e)}")
+        logger.error("Error fetching analysis: %s", e)
         return jsonify({
             "error": str(e),
             "message": "Failed to fetch analysis"
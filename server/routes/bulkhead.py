@@ -0,0 +1,191 @@
+"""
+Bulkheads: bounded, prioritized admission per workload.
+
+Telemetry reads take milliseconds; analyses and chat turns block on LLMs
+for seconds to minutes. Without limits, a burst of ``/api/ai/predict`` calls
+holds every server thread and the telemetry endpoints the alarms poll wait
+behind it. Each blueprint is therefore admitted through a pool:
+
+    telemetry   priority 0, may use every server thread
+    chat        priority 1
+    analysis    priority 2
+
+A pool runs at most ``concurrency`` requests at once, and lower-priority
+pools never take the last ``BULKHEAD_RESERVE`` of the ``BULKHEAD_CAPACITY``
+server threads. A request that cannot start waits in its pool's queue, and
+freed slots go to the highest-priority waiters first. It is turned away with
+``Retry-After`` when
+
+    * its pool's queue is full (429): this workload is over its share
+    * it waited ``max_wait`` seconds without a slot (503): the server is
+      saturated
+
+Retry-After estimates when a slot frees up, from the pool's recent request
+times. Set ``BULKHEAD_CAPACITY`` to the number of server threads (e.g.
+gunicorn ``--threads``). Set ``BULKHEADS_ENABLED=false`` to turn admission
+control off.
+"""
+import math
+import os
+import threading
+import time
+
+from flask import g, jsonify
+
+from monitoring import registry
+
+BULKHEADS_ENABLED = os.environ.get('BULKHEADS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+BULKHEAD_CAPACITY = int(os.environ.get('BULKHEAD_CAPACITY', 32))
+# Threads only the top-priority (telemetry) pool may use
+BULKHEAD_RESERVE = int(os.environ.get('BULKHEAD_RESERVE', 8))
+
+# name: (priority, concurrency, queue limit, max wait in seconds)
+POOL_DEFAULTS = {
+    'telemetry': (0, BULKHEAD_CAPACITY, 64, 2.0),
+    'chat': (1, 8, 16, 10.0),
+    'analysis': (2, 4, 8, 30.0),
+}
+
+# Weight of the latest request in the pool's average request time
+SERVICE_TIME_ALPHA = 0.2
+MAX_RETRY_AFTER = 120
+
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+POOL_IN_FLIGHT = registry.gauge(
+    'aquaponics_pool_in_flight', 'Requests running per workload pool')
+POOL_QUEUE_DEPTH = registry.gauge(
+    'aquaponics_pool_queue_depth', 'Requests waiting for a slot per workload pool')
+POOL_WAIT = registry.histogram(
+    'aquaponics_pool_wait_seconds', 'Time admitted requests waited for a slot', buckets=WAIT_BUCKETS)
+POOL_REJECTED = registry.counter(
+    'aquaponics_pool_rejected_total', 'Requests turned away per workload pool and reason')
+
+def pool_setting(name, setting, default):
+    return type(default)(os.environ.get(f'BULKHEAD_{name.upper()}_{setting}', default))
+
+class Rejected(Exception):
+    """A request was not admitted; carries the status and Retry-After seconds."""
+
+    def __init__(self, status, reason, retry_after):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+class WorkloadPool:
+    """Admission state of one workload (guarded by the bulkhead's lock)."""
+
+    def __init__(self, name, priority, concurrency, max_queue, max_wait):
+        self.name = name
+        self.priority = priority
+        self.concurrency = pool_setting(name, 'CONCURRENCY', concurrency)
+        self.max_queue = pool_setting(name, 'QUEUE', max_queue)
+        self.max_wait = pool_setting(name, 'MAX_WAIT', max_wait)
+        self.in_flight = 0
+        self.waiting = 0
+        self.service_time = None  # moving average, seconds
+
+    def retry_after(self):
+        """Seconds until a slot is likely free for a new request."""
+        service_time = self.service_time or 1.0
+        rounds = (self.waiting + self.in_flight) / max(self.concurrency, 1)
+        return max(1, min(MAX_RETRY_AFTER, math.ceil(service_time * max(rounds, 1))))
+
+class Bulkhead:
+    """Admission control over a fixed number of server threads."""
+
+    def __init__(self, pools=POOL_DEFAULTS, capacity=BULKHEAD_CAPACITY, reserve=BULKHEAD_RESERVE):
+        self.capacity = capacity
+        self.reserve = reserve
+        self.pools = {name: WorkloadPool(name, *settings) for name, settings in pools.items()}
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def _admissible(self, pool):
+        limit = self.capacity if pool.priority == 0 else self.capacity - self.reserve
+        if pool.in_flight >= pool.concurrency or self.in_flight >= limit:
+            return False
+        # Freed slots go to higher-priority waiters first
+        return not any(other.waiting for other in self.pools.values()
+                       if other.priority < pool.priority)
+
+    def _update_gauges(self, pool):
+        POOL_IN_FLIGHT.set(pool.in_flight, pool=pool.name)
+        POOL_QUEUE_DEPTH.set(pool.waiting, pool=pool.name)
+
+    def acquire(self, name):
+        """
+        Take a slot in pool ``name``, waiting up to its ``max_wait``.
+
+        Returns:
+            float: seconds waited
+
+        Raises:
+            Rejected: if the queue is full or no slot freed up in time
+        """
+        pool = self.pools[name]
+        started = time.monotonic()
+        with self._cond:
+            if not self._admissible(pool):
+                if pool.waiting >= pool.max_queue:
+                    POOL_REJECTED.inc(pool=name, reason='queue_full')
+                    raise Rejected(429, 'queue_full', pool.retry_after())
+                pool.waiting += 1
+                self._update_gauges(pool)
+                deadline = started + pool.max_wait
+                try:
+                    while not self._admissible(pool):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            POOL_REJECTED.inc(pool=name, reason='timeout')
+                            raise Rejected(503, 'timeout', pool.retry_after())
+                        self._cond.wait(remaining)
+                finally:
+                    pool.waiting -= 1
+                    # A lower-priority waiter may have been held back by this one
+                    self._cond.notify_all()
+            pool.in_flight += 1
+            self.in_flight += 1
+            self._update_gauges(pool)
+        waited = time.monotonic() - started
+        POOL_WAIT.observe(waited, pool=name)
+        return waited
+
+    def release(self, name, duration):
+        """Free a slot taken by ``acquire``; ``duration`` is the request's run time."""
+        pool = self.pools[name]
+        with self._cond:
+            pool.in_flight -= 1
+            self.in_flight -= 1
+            pool.service_time = duration if pool.service_time is None else (
+                SERVICE_TIME_ALPHA * duration + (1 - SERVICE_TIME_ALPHA) * pool.service_time)
+            self._update_gauges(pool)
+            self._cond.notify_all()
+
+    def guard(self, blueprint, name):
+        """Admit every request to ``blueprint`` through pool ``name`` (before registering it)."""
+        if not BULKHEADS_ENABLED:
+            return
+
+        @blueprint.before_request
+        def admit():
+            try:
+                self.acquire(name)
+            except Rejected as e:
+                response = jsonify({
+                    "error": "Too Many Requests" if e.status == 429 else "Service Unavailable",
+                    "message": f"The {name} workload is at capacity. Please try again later.",
+                    "retry_after": e.retry_after
+                })
+                response.headers['Retry-After'] = str(e.retry_after)
+                return response, e.status
+            g.bulkhead_slot = (name, time.monotonic())
+
+        @blueprint.teardown_request
+        def free(exc=None):
+            slot = g.pop('bulkhead_slot', None)
+            if slot is not None:
+                self.release(slot[0], time.monotonic() - slot[1])
+
+bulkhead = Bulkhead()
@@ -0,0 +1,111 @@
+"""
+Server-side response cache and conditional GET for read endpoints.
+
+Dashboard polls hit the same read endpoints with unchanged data. Each
+cached view declares a cheap *data version* function (file mtimes, the
+result store's sequence); the cache key is the route, query string and
+that version:
+
+    * the ETag is derived from the key alone, so ``If-None-Match`` is
+      answered with 304 before the view runs
+    * otherwise the serialized body of the last 200 response for that
+      route and query is reused while the version is unchanged
+    * a new version replaces the entry, so invalidation happens exactly
+      when new telemetry or analyses land
+
+Set ``RESPONSE_CACHE_ENABLED=false`` to bypass it.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, request
+
+from monitoring import registry
+
+RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 256))
+
+# Part of every ETag; bump when a cached endpoint's payload format changes so
+# clients don't keep revalidating copies in the old format
+PAYLOAD_FORMAT_VERSION = 1
+
+CACHE_RESULTS = registry.counter(
+    'aquaponics_response_cache_total', 'Response cache lookups by route and result')
+
+def file_version(*paths):
+    """Data version of a set of files: their modification times and sizes."""
+    version = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            version.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            version.append(None)
+    return tuple(version)
+
+class ResponseCache:
+    """LRU cache of response bodies, one entry per route and query string."""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def cached(self, version, cache_control='no-cache'):
+        """
+        Cache a GET view's 200 responses until ``version()`` changes.
+
+        Args:
+            version (callable): Returns a hashable data version; must be cheap
+            cache_control (str): Cache-Control sent with the response. The
+                default makes clients revalidate (and get a 304) every poll.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not RESPONSE_CACHE_ENABLED:
+                    return view(*args, **kwargs)
+
+                route = request.path
+                key = (route, request.query_string)
+                data_version = version()
+                etag = hashlib.sha1(
+                    repr((key, data_version, PAYLOAD_FORMAT_VERSION)).encode('utf-8')).hexdigest()[:24]
+                headers = {'ETag': f'"{etag}"', 'Cache-Control': cache_control}
+
+                if request.if_none_match.contains(etag):
+                    CACHE_RESULTS.inc(route=request.url_rule.rule, result='not_modified')
+                    return Response(status=304, headers=headers)
+
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if entry is not None and entry[0] == etag:
+                        self._entries.move_to_end(key)
+                if entry is not None and entry[0] == etag:
+                    CACHE_RESULTS.inc(route=request.url_rule.rule, result='hit')
+                    return Response(entry[1], mimetype=entry[2], headers=headers)
+
+                CACHE_RESULTS.inc(route=request.url_rule.rule, result='miss')
+                response = view(*args, **kwargs)
+                if isinstance(response, tuple):
+                    # Error responses, e.g. (jsonify(...), 500), are not cached
+                    return response
+                if response.status_code == 200 and not response.direct_passthrough:
+                    with self._lock:
+                        self._entries[key] = (etag, response.get_data(), response.mimetype)
+                        self._entries.move_to_end(key)
+                        while len(self._entries) > self.max_entries:
+                            self._entries.popitem(last=False)
+                    response.headers.update(headers)
+                return response
+            return wrapper
+        return decorator
+
+response_cache = ResponseCache()
@@ -2,25 +2,40 @@
 API routes for chatbot functionality.
 """
 import json
+import logging
 import os
 import requests
 import time
 import uuid
 from datetime import datetime
 from flask import Blueprint, request, jsonify
+from ai.conversation import PROMPT_TOKENS, Conversation
+from ai.knowledge import CHAT_KB_ENABLED, CHAT_KB_GROUNDING_SCORE, KnowledgeBase, describe_for_prompt
+import ai.models  # noqa: F401 (registers the LLM providers with llm_router)
 from ai.prompts.o1_prompt import O1_SYSTEM_PROMPT
+from ai.routing import LLMUnavailableError, llm_router
+from ai.tokens import count_tokens
+from monitoring import log_body, record_backoff, span
+from routes.telemetry import FISH_PARAMS, PLANT_PARAMS, telemetry_snapshot
+
+logger = logging.getLogger(__name__)
 
 # Create blueprint for chatbot routes
 chatbot_bp = Blueprint('chatbot', __name__)
 
-# In-memory storage for chat history (would be a database in production)
+# In-memory storage for chat history (would be a database in production):
+# session id -> Conversation
 chat_sessions = {}
 
 # O1 Mini API configuration
 O1_API_HOST = "suzarilshah.openai.azure.com"
 O1_DEPLOYMENT = "o1-mini"
 O1_API_VERSION = "2023-05-15"
-O1_API_BASE = f"https://{O1_API_HOST}/openai/deployments/{O1_DEPLOYMENT}/chat/completions?api-version={O1_API_VERSION}"
+# CHATBOT_API_BASE overrides the full endpoint URL (e.g. to point at a local mock)
+O1_API_BASE = os.environ.get(
+    "CHATBOT_API_BASE",
+    f"https://{O1_API_HOST}/openai/deployments/{O1_DEPLOYMENT}/chat/completions?api-version={O1_API_VERSION}"
+)
 
 # Get API key from environment with validation
 def get_api_key():
@@ -40,6 +55,30 @@ RETRY_ERRORS = (requests.exceptions.RequestException, requests.exceptions.Timeou
 # Chatbot system prompt - focused on pH management from telemetry data
 CHATBOT_SYSTEM_PROMPT = """You are an aquaponics expert. Keep pH 6.5-7.5. If pH <6.5: add coral, check 12hrs, alert >48hrs. Monitor ammonia <0.5ppm."""
 
+# Instructions sent at the start of every request
+CHATBOT_INSTRUCTIONS = "Instructions for you: You are an aquaponics expert. Monitor these parameters:\n- Fish: pH (6.5-7.5), Temperature (18-24°C), Ammonia (<0.5ppm)\n- Spearmint: Height (20-60cm), Growth Rate (0.8-1.5cm/day), EC (1.2-2.0 mS/cm)\n- Track pH impact on nutrient absorption and ammonia's effect on root stress."
+
+# Playbook retriever, indexed once at startup (see ai/knowledge.py)
+knowledge_base = KnowledgeBase(ranges={**FISH_PARAMS, **PLANT_PARAMS})
+
+def knowledge_answer(passage):
+    """A playbook as a reply, with the current readings of the parameters it covers."""
+    reply = passage['text']
+    try:
+        snapshot = telemetry_snapshot.get()
+    except Exception as e:
+        logger.warning("Telemetry snapshot unavailable: %s", e)
+        return reply
+    readings = []
+    for param in passage.get('params', []):
+        reading = snapshot['latest'].get(param)
+        if reading is not None:
+            status = 'within range' if reading['status'] == 'ok' else reading['status'].upper()
+            readings.append(f"- {param}: {reading['value']:g} ({status})")
+    if readings:
+        reply += f"\n\nCurrent readings (as of {snapshot['as_of']}):\n" + '\n'.join(readings)
+    return reply
+
 @chatbot_bp.route('/send', methods=['POST'])
 def send_message():
     """Send a message to the chatbot and get a response."""
@@ -50,42 +89,70 @@ def send_message():
         session_id = data.get('sessionId', str(uuid.uuid4()))
         
         # Get or create chat history
-        if session_id not in chat_sessions:
-            chat_sessions[session_id] = []
+        conversation = chat_sessions.get(session_id)
+        if conversation is None:
+            conversation = chat_sessions.setdefault(session_id, Conversation(CHATBOT_INSTRUCTIONS))
         
         # Add user message to history
-        chat_sessions[session_id].append({
+        conversation.append({
             "role": "user",
             "content": message,
             "timestamp": datetime.now().isoformat()
         })
         
-        # Prepare messages for API - Note: O1 Mini only supports user role
-        messages = [{"role": "user", "content": "Instructions for you: You are an aquaponics expert. Monitor these parameters:\n- Fish: pH (6.5-7.5), Temperature (18-24°C), Ammonia (<0.5ppm)\n- Spearmint: Height (20-60cm), Growth Rate (0.8-1.5cm/day), EC (1.2-2.0 mS/cm)\n- Track pH impact on nutrient absorption and ammonia's effect on root stress."}]
-        
-        # Add message with user role only
-        messages.append({"role": "user", "content": message})
-        
-        # Call Azure O1 Mini API
-        response = call_o1_api(messages)
+        # Routine questions are answered from the playbooks without an LLM call;
+        # related playbooks ground the LLM's answer
+        outcome, matches = knowledge_base.lookup(message) if CHAT_KB_ENABLED else ('miss', [])
+        if outcome == 'direct':
+            response = knowledge_answer(matches[0][1])
+            prompt_tokens = verbatim = 0
+        else:
+            # Prepare messages for API - Note: O1 Mini only supports user role,
+            # so earlier turns go in as one user message (summary plus recent turns)
+            messages = [{"role": "user", "content": CHATBOT_INSTRUCTIONS}]
+            # Current readings, alerts and trends, shared by all sessions
+            snapshot = telemetry_snapshot.text()
+            if snapshot:
+                messages.append({"role": "user", "content": snapshot})
+            if matches:
+                messages.append({"role": "user", "content": describe_for_prompt(matches)})
+            with span('chat_context'):
+                context, verbatim = conversation.build_context()
+            if context:
+                messages.append({"role": "user", "content": context})
+            
+            # Add message with user role only
+            messages.append({"role": "user", "content": message})
+            prompt_tokens = sum(count_tokens(item['content']) for item in messages)
+            PROMPT_TOKENS.observe(prompt_tokens)
+            
+            # Call Azure O1 Mini API
+            response = call_o1_api(messages)
         
         # Add assistant response to history
         assistant_message = {
             "role": "assistant",
             "content": response,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.now().isoformat(),
+            "promptTokens": prompt_tokens
         }
-        chat_sessions[session_id].append(assistant_message)
+        if outcome == 'direct':
+            assistant_message["source"] = "knowledge_base"
+        conversation.append(assistant_message)
+        conversation.schedule_summary()
+        logger.info("Chat turn used %d prompt tokens", prompt_tokens,
+                    extra={'session': session_id, 'verbatim_messages': verbatim, 'knowledge': outcome,
+                           'summarized_messages': conversation.summarized})
         
         # Return response with session info
         return jsonify({
             "sessionId": session_id,
             "message": assistant_message,
-            "history": chat_sessions[session_id]
+            "history": conversation.messages
         })
         
     except Exception as e:
-        print(f"Error in chatbot: {str(e)}")
+        logger.exception("Error in chatbot: %s", e)
         return jsonify({
             "error": str(e),
             "message": {
@@ -103,180 +170,225 @@ def get_history(session_id):
     
     return jsonify({
         "sessionId": session_id,
-        "history": chat_sessions[session_id]
+        "history": chat_sessions[session_id].messages
     })
 
+class ChatReplyError(Exception):
+    """An O1 attempt failed; ``reply`` is what the user sees if no provider answers."""
+
+    def __init__(self, reply):
+        super().__init__(reply)
+        self.reply = reply
+
+# Reply when the provider could not be reached or answered with an error
+CONNECTION_ERROR_REPLY = "I apologize, but I'm having trouble connecting to my knowledge base right now. This might be due to an API configuration issue. Please check the server logs for more details."
+
 def call_o1_api(messages, max_retries=MAX_RETRIES, current_attempt=0):
-    """Call the Azure O1 Mini API with retry logic."""
+    """Call the Azure O1 Mini API, hedged with the other provider (see ai/routing.py)."""
     try:
-        try:
-            api_key = get_api_key()
-        except ValueError as e:
-            print(f"API Key Error: {str(e)}")
-            return "I apologize, but I'm not properly configured. Please check the server logs for more details."
-            
-        # Azure OpenAI specific headers
-        headers = {
-            "Content-Type": "application/json",
-            "api-key": api_key
-        }
-        
-        # Payload for Azure OpenAI - using reduced tokens to avoid rate limits
-        payload = {
-            "messages": messages,
-            "max_completion_tokens": 5000  # Reduced tokens as requested
-        }
-        
-        print(f"Sending request to Azure OpenAI with payload: {json.dumps(payload, default=str)}")
+        api_key = get_api_key()
+    except ValueError as e:
+        logger.error("API Key Error: %s", e)
+        return "I apologize, but I'm not properly configured. Please check the server logs for more details."
+    
+    def send(messages, cancel):
+        return request_o1(messages, api_key, cancel, max_retries)
+    
+    try:
+        # O1 Mini while it is healthy; the other provider answers if it is slow or failing
+        return llm_router.complete(messages, prefer=O1_DEPLOYMENT, overrides={O1_DEPLOYMENT: send})
+    except LLMUnavailableError as e:
+        error = e.errors.get(O1_DEPLOYMENT)
+        if isinstance(error, ChatReplyError):
+            return error.reply
+        logger.error("Error calling O1 API: %s", e)
+        return CONNECTION_ERROR_REPLY
+
+# Keywords in a question -> parameter, for the rate-limit fallback
+PARAM_KEYWORDS = {'pH': ('ph',), 'ec': ('ec',), 'ammonia': ('ammonia',), 'temperature': ('temperature', 'temp')}
+
+def rate_limit_reply(messages):
+    """Context-aware fallback reply when O1 Mini is rate limited."""
+    message = messages[-1]['content'].lower()
+    mentioned = [param for param, keywords in PARAM_KEYWORDS.items() if any(k in message for k in keywords)]
+    try:
+        snapshot = telemetry_snapshot.get()
+    except Exception as e:
+        logger.warning("Telemetry snapshot unavailable: %s", e)
+        snapshot = {'latest': {}, 'alerts': []}
+
+    # Answer from the current readings where there are some
+    lines = []
+    for param in mentioned:
+        reading = snapshot['latest'].get(param)
+        if reading is None:
+            continue
+        state = 'within range' if reading['status'] == 'ok' else f"{reading['status'].upper()}, outside optimal range"
+        lines.append(f"- {param} is {reading['value']:g} as of {snapshot['as_of']} "
+                     f"(optimal {reading['min']}-{reading['max']}): {state}")
+    alerts = [alert for alert in snapshot['alerts'] if not mentioned or alert['parameter'] in mentioned]
+    lines += [f"- [{alert['type']}] {alert['message']}" for alert in alerts]
+    if lines:
+        return ("I can't reach my knowledge base right now, but here is the current system state:\n"
+                + '\n'.join(lines))
+
+    # Provide error-specific responses based on our telemetry data memory
+    if mentioned:
+        error_msg = "ERROR: Parameter outside optimal range:\n"
+        if 'pH' in mentioned:
+            error_msg += "- pH must be 6.5-7.5\n"
+        if 'ec' in mentioned:
+            error_msg += "- EC must be 1.2-2.0 mS/cm\n"
+        if 'ammonia' in mentioned:
+            error_msg += "- Ammonia must be <0.5ppm\n"
+        if 'temperature' in mentioned:
+            error_msg += "- Temperature must be 18-24°C\n"
+        return error_msg + "\nPlease adjust parameters to within these ranges."
+    return CONNECTION_ERROR_REPLY
+
+def request_o1(messages, api_key, cancel, max_retries=MAX_RETRIES):
+    """
+    One O1 Mini request with retry logic.
+    
+    Returns:
+        str: The reply text
         
-        # Enhanced retry logic with exponential backoff
-        for attempt in range(max_retries):
-            try:
-                print(f"Making API request (attempt {attempt + 1}/{max_retries})")
+    Raises:
+        ChatReplyError: with the fallback reply, if O1 Mini gave no answer
+    """
+    # Azure OpenAI specific headers
+    headers = {
+        "Content-Type": "application/json",
+        "api-key": api_key
+    }
+    
+    # Payload for Azure OpenAI - using reduced tokens to avoid rate limits
+    payload = {
+        "messages": messages,
+        "max_completion_tokens": 5000  # Reduced tokens as requested
+    }
+    
+    log_body(logger, "Sending request to Azure OpenAI", payload, messages=len(messages))
+    
+    # Enhanced retry logic with exponential backoff
+    for attempt in range(max_retries):
+        try:
+            logger.debug("Making API request (attempt %s/%s)", attempt + 1, max_retries)
+            with span('llm_attempt', model=O1_DEPLOYMENT):
                 response = requests.post(
                     O1_API_BASE,
                     headers=headers,
                     json=payload,
                     timeout=30
                 )
-                
-                # Check for specific error status codes that warrant a retry
-                if response.status_code == 429:
-                    print(f"Rate limit hit, providing context-aware fallback response")
-                    # Provide error-specific responses based on our telemetry data memory
-                    if any(param in message.lower() for param in ['ph', 'ec', 'ammonia', 'temperature']):
-                        error_msg = "ERROR: Parameter outside optimal range:\n"
-                        if 'ph' in message.lower():
-                            error_msg += "- pH must be 6.5-7.5\n"
-                        if 'ec' in message.upper():
-                            error_msg += "- EC must be 1.2-2.0 mS/cm\n"
-                        if 'ammonia' in message.lower():
-                            error_msg += "- Ammonia must be <0.5ppm\n"
-                        if 'temperature' in message.lower() or 'temp' in message.lower():
-                            error_msg += "- Temperature must be 18-24°C\n"
-                        return error_msg + "\nPlease adjust parameters to within these ranges."
-                    break
-                elif response.status_code in [500, 502, 503, 504]:
-                    if attempt < max_retries - 1:
-                        wait_time = RETRY_DELAY * (2 ** attempt)  # Exponential backoff
-                        print(f"Received status {response.status_code}, retrying in {wait_time}s...")
-                        time.sleep(wait_time)
-                        continue
-                elif response.status_code == 400:
-                    # Handle specific Azure API errors
-                    try:
-                        error_data = response.json().get('error', {})
-                        if 'unsupported_parameter' in error_data.get('code', ''):
-                            print(f"Azure API parameter error: {error_data.get('message')}")
-                            return "I apologize, but I'm having configuration issues. Please try again later."
-                    except Exception as e:
-                        print(f"Error parsing API error response: {str(e)}")
-                break
-                
-            except RETRY_ERRORS as e:
-                if attempt == max_retries - 1:
-                    print(f"Failed after {max_retries} attempts: {str(e)}")
+            
+            # Check for specific error status codes that warrant a retry
+            if response.status_code == 429:
+                logger.warning("Rate limit hit, providing context-aware fallback response")
+                raise ChatReplyError(rate_limit_reply(messages))
+            elif response.status_code in [500, 502, 503, 504]:
+                if attempt < max_retries - 1 and not cancel.is_set():
+                    wait_time = RETRY_DELAY * (2 ** attempt)  # Exponential backoff
+                    logger.warning("Received status %s, retrying in %ss", response.status_code, wait_time)
+                    if cancel.wait(wait_time):
+                        break
+                    record_backoff(O1_DEPLOYMENT, wait_time)
+                    continue
+            elif response.status_code == 400:
+                # Handle specific Azure API errors
+                try:
+                    error_data = response.json().get('error', {})
+                    if 'unsupported_parameter' in error_data.get('code', ''):
+                        logger.error("Azure API parameter error: %s", error_data.get('message'))
+                        raise ChatReplyError("I apologize, but I'm having configuration issues. Please try again later.")
+                except ChatReplyError:
                     raise
-                wait_time = RETRY_DELAY * (2 ** attempt)
-                print(f"Request failed: {str(e)}. Retrying in {wait_time}s...")
-                time.sleep(wait_time)
-        
-        # Debug information
-        print(f"Azure API Response Status: {response.status_code}")
-        
-        # Check for successful response
-        if response.status_code != 200:
-            print(f"Error calling O1 API: {response.status_code} {response.reason} for url: {O1_API_BASE}")
-            print(f"Response content: {response.text}")
-            return "I apologize, but I'm having trouble connecting to my knowledge base right now. This might be due to an API configuration issue. Please check the server logs for more details."
-        
-        # Parse response with enhanced error handling
-        try:
+                except Exception as e:
+                    logger.error("Error parsing API error response: %s", e)
+            break
+            
+        except RETRY_ERRORS as e:
+            if attempt == max_retries - 1 or cancel.is_set():
+                logger.error("Failed after %s attempts: %s", attempt + 1, e)
+                log_body(logger, "O1 API error response", getattr(e.response, 'text', None) or str(e),
+                         level=logging.ERROR, sample_rate=1.0)
+                raise ChatReplyError(CONNECTION_ERROR_REPLY) from e
+            wait_time = RETRY_DELAY * (2 ** attempt)
+            logger.warning("Request failed: %s. Retrying in %ss", e, wait_time)
+            if cancel.wait(wait_time):
+                raise ChatReplyError(CONNECTION_ERROR_REPLY) from e
+            record_backoff(O1_DEPLOYMENT, wait_time)
+    
+    logger.debug("Azure API Response Status: %s", response.status_code)
+    
+    # Check for successful response
+    if response.status_code != 200:
+        logger.error("Error calling O1 API: %s %s", response.status_code, response.reason,
+                     extra={"url": O1_API_BASE})
+        log_body(logger, "O1 API error response", response.text, level=logging.ERROR, sample_rate=1.0)
+        raise ChatReplyError(CONNECTION_ERROR_REPLY)
+    
+    # Parse response with enhanced error handling
+    try:
+        with span('llm_response_parse', model=O1_DEPLOYMENT):
             response_json = response.json()
-            print("=== Azure OpenAI Response Details ===")
-            print(f"Status Code: {response.status_code}")
-            print(f"Response Headers: {dict(response.headers)}")
-            print(f"Full Response Body: {json.dumps(response_json, indent=2)}")
+        log_body(logger, "Azure OpenAI response", response_json, status=response.status_code)
+    except json.JSONDecodeError as e:
+        logger.error("Failed to parse JSON response: %s", e)
+        log_body(logger, "Unparseable O1 API response", response.text, level=logging.ERROR, sample_rate=1.0)
+        raise ChatReplyError("I apologize, but I received an invalid response from my knowledge base. Please check the server logs for more details.")
+    return extract_reply(response_json, messages)
+
+def extract_reply(response_json, messages):
+    """The reply text of a chat-completions response (ChatReplyError if there is none)."""
+    # Check for API errors first
+    if 'error' in response_json:
+        error_msg = response_json['error'].get('message', 'Unknown API error')
+        logger.error("API Error: %s", error_msg)
+        raise ChatReplyError(f"I apologize, but I encountered an error: {error_msg}")
+    
+    # Extract the message content with improved validation
+    if 'choices' in response_json and response_json['choices']:
+        choice = response_json['choices'][0]
+        if isinstance(choice, dict):
+            # Check finish reason and content
+            finish_reason = choice.get('finish_reason')
+            message = choice.get('message', {})
+            content = (message.get('content') or '').strip()
             
-            # Check for API errors first
-            if 'error' in response_json:
-                error_msg = response_json['error'].get('message', 'Unknown API error')
-                print(f"API Error: {error_msg}")
-                return f"I apologize, but I encountered an error: {error_msg}"
+            if not content or content.isspace():
+                logger.warning("Empty content received, finish_reason: %s", finish_reason)
+                # Answer from the closest playbook, if there is one
+                matches = knowledge_base.search(messages[-1]['content'], limit=1)
+                if matches and matches[0][0] >= CHAT_KB_GROUNDING_SCORE:
+                    raise ChatReplyError(matches[0][1]['text'])
             
-            # Extract the message content with improved validation
-            if 'choices' in response_json and response_json['choices']:
-                choice = response_json['choices'][0]
-                print(f"\nAnalyzing first choice: {json.dumps(choice, indent=2)}")
-                
-                if isinstance(choice, dict):
-                    # Check finish reason and content
-                    finish_reason = choice.get('finish_reason')
-                    message = choice.get('message', {})
-                    content = message.get('content', '').strip()
-                    
-                    if not content or content.isspace():
-                        print(f"Empty content received, finish_reason: {finish_reason}")
-                        # Provide direct responses based on telemetry data ranges
-                        if 'pH' in messages[-1]['content'].lower():
-                            # Based on our memory of pH ranges and fish health
-                            return "1. Add crushed coral\n2. Check pH every 12hrs\n3. Monitor ammonia (<0.5ppm)\n4. If pH stays low >48hrs:\n   - Do 20% water change\n   - Check fish health"
-                    
-                    # Extract content from various possible locations
-                    content = None
-                    if 'message' in choice and isinstance(choice['message'], dict):
-                        content = choice['message'].get('content')
-                    elif 'text' in choice:
-                        content = choice['text']
-                    
-                    if content and content.strip():
-                        print(f"Found valid content: {content}")
-                        return content
-                    else:
-                        print("Empty or invalid content received")
-                        return "I apologize, but I was unable to generate a meaningful response. Please try rephrasing your question."
-                    
-                    # Format 2: Azure OpenAI streaming format
-                    if 'delta' in choice and isinstance(choice['delta'], dict):
-                        if 'content' in choice['delta']:
-                            content = choice['delta']['content']
-                            print(f"Found content in delta: {content}")
-                            return content
-                    
-                    # Format 3: Direct content in choice
-                    if 'content' in choice:
-                        content = choice['content']
-                        print(f"Found direct content in choice: {content}")
-                        return content
-                    
-                    # Format 4: Text field (some models use this)
-                    if 'text' in choice:
-                        content = choice['text']
-                        print(f"Found content in text field: {content}")
-                        return content
-                    
-                    print("No recognized content format in choice object")
-                else:
-                    print(f"Unexpected choice type: {type(choice)}")
-            else:
-                print("No choices array found in response")
+            # Extract content from various possible locations
+            content = None
+            if 'message' in choice and isinstance(choice['message'], dict):
+                content = choice['message'].get('content')
+            elif 'delta' in choice and isinstance(choice['delta'], dict):
+                # Azure OpenAI streaming format
+                content = choice['delta'].get('content')
+            elif 'text' in choice:
+                # Text field (some models use this)
+                content = choice['text']
+            elif 'content' in choice:
+                content = choice['content']
             
-            # Last resort: Check for content at root level
-            if 'content' in response_json:
-                content = response_json['content']
-                print(f"Found content at root level: {content}")
+            if content and content.strip():
+                logger.debug("Found valid content (%s chars)", len(content))
                 return content
-            
-            print("=== End of Response Analysis ===")
-            return "I apologize, but I received an unexpected response format from my knowledge base. Please check the server logs for more details."  
-        except json.JSONDecodeError as e:
-            print(f"Failed to parse JSON response: {e}")
-            print(f"Raw response: {response.text}")
-            return "I apologize, but I received an invalid response from my knowledge base. Please check the server logs for more details."
-        
-    except Exception as e:
-        print(f"Error calling O1 API: {str(e)}")
-        if hasattr(e, 'response') and hasattr(e.response, 'text'):
-            print(f"Response content: {e.response.text}")
-        return "I apologize, but I'm having trouble connecting to my knowledge base right now. This might be due to an API configuration issue. Please check the server logs for more details."
-
+            logger.warning("Empty or invalid content received")
+            raise ChatReplyError("I apologize, but I was unable to generate a meaningful response. Please try rephrasing your question.")
+        else:
+            logger.warning("Unexpected choice type: %s", type(choice))
+    else:
+        logger.warning("No choices array found in response")
+    
+    # Last resort: Check for content at root level
+    if 'content' in response_json:
+        logger.debug("Found content at root level")
+        return response_json['content']
+    
+    raise ChatReplyError("I apologize, but I received an unexpected response format from my knowledge base. Please check the server logs for more details.")
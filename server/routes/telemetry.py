@@ -3,9 +3,23 @@ Telemetry data routes for the Aquaponics Monitoring System.
 """
 from datetime import datetime
 import json
+import os
 from pathlib import Path
-from flask import Blueprint, jsonify, request, send_file
+from flask import Blueprint, Response, jsonify, request
+import numpy as np
 import pandas as pd
+from werkzeug.http import http_date
+from ai.telemetry_context import TelemetrySnapshot
+from monitoring import span
+from routes.caching import file_version, response_cache
+from storage.alerts import HOUR_NS, AlertManager, to_iso
+from storage.correlations import (CORRELATION_MAX_LAG, CORRELATION_RESOLUTION, DRIVERS, RESPONSES,
+                                  correlate_grid, parse_duration, to_grid)
+from storage.export import ENCODINGS, SECOND_NS, CsvExport, parse_bound
+from storage.fleet import FleetAggregator
+from storage.ingest import SOURCES
+from storage.loader import ColumnSummary, iter_canonical, read_header, read_last_row
+from storage.rollups import ROLLUP_COLUMNS, STATS, RollupStore, point_stats, rollup
 
 telemetry_bp = Blueprint('telemetry', __name__)
 
@@ -22,22 +36,110 @@ PLANT_PARAMS = {
     'ec': {'min': 1.2, 'max': 2.0}  # mS/cm
 }
 
+# Root data directory, overridable so benchmarks can point at synthetic data
+DATA_DIR = Path(os.environ.get('AQUAPONICS_DATA_DIR', Path(__file__).parent.parent / 'data'))
+
+# Alert rules for the optimal ranges: alerts open outside [min, max] once the
+# breach has lasted open_after, and resolve only once readings are back
+# inside [min + band, max - band] for clear_after (see storage.alerts)
+ALERT_RULES = {
+    'pH': dict(FISH_PARAMS['pH'], component='fish', severity='warning', band=0.1,
+               open_after=HOUR_NS, clear_after=HOUR_NS,
+               message='pH level ({value}) is outside optimal range ({min}-{max})'),
+    'temperature': dict(FISH_PARAMS['temperature'], component='fish', severity='warning', band=0.5,
+                        open_after=HOUR_NS, clear_after=HOUR_NS,
+                        message='Temperature ({value}°C) is outside optimal range ({min}-{max}°C)'),
+    # Ammonia is toxic: alert on the first reading over the limit
+    'ammonia': dict(min=None, max=FISH_PARAMS['ammonia']['max'], component='fish', severity='critical', band=0.05,
+                    open_after=0, clear_after=HOUR_NS,
+                    message='Ammonia level ({value}ppm) is above safe limit ({max}ppm)'),
+    'ec': dict(PLANT_PARAMS['ec'], component='plant', severity='warning', band=0.05,
+               open_after=HOUR_NS, clear_after=HOUR_NS,
+               message='EC ({value} mS/cm) is outside optimal range ({min}-{max} mS/cm)'),
+    'growth_rate': dict(PLANT_PARAMS['growth_rate'], component='plant', severity='warning', band=0.05,
+                        open_after=6 * HOUR_NS, clear_after=6 * HOUR_NS,
+                        message='Growth rate ({value} cm/day) is outside optimal range ({min}-{max} cm/day)'),
+}
+
+alert_manager = AlertManager(ALERT_RULES, DATA_DIR)
+
+# Current state of the validation dataset for chat requests (see ai.telemetry_context)
+telemetry_snapshot = TelemetrySnapshot({**FISH_PARAMS, **PLANT_PARAMS}, alert_manager, DATA_DIR)
+
+# Per-tank and fleet-wide aggregates of data/fleet/<tank>.csv (see storage.fleet)
+fleet_aggregator = FleetAggregator({**FISH_PARAMS, **PLANT_PARAMS})
+
 def get_data_file_path(dataset_type):
     """Get the path to a telemetry data file."""
-    data_dir = Path(__file__).parent.parent / 'data' / 'telemetry'
+    data_dir = DATA_DIR / 'telemetry'
     return data_dir / f'{dataset_type}.csv'
 
+def telemetry_version():
+    """Data version of the canonical datasets (changes whenever ingest writes)."""
+    return file_version(*(get_data_file_path(dataset_type) for dataset_type in SOURCES))
+
+def series_version():
+    """Data version of the canonical datasets and their rollup tiers."""
+    rollup_paths = [path for dataset_type in SOURCES for path in RollupStore(dataset_type, DATA_DIR).version_paths()]
+    return telemetry_version() + file_version(*rollup_paths)
+
+def read_latest(dataset_type):
+    """The newest row of a canonical dataset as a dict ({} if there is none)."""
+    path = get_data_file_path(dataset_type)
+    if not path.exists():
+        return {}
+    with span('csv_tail_read', dataset=dataset_type):
+        row = read_last_row(path)
+    return row.dropna().to_dict() if row is not None else {}
+
+def latest_trends(row, params):
+    """
+    Read the materialized rolling features (see storage.features) from a row.
+
+    Returns:
+        dict: {param: {feature_suffix: value}} for every feature present
+    """
+    trends = {}
+    for param in params:
+        prefix = f'{param}_'
+        values = {column[len(prefix):]: row[column] for column in row.index
+                  if column.startswith(prefix) and pd.notna(row[column])}
+        if values:
+            trends[param] = values
+    return trends
+
+def describe_columns(summary, params):
+    """Describe each monitored parameter that the dataset actually records."""
+    return {param: summary.describe(param) for param in params if param in summary.columns}
+
+def summarize_dataset(dataset_type, params):
+    """
+    Describe ``params`` over a whole dataset, read in fixed-size chunks.
+
+    Returns:
+        tuple: (ColumnSummary, first timestamp, last timestamp) with the
+               timestamps as ISO strings (None if the dataset has no rows)
+    """
+    path = get_data_file_path(dataset_type)
+    summary = ColumnSummary([param for param in params if param in read_header(path)])
+    first = last = None
+    for chunk in iter_canonical(path, summary.columns):
+        if chunk.empty:
+            continue
+        if first is None:
+            first = int(chunk['timestamp'].iloc[0])
+        last = int(chunk['timestamp'].iloc[-1])
+        summary.update(chunk)
+    return summary, to_iso(first) if first is not None else None, to_iso(last) if last is not None else None
+
 @telemetry_bp.route('/latest', methods=['GET'])
+@response_cache.cached(telemetry_version)
 def get_latest_telemetry():
     """Get the latest telemetry data."""
     try:
-        # Read the latest data from both datasets
-        initial_data = pd.read_csv(get_data_file_path('initial'))
-        validation_data = pd.read_csv(get_data_file_path('validation'))
-        
-        # Get the latest row from each dataset
-        latest_initial = initial_data.iloc[-1].to_dict() if not initial_data.empty else {}
-        latest_validation = validation_data.iloc[-1].to_dict() if not validation_data.empty else {}
+        # Read only the latest row of each dataset, from the end of the file
+        latest_initial = read_latest('initial')
+        latest_validation = read_latest('validation')
         
         return jsonify({
             'initial': latest_initial,
@@ -55,11 +157,21 @@ def get_latest_telemetry():
 
 @telemetry_bp.route('/download/<dataset_type>', methods=['GET'])
 def download_dataset(dataset_type):
-    """Download a specific dataset as CSV."""
-    if dataset_type not in ['initial', 'validation']:
+    """
+    Stream a dataset as CSV.
+
+    Query parameters:
+        start, end: optional inclusive time range (ISO timestamps or dates)
+        columns: optional comma-separated column list (timestamp is always included)
+
+    The body is gzip/zstd-compressed when the client's Accept-Encoding allows,
+    and supports ETag/Last-Modified conditional requests and single byte
+    ranges (on the encoded bytes) for resumable downloads.
+    """
+    if dataset_type not in SOURCES:
         return jsonify({
             'error': 'Invalid dataset type',
-            'message': 'Dataset type must be either "initial" or "validation"'
+            'message': f'Dataset type must be one of: {", ".join(SOURCES)}'
         }), 400
     
     try:
@@ -69,20 +181,195 @@ def download_dataset(dataset_type):
                 'error': 'Dataset not found',
                 'message': f'No data available for {dataset_type} dataset'
             }), 404
-            
-        return send_file(
-            file_path,
-            mimetype='text/csv',
-            as_attachment=True,
-            download_name=f'aquaponics_{dataset_type}_data.csv'
-        )
+        
+        columns = request.args.get('columns')
+        encoding = request.accept_encodings.best_match(ENCODINGS) or 'identity'
+        try:
+            export = CsvExport(
+                file_path,
+                start=parse_bound(request.args.get('start')),
+                end=parse_bound(request.args.get('end'), end=True),
+                columns=[c.strip() for c in columns.split(',') if c.strip()] if columns else None,
+                encoding=encoding
+            )
+        except ValueError as e:
+            return jsonify({
+                'error': 'Invalid export parameters',
+                'message': str(e)
+            }), 400
+        
+        headers = {
+            'ETag': f'"{export.etag}"',
+            'Last-Modified': http_date(export.last_modified),
+            'Accept-Ranges': 'bytes',
+            'Vary': 'Accept-Encoding',
+            'Content-Disposition': f'attachment; filename=aquaponics_{dataset_type}_data.csv'
+        }
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        
+        # Conditional GET: the client's copy is current
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains(export.etag)
+        else:
+            not_modified = bool(request.if_modified_since and request.if_modified_since >= export.last_modified)
+        if not_modified:
+            return Response(status=304, headers=headers)
+        
+        # Resume from a byte range, unless the representation changed (If-Range)
+        byte_range, if_range = request.range, request.if_range
+        if byte_range and (if_range.etag or if_range.date):
+            if if_range.etag:
+                unchanged = if_range.etag == export.etag
+            else:
+                unchanged = if_range.date >= export.last_modified
+            if not unchanged:
+                byte_range = None
+        if byte_range:
+            length = export.length()
+            bounds = byte_range.range_for_length(length)
+            if bounds is None:
+                headers['Content-Range'] = f'bytes */{length}'
+                return Response(status=416, headers=headers)
+            first, stop = bounds
+            headers['Content-Range'] = f'bytes {first}-{stop - 1}/{length}'
+            headers['Content-Length'] = str(stop - first)
+            return Response(export.iter_bytes(first, stop), status=206, mimetype='text/csv',
+                            headers=headers, direct_passthrough=True)
+        
+        if export.is_raw and encoding == 'identity':
+            headers['Content-Length'] = str(export.file_size)
+        return Response(export.iter_bytes(), mimetype='text/csv', headers=headers, direct_passthrough=True)
     except Exception as e:
         return jsonify({
             'error': 'Failed to download dataset',
             'message': str(e)
         }), 500
 
+def to_ns(iso_timestamp):
+    return None if iso_timestamp is None else int(np.datetime64(iso_timestamp, 'ns').astype(np.int64))
+
+def read_raw_series(dataset_type, start, end, columns):
+    """Raw readings in ``[start, end]`` as (timestamps, per-reading stats)."""
+    path = get_data_file_path(dataset_type)
+    header = read_header(path)
+    columns = [column for column in (columns or ROLLUP_COLUMNS) if column in header]
+    chunks = []
+    # float64, like the rollup tiers, so raw and rolled-up values match
+    for chunk in iter_canonical(path, columns, dtype=np.float64):
+        past_end = end is not None and len(chunk) and chunk['timestamp'].iloc[-1] > end
+        if start is not None:
+            chunk = chunk[chunk['timestamp'] >= start]
+        if end is not None:
+            chunk = chunk[chunk['timestamp'] <= end]
+        chunks.append(chunk)
+        # Rows are sorted by timestamp: nothing after this chunk can match
+        if past_end:
+            break
+    df = pd.concat(chunks, ignore_index=True)
+    return df['timestamp'].to_numpy(dtype=np.int64), point_stats(df, columns)
+
+def query_flag(name, default=False):
+    """A boolean query parameter (1/true/yes)."""
+    value = request.args.get(name)
+    return default if value is None else value.lower() in ('1', 'true', 'yes')
+
+def series_json(values):
+    """JSON-safe list of a float array (NaN -> null)."""
+    return [None if np.isnan(value) else value for value in values.tolist()]
+
+@telemetry_bp.route('/series/<dataset_type>', methods=['GET'])
+@response_cache.cached(series_version)
+def get_series(dataset_type):
+    """
+    Get a downsampled time series for charts.
+
+    Query parameters:
+        start, end: optional inclusive time range (ISO timestamps or dates)
+        resolution: bucket width (e.g. 15m, 1h, 1d); defaults to the range / points
+        points: target number of buckets when no resolution is given (default 500)
+        columns: optional comma-separated column list
+
+    Reads the coarsest rollup tier that satisfies the resolution (see
+    storage.rollups), falling back to raw readings for sub-minute resolutions.
+    Each column has min/max/mean/count/last per bucket.
+    """
+    if dataset_type not in SOURCES:
+        return jsonify({
+            'error': 'Invalid dataset type',
+            'message': f'Dataset type must be one of: {", ".join(SOURCES)}'
+        }), 400
+
+    try:
+        columns = request.args.get('columns')
+        try:
+            start = to_ns(parse_bound(request.args.get('start')))
+            end = to_ns(parse_bound(request.args.get('end'), end=True))
+            columns = [c.strip() for c in columns.split(',') if c.strip()] if columns else None
+            resolution = request.args.get('resolution')
+            resolution = int(pd.Timedelta(resolution).value) if resolution else None
+            points = int(request.args.get('points', 500))
+            if (resolution is not None and resolution <= 0) or points <= 0:
+                raise ValueError('resolution and points must be positive')
+            if start is not None and end is not None and start > end:
+                raise ValueError('start must not be after end')
+        except ValueError as e:
+            return jsonify({
+                'error': 'Invalid series parameters',
+                'message': str(e)
+            }), 400
+
+        store = RollupStore(dataset_type, DATA_DIR)
+        # The stored readings within the requested range
+        first, last = store.time_range()
+        if first is not None:
+            first = max(first, start) if start is not None else first
+            last = min(last, end) if end is not None else last
+        if resolution is None:
+            resolution = max((last - first) // points, SECOND_NS) if first is not None and first <= last else 0
+
+        with span('series_query', dataset=dataset_type):
+            if first is not None and first > last:
+                # Nothing stored in the range
+                tier, timestamps = 'raw', np.empty(0, np.int64)
+                stats = {column: {stat: np.empty(0, np.int64 if stat == 'count' else np.float64) for stat in STATS}
+                         for column in (columns or store.columns) if column in store.columns}
+            else:
+                tier, timestamps, stats = store.query(start, end, resolution, columns)
+            if tier is None:
+                if not get_data_file_path(dataset_type).exists():
+                    return jsonify({
+                        'error': 'Dataset not found',
+                        'message': f'No data available for {dataset_type} dataset'
+                    }), 404
+                timestamps, stats = read_raw_series(dataset_type, start, end, columns)
+                if resolution:
+                    timestamps, stats = rollup(timestamps, stats, resolution)
+
+            with np.errstate(invalid='ignore', divide='ignore'):
+                series = {column: {
+                    'min': series_json(values['min']),
+                    'max': series_json(values['max']),
+                    'mean': series_json(values['sum'] / values['count']),
+                    'count': values['count'].tolist(),
+                    'last': series_json(values['last']),
+                } for column, values in stats.items()}
+
+        return jsonify({
+            'dataset': dataset_type,
+            'tier': tier or 'raw',
+            'resolution_seconds': resolution // 10**9 if resolution else 0,
+            'timestamps': np.datetime_as_string(timestamps.view('datetime64[ns]'), unit='s').tolist(),
+            'series': series
+        })
+    except Exception as e:
+        return jsonify({
+            'error': 'Failed to fetch series',
+            'message': str(e)
+        }), 500
+
 @telemetry_bp.route('/stats', methods=['GET'])
+@response_cache.cached(telemetry_version)
 def get_telemetry_stats():
     """Get statistical analysis of telemetry data."""
     try:
@@ -90,29 +377,21 @@ def get_telemetry_stats():
         for dataset_type in ['initial', 'validation']:
             file_path = get_data_file_path(dataset_type)
             if file_path.exists():
-                df = pd.read_csv(file_path)
-                
-                # Calculate statistics for fish parameters
-                fish_stats = {
-                    'pH': df['pH'].describe().to_dict(),
-                    'temperature': df['temperature'].describe().to_dict(),
-                    'ammonia': df['ammonia'].describe().to_dict()
-                }
-                
-                # Calculate statistics for plant parameters
-                plant_stats = {
-                    'height': df['height'].describe().to_dict(),
-                    'growth_rate': df['growth_rate'].describe().to_dict(),
-                    'ec': df['ec'].describe().to_dict()
-                }
+                with span('stats_compute', dataset=dataset_type):
+                    # One pass over fixed-size chunks of just the monitored columns
+                    summary, start, end = summarize_dataset(dataset_type, {**FISH_PARAMS, **PLANT_PARAMS})
+                    fish_stats = describe_columns(summary, FISH_PARAMS)
+                    plant_stats = describe_columns(summary, PLANT_PARAMS)
+                last_row = read_last_row(file_path)
                 
                 stats[dataset_type] = {
                     'fish': fish_stats,
                     'plant': plant_stats,
-                    'sample_size': len(df),
+                    'trends': latest_trends(last_row, {**FISH_PARAMS, **PLANT_PARAMS}) if last_row is not None else {},
+                    'sample_size': summary.rows,
                     'date_range': {
-                        'start': df['timestamp'].iloc[0],
-                        'end': df['timestamp'].iloc[-1]
+                        'start': start,
+                        'end': end
                     }
                 }
         
@@ -129,60 +408,146 @@ def get_telemetry_stats():
             'message': str(e)
         }), 500
 
+@telemetry_bp.route('/correlations', methods=['GET'])
+@response_cache.cached(series_version)
+def get_correlations():
+    """
+    Get lagged cross-correlations between fish and plant parameters.
+
+    Query parameters:
+        dataset: initial or validation (default both)
+        start, end: optional inclusive time range
+        resolution: grid the series are resampled onto (default 6h)
+        max_lag: largest lag tried in each direction (default 7d)
+        curve: include r at every lag (default false)
+
+    For each driver (pH, temperature, ammonia, EC, turbidity) and response
+    (height, growth rate, humidity) pair, reports the lag with the strongest
+    correlation; a positive lag means the fish parameter leads (see
+    storage.correlations).
+    """
+    datasets = [request.args['dataset']] if request.args.get('dataset') else list(SOURCES)
+    if any(dataset_type not in SOURCES for dataset_type in datasets):
+        return jsonify({
+            'error': 'Invalid dataset type',
+            'message': f'Dataset type must be one of: {", ".join(SOURCES)}'
+        }), 400
+
+    try:
+        try:
+            start = to_ns(parse_bound(request.args.get('start')))
+            end = to_ns(parse_bound(request.args.get('end'), end=True))
+            resolution = request.args.get('resolution', CORRELATION_RESOLUTION)
+            width = parse_duration(resolution)
+            max_lag = parse_duration(request.args.get('max_lag', CORRELATION_MAX_LAG))
+            curve = query_flag('curve')
+        except ValueError as e:
+            return jsonify({
+                'error': 'Invalid correlation parameters',
+                'message': str(e)
+            }), 400
+
+        correlations = {}
+        for dataset_type in datasets:
+            if not get_data_file_path(dataset_type).exists():
+                continue
+            columns = DRIVERS + RESPONSES
+            with span('correlations_compute', dataset=dataset_type):
+                _, timestamps, stats = RollupStore(dataset_type, DATA_DIR).query(start, end, width, columns)
+                if timestamps is None:
+                    timestamps, stats = read_raw_series(dataset_type, start, end, columns)
+                _, grid = to_grid(timestamps, stats, width)
+                try:
+                    correlations[dataset_type] = correlate_grid(grid, width, max_lag, curve=curve)
+                except ValueError as e:
+                    return jsonify({
+                        'error': 'Invalid correlation parameters',
+                        'message': str(e)
+                    }), 400
+
+        return jsonify({
+            'resolution_hours': width / HOUR_NS,
+            'max_lag_hours': max_lag / HOUR_NS,
+            'correlations': correlations
+        })
+    except Exception as e:
+        return jsonify({
+            'error': 'Failed to compute correlations',
+            'message': str(e)
+        }), 500
+
+def fleet_version():
+    """Data version of the tank files."""
+    return fleet_aggregator.version()
+
+@telemetry_bp.route('/fleet', methods=['GET'])
+@response_cache.cached(fleet_version)
+def get_fleet():
+    """
+    Get fleet-wide statistics across every tank.
+
+    Query parameters:
+        tanks: include the per-tank list (default true)
+        histograms: include each parameter's histogram (default false)
+
+    Only tank files that changed since the last request are read, and only
+    their new rows when they were appended to (see storage.fleet).
+    """
+    try:
+        with span('fleet_aggregate'):
+            fleet_aggregator.refresh()
+            fleet = fleet_aggregator.summary(histograms=query_flag('histograms'))
+            if query_flag('tanks', True):
+                fleet['tank_list'] = fleet_aggregator.tank_list()
+        fleet['parameters'] = {'fish': FISH_PARAMS, 'plant': PLANT_PARAMS}
+        return jsonify(fleet)
+    except Exception as e:
+        return jsonify({
+            'error': 'Failed to aggregate fleet',
+            'message': str(e)
+        }), 500
+
+@telemetry_bp.route('/fleet/<tank_id>', methods=['GET'])
+@response_cache.cached(fleet_version)
+def get_fleet_tank(tank_id):
+    """Get one tank's latest readings and statistics over its history."""
+    try:
+        with span('fleet_aggregate'):
+            fleet_aggregator.refresh()
+            tank = fleet_aggregator.tank(tank_id, histograms=query_flag('histograms'))
+        if tank is None:
+            return jsonify({
+                'error': 'Tank not found',
+                'message': f'No telemetry for tank {tank_id}'
+            }), 404
+        return jsonify(tank)
+    except Exception as e:
+        return jsonify({
+            'error': 'Failed to aggregate tank',
+            'message': str(e)
+        }), 500
+
+def alerts_version():
+    """Data version of the validation dataset and the shared alert state."""
+    return alert_manager.version()
+
 @telemetry_bp.route('/alerts', methods=['GET'])
+@response_cache.cached(alerts_version)
 def get_system_alerts():
-    """Get system alerts based on latest telemetry data."""
+    """
+    Get the active (open or acknowledged) alerts.
+
+    Alerts are evaluated as new readings arrive (see storage.alerts), with
+    hysteresis and minimum durations, so a breach is reported once until it
+    resolves instead of on every poll.
+    """
     try:
-        # Read latest data
-        latest_data = pd.read_csv(get_data_file_path('validation')).iloc[-1]
-        
-        alerts = []
-        
-        # Check fish parameters
-        if not (FISH_PARAMS['pH']['min'] <= latest_data['pH'] <= FISH_PARAMS['pH']['max']):
-            alerts.append({
-                'type': 'warning',
-                'parameter': 'pH',
-                'message': f'pH level ({latest_data["pH"]}) is outside optimal range ({FISH_PARAMS["pH"]["min"]}-{FISH_PARAMS["pH"]["max"]})',
-                'component': 'fish'
-            })
-            
-        if not (FISH_PARAMS['temperature']['min'] <= latest_data['temperature'] <= FISH_PARAMS['temperature']['max']):
-            alerts.append({
-                'type': 'warning',
-                'parameter': 'temperature',
-                'message': f'Temperature ({latest_data["temperature"]}°C) is outside optimal range ({FISH_PARAMS["temperature"]["min"]}-{FISH_PARAMS["temperature"]["max"]}°C)',
-                'component': 'fish'
-            })
-            
-        if latest_data['ammonia'] > FISH_PARAMS['ammonia']['max']:
-            alerts.append({
-                'type': 'critical',
-                'parameter': 'ammonia',
-                'message': f'Ammonia level ({latest_data["ammonia"]}ppm) is above safe limit ({FISH_PARAMS["ammonia"]["max"]}ppm)',
-                'component': 'fish'
-            })
-        
-        # Check plant parameters
-        if not (PLANT_PARAMS['ec']['min'] <= latest_data['ec'] <= PLANT_PARAMS['ec']['max']):
-            alerts.append({
-                'type': 'warning',
-                'parameter': 'ec',
-                'message': f'EC ({latest_data["ec"]} mS/cm) is outside optimal range ({PLANT_PARAMS["ec"]["min"]}-{PLANT_PARAMS["ec"]["max"]} mS/cm)',
-                'component': 'plant'
-            })
-            
-        if not (PLANT_PARAMS['growth_rate']['min'] <= latest_data['growth_rate'] <= PLANT_PARAMS['growth_rate']['max']):
-            alerts.append({
-                'type': 'warning',
-                'parameter': 'growth_rate',
-                'message': f'Growth rate ({latest_data["growth_rate"]} cm/day) is outside optimal range ({PLANT_PARAMS["growth_rate"]["min"]}-{PLANT_PARAMS["growth_rate"]["max"]} cm/day)',
-                'component': 'plant'
-            })
+        alerts = alert_manager.active()
+        watermark = alert_manager.watermark
         
         return jsonify({
             'alerts': alerts,
-            'timestamp': latest_data['timestamp'],
+            'timestamp': to_iso(watermark) if watermark is not None else None,
             'total_alerts': len(alerts)
         })
     except Exception as e:
@@ -190,3 +555,62 @@ def get_system_alerts():
             'error': 'Failed to generate alerts',
             'message': str(e)
         }), 500
+
+@telemetry_bp.route('/alerts/<alert_id>/acknowledge', methods=['POST'])
+def acknowledge_alert(alert_id):
+    """Acknowledge an open alert; it stays active until its condition resolves."""
+    try:
+        alert = alert_manager.acknowledge(alert_id)
+        if alert is None:
+            return jsonify({
+                'error': 'Alert not found',
+                'message': f'No active alert with ID {alert_id}'
+            }), 404
+        return jsonify(alert)
+    except Exception as e:
+        return jsonify({
+            'error': 'Failed to acknowledge alert',
+            'message': str(e)
+        }), 500
+
+@telemetry_bp.route('/alerts/history', methods=['GET'])
+def get_alert_history():
+    """
+    Get alert transitions (open, acknowledged, resolved), newest first.
+
+    Query parameters:
+        start, end: optional inclusive telemetry time range
+        parameter, state: optional filters
+        limit: page size (default 50, at most 500)
+        before: cursor from the previous page's ``next``
+    """
+    try:
+        try:
+            start = parse_bound(request.args.get('start'))
+            end = parse_bound(request.args.get('end'), end=True)
+            before = request.args.get('before')
+            before = int(before) if before else None
+            limit = min(int(request.args.get('limit', 50)), 500)
+            if limit <= 0:
+                raise ValueError('limit must be positive')
+        except ValueError as e:
+            return jsonify({
+                'error': 'Invalid history parameters',
+                'message': str(e)
+            }), 400
+        
+        alert_manager.sync()
+        events, cursor = alert_manager.log.query(
+            since=to_ns(start), until=to_ns(end),
+            before=before, limit=limit,
+            parameter=request.args.get('parameter'), state=request.args.get('state')
+        )
+        return jsonify({
+            'events': events,
+            'next': cursor
+        })
+    except Exception as e:
+        return jsonify({
+            'error': 'Failed to fetch alert history',
+            'message': str(e)
+        }), 500
@@ -0,0 +1,3 @@
+"""
+Aquaponics Telemetry Storage Module
+"""
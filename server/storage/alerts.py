@@ -0,0 +1,388 @@
+"""
+Stateful telemetry alerts with hysteresis and an append-only alert log.
+
+Alerts are evaluated once per new reading, not on every poll. Each alert
+key (a parameter rule, or ``sensor:<param>`` for sensor faults) moves
+between states in telemetry time:
+
+    (inactive) --breach held for open_after--> open --ack--> acknowledged
+         ^                                       |                |
+         +------ clear held for clear_after -----+----------------+  (resolved)
+
+A value rule breaches outside ``[min, max]`` but only clears inside the
+narrower ``[min + band, max - band]``, so readings hovering at a threshold
+raise one alert instead of flapping. Readings flagged as sensor faults
+(``storage.quality``) neither raise nor clear value alerts; they open a
+``sensor`` alert instead.
+
+Every transition is appended to ``data/alerts/alerts.log`` (one JSON line
+per event, indexed in memory by telemetry time for paginated history
+queries). The current state, including pending breaches and the position
+read up to in the canonical file, is checkpointed to ``state.json`` under
+the log's file lock, so several server processes share one alert state
+and never log the same transition twice. Active alerts are served from
+memory.
+"""
+import bisect
+import io
+import json
+import logging
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from monitoring import registry
+from .export import read_header
+from .ingest import parse_timestamps, read_canonical_tail
+from .quality import QUALITY_RULES, describe_flags, flag_column
+from .results import FileLock
+
+logger = logging.getLogger(__name__)
+
+HOUR_NS = 3600 * 10**9
+DAY_NS = 24 * HOUR_NS
+
+# Readings evaluated when there is no alert state yet, so a first start
+# doesn't replay months of history as a burst of alerts
+BOOTSTRAP_WINDOW = DAY_NS
+
+CHUNK_ROWS = 100_000
+
+SEVERITY_ORDER = {'critical': 0, 'warning': 1, 'info': 2}
+
+ALERT_TRANSITIONS = registry.counter(
+    'aquaponics_alert_transitions_total', 'Alert state transitions by parameter and state')
+
+def to_iso(timestamp_ns):
+    return str(np.datetime64(int(timestamp_ns), 'ns').astype('datetime64[s]'))
+
+def to_ns(iso_timestamp):
+    return int(np.datetime64(iso_timestamp, 'ns').astype(np.int64))
+
+class AlertLog:
+    """Append-only JSON-lines event log with an in-memory time index."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._offsets = []
+        self._times = []
+        self._end = 0
+        self.refresh()
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def refresh(self):
+        """Index events appended since the last refresh (by any process)."""
+        try:
+            if self.path.stat().st_size == self._end:
+                return
+        except FileNotFoundError:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._end)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # a writer is mid-append; pick it up next time
+                timestamp = to_ns(json.loads(line)['time'])
+                self._offsets.append(self._end)
+                # Kept non-decreasing so the index can be bisected
+                self._times.append(max(timestamp, self._times[-1]) if self._times else timestamp)
+                self._end += len(line)
+
+    def append(self, events):
+        """Append events, numbering them; the caller holds the file lock."""
+        self.refresh()
+        lines = []
+        for event in events:
+            event['seq'] = len(self._offsets) + len(lines)
+            lines.append(json.dumps(event) + '\n')
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(''.join(lines))
+        self.refresh()
+
+    def query(self, since=None, until=None, before=None, limit=50, parameter=None, state=None):
+        """
+        Events newest first, optionally within a telemetry time range.
+
+        Args:
+            since, until (int): Inclusive time bounds, int64 ns
+            before (int): Cursor: only events with ``seq`` below this
+            limit (int): Maximum number of events returned
+            parameter, state (str): Optional filters
+
+        Returns:
+            tuple: (events, cursor for the next page or None)
+        """
+        self.refresh()
+        first = bisect.bisect_left(self._times, since) if since is not None else 0
+        seq = bisect.bisect_right(self._times, until) if until is not None else len(self._offsets)
+        if before is not None:
+            seq = min(seq, before)
+
+        events = []
+        with open(self.path, 'rb') if self._offsets else io.BytesIO() as f:
+            while seq > first and len(events) < limit:
+                seq -= 1
+                f.seek(self._offsets[seq])
+                event = json.loads(f.readline())
+                if (parameter is None or event['parameter'] == parameter) and (state is None or event['state'] == state):
+                    events.append(event)
+        return events, (seq if seq > first else None)
+
+class AlertManager:
+    """Alert state of one canonical dataset, advanced as readings arrive."""
+
+    def __init__(self, rules, data_dir, dataset_type='validation'):
+        """
+        Args:
+            rules (dict): {parameter: rule}; a rule has ``component``,
+                ``severity``, ``min``/``max`` (None for one-sided), ``band``,
+                ``open_after``/``clear_after`` (ns) and a ``message`` template
+            data_dir (str | Path): Data directory with ``telemetry/``
+            dataset_type (str): Canonical dataset to watch
+        """
+        self.rules = rules
+        self.source = Path(data_dir) / 'telemetry' / f'{dataset_type}.csv'
+        self.directory = Path(data_dir) / 'alerts'
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.log = AlertLog(self.directory / 'alerts.log')
+        self.checkpoint_path = self.directory / 'state.json'
+        self._lock = threading.Lock()
+        self._synced_version = None
+        self._checkpoint_mtime = None
+        self.state = {'watermark': None, 'offset': None, 'inode': None, 'conditions': {}, 'active': {}}
+
+    def version(self):
+        """Changes whenever new readings arrive or another process updates the state."""
+        versions = []
+        for path in (self.source, self.checkpoint_path):
+            try:
+                stat = path.stat()
+                versions.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                versions.append(None)
+        return tuple(versions)
+
+    @property
+    def watermark(self):
+        """Timestamp (int64 ns) of the last evaluated reading, or None."""
+        return self.state['watermark']
+
+    def active(self):
+        """Open and acknowledged alerts, most severe first."""
+        self.sync()
+        alerts = list(self.state['active'].values())
+        alerts.sort(key=lambda alert: (SEVERITY_ORDER.get(alert['type'], 9), alert['opened_at']))
+        return [dict(alert) for alert in alerts]
+
+    def sync(self):
+        """Evaluate readings appended to the dataset since the last sync."""
+        version = self.version()
+        if version == self._synced_version:
+            return
+        with self._lock, open(self.log.path, 'ab') as lock_file, FileLock(lock_file):
+            self._load_checkpoint()
+            frame = self._read_new_rows()
+            if frame is not None:
+                events = self._evaluate(frame)
+                if events:
+                    self.log.append(events)
+                self._save_checkpoint()
+            self._synced_version = self.version()
+
+    def acknowledge(self, alert_id):
+        """
+        Acknowledge an open alert.
+
+        Returns:
+            dict | None: the alert, or None if no active alert has that ID
+        """
+        self.sync()
+        with self._lock, open(self.log.path, 'ab') as lock_file, FileLock(lock_file):
+            self._load_checkpoint()
+            alert = next((alert for alert in self.state['active'].values() if alert['id'] == alert_id), None)
+            if alert is None:
+                return None
+            if alert['state'] == 'open':
+                alert['state'] = 'acknowledged'
+                alert['acknowledged_at'] = datetime.now().isoformat()
+                time = self.watermark if self.watermark is not None else to_ns(alert['opened_at'])
+                self.log.append([self._event(alert, 'acknowledged', time)])
+                self._save_checkpoint()
+                self._synced_version = self.version()
+            return dict(alert)
+
+    def _load_checkpoint(self):
+        """Adopt the state another process checkpointed since we last looked."""
+        try:
+            mtime = self.checkpoint_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._checkpoint_mtime:
+            with open(self.checkpoint_path, 'r') as f:
+                self.state = json.load(f)
+            self._checkpoint_mtime = mtime
+        self.log.refresh()
+
+    def _save_checkpoint(self):
+        tmp_path = self.checkpoint_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f)
+        tmp_path.replace(self.checkpoint_path)
+        self._checkpoint_mtime = self.checkpoint_path.stat().st_mtime_ns
+
+    def _read_new_rows(self):
+        """
+        Rows after the watermark, read from where the last sync stopped.
+
+        Falls back to scanning the file when it was rewritten (new inode).
+
+        Returns:
+            DataFrame | None: new rows (possibly empty), or None without data
+        """
+        try:
+            stat = self.source.stat()
+        except FileNotFoundError:
+            return None
+        state = self.state
+        watermark = state['watermark']
+
+        if watermark is None:
+            frame = read_canonical_tail(self.source, BOOTSTRAP_WINDOW)
+            end = stat.st_size
+        elif stat.st_ino == state['inode'] and state['offset'] is not None and stat.st_size >= state['offset']:
+            with open(self.source, 'rb') as f:
+                f.seek(state['offset'])
+                data = f.read(stat.st_size - state['offset'])
+            # Leave a partially written last line for the next sync
+            data = data[:data.rfind(b'\n') + 1]
+            end = state['offset'] + len(data)
+            frame = pd.read_csv(io.BytesIO(data), names=read_header(self.source)) if data else pd.DataFrame()
+            if not frame.empty:
+                frame['timestamp'] = parse_timestamps(frame['timestamp'])
+        else:
+            chunks = []
+            for chunk in pd.read_csv(self.source, chunksize=CHUNK_ROWS):
+                chunk['timestamp'] = parse_timestamps(chunk['timestamp'])
+                chunks.append(chunk[chunk['timestamp'] > watermark])
+            frame = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+            end = stat.st_size
+
+        with open(self.source, 'rb') as f:
+            f.seek(max(end - 1, 0))
+            at_line_end = f.read(1) == b'\n'
+        state.update(offset=end if at_line_end else None, inode=stat.st_ino)
+        if frame.empty:
+            return frame
+        if watermark is not None:
+            frame = frame[frame['timestamp'] > watermark]
+        if not frame.empty:
+            state['watermark'] = int(frame['timestamp'].iloc[-1])
+        return frame
+
+    def _rules_for(self, frame):
+        """(key, parameter, rule) for every value and sensor rule the frame can feed."""
+        for parameter, rule in self.rules.items():
+            if parameter in frame.columns:
+                yield parameter, parameter, rule
+        for parameter in QUALITY_RULES:
+            if parameter in frame.columns and flag_column(parameter) in frame.columns:
+                yield f'sensor:{parameter}', parameter, None
+
+    def _evaluate(self, frame):
+        """Advance every alert key through the new readings; returns the events."""
+        events = []
+        if frame.empty:
+            # The file was only touched (e.g. an ingest with nothing new)
+            return events
+        timestamps = frame['timestamp'].to_numpy(dtype=np.int64)
+        for key, parameter, rule in self._rules_for(frame):
+            values = frame[parameter].to_numpy(dtype=np.float64)
+            column = flag_column(parameter)
+            flags = frame[column].to_numpy() if column in frame.columns else np.zeros(len(frame), dtype=np.int8)
+            for timestamp, value, flag in zip(timestamps.tolist(), values.tolist(), flags.tolist()):
+                if value != value:  # NaN: no reading
+                    continue
+                event = self._step(key, parameter, rule, timestamp, value, int(flag))
+                if event:
+                    events.append(event)
+        events.sort(key=lambda event: to_ns(event['time']))
+        return events
+
+    def _step(self, key, parameter, rule, timestamp, value, flag):
+        """Apply one reading to one alert key; returns the transition event, if any."""
+        if rule is None:
+            # Sensor fault: raised by a flagged reading, cleared by a clean one
+            breach, clear = flag != 0, flag == 0
+            open_after = clear_after = 0
+            message = f"{parameter} reading ({value}) looks like a sensor fault ({', '.join(describe_flags(flag))}); check the probe"
+            component, severity = 'sensor', 'info'
+        else:
+            if flag:
+                return None
+            low, high, band = rule.get('min'), rule.get('max'), rule.get('band', 0)
+            breach = (low is not None and value < low) or (high is not None and value > high)
+            clear = (low is None or value >= low + band) and (high is None or value <= high - band)
+            open_after, clear_after = rule.get('open_after', 0), rule.get('clear_after', 0)
+            message = rule['message'].format(value=value, min=low, max=high)
+            component, severity = rule['component'], rule['severity']
+
+        condition = self.state['conditions'].setdefault(key, {'pending_since': None, 'clearing_since': None})
+        alert = self.state['active'].get(key)
+        if alert is None:
+            if clear:
+                condition['pending_since'] = None
+            if not breach:
+                # Inside the band a pending breach keeps its start time
+                return None
+            if condition['pending_since'] is None:
+                condition['pending_since'] = timestamp
+            if timestamp - condition['pending_since'] < open_after:
+                return None
+            condition['pending_since'] = None
+            alert = {
+                'id': str(uuid.uuid4()),
+                'parameter': parameter,
+                'component': component,
+                'type': severity,
+                'state': 'open',
+                'opened_at': to_iso(timestamp),
+                'acknowledged_at': None,
+                'value': value,
+                'message': message,
+            }
+            self.state['active'][key] = alert
+            return self._event(alert, 'open', timestamp)
+
+        if not clear:
+            condition['clearing_since'] = None
+            if breach:
+                # Keep reporting the latest out-of-range reading
+                alert.update(value=value, message=message)
+            return None
+        if condition['clearing_since'] is None:
+            condition['clearing_since'] = timestamp
+        if timestamp - condition['clearing_since'] < clear_after:
+            return None
+        condition['clearing_since'] = None
+        del self.state['active'][key]
+        return self._event(dict(alert, value=value), 'resolved', timestamp)
+
+    def _event(self, alert, state, timestamp):
+        ALERT_TRANSITIONS.inc(parameter=alert['parameter'], state=state)
+        return {
+            'id': alert['id'],
+            'parameter': alert['parameter'],
+            'component': alert['component'],
+            'type': alert['type'],
+            'state': state,
+            'time': to_iso(timestamp),
+            'value': alert['value'],
+            'message': alert['message'],
+            'logged_at': datetime.now().isoformat(),
+        }
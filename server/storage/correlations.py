@@ -0,0 +1,250 @@
+"""
+Lagged cross-correlations between fish-tank and plant-bed readings.
+
+The prompts ask the models to reason about cross-dependencies (pH ->
+nutrient absorption, ammonia -> root stress, ...). This module measures
+them: each fish parameter (the driver) is correlated with each plant
+parameter (the response) at every lag up to ``max_lag``, and the lag with
+the strongest correlation is reported.
+
+Series are first resampled onto a common grid of ``resolution``-wide
+buckets (bucket means, from the rollup tiers or raw readings) and linearly
+detrended, so a steady trend such as plant height does not correlate with
+everything. Empty buckets stay missing: every lag gets an exact Pearson r
+over the bucket pairs where both series have a value. The six sums that
+needs (n, sums, sums of squares and cross products) are each a masked
+cross-correlation, computed for all driver/response pairs and all lags at
+once with one real FFT per series.
+
+A positive lag means the driver leads: the response ``lag`` later moves
+with the driver now.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from .ingest import join_streams, normalize_records
+from .rollups import point_stats, rollup
+
+# Fish-tank parameters and the plant-bed parameters they may drive
+DRIVERS = ['pH', 'temperature', 'ammonia', 'ec', 'turbidity']
+RESPONSES = ['height', 'growth_rate', 'humidity']
+
+CORRELATION_RESOLUTION = os.environ.get('CORRELATION_RESOLUTION', '6h')
+CORRELATION_MAX_LAG = os.environ.get('CORRELATION_MAX_LAG', '7d')
+
+# Bucket pairs needed before a lag's r is considered: MIN_PAIRS, and at
+# least MIN_OVERLAP of the best-covered lag's (on a grid much finer than
+# the sampling, most lags only line up a few stray readings)
+MIN_PAIRS = 12
+MIN_OVERLAP = 0.5
+# Longest grid correlated (e.g. a year at 6-minute resolution)
+MAX_GRID_POINTS = 100_000
+# |r| above SIGNIFICANCE_Z / sqrt(pairs) is reported as significant (the
+# 1% two-sided level; the best of many lags is biased upwards, hence not 5%)
+SIGNIFICANCE_Z = 2.58
+
+MINUTE_NS = 60 * 10**9
+HOUR_NS = 60 * MINUTE_NS
+
+def parse_duration(value):
+    """A duration such as ``6h`` or ``7d`` in ns."""
+    duration = int(pd.Timedelta(value).value)
+    if duration <= 0:
+        raise ValueError(f'duration must be positive: {value}')
+    return duration
+
+def to_grid(timestamps, stats, width):
+    """
+    Bucket means of ``stats`` on a regular grid of ``width``-ns buckets.
+
+    Args:
+        timestamps (ndarray): Sorted bucket (or reading) timestamps, int64 ns
+        stats (dict): {column: {stat: ndarray}} as returned by the rollups
+
+    Returns:
+        tuple: (first bucket start, {column: float64 array with NaN for empty buckets})
+    """
+    buckets, stats = rollup(timestamps, stats, width)
+    if not len(buckets):
+        return None, {column: np.empty(0) for column in stats}
+    positions = (buckets - buckets[0]) // width
+    grid = {}
+    for column, values in stats.items():
+        series = np.full(int(positions[-1]) + 1, np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            series[positions] = np.where(values['count'] > 0, values['sum'] / values['count'], np.nan)
+        grid[column] = series
+    return int(buckets[0]), grid
+
+def detrend(values):
+    """``values`` minus their least-squares line, fitted over the non-missing entries."""
+    valid = ~np.isnan(values)
+    if valid.sum() < 2:
+        return values - np.nanmean(values) if valid.any() else values
+    x = np.flatnonzero(valid)
+    slope, intercept = np.polyfit(x, values[valid], 1)
+    return values - (slope * np.arange(len(values)) + intercept)
+
+def lagged_correlations(drivers, responses, max_lag):
+    """
+    Pearson r of every driver/response pair at lags ``-max_lag..max_lag``.
+
+    Args:
+        drivers (ndarray): (p, n) series, NaN where missing
+        responses (ndarray): (q, n) series on the same grid
+        max_lag (int): Largest lag in buckets
+
+    Returns:
+        tuple: (lags, r of shape (p, q, lags), pairs of shape (p, q, lags));
+               r is NaN where too few pairs overlap
+    """
+    n = drivers.shape[1]
+    max_lag = min(max_lag, n - 1)
+    # Zero padding to n + max_lag keeps lagged products from wrapping around
+    size = 1 << int(np.ceil(np.log2(n + max_lag + 1)))
+
+    def spectra(series):
+        mask = ~np.isnan(series)
+        values = np.where(mask, series, 0.0)
+        # Standardized, so the sums below stay well conditioned
+        scale = np.nanstd(np.where(mask, series, np.nan), axis=1, keepdims=True)
+        values = values / np.where(scale > 0, scale, 1.0)
+        return [np.fft.rfft(a, size) for a in (mask.astype(np.float64), values, values ** 2)]
+
+    d_mask, d_sum, d_sq = spectra(drivers)
+    r_mask, r_sum, r_sq = spectra(responses)
+
+    def correlate(a, b):
+        # c[k] = sum_t a[t] b[t + k] for every pair, lags -max_lag..max_lag
+        full = np.fft.irfft(np.conj(a)[:, None, :] * b[None, :, :], size)
+        return np.concatenate([full[..., size - max_lag:], full[..., :max_lag + 1]], axis=-1)
+
+    pairs = np.rint(correlate(d_mask, r_mask))
+    sum_x, sum_y = correlate(d_sum, r_mask), correlate(d_mask, r_sum)
+    sum_xx, sum_yy = correlate(d_sq, r_mask), correlate(d_mask, r_sq)
+    sum_xy = correlate(d_sum, r_sum)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covariance = pairs * sum_xy - sum_x * sum_y
+        variance = (pairs * sum_xx - sum_x ** 2) * (pairs * sum_yy - sum_y ** 2)
+        r = np.clip(covariance / np.sqrt(variance), -1.0, 1.0)
+    enough = (pairs >= MIN_PAIRS) & (pairs >= MIN_OVERLAP * pairs.max(axis=-1, keepdims=True))
+    r[~enough | ~(variance > 0)] = np.nan
+    return np.arange(-max_lag, max_lag + 1), r, pairs.astype(np.int64)
+
+def correlate_grid(grid, width, max_lag_ns, drivers=DRIVERS, responses=RESPONSES, curve=False):
+    """
+    Strongest lagged correlation of each driver/response pair on a grid.
+
+    Args:
+        grid (dict): {column: series} from ``to_grid``
+        width (int): Bucket width in ns
+        max_lag_ns (int): Largest lag in ns
+        curve (bool): Also return r at every lag
+
+    Returns:
+        dict: {'lags_hours': [...] (with ``curve``), 'pairs': [...]} with one
+              entry per pair that has enough overlapping buckets
+
+    Raises:
+        ValueError: if the grid is longer than ``MAX_GRID_POINTS``
+    """
+    length = max((len(series) for series in grid.values()), default=0)
+    if length > MAX_GRID_POINTS:
+        raise ValueError(f'{length} buckets at this resolution (at most {MAX_GRID_POINTS}); '
+                         'use a coarser resolution or a shorter range')
+    drivers = [column for column in drivers if np.count_nonzero(~np.isnan(grid.get(column, []))) >= MIN_PAIRS]
+    responses = [column for column in responses if np.count_nonzero(~np.isnan(grid.get(column, []))) >= MIN_PAIRS]
+    result = {'pairs': []}
+    if not drivers or not responses:
+        return result
+
+    lags, r, pairs = lagged_correlations(
+        np.vstack([detrend(grid[column]) for column in drivers]),
+        np.vstack([detrend(grid[column]) for column in responses]),
+        max(max_lag_ns // width, 0))
+    lag_hours = lags * width / HOUR_NS
+    zero = len(lags) // 2
+    if curve:
+        result['lags_hours'] = lag_hours.tolist()
+
+    for i, driver in enumerate(drivers):
+        for j, response in enumerate(responses):
+            values = r[i, j]
+            if np.isnan(values).all():
+                continue
+            best = int(np.nanargmax(np.abs(values)))
+            entry = {
+                'driver': driver,
+                'response': response,
+                'lag_hours': float(lag_hours[best]),
+                'r': round(float(values[best]), 3),
+                'r_at_zero': None if np.isnan(values[zero]) else round(float(values[zero]), 3),
+                'pairs': int(pairs[i, j, best]),
+            }
+            entry['significant'] = bool(abs(entry['r']) >= SIGNIFICANCE_Z / np.sqrt(entry['pairs']))
+            if curve:
+                entry['curve'] = [None if np.isnan(v) else round(float(v), 3) for v in values]
+            result['pairs'].append(entry)
+    result['pairs'].sort(key=lambda entry: -abs(entry['r']))
+    return result
+
+def correlate_records(datasets, resolution=None, max_lag=CORRELATION_MAX_LAG):
+    """
+    Correlations over telemetry posted in a request.
+
+    Args:
+        datasets (list): Dicts with ``fish`` and ``plant`` reading lists
+            (e.g. ``initialData`` and ``validationData``), taken together
+        resolution (str): Bucket width; by default the median interval
+            between the posted readings
+
+    Returns:
+        dict: as ``correlate_grid``, plus ``resolution_hours``
+    """
+    frames = []
+    for data in datasets:
+        fish, plant = normalize_records(data.get('fish')), normalize_records(data.get('plant'))
+        if fish.empty or plant.empty:
+            frames.append(fish if plant.empty else plant)
+        else:
+            frames.append(join_streams(fish, plant))
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return {'resolution_hours': None, 'pairs': []}
+    frame = pd.concat(frames, ignore_index=True).sort_values('timestamp', kind='stable')
+    timestamps = frame['timestamp'].to_numpy(dtype=np.int64)
+
+    if resolution is None:
+        steps = np.diff(timestamps)
+        steps = steps[steps > 0]
+        width = int(np.median(steps)) if len(steps) else HOUR_NS
+        # Whole hours (or minutes), so lags read as round numbers
+        unit = HOUR_NS if width >= HOUR_NS else MINUTE_NS
+        width = max(int(round(width / unit)), 1) * unit
+    else:
+        width = parse_duration(resolution)
+    columns = [column for column in DRIVERS + RESPONSES if column in frame.columns]
+    _, grid = to_grid(timestamps, point_stats(frame, columns), width)
+    result = correlate_grid(grid, width, parse_duration(max_lag))
+    return dict(result, resolution_hours=width / HOUR_NS)
+
+def describe_for_prompt(result, limit=6):
+    """A few lines summarizing the significant correlations, for LLM prompts ('' if none were computed)."""
+    if not result.get('pairs'):
+        return ''
+    significant = [entry for entry in result['pairs'] if entry['significant']][:limit]
+    if not significant:
+        return 'No significant lagged correlations between fish and plant parameters.'
+    lines = []
+    for entry in significant:
+        if entry['lag_hours']:
+            lag = f"at lag {entry['lag_hours']:+.4g}h"
+            if entry['r_at_zero'] is not None:
+                lag += f", r={entry['r_at_zero']:+.2f} at lag 0"
+        else:
+            lag = 'at lag 0'
+        lines.append(f"- {entry['driver']} -> {entry['response']}: r={entry['r']:+.2f} {lag} ({entry['pairs']} pairs)")
+    return '\n'.join(lines)
@@ -0,0 +1,183 @@
+"""
+Streaming CSV exports of canonical datasets.
+
+An export is a byte stream generated in fixed-size pieces, so memory use
+does not depend on the dataset size:
+
+    * unfiltered exports copy the canonical file in ``BLOCK_SIZE`` blocks
+    * time-range / column-selected exports read it ``CHUNK_ROWS`` rows at a
+      time (as strings, so values are written back exactly as stored) and
+      stop reading once past the end of the range; canonical timestamps are
+      ISO-8601, so range checks are plain string comparisons
+    * compression (gzip, or zstd when ``zstandard`` is installed) is applied
+      to the stream with incremental compressor objects
+
+Every export is deterministic for a given file version and options, which
+is what lets HTTP Range requests and ETags work on compressed and filtered
+representations too.
+"""
+import hashlib
+import re
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from .ingest import NAT_INT64, parse_timestamps
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BLOCK_SIZE = 64 * 1024
+CHUNK_ROWS = 50_000
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# Content codings we can produce, best first
+ENCODINGS = (['zstd'] if zstandard else []) + ['gzip']
+
+# Lengths of generated exports, by ETag (computing one means generating it)
+_LENGTH_CACHE = OrderedDict()
+LENGTH_CACHE_SIZE = 64
+
+SECOND_NS = 1_000_000_000
+DAY_NS = 86_400 * SECOND_NS
+_DATE_ONLY = re.compile(r'^\d{4}-\d{1,2}-\d{1,2}$')
+
+def parse_bound(value, end=False):
+    """
+    Parse a ``start``/``end`` query value into a canonical ISO timestamp.
+
+    Bounds are inclusive, so a date-only ``end`` (``2024-07-31``) means the
+    last second of that day rather than its midnight.
+
+    Raises:
+        ValueError: if the value is not a supported timestamp format
+    """
+    if value is None or value == '':
+        return None
+    parsed = parse_timestamps([value])[0]
+    if parsed == NAT_INT64:
+        raise ValueError(f"Unrecognized timestamp: {value!r}")
+    if end and _DATE_ONLY.match(value.strip()):
+        parsed += DAY_NS - SECOND_NS
+    return str(np.datetime_as_string(np.int64(parsed).view('datetime64[ns]'), unit='s'))
+
+def read_header(path):
+    """Column names of a canonical CSV file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.readline().rstrip('\r\n').split(',')
+
+def compress_stream(chunks, encoding):
+    """Compress a stream of byte chunks incrementally."""
+    if encoding == 'gzip':
+        # wbits=31 writes a gzip container; zlib leaves mtime at 0, so output is deterministic
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    elif encoding == 'zstd':
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    else:
+        yield from chunks
+        return
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def slice_stream(chunks, first, stop):
+    """Yield only bytes ``first`` (inclusive) to ``stop`` (exclusive) of a stream."""
+    position = 0
+    for chunk in chunks:
+        end = position + len(chunk)
+        if end > first:
+            yield chunk[max(0, first - position):stop - position]
+        position = end
+        if position >= stop:
+            break
+
+class CsvExport:
+    """One representation (file version, filters, encoding) of a dataset export."""
+
+    def __init__(self, path, start=None, end=None, columns=None, encoding='identity'):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.encoding = encoding
+        stat = path.stat()
+        self.mtime_ns = stat.st_mtime_ns
+        self.file_size = stat.st_size
+
+        header = read_header(path)
+        if columns:
+            unknown = [column for column in columns if column not in header]
+            if unknown:
+                raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+            self.columns = ['timestamp'] + [column for column in columns if column != 'timestamp']
+        else:
+            self.columns = None
+
+        options = f"{self.mtime_ns}:{self.file_size}:{start}:{end}:{self.columns}:{encoding}"
+        self.etag = hashlib.sha1(options.encode('utf-8')).hexdigest()[:20]
+        self.last_modified = datetime.fromtimestamp(self.mtime_ns / 1e9, tz=timezone.utc).replace(microsecond=0)
+
+    @property
+    def is_raw(self):
+        """Whether the export is the canonical file byte for byte."""
+        return self.start is None and self.end is None and self.columns is None
+
+    def iter_csv(self):
+        """Yield the uncompressed CSV in pieces."""
+        if self.is_raw:
+            with open(self.path, 'rb') as f:
+                while True:
+                    block = f.read(BLOCK_SIZE)
+                    if not block:
+                        return
+                    yield block
+
+        usecols = self.columns or read_header(self.path)
+        header = True
+        reader = pd.read_csv(self.path, usecols=usecols, dtype=str, keep_default_na=False,
+                             chunksize=CHUNK_ROWS)
+        for chunk in reader:
+            timestamps = chunk['timestamp']
+            mask = np.ones(len(chunk), dtype=bool)
+            if self.start is not None:
+                mask &= (timestamps >= self.start).to_numpy()
+            if self.end is not None:
+                mask &= (timestamps <= self.end).to_numpy()
+            if mask.any() or header:
+                yield chunk.loc[mask, usecols].to_csv(index=False, header=header, lineterminator='\n').encode('utf-8')
+                header = False
+            # Rows are sorted by timestamp: nothing after this chunk can match
+            if self.end is not None and len(chunk) and timestamps.iloc[-1] > self.end:
+                break
+
+    def iter_bytes(self, first=0, stop=None):
+        """Yield the encoded export, optionally only bytes ``first`` to ``stop``."""
+        chunks = compress_stream(self.iter_csv(), self.encoding)
+        if first == 0 and stop is None:
+            return chunks
+        return slice_stream(chunks, first, stop if stop is not None else float('inf'))
+
+    def length(self):
+        """
+        Byte length of the encoded export.
+
+        Free for raw uncompressed exports; otherwise the export is generated
+        once (in constant memory) and its length cached by ETag.
+        """
+        if self.is_raw and self.encoding == 'identity':
+            return self.file_size
+        if self.etag in _LENGTH_CACHE:
+            _LENGTH_CACHE.move_to_end(self.etag)
+            return _LENGTH_CACHE[self.etag]
+        length = sum(len(chunk) for chunk in self.iter_bytes())
+        _LENGTH_CACHE[self.etag] = length
+        if len(_LENGTH_CACHE) > LENGTH_CACHE_SIZE:
+            _LENGTH_CACHE.popitem(last=False)
+        return length
@@ -0,0 +1,103 @@
+"""
+Derived telemetry features, materialized as extra columns of the canonical store.
+
+The raw plant exports only record height (roughly every 5 hours), and every
+consumer used to recompute rates and trends on its own. These columns are
+computed once, vectorized, when rows are ingested:
+
+    growth_rate                 cm/day from height deltas over GROWTH_WINDOW
+    <param>_mean_<w>            rolling mean over each window in ROLLING_WINDOWS
+    <param>_std_<w>             rolling standard deviation over the same windows
+    is_daytime                  reading taken between DAYTIME_HOURS
+    <param>_day_mean_24h        mean of daytime readings over the last 24h
+    <param>_night_mean_24h      mean of night-time readings over the last 24h
+
+Every feature only looks back at most ``LOOKBACK``, so new rows can be
+processed incrementally given that much preceding context.
+"""
+import numpy as np
+import pandas as pd
+
+HOUR_NS = 3600 * 10**9
+DAY_NS = 24 * HOUR_NS
+
+ROLLING_WINDOWS = {'6h': 6 * HOUR_NS, '24h': DAY_NS, '7d': 7 * DAY_NS}
+GROWTH_WINDOW = 3 * DAY_NS
+DAYTIME_HOURS = (6, 18)
+
+# Longest look-back of any feature: the context needed for incremental updates
+LOOKBACK = max(max(ROLLING_WINDOWS.values()), GROWTH_WINDOW, DAY_NS)
+
+# Parameters that get rolling features (when present in the dataset)
+FEATURE_PARAMS = ['pH', 'temperature', 'ammonia', 'ec', 'turbidity', 'height', 'growth_rate']
+
+def derive_growth_rate(timestamps, height, window=GROWTH_WINDOW):
+    """
+    Growth rate in cm/day from height deltas over a trailing time window.
+
+    Heights are recorded in whole centimetres, so a single 5-hour delta is
+    mostly 0 or 1; measuring over ``window`` gives a usable rate. Rows with
+    no earlier reading in the window get NaN.
+    """
+    start = np.searchsorted(timestamps, timestamps - window, side='left')
+    elapsed_days = (timestamps - timestamps[start]) / DAY_NS
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = (height - height[start]) / elapsed_days
+    rate[elapsed_days <= 0] = np.nan
+    return np.round(rate, 4)
+
+def add_derived_columns(frame, context=None):
+    """
+    Compute the derived feature columns for ``frame``.
+
+    Args:
+        frame (DataFrame): Canonical rows, ``timestamp`` as int64 ns, sorted
+        context (DataFrame): Optional earlier rows (at least ``LOOKBACK`` of
+            them) used as look-back only; they are not returned
+
+    Returns:
+        DataFrame: ``frame`` with the feature columns added
+    """
+    n_context = 0 if context is None else len(context)
+    needs_growth = 'height' in frame.columns and (
+        'growth_rate' not in frame.columns or frame['growth_rate'].isna().all())
+    if n_context:
+        keep = [c for c in frame.columns if c in context.columns]
+        if needs_growth and 'growth_rate' in context.columns:
+            keep.append('growth_rate')
+        work = pd.concat([context[keep], frame], ignore_index=True)
+    else:
+        work = frame.reset_index(drop=True)
+    timestamps = work['timestamp'].to_numpy(dtype=np.int64)
+
+    derived = {}
+    if needs_growth:
+        growth = derive_growth_rate(timestamps, work['height'].to_numpy(dtype=np.float64))
+        if n_context and 'growth_rate' in context.columns:
+            # Context rows keep their stored rates (derived with their own look-back)
+            growth[:n_context] = context['growth_rate'].to_numpy(dtype=np.float64)
+        derived['growth_rate'] = growth
+    work = work.assign(**derived)
+
+    params = [p for p in FEATURE_PARAMS if p in work.columns]
+    indexed = work[params].set_index(pd.DatetimeIndex(timestamps.view('datetime64[ns]')))
+
+    for label, window_ns in ROLLING_WINDOWS.items():
+        rolling = indexed.rolling(pd.Timedelta(window_ns, unit='ns'), min_periods=1)
+        means, stds = rolling.mean(), rolling.std()
+        for param in params:
+            derived[f'{param}_mean_{label}'] = np.round(means[param].to_numpy(), 4)
+            derived[f'{param}_std_{label}'] = np.round(stds[param].to_numpy(), 4)
+
+    hours = (timestamps // HOUR_NS) % 24
+    is_daytime = (hours >= DAYTIME_HOURS[0]) & (hours < DAYTIME_HOURS[1])
+    derived['is_daytime'] = is_daytime
+    day_mask = pd.Series(is_daytime, index=indexed.index)
+    day_means = indexed.where(day_mask, axis=0).rolling('24h', min_periods=1).mean()
+    night_means = indexed.where(~day_mask, axis=0).rolling('24h', min_periods=1).mean()
+    for param in params:
+        derived[f'{param}_day_mean_24h'] = np.round(day_means[param].to_numpy(), 4)
+        derived[f'{param}_night_mean_24h'] = np.round(night_means[param].to_numpy(), 4)
+
+    result = work.assign(**derived)
+    return result.iloc[n_context:].reset_index(drop=True)
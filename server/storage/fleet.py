@@ -0,0 +1,430 @@
+"""
+Fleet-wide aggregation over many tanks' telemetry.
+
+Each tank's canonical telemetry is a CSV in ``data/fleet/<tank id>.csv``,
+in the layout of ``data/telemetry/<dataset>.csv`` (any subset of its
+columns). ``FleetAggregator.refresh()`` keeps an aggregate per tank up to
+date and merges them into the fleet's:
+
+    map     tanks whose file changed since the last refresh are split into
+            partitions of ``FLEET_PARTITION_TANKS`` and aggregated in a
+            process pool. A file that only grew is read from where the last
+            refresh stopped and the new rows are merged into the tank's
+            aggregate; a replaced or rewritten file is read again in full.
+    reduce  the tank aggregates merge into the fleet's: counts, means and
+            variances combine exactly (Chan's parallel update), min/max,
+            out-of-range readings and fixed-bin histograms add up.
+
+A refresh therefore reads only the rows written since the previous one, and
+an unchanged tank costs a ``stat``. Readings flagged as sensor faults
+(``qc_*``) are left out, as in the alerts.
+
+"Now" statistics use each tank's latest reading per parameter. Tanks with
+no reading within ``FLEET_STALE_SECONDS`` of the fleet's newest one are
+reported as stale and left out of them.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from monitoring import registry, span
+from .alerts import to_iso
+from .loader import DATA_DIR, complete_end, data_start, iter_canonical, read_header
+from .quality import QUALITY_RULES, flag_column, suppress_flagged
+
+logger = logging.getLogger(__name__)
+
+FLEET_DIR = Path(os.environ.get('FLEET_DIR', DATA_DIR / 'fleet'))
+FLEET_WORKERS = int(os.environ.get('FLEET_WORKERS', os.cpu_count() or 1))
+# Changed tanks per task sent to a worker process
+FLEET_PARTITION_TANKS = int(os.environ.get('FLEET_PARTITION_TANKS', 16))
+FLEET_STALE_SECONDS = float(os.environ.get('FLEET_STALE_SECONDS', 3600))
+
+# Histogram bins per parameter, over its optimal range widened by twice its
+# width on each side (within the physically possible range); readings
+# outside fall into the end bins
+HISTOGRAM_BINS = 100
+HISTOGRAM_WIDENING = 2.0
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+# Bytes before a tank's read offset kept to detect a rewritten file
+FINGERPRINT_BYTES = 64
+
+REFRESH_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+FLEET_REFRESH = registry.histogram(
+    'aquaponics_fleet_refresh_seconds', 'Time to bring the fleet aggregates up to date', buckets=REFRESH_BUCKETS)
+FLEET_TANK_READS = registry.counter(
+    'aquaponics_fleet_tank_reads_total', 'Tank files read by fleet refreshes, by mode (incremental or full)')
+
+def histogram_range(param, low, high):
+    """Edges of ``param``'s histogram from its optimal range [``low``, ``high``]."""
+    low = 0.0 if low is None else float(low)
+    high = low + 1.0 if high is None else float(high)
+    width = max(high - low, 1e-9)
+    start, end = low - HISTOGRAM_WIDENING * width, high + HISTOGRAM_WIDENING * width
+    if param in QUALITY_RULES:
+        possible_low, possible_high = QUALITY_RULES[param]['range']
+        start, end = max(start, possible_low), min(end, possible_high)
+    return start, end
+
+class Aggregate:
+    """Mergeable statistics of readings, one entry per parameter."""
+
+    def __init__(self, ranges):
+        self.ranges = ranges
+        self.params = list(ranges)
+        size = len(self.params)
+        self.count = np.zeros(size, dtype=np.int64)
+        self.mean = np.zeros(size)
+        self.m2 = np.zeros(size)
+        self.min = np.full(size, np.inf)
+        self.max = np.full(size, -np.inf)
+        self.out_of_range = np.zeros(size, dtype=np.int64)
+        self.histogram = np.zeros((size, HISTOGRAM_BINS), dtype=np.int64)
+        self.edges = np.array([histogram_range(param, *ranges[param]) for param in self.params])
+
+    def add(self, values):
+        """Fold in readings: an (n, params) float array, NaN where missing."""
+        valid = ~np.isnan(values)
+        count = valid.sum(axis=0)
+        if not count.any():
+            return
+        filled = np.where(valid, values, 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(count > 0, filled.sum(axis=0) / count, 0.0)
+        m2 = (np.where(valid, values - mean, 0.0) ** 2).sum(axis=0)
+        self._combine(count, mean, m2)
+        self.min = np.fmin(self.min, np.where(valid, values, np.inf).min(axis=0))
+        self.max = np.fmax(self.max, np.where(valid, values, -np.inf).max(axis=0))
+
+        low = np.array([self.ranges[param][0] if self.ranges[param][0] is not None else -np.inf
+                        for param in self.params])
+        high = np.array([self.ranges[param][1] if self.ranges[param][1] is not None else np.inf
+                         for param in self.params])
+        self.out_of_range += (valid & ((values < low) | (values > high))).sum(axis=0)
+        start, end = self.edges[:, 0], self.edges[:, 1]
+        bins = np.clip(((filled - start) / (end - start) * HISTOGRAM_BINS).astype(np.int64), 0, HISTOGRAM_BINS - 1)
+        for i in range(len(self.params)):
+            self.histogram[i] += np.bincount(bins[valid[:, i], i], minlength=HISTOGRAM_BINS)
+
+    def _combine(self, count, mean, m2):
+        total = self.count + count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = mean - self.mean
+            self.m2 = self.m2 + m2 + np.where(total > 0, delta ** 2 * self.count * count / total, 0.0)
+            self.mean = np.where(total > 0, self.mean + delta * count / np.maximum(total, 1), 0.0)
+        self.count = total
+
+    def merge(self, other):
+        """Fold in another aggregate over the same parameters."""
+        self._combine(other.count, other.mean, other.m2)
+        self.min = np.fmin(self.min, other.min)
+        self.max = np.fmax(self.max, other.max)
+        self.out_of_range += other.out_of_range
+        self.histogram += other.histogram
+        return self
+
+    def quantiles(self, i):
+        """QUANTILES of parameter ``i``, interpolated within histogram bins."""
+        cumulative = np.cumsum(self.histogram[i])
+        start, end = self.edges[i]
+        width = (end - start) / HISTOGRAM_BINS
+        values = {}
+        for q in QUANTILES:
+            target = q * cumulative[-1]
+            b = int(np.searchsorted(cumulative, target))
+            below = cumulative[b - 1] if b else 0
+            fraction = (target - below) / max(self.histogram[i][b], 1)
+            value = start + (b + fraction) * width
+            values[f'p{int(q * 100)}'] = round(float(np.clip(value, self.min[i], self.max[i])), 4)
+        return values
+
+    def describe(self, histograms=False):
+        """{param: statistics} for the parameters with readings."""
+        described = {}
+        for i, param in enumerate(self.params):
+            count = int(self.count[i])
+            if not count:
+                continue
+            entry = {
+                'count': count,
+                'mean': round(float(self.mean[i]), 4),
+                'std': round(float(np.sqrt(self.m2[i] / (count - 1))), 4) if count > 1 else None,
+                'min': float(self.min[i]),
+                'max': float(self.max[i]),
+                **self.quantiles(i),
+                'out_of_range_readings': int(self.out_of_range[i]),
+            }
+            if histograms:
+                entry['histogram'] = {
+                    'start': float(self.edges[i][0]),
+                    'end': float(self.edges[i][1]),
+                    'counts': self.histogram[i].tolist(),
+                }
+            described[param] = entry
+        return described
+
+class TankState:
+    """One tank's aggregate, latest readings and how far its file has been read."""
+
+    def __init__(self, tank_id, ranges):
+        self.tank_id = tank_id
+        self.history = Aggregate(ranges)
+        size = len(self.history.params)
+        self.latest = np.full(size, np.nan)
+        self.latest_at = np.zeros(size, dtype=np.int64)
+        self.last_seen = None  # newest timestamp, int64 ns
+        self.rows = 0
+        # Where the next read starts, and what identifies the file up to there
+        self.inode = None
+        self.offset = None
+        self.fingerprint = b''
+        self.header = None
+
+    def update(self, frame):
+        params = self.history.params
+        frame = suppress_flagged(frame)
+        values = np.column_stack([
+            frame[param].to_numpy(dtype=np.float64) if param in frame.columns else np.full(len(frame), np.nan)
+            for param in params
+        ])
+        timestamps = frame['timestamp'].to_numpy(dtype=np.int64)
+        self.history.add(values)
+        self.rows += len(frame)
+        if len(frame):
+            self.last_seen = int(timestamps[-1]) if self.last_seen is None else max(self.last_seen, int(timestamps[-1]))
+        # Last reading of each parameter in this chunk
+        valid = ~np.isnan(values)
+        has = valid.any(axis=0)
+        last = len(values) - 1 - np.argmax(valid[::-1], axis=0)
+        columns = np.flatnonzero(has)
+        self.latest[columns] = values[last[columns], columns]
+        self.latest_at[columns] = timestamps[last[columns]]
+
+    def out_of_range(self):
+        """Parameters whose latest reading is outside the optimal range."""
+        flagged = []
+        for i, param in enumerate(self.history.params):
+            low, high = self.history.ranges[param]
+            value = self.latest[i]
+            if not np.isnan(value) and ((low is not None and value < low) or (high is not None and value > high)):
+                flagged.append(param)
+        return flagged
+
+def _fingerprint(path, offset):
+    with open(path, 'rb') as f:
+        f.seek(max(0, offset - FINGERPRINT_BYTES))
+        return f.read(min(offset, FINGERPRINT_BYTES))
+
+def refresh_tank(tank_id, path, state, ranges):
+    """
+    Bring a tank's state up to date with its file.
+
+    Reads only the rows after ``state.offset`` when the file has merely grown
+    since; otherwise (new tank, replaced or rewritten file) reads it all.
+
+    Returns:
+        tuple: (TankState, 'incremental' or 'full')
+    """
+    stat = os.stat(path)
+    header = read_header(path)
+    appended = (state is not None and state.inode == stat.st_ino and state.header == header
+                and state.offset <= stat.st_size and _fingerprint(path, state.offset) == state.fingerprint)
+    if not appended:
+        state = TankState(tank_id, ranges)
+        state.header = header
+        state.offset = data_start(path)
+    end = complete_end(path, stat.st_size)
+    columns = list(ranges) + [flag_column(param) for param in ranges]
+    # float64: the readings are summed over the tank's whole history
+    for chunk in iter_canonical(path, columns, dtype=np.float64, start=state.offset, stop=end):
+        state.update(chunk)
+    state.inode = stat.st_ino
+    state.offset = max(end, state.offset)
+    state.fingerprint = _fingerprint(path, state.offset)
+    return state, 'incremental' if appended else 'full'
+
+def refresh_partition(tasks):
+    """Worker entry point: ``refresh_tank`` for each (tank id, path, state, ranges) task."""
+    results = []
+    for task in tasks:
+        try:
+            results.append((task[0], *refresh_tank(*task)))
+        except Exception as e:
+            logger.warning("Failed to aggregate tank %s: %s", task[0], e)
+            results.append((task[0], None, 'failed'))
+    return results
+
+class FleetAggregator:
+    """Per-tank and fleet-wide aggregates over the tank files in ``fleet_dir``."""
+
+    def __init__(self, ranges, fleet_dir=FLEET_DIR, workers=FLEET_WORKERS,
+                 partition_tanks=FLEET_PARTITION_TANKS, stale_seconds=FLEET_STALE_SECONDS):
+        """
+        Args:
+            ranges (dict): {param: {'min': ..., 'max': ...}} optimal ranges
+                of the aggregated parameters (either bound may be None)
+        """
+        self.ranges = {param: (bounds.get('min'), bounds.get('max')) for param, bounds in ranges.items()}
+        self.fleet_dir = Path(fleet_dir)
+        self.workers = workers
+        self.partition_tanks = partition_tanks
+        self.stale_ns = int(stale_seconds * 10**9)
+        self.tanks = {}
+        self._signatures = {}
+        self._fleet = None
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def paths(self):
+        """{tank id: path} of the tank files."""
+        if not self.fleet_dir.is_dir():
+            return {}
+        return {path.stem: path for path in sorted(self.fleet_dir.glob('*.csv'))}
+
+    def version(self):
+        """Data version of the fleet: every tank file's name, mtime and size."""
+        version = []
+        for tank_id, path in self.paths().items():
+            try:
+                stat = os.stat(path)
+                version.append((tank_id, stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                continue
+        return tuple(version)
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def refresh(self):
+        """
+        Update the tanks whose files changed (see the module docstring).
+
+        Returns:
+            dict: {'full': n, 'incremental': n, 'failed': n} tanks read
+        """
+        with self._lock:
+            started = time.perf_counter()
+            paths = self.paths()
+            for tank_id in set(self.tanks) - set(paths):
+                del self.tanks[tank_id]
+                self._signatures.pop(tank_id, None)
+                self._fleet = None
+
+            tasks, signatures = [], {}
+            for tank_id, path in paths.items():
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+                if self._signatures.get(tank_id) != signature:
+                    tasks.append((tank_id, str(path), self.tanks.get(tank_id), self.ranges))
+                    signatures[tank_id] = signature
+
+            reads = {'full': 0, 'incremental': 0, 'failed': 0}
+            if not tasks:
+                return reads
+            partitions = [tasks[i:i + self.partition_tanks] for i in range(0, len(tasks), self.partition_tanks)]
+            logger.debug("Refreshing %d tanks in %d partitions", len(tasks), len(partitions))
+            with span('fleet_refresh'):
+                if self.workers <= 1 or len(partitions) == 1:
+                    results = map(refresh_partition, partitions)
+                else:
+                    results = self._pool().map(refresh_partition, partitions)
+                for partition in results:
+                    for tank_id, state, mode in partition:
+                        reads[mode] += 1
+                        if mode != 'failed':
+                            FLEET_TANK_READS.inc(mode=mode)
+                            self.tanks[tank_id] = state
+                            self._signatures[tank_id] = signatures[tank_id]
+            self._fleet = None
+            FLEET_REFRESH.observe(time.perf_counter() - started)
+            return reads
+
+    def summary(self, histograms=False):
+        """
+        Fleet-wide statistics.
+
+        Returns:
+            dict: tank counts, per-parameter statistics of the tanks' latest
+                  readings (``now``) and of all readings (``history``)
+        """
+        with self._lock:
+            tanks = list(self.tanks.values())
+            if self._fleet is None:
+                fleet = Aggregate(self.ranges)
+                for state in tanks:
+                    fleet.merge(state.history)
+                self._fleet = fleet
+            fleet = self._fleet
+
+        seen = [state.last_seen for state in tanks if state.last_seen is not None]
+        newest = max(seen) if seen else None
+        current = [state for state in tanks if newest is not None and state.last_seen is not None
+                   and state.last_seen >= newest - self.stale_ns]
+        now = {}
+        for i, param in enumerate(self.ranges):
+            values = np.array([state.latest[i] for state in current if not np.isnan(state.latest[i])])
+            if not len(values):
+                continue
+            low, high = self.ranges[param]
+            below = int((values < low).sum()) if low is not None else 0
+            above = int((values > high).sum()) if high is not None else 0
+            now[param] = {
+                'tanks': len(values),
+                'out_of_range': below + above,
+                'below': below,
+                'above': above,
+                'mean': round(float(values.mean()), 4),
+                'min': float(values.min()),
+                'max': float(values.max()),
+                **{f'p{int(q * 100)}': round(float(np.quantile(values, q)), 4) for q in QUANTILES},
+            }
+        return {
+            'tanks': len(tanks),
+            'current_tanks': len(current),
+            'stale_tanks': len(tanks) - len(current),
+            'tanks_out_of_range': sum(1 for state in current if state.out_of_range()),
+            'newest_reading': to_iso(newest) if newest is not None else None,
+            'now': now,
+            'history': fleet.describe(histograms),
+        }
+
+    def tank_list(self):
+        """Compact per-tank rows: latest readings and the parameters out of range."""
+        with self._lock:
+            tanks = sorted(self.tanks.values(), key=lambda state: state.tank_id)
+        return [{
+            'tank': state.tank_id,
+            'last_seen': to_iso(state.last_seen) if state.last_seen is not None else None,
+            'rows': state.rows,
+            'latest': {param: float(state.latest[i]) for i, param in enumerate(self.ranges)
+                       if not np.isnan(state.latest[i])},
+            'out_of_range': state.out_of_range(),
+        } for state in tanks]
+
+    def tank(self, tank_id, histograms=False):
+        """One tank's latest readings and history statistics (None if unknown)."""
+        with self._lock:
+            state = self.tanks.get(tank_id)
+        if state is None:
+            return None
+        return {
+            'tank': tank_id,
+            'last_seen': to_iso(state.last_seen) if state.last_seen is not None else None,
+            'rows': state.rows,
+            'latest': {param: {'value': float(state.latest[i]), 'timestamp': to_iso(state.latest_at[i])}
+                       for i, param in enumerate(self.ranges) if not np.isnan(state.latest[i])},
+            'out_of_range': state.out_of_range(),
+            'history': state.history.describe(histograms),
+        }
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Schema-mapping ingestion of raw sensor exports into the canonical store.
+
+Reads the raw fish and plant CSV exports (``data/fish_initial.csv``,
+``data/plant_initial.csv``...), maps their headers through the alias table
+in ``storage.schema``, converts units, parses timestamps with explicit
+formats into int64 nanoseconds, joins the fish and plant streams on
+timestamp, computes the derived feature columns (``storage.features``) and
+writes one canonical CSV per dataset to ``data/telemetry/<dataset>.csv``,
+which is what the telemetry routes and the AI stage read.
+
+When a canonical file already exists, only rows newer than its last
+timestamp are processed and appended, using the preceding ``LOOKBACK`` of
+stored rows as context for the rolling features.
+
+Readings are also tagged with sensor-fault flags (``storage.quality``), and
+the rollup tiers (``storage.rollups``) are updated with the same new rows.
+
+Usage (from the server directory):
+    python -m storage.ingest [--force]
+"""
+import argparse
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from monitoring import span
+from .features import LOOKBACK, add_derived_columns
+from .quality import flag_column, flag_readings, summarize_flags
+from .rollups import ROLLUP_COLUMNS, RollupStore
+from .schema import CANONICAL_COLUMNS, TIMESTAMP_FORMATS, resolve_column
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(os.environ.get('AQUAPONICS_DATA_DIR', Path(__file__).parent.parent / 'data'))
+
+# Raw exports that make up each canonical dataset
+SOURCES = {
+    'initial': {'fish': 'fish_initial.csv', 'plant': 'plant_initial.csv'},
+    'validation': {'fish': 'fish_validate.csv', 'plant': 'plant_validate.csv'},
+}
+
+# Fish and plant probes are logged by separate devices; readings up to this
+# far apart are treated as the same sample when joining the streams
+JOIN_TOLERANCE_NS = int(pd.Timedelta(minutes=30).value)
+
+NAT_INT64 = np.iinfo(np.int64).min
+
+def parse_timestamps(values):
+    """
+    Parse timestamp strings into int64 nanoseconds since the epoch.
+
+    Each format in ``TIMESTAMP_FORMATS`` is applied, vectorized, to the rows
+    earlier formats could not parse. Unparseable rows become ``NAT_INT64``.
+    """
+    values = pd.Series(values, dtype='string').str.strip()
+    parsed = np.full(len(values), NAT_INT64, dtype=np.int64)
+    pending = np.ones(len(values), dtype=bool)
+
+    for fmt in TIMESTAMP_FORMATS:
+        if not pending.any():
+            break
+        attempt = pd.to_datetime(values[pending], format=fmt, errors='coerce')
+        ok = attempt.notna().to_numpy()
+        indices = np.flatnonzero(pending)[ok]
+        parsed[indices] = attempt[ok].to_numpy(dtype='datetime64[ns]').view(np.int64)
+        pending[indices] = False
+
+    return parsed
+
+def read_source(path):
+    """
+    Read one raw export and map it onto canonical columns and units.
+
+    Returns:
+        DataFrame: canonical columns only, ``timestamp`` as int64 ns, sorted
+    """
+    with span('csv_load', dataset=Path(path).stem):
+        # utf-8-sig strips the BOM the sensor exports start with
+        raw = pd.read_csv(path, encoding='utf-8-sig', dtype=str)
+    return map_columns(raw, path)
+
+def normalize_records(records):
+    """
+    Map reading dicts (raw export headers or canonical names) onto the schema.
+
+    Used for telemetry posted in API requests, e.g. the ``initialData`` of
+    /api/ai/predict, so it gets the same treatment as ingested exports.
+
+    Returns:
+        DataFrame: canonical columns, ``timestamp`` as int64 ns, sorted
+    """
+    raw = pd.DataFrame.from_records(records or [])
+    if raw.empty:
+        return raw
+    return map_columns(raw, 'request payload')
+
+def screen_records(records):
+    """
+    Blank out readings in request telemetry that look like sensor faults.
+
+    The records are flagged as in ``storage.quality`` and flagged values are
+    replaced with None (under their original headers), so they are neither
+    alerted on nor shown to the LLMs as real readings.
+
+    Returns:
+        tuple: (screened copy of the records, {param: {flag: count}})
+    """
+    raw = pd.DataFrame.from_records(records or [])
+    if raw.empty:
+        return records, {}
+    flagged = flag_readings(map_columns(raw, 'request payload', keep_index=True))
+    summary = summarize_flags(flagged)
+    if not summary:
+        return records, {}
+
+    headers = {}
+    for header in raw.columns:
+        name, _ = resolve_column(header)
+        headers.setdefault(name, []).append(header)
+    screened = [dict(record) for record in records]
+    for param in summary:
+        for position in flagged.index[flagged[flag_column(param)].to_numpy() != 0]:
+            for header in headers.get(param, []):
+                screened[position][header] = None
+    return screened, summary
+
+def map_columns(raw, source, keep_index=False):
+    """
+    Rename, convert and parse a raw frame into canonical columns and units.
+
+    With ``keep_index`` the result keeps ``raw``'s row labels (rows are still
+    sorted by timestamp), so values can be traced back to their source rows.
+    """
+    columns = {}
+    for header in raw.columns:
+        name, multiplier = resolve_column(header)
+        if name is None:
+            logger.warning("Ignoring unmapped column %r in %s", header, source)
+            continue
+        if name in columns:
+            logger.warning("Duplicate mapping for %s in %s; keeping first", name, source)
+            continue
+        if name == 'timestamp':
+            columns[name] = parse_timestamps(raw[header])
+        else:
+            numbers = pd.to_numeric(raw[header], errors='coerce').to_numpy(dtype=np.float64)
+            # Rounded so unit conversion doesn't leave float noise in the store
+            columns[name] = np.round(numbers * multiplier, 6) if multiplier != 1.0 else numbers
+
+    if 'timestamp' not in columns:
+        raise ValueError(f"No timestamp column found in {source}")
+
+    frame = pd.DataFrame(columns, index=raw.index)
+    invalid = frame['timestamp'] == NAT_INT64
+    if invalid.any():
+        logger.warning("Dropping %d rows with unparseable timestamps from %s", int(invalid.sum()), source)
+        frame = frame[~invalid]
+    frame = frame.sort_values('timestamp', kind='stable')
+    return frame if keep_index else frame.reset_index(drop=True)
+
+def join_streams(fish, plant, tolerance_ns=JOIN_TOLERANCE_NS):
+    """Join plant readings onto fish readings by nearest timestamp."""
+    return pd.merge_asof(fish, plant, on='timestamp', direction='nearest', tolerance=tolerance_ns)
+
+def materialize(frame, context=None):
+    """Add the derived feature and sensor-fault flag columns to canonical rows."""
+    return flag_readings(add_derived_columns(frame, context), context)
+
+def to_canonical(frame):
+    """Order columns canonically and render timestamps as ISO-8601 strings."""
+    ordered = [column for column in CANONICAL_COLUMNS if column in frame.columns]
+    ordered += [column for column in frame.columns if column not in CANONICAL_COLUMNS]
+    canonical = frame[ordered].copy()
+    canonical['timestamp'] = np.datetime_as_string(
+        canonical['timestamp'].to_numpy(dtype=np.int64).view('datetime64[ns]'), unit='s')
+    return canonical
+
+def read_canonical_tail(path, lookback=LOOKBACK, chunksize=100_000):
+    """
+    Read the last ``lookback`` nanoseconds of a canonical file.
+
+    Streams the file in chunks so memory stays bounded by the tail size.
+
+    Returns:
+        DataFrame: tail rows with ``timestamp`` as int64 ns (empty if no rows)
+    """
+    tail = None
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        chunk['timestamp'] = parse_timestamps(chunk['timestamp'])
+        tail = chunk if tail is None else pd.concat([tail, chunk], ignore_index=True)
+        cutoff = tail['timestamp'].iloc[-1] - lookback
+        tail = tail[tail['timestamp'] >= cutoff]
+    return tail if tail is not None else pd.DataFrame()
+
+def append_canonical(frame, path):
+    """Append rows to a canonical file; returns False if the columns differ."""
+    with open(path, 'r', encoding='utf-8') as f:
+        header = f.readline().strip().split(',')
+    if set(header) != set(frame.columns):
+        return False
+    frame[header].to_csv(path, mode='a', header=False, index=False)
+    return True
+
+def append_rows(frame, target):
+    """
+    Materialize features for new canonical rows and append them to ``target``.
+
+    Only rows newer than the last stored timestamp are appended. Falls back
+    to a full rewrite when there is no usable existing file.
+
+    Returns:
+        DataFrame: The rows written, with features and ``timestamp`` as int64 ns
+    """
+    target = Path(target)
+    tail = read_canonical_tail(target) if target.exists() else pd.DataFrame()
+
+    if tail.empty:
+        materialized = materialize(frame)
+        write_canonical(to_canonical(materialized), target)
+        return materialized
+
+    new_rows = frame[frame['timestamp'] > tail['timestamp'].iloc[-1]]
+    if new_rows.empty:
+        return new_rows
+    # The row count is logged rather than a span label: labels must have few values
+    logger.debug("Computing features for %d new rows of %s", len(new_rows), target.name)
+    with span('features_compute'):
+        materialized = materialize(new_rows, context=tail)
+    if not append_canonical(to_canonical(materialized), target):
+        raise ValueError(f"Column layout of {target} changed; rebuild it with --force")
+    return materialized
+
+def write_canonical(frame, path):
+    """Write a canonical dataset atomically (readers never see a partial file)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.csv.tmp')
+    frame.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+def has_current_layout(path):
+    """Whether a canonical file has every column ``materialize`` produces now."""
+    sample = pd.read_csv(path, nrows=1)
+    if sample.empty:
+        return True
+    sample['timestamp'] = parse_timestamps(sample['timestamp'])
+    return set(materialize(sample).columns) <= set(sample.columns)
+
+def rebuild_rollups(rollups, path):
+    """Rebuild a dataset's rollup tiers from its whole canonical file, chunk by chunk; returns the rows."""
+    from .loader import iter_canonical  # the loader imports this module
+
+    rollups.clear()
+    rows = 0
+    # float64 like the tiers; only the rolled-up columns are parsed
+    for chunk in iter_canonical(path, ROLLUP_COLUMNS, dtype=np.float64):
+        rows += rollups.update(chunk)
+    logger.info("Rebuilt rollups from %s: %d rows", path, rows)
+    return rows
+
+def ingest_dataset(dataset_type, data_dir=DATA_DIR, force=False):
+    """
+    Build ``telemetry/<dataset_type>.csv`` from its raw fish and plant exports.
+
+    Skipped when the raw exports are missing, or when the canonical file is
+    already newer than all of them (unless ``force`` is set).
+
+    Returns:
+        Path | None: The canonical file, or None if there was nothing to ingest
+    """
+    data_dir = Path(data_dir)
+    sources = {stream: data_dir / name for stream, name in SOURCES[dataset_type].items()}
+    target = data_dir / 'telemetry' / f'{dataset_type}.csv'
+
+    rollups = RollupStore(dataset_type, data_dir)
+
+    if not all(path.exists() for path in sources.values()):
+        return None
+    if target.exists() and not force and not has_current_layout(target):
+        logger.warning("%s predates the current feature columns; rebuilding", target)
+        force = True
+    if (not force and target.exists()
+            and target.stat().st_mtime >= max(path.stat().st_mtime for path in sources.values())):
+        if rollups.watermark is None:
+            rebuild_rollups(rollups, target)
+        return target
+
+    with span('ingest', dataset=dataset_type):
+        fish = read_source(sources['fish'])
+        plant = read_source(sources['plant'])
+        joined = join_streams(fish, plant)
+        if force or not target.exists():
+            materialized = materialize(joined)
+            write_canonical(to_canonical(materialized), target)
+            written = len(joined)
+            with span('rollup_update', dataset=dataset_type):
+                rollups.rebuild(materialized)
+        else:
+            try:
+                materialized = append_rows(joined, target)
+            except ValueError as e:
+                logger.warning("%s; rebuilding", e)
+                materialized = materialize(joined)
+                write_canonical(to_canonical(materialized), target)
+                rollups.rebuild(materialized)
+            written = len(materialized)
+            with span('rollup_update', dataset=dataset_type):
+                if rollups.update(materialized) < 0:
+                    logger.warning("Rollup columns of %s changed; rebuilding", dataset_type)
+                    rebuild_rollups(rollups, target)
+            # Mark as up to date even when there was nothing new to append
+            os.utime(target)
+
+    logger.info("Ingested %s dataset: %d new rows", dataset_type, written,
+                extra={'dataset': dataset_type, 'rows': written})
+    return target
+
+def ingest_all(data_dir=DATA_DIR, force=False):
+    """Ingest every dataset in ``SOURCES``; returns {dataset: path or None}."""
+    return {dataset_type: ingest_dataset(dataset_type, data_dir, force) for dataset_type in SOURCES}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Ingest raw sensor exports into the canonical store')
+    parser.add_argument('--data-dir', default=str(DATA_DIR))
+    parser.add_argument('--force', action='store_true', help='Rebuild even if up to date')
+    args = parser.parse_args(argv)
+
+    for dataset_type, path in ingest_all(args.data_dir, args.force).items():
+        print(f"{dataset_type}: {path or 'no raw exports found'}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+"""
+Readers for the canonical telemetry store written by ``storage.ingest``.
+
+Reads use an explicit schema instead of ``read_csv`` inference: readings
+and derived features as float32 (the probes' precision is far below its
+~7 significant digits), fault flags as int8, ``is_daytime`` as boolean, and
+``timestamp`` parsed to int64 ns. Only the requested columns are parsed,
+and ``iter_canonical`` streams fixed-size chunks, so a reader's memory is
+bounded by the chunk rather than the dataset's history.
+"""
+import io
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from monitoring import span
+from .ingest import parse_timestamps
+from .quality import flag_column
+from .schema import CANONICAL_TIMESTAMP_FORMAT
+
+DATA_DIR = Path(os.environ.get('AQUAPONICS_DATA_DIR', Path(__file__).parent.parent / 'data'))
+
+# Rows per chunk for chunked reads (~100k rows x 70 columns x 4 bytes = 28 MB)
+CHUNK_ROWS = int(os.environ.get('TELEMETRY_CHUNK_ROWS', 100_000))
+
+READING_DTYPE = np.float32
+FLAG_DTYPE = np.int8
+BOOLEAN_COLUMNS = {'is_daytime'}
+
+# Values per column kept for the ``/stats`` quartiles (float32, 400 kB per column)
+QUANTILE_SAMPLE = int(os.environ.get('STATS_QUANTILE_SAMPLE', 100_000))
+
+# Bytes read from the end of a file per step when looking for the last row
+TAIL_BLOCK = 64 * 1024
+
+def canonical_path(dataset_type, data_dir=DATA_DIR):
+    """Path of a canonical dataset file."""
+    return Path(data_dir) / 'telemetry' / f'{dataset_type}.csv'
+
+def column_dtype(column, dtype=READING_DTYPE):
+    """In-memory dtype of a canonical column (``timestamp`` is read as text, then parsed)."""
+    if column == 'timestamp':
+        return str
+    if column.startswith(flag_column('')):
+        return FLAG_DTYPE
+    if column in BOOLEAN_COLUMNS:
+        return 'boolean'
+    return dtype
+
+def read_header(path):
+    """Column names of a canonical file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.readline().rstrip('\r\n').split(',')
+
+def parse_canonical_timestamps(values):
+    """Canonical ISO timestamps to int64 ns (other formats via ``parse_timestamps``)."""
+    parsed = pd.to_datetime(values, format=CANONICAL_TIMESTAMP_FORMAT, errors='coerce')
+    if parsed.isna().any():
+        return parse_timestamps(values)
+    return parsed.to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+def _reader_options(path, columns, dtype):
+    header = read_header(path)
+    usecols = header if columns is None else ['timestamp'] + [c for c in header if c in set(columns) and c != 'timestamp']
+    return {'usecols': usecols, 'dtype': {column: column_dtype(column, dtype) for column in usecols}}
+
+def _finish(frame):
+    frame['timestamp'] = parse_canonical_timestamps(frame['timestamp'])
+    return frame
+
+def read_canonical(path, columns=None, dtype=READING_DTYPE):
+    """
+    Read a canonical file with the explicit schema.
+
+    Args:
+        path (Path): Canonical CSV
+        columns (list): Columns to read besides ``timestamp`` (default all;
+            columns the file lacks are skipped)
+        dtype: Dtype for readings and features; float64 where values are
+            passed on as text (e.g. into prompts)
+
+    Returns:
+        DataFrame: the rows, ``timestamp`` as int64 ns
+    """
+    return _finish(pd.read_csv(path, **_reader_options(path, columns, dtype)))
+
+class _ByteRange(io.RawIOBase):
+    """Read-only view of bytes ``[start, stop)`` of a file."""
+
+    def __init__(self, path, start, stop):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._remaining = stop - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        view = memoryview(buffer)[:max(0, min(len(buffer), self._remaining))]
+        read = self._file.readinto(view)
+        self._remaining -= read
+        return read
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+def data_start(path):
+    """Byte offset of the first row (just past the header line)."""
+    with open(path, 'rb') as f:
+        f.readline()
+        return f.tell()
+
+def complete_end(path, size):
+    """Byte offset just past the last complete line in the first ``size`` bytes."""
+    with open(path, 'rb') as f:
+        position = size
+        while position > 0:
+            start = max(0, position - TAIL_BLOCK)
+            f.seek(start)
+            block = f.read(position - start)
+            newline = block.rfind(b'\n')
+            if newline >= 0:
+                return start + newline + 1
+            position = start
+    return 0
+
+def iter_canonical(path, columns=None, chunk_rows=CHUNK_ROWS, dtype=READING_DTYPE, start=None, stop=None):
+    """
+    Like ``read_canonical``, as a generator of ``chunk_rows``-row frames.
+
+    ``start`` and ``stop`` restrict the read to the rows in that byte range
+    (``start`` at the beginning of a row, ``stop`` just past a newline), e.g.
+    the rows appended since an earlier read ended at ``start``.
+    """
+    options = _reader_options(path, columns, dtype)
+    source = path
+    if start is not None or stop is not None:
+        start = data_start(path) if start is None else start
+        stop = os.path.getsize(path) if stop is None else stop
+        if stop <= start:
+            return
+        source = io.BufferedReader(_ByteRange(path, start, stop))
+        options.update(header=None, names=read_header(path))
+    with pd.read_csv(source, chunksize=chunk_rows, **options) as reader:
+        for chunk in reader:
+            yield _finish(chunk)
+
+def read_last_row(path):
+    """
+    The last row of a canonical file, read from the end of the file.
+
+    Values keep their default (float64) parsing, as in the file.
+
+    Returns:
+        Series: the row with ``timestamp`` as text, or None if there are no rows
+    """
+    with open(path, 'rb') as f:
+        header = f.readline()
+        body_start = f.tell()
+        end = f.seek(0, os.SEEK_END)
+        tail = b''
+        position = end
+        # Step back until the block holds a full last line
+        while position > body_start:
+            position = max(body_start, position - TAIL_BLOCK)
+            f.seek(position)
+            tail = f.read(end - position)
+            if tail.rstrip(b'\r\n').count(b'\n') >= 1 or position == body_start:
+                break
+    lines = tail.rstrip(b'\r\n').splitlines()
+    if not lines or not lines[-1].strip():
+        return None
+    frame = pd.read_csv(io.BytesIO(header + lines[-1] + b'\n'), dtype={'timestamp': str})
+    return frame.iloc[-1]
+
+def load_canonical(dataset_type, data_dir=DATA_DIR, columns=None, dtype=READING_DTYPE):
+    """
+    Load a canonical dataset with ``timestamp`` parsed to int64 ns.
+
+    Returns:
+        DataFrame: the dataset, or an empty frame if it does not exist
+    """
+    path = canonical_path(dataset_type, data_dir)
+    if not path.exists():
+        return pd.DataFrame()
+    with span('csv_load', dataset=dataset_type):
+        return read_canonical(path, columns, dtype)
+
+class ColumnSummary:
+    """
+    ``DataFrame.describe()`` statistics of columns, accumulated chunk by chunk.
+
+    Count, mean, std, min and max are merged per chunk (Chan's parallel
+    variance update, in float64) and are exact. The quartiles come from a
+    uniform reservoir sample of at most ``sample_size`` values per column
+    (Algorithm R, seeded, so a file always gives the same answer): exact up
+    to ``sample_size`` readings, beyond that the rank error of a quartile
+    has a standard deviation of sqrt(0.25 * 0.75 / sample_size), about 0.14
+    percentile points at the default 100,000. Memory is bounded by the
+    sample, not the history.
+    """
+
+    def __init__(self, columns, sample_size=QUANTILE_SAMPLE, seed=0):
+        self.columns = list(columns)
+        self.sample_size = sample_size
+        self._rng = np.random.default_rng(seed)
+        self.rows = 0
+        self._count = dict.fromkeys(self.columns, 0)
+        self._mean = dict.fromkeys(self.columns, 0.0)
+        self._m2 = dict.fromkeys(self.columns, 0.0)
+        self._min = dict.fromkeys(self.columns, np.inf)
+        self._max = dict.fromkeys(self.columns, -np.inf)
+        self._sample = {column: np.empty(0, dtype=np.float32) for column in self.columns}
+
+    def update(self, frame):
+        self.rows += len(frame)
+        for column in self.columns:
+            if column not in frame.columns:
+                continue
+            values = frame[column].to_numpy(dtype=np.float32)
+            values = values[~np.isnan(values)]
+            if not len(values):
+                continue
+            wide = values.astype(np.float64)
+            count, mean = len(wide), wide.mean()
+            m2 = ((wide - mean) ** 2).sum()
+            total = self._count[column] + count
+            delta = mean - self._mean[column]
+            self._m2[column] += m2 + delta ** 2 * self._count[column] * count / total
+            self._mean[column] += delta * count / total
+            self._count[column] = total
+            self._min[column] = min(self._min[column], float(values.min()))
+            self._max[column] = max(self._max[column], float(values.max()))
+            self._add_to_sample(column, values, seen=total - count)
+
+    def _add_to_sample(self, column, values, seen):
+        """Reservoir update with ``values``, after ``seen`` earlier values."""
+        sample = self._sample[column]
+        room = self.sample_size - len(sample)
+        if room > 0:
+            taken = values[:room]
+            sample = np.concatenate([sample, taken])
+            values, seen = values[room:], seen + len(taken)
+        if len(values):
+            # Value number i (1-based) replaces a random slot with probability size / i
+            slots = (self._rng.random(len(values)) * np.arange(seen + 1, seen + len(values) + 1)).astype(np.int64)
+            keep = slots < self.sample_size
+            # A later value taking the same slot wins, as in the sequential algorithm
+            sample[slots[keep]] = values[keep]
+        self._sample[column] = sample
+
+    def describe(self, column):
+        """The statistics ``Series.describe()`` returns, as a dict."""
+        count = self._count[column]
+        if not count:
+            return {'count': 0.0, 'mean': np.nan, 'std': np.nan, 'min': np.nan,
+                    '25%': np.nan, '50%': np.nan, '75%': np.nan, 'max': np.nan}
+        quartiles = np.percentile(self._sample[column], [25, 50, 75]).astype(np.float32)
+        return {
+            'count': float(count),
+            'mean': as_reading(self._mean[column]),
+            'std': as_reading(np.sqrt(self._m2[column] / (count - 1))) if count > 1 else np.nan,
+            'min': as_reading(self._min[column]),
+            '25%': as_reading(quartiles[0]),
+            '50%': as_reading(quartiles[1]),
+            '75%': as_reading(quartiles[2]),
+            'max': as_reading(self._max[column]),
+        }
+
+def as_reading(value):
+    """A float32 reading as the shortest float that round-trips (7.2, not 7.199999809)."""
+    return float(str(np.float32(value)))
@@ -0,0 +1,199 @@
+"""
+Sensor-fault and anomaly flags for telemetry readings.
+
+Probes drift, spike and stick. Every reading of a checked parameter gets a
+bitmask in the ``qc_<param>`` column, computed vectorized and causally (each
+reading is judged only against earlier ones, so new rows can be flagged
+incrementally given ``QUALITY_CONTEXT`` preceding rows):
+
+    spike       robust z-score against the median/MAD of the previous
+                ``SPIKE_WINDOW`` readings exceeds ``SPIKE_Z``. A deviation the
+                next reading confirms (same direction) is a level shift, e.g.
+                a water change, so only its first reading is flagged
+    flatline    the same value repeated for at least ``FLATLINE_READINGS``
+                readings spanning ``FLATLINE_DURATION`` (a stuck probe)
+    rate        change since the last unflagged reading larger than the
+                parameter's ``max_rate`` per hour (over at least an hour)
+                allows, plus ``RATE_NOISE_Z`` times the spike noise spread
+    range       outside the physically possible range
+
+Flagged readings stay in the store, tagged; alerting and prompt building
+leave them out (``suppress_flagged``, ``storage.ingest.screen_records``).
+"""
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+HOUR_NS = 3600 * 10**9
+
+FLAGS = {'spike': 1, 'flatline': 2, 'rate': 4, 'range': 8}
+
+# Per parameter: physically possible range, fastest plausible change per
+# hour, the smallest spread the spike score uses (around the probe's noise,
+# so a quiet sensor's MAD of ~0 doesn't make every wobble a spike), and
+# whether a repeated value means the probe is stuck. Height is recorded in
+# whole centimetres and ammonia often reads a steady 0, so those repeat.
+QUALITY_RULES = {
+    'pH': {'range': (0, 14), 'max_rate': 1.0, 'min_scale': 0.1, 'flatline': True},
+    'temperature': {'range': (-5, 50), 'max_rate': 3.0, 'min_scale': 0.3, 'flatline': True},
+    'ammonia': {'range': (0, 50), 'max_rate': 1.0, 'min_scale': 0.05, 'flatline': False},
+    'ec': {'range': (0, 20), 'max_rate': 0.5, 'min_scale': 0.05, 'flatline': True},
+    'tds': {'range': (0, 20000), 'max_rate': 300, 'min_scale': 20, 'flatline': True},
+    'turbidity': {'range': (0, 4000), 'max_rate': 20, 'min_scale': 2, 'flatline': True},
+    'height': {'range': (0, 300), 'max_rate': 5, 'min_scale': 1, 'flatline': False},
+    'plant_temperature': {'range': (-10, 60), 'max_rate': 5, 'min_scale': 0.3, 'flatline': True},
+    'humidity': {'range': (0, 100), 'max_rate': 30, 'min_scale': 3, 'flatline': True},
+    'pressure': {'range': (80000, 110000), 'max_rate': 500, 'min_scale': 50, 'flatline': True},
+}
+
+SPIKE_WINDOW = 24
+SPIKE_MIN_READINGS = 8
+SPIKE_Z = 6.0
+FLATLINE_READINGS = 4
+FLATLINE_DURATION = 6 * HOUR_NS
+# Rate limits apply over at least an hour, with a noise allowance on top,
+# so the reading-to-reading jitter of dense probes isn't a fast change
+MIN_RATE_INTERVAL = HOUR_NS
+RATE_NOISE_Z = 4.0
+
+# Preceding rows used as look-back when flagging new rows incrementally
+QUALITY_CONTEXT = 4 * SPIKE_WINDOW
+
+# Rows per block when computing window medians (bounds the window copies)
+BLOCK_ROWS = 65_536
+
+def flag_column(param):
+    return f'qc_{param}'
+
+def rolling_median_mad(values, window=SPIKE_WINDOW, min_readings=SPIKE_MIN_READINGS):
+    """
+    Median and MAD of the ``window`` readings before each reading.
+
+    Returns:
+        tuple: (median, mad) arrays, NaN where fewer than ``min_readings``
+    """
+    n = len(values)
+    median = np.full(n, np.nan)
+    mad = np.full(n, np.nan)
+    if n <= min_readings:
+        return median, mad
+    # Row i of the view holds values[i - window:i] (NaN-padded at the start)
+    windows = sliding_window_view(np.concatenate([np.full(window, np.nan), values[:-1]]), window)
+    for first in range(min_readings, n, BLOCK_ROWS):
+        block = windows[first:first + BLOCK_ROWS]
+        if first < window:
+            # Only the first rows have padding; nanmedian is much slower
+            with np.errstate(all='ignore'):
+                median[first:first + len(block)] = np.nanmedian(block, axis=1)
+                mad[first:first + len(block)] = np.nanmedian(
+                    np.abs(block - median[first:first + len(block), None]), axis=1)
+        else:
+            median[first:first + len(block)] = np.median(block, axis=1)
+            mad[first:first + len(block)] = np.median(np.abs(block - median[first:first + len(block), None]), axis=1)
+    return median, mad
+
+def run_lengths(values, timestamps):
+    """Readings so far, and time elapsed, in each reading's run of equal values."""
+    changed = np.r_[True, values[1:] != values[:-1]]
+    run_start = np.maximum.accumulate(np.where(changed, np.arange(len(values)), 0))
+    return np.arange(len(values)) - run_start + 1, timestamps - timestamps[run_start]
+
+def flag_series(timestamps, values, rules):
+    """
+    Flag the readings of one parameter (NaNs excluded by the caller).
+
+    Returns:
+        ndarray: int8 flag bitmask per reading
+    """
+    flags = np.zeros(len(values), dtype=np.int8)
+    if not len(values):
+        return flags
+
+    low, high = rules['range']
+    out_of_range = (values < low) | (values > high)
+    flags[out_of_range] |= FLAGS['range']
+
+    median, mad = rolling_median_mad(values)
+    # 1.4826 * MAD estimates the standard deviation of normal noise
+    scale = np.fmax(1.4826 * mad, rules['min_scale'])
+    with np.errstate(invalid='ignore'):
+        z = (values - median) / scale
+    outlier = np.nan_to_num(np.abs(z)) > SPIKE_Z
+    confirmed = np.r_[False, outlier[:-1] & (np.sign(z[:-1]) == np.sign(z[1:]))]
+    spike = outlier & ~confirmed
+    flags[spike] |= FLAGS['spike']
+
+    if rules['flatline']:
+        readings, elapsed = run_lengths(values, timestamps)
+        flags[(readings >= FLATLINE_READINGS) & (elapsed >= FLATLINE_DURATION)] |= FLAGS['flatline']
+
+    # Rate against the last reading that was not itself a spike or out of range
+    trusted = ~(spike | out_of_range)
+    last_trusted = np.maximum.accumulate(np.where(trusted, np.arange(len(values)), -1))
+    reference = np.r_[-1, last_trusted[:-1]]
+    has_reference = reference >= 0
+    reference = np.maximum(reference, 0)
+    elapsed_hours = np.maximum(timestamps - timestamps[reference], MIN_RATE_INTERVAL) / HOUR_NS
+    allowed = rules['max_rate'] * elapsed_hours + RATE_NOISE_Z * scale
+    too_fast = has_reference & (np.abs(values - values[reference]) > allowed)
+    flags[too_fast] |= FLAGS['rate']
+    return flags
+
+def flag_readings(frame, context=None):
+    """
+    Add a ``qc_<param>`` flag column for each checked parameter in ``frame``.
+
+    Args:
+        frame (DataFrame): Canonical rows, ``timestamp`` as int64 ns, sorted
+        context (DataFrame): Optional earlier rows (the last
+            ``QUALITY_CONTEXT`` are used) as look-back only
+
+    Returns:
+        DataFrame: ``frame`` with the flag columns added
+    """
+    params = [param for param in QUALITY_RULES if param in frame.columns]
+    n_context = 0
+    if context is not None and len(context):
+        context = context.iloc[-QUALITY_CONTEXT:]
+        keep = ['timestamp'] + params
+        work = pd.concat([context.reindex(columns=keep), frame[keep]], ignore_index=True)
+        n_context = len(context)
+    else:
+        work = frame
+    timestamps = work['timestamp'].to_numpy(dtype=np.int64)
+
+    flags = {}
+    for param in params:
+        values = work[param].to_numpy(dtype=np.float64)
+        valid = ~np.isnan(values)
+        column = np.zeros(len(values), dtype=np.int8)
+        column[valid] = flag_series(timestamps[valid], values[valid], QUALITY_RULES[param])
+        flags[flag_column(param)] = column[n_context:]
+    return frame.assign(**flags)
+
+def describe_flags(value):
+    """Names of the flags set in a bitmask, e.g. ['spike', 'rate']."""
+    return [name for name, bit in FLAGS.items() if int(value) & bit]
+
+def suppress_flagged(frame):
+    """Copy of ``frame`` with flagged readings replaced by NaN."""
+    suppressed = {}
+    for param in QUALITY_RULES:
+        column = flag_column(param)
+        if param in frame.columns and column in frame.columns:
+            suppressed[param] = frame[param].where(frame[column] == 0)
+    return frame.assign(**suppressed)
+
+def summarize_flags(frame):
+    """Flagged reading counts: {param: {flag: count}} (flagged params only)."""
+    summary = {}
+    for param in QUALITY_RULES:
+        column = flag_column(param)
+        if column not in frame.columns:
+            continue
+        flags = frame[column].to_numpy()
+        counts = {name: int(np.count_nonzero(flags & bit)) for name, bit in FLAGS.items()}
+        counts = {name: count for name, count in counts.items() if count}
+        if counts:
+            summary[param] = counts
+    return summary
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Compressed, deduplicated store for AI analysis records.
+
+Layout under ``data/analysis/``:
+
+    blobs/<ab>/<sha256>.<ext>   content-addressed, compressed JSON values
+    records.log                 append-only log of compressed record frames
+    records.idx                 one JSON line per record: id, offset, length,
+                                codec and the metadata /history lists
+    records.gen                 compaction generation
+    records.lock                advisory lock shared by every process using the store
+
+Large record fields (``results``, ``systemConfig`` and legacy
+``prompt_template`` text) are stored as blobs keyed by the hash of their
+canonical JSON, so identical results or configs are written once and the
+record frame only holds ``{"$blob": "<sha256>"}``. The index is held in
+memory; ``get()`` is one seek + read + decompress, and listing history
+never touches the log.
+
+Writers take the lock exclusively and readers take it shared, so a reader
+never sees a log and index that ``compact()`` is halfway through replacing.
+Compaction rewrites both files and bumps the generation; a store whose
+generation is behind (another process compacted) drops its in-memory index
+and reloads it, and ``version()`` is ``(generation, index position)`` so it
+keeps growing across compactions.
+
+Records are compressed with zstd when the ``zstandard`` package is
+installed, and gzip otherwise; each frame and blob records its codec.
+
+Usage (from the server directory), to move per-analysis ``<uuid>.json``
+files and ``history.json`` into the store (safe while the server runs):
+    python -m storage.results compact [--delete]
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development only
+    fcntl = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(os.environ.get('AQUAPONICS_DATA_DIR', Path(__file__).parent.parent / 'data'))
+
+BLOB_FIELDS = ('results', 'systemConfig', 'prompt_template')
+BLOB_KEY = '$blob'
+
+# Record metadata kept in the index (what /api/ai/history returns)
+INDEX_FIELDS = ('timestamp', 'modelUsed', 'confidence_score')
+
+LEGACY_FILE = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\.json$')
+
+DEFAULT_CODEC = 'zstd' if zstandard else 'gzip'
+CODEC_EXTENSIONS = {'zstd': 'zst', 'gzip': 'gz'}
+
+def compress(data, codec=DEFAULT_CODEC):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=9).compress(data)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+def decompress(data, codec):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Record is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+def canonical_json(value):
+    """Deterministic compact JSON, so equal values hash equally."""
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+class FileLock:
+    """Advisory lock on an open file (shared by gunicorn workers); exclusive unless ``shared``."""
+
+    def __init__(self, f, shared=False):
+        self.f = f
+        self.shared = shared
+
+    def __enter__(self):
+        if fcntl:
+            fcntl.flock(self.f, fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        return self.f
+
+    def __exit__(self, *exc):
+        if fcntl:
+            fcntl.flock(self.f, fcntl.LOCK_UN)
+
+class _OpenFileLock(FileLock):
+    """FileLock on ``path``, opened (and created) on entry and closed on exit."""
+
+    def __init__(self, path, shared=False):
+        super().__init__(None, shared)
+        self.path = path
+
+    def __enter__(self):
+        self.f = open(self.path, 'ab')
+        try:
+            return super().__enter__()
+        except BaseException:
+            self.f.close()
+            raise
+
+    def __exit__(self, *exc):
+        try:
+            super().__exit__(*exc)
+        finally:
+            self.f.close()
+
+class ResultStore:
+    """Append-only analysis record store with content-addressed blobs."""
+
+    def __init__(self, root, codec=DEFAULT_CODEC):
+        self.root = Path(root)
+        self.blob_dir = self.root / 'blobs'
+        self.log_path = self.root / 'records.log'
+        self.index_path = self.root / 'records.idx'
+        self.generation_path = self.root / 'records.gen'
+        self.lock_path = self.root / 'records.lock'
+        self.codec = codec
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index = {}
+        self._index_pos = 0
+        self._generation = 0
+        self._load_blob = lru_cache(maxsize=256)(self._read_blob)
+        with self._lock, self._file_lock(shared=True):
+            self._refresh()
+
+    def _file_lock(self, shared=False):
+        return _OpenFileLock(self.lock_path, shared)
+
+    def _read_generation(self):
+        try:
+            return int(self.generation_path.read_text())
+        except FileNotFoundError:
+            return 0
+
+    def _refresh(self):
+        """
+        Read index lines appended since the last refresh (by any process).
+
+        Call with the file lock held; reloads the whole index if the store
+        was compacted since the last refresh.
+        """
+        generation = self._read_generation()
+        if generation != self._generation:
+            self._index = {}
+            self._index_pos = 0
+            self._generation = generation
+        try:
+            if self.index_path.stat().st_size == self._index_pos:
+                return
+        except FileNotFoundError:
+            return
+        with open(self.index_path, 'rb') as f:
+            f.seek(self._index_pos)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # a writer is mid-append; pick it up next time
+                self._index_pos += len(line)
+                try:
+                    entry = json.loads(line)
+                    self._index[entry['id']] = entry
+                except (ValueError, KeyError):
+                    logger.warning("Skipping corrupt index line in %s", self.index_path)
+
+    def version(self):
+        """(generation, index position): grows with every stored record and compaction."""
+        with self._lock, self._file_lock(shared=True):
+            self._refresh()
+            return self._generation, self._index_pos
+
+    def __contains__(self, analysis_id):
+        with self._lock, self._file_lock(shared=True):
+            self._refresh()
+            return analysis_id in self._index
+
+    def _blob_path(self, digest, codec):
+        return self.blob_dir / digest[:2] / f"{digest}.{CODEC_EXTENSIONS[codec]}"
+
+    def _write_blob(self, value):
+        data = canonical_json(value)
+        digest = hashlib.sha256(data).hexdigest()
+        for codec in CODEC_EXTENSIONS:
+            if self._blob_path(digest, codec).exists():
+                return digest
+        path = self._blob_path(digest, self.codec)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(compress(data, self.codec))
+        os.replace(tmp_path, path)
+        return digest
+
+    def _read_blob(self, digest):
+        for codec in CODEC_EXTENSIONS:
+            path = self._blob_path(digest, codec)
+            if path.exists():
+                return json.loads(decompress(path.read_bytes(), codec))
+        raise FileNotFoundError(f"Missing blob {digest}")
+
+    def put(self, record):
+        """Store a record (must have ``id``); large fields go to shared blobs."""
+        frame = dict(record)
+        for field in BLOB_FIELDS:
+            if frame.get(field) is not None:
+                frame[field] = {BLOB_KEY: self._write_blob(frame[field])}
+        payload = compress(canonical_json(frame), self.codec)
+
+        with self._lock, self._file_lock(), open(self.log_path, 'ab') as log:
+            log.seek(0, os.SEEK_END)
+            offset = log.tell()
+            log.write(payload)
+            log.flush()
+            entry = {'id': record['id'], 'offset': offset, 'length': len(payload), 'codec': self.codec}
+            entry.update({field: record.get(field) for field in INDEX_FIELDS})
+            with open(self.index_path, 'a', encoding='utf-8') as index:
+                index.write(json.dumps(entry) + '\n')
+        return entry
+
+    def get(self, analysis_id):
+        """The full record for ``analysis_id``, or None if unknown."""
+        with self._lock, self._file_lock(shared=True):
+            self._refresh()
+            entry = self._index.get(analysis_id)
+            if entry is None:
+                return None
+            with open(self.log_path, 'rb') as log:
+                log.seek(entry['offset'])
+                payload = log.read(entry['length'])
+        frame = json.loads(decompress(payload, entry['codec']))
+        for field in BLOB_FIELDS:
+            value = frame.get(field)
+            if isinstance(value, dict) and set(value) == {BLOB_KEY}:
+                frame[field] = self._load_blob(value[BLOB_KEY])
+        return frame
+
+    def list(self):
+        """Index metadata of every record, newest first."""
+        with self._lock, self._file_lock(shared=True):
+            self._refresh()
+            entries = list(self._index.values())
+        entries.sort(key=lambda entry: entry.get('timestamp') or '', reverse=True)
+        return [{'id': entry['id'], **{field: entry.get(field) for field in INDEX_FIELDS}}
+                for entry in entries]
+
+    def compact(self):
+        """
+        Rewrite the log keeping only the latest frame of each record.
+
+        Holds the store's lock throughout, and bumps the generation so other
+        processes reload their index.
+
+        Returns:
+            tuple: (bytes before, bytes after)
+        """
+        with self._lock, self._file_lock():
+            self._refresh()
+            if not self.log_path.exists():
+                return 0, 0
+            before = self.log_path.stat().st_size
+            tmp_log = self.log_path.with_suffix('.log.tmp')
+            tmp_index = self.index_path.with_suffix('.idx.tmp')
+            index = {}
+            with open(self.log_path, 'rb') as log, open(tmp_log, 'wb') as out, \
+                    open(tmp_index, 'w', encoding='utf-8') as out_index:
+                for entry in self._index.values():
+                    log.seek(entry['offset'])
+                    payload = log.read(entry['length'])
+                    entry = dict(entry, offset=out.tell())
+                    out.write(payload)
+                    out_index.write(json.dumps(entry) + '\n')
+                    index[entry['id']] = entry
+            os.replace(tmp_log, self.log_path)
+            os.replace(tmp_index, self.index_path)
+            tmp_generation = self.generation_path.with_suffix('.gen.tmp')
+            tmp_generation.write_text(str(self._generation + 1))
+            os.replace(tmp_generation, self.generation_path)
+            self._index = index
+            self._index_pos = self.index_path.stat().st_size
+            self._generation += 1
+            return before, self.log_path.stat().st_size
+
+def migrate_legacy(store, analysis_dir, delete=False):
+    """
+    Move ``<uuid>.json`` files and ``history.json`` entries into ``store``.
+
+    Returns:
+        dict: counts of migrated, skipped (already stored) and deleted files
+    """
+    analysis_dir = Path(analysis_dir)
+    counts = {'migrated': 0, 'skipped': 0, 'deleted': 0}
+    migrated_files = []
+
+    records = {}
+    history_file = analysis_dir / 'history.json'
+    if history_file.exists():
+        with open(history_file, 'r') as f:
+            records.update(json.load(f))
+    for path in analysis_dir.iterdir():
+        if LEGACY_FILE.match(path.name):
+            # Per-analysis files win over history.json (they were the primary copy)
+            with open(path, 'r') as f:
+                record = json.load(f)
+            records[record.get('id', path.stem)] = record
+            migrated_files.append(path)
+
+    for analysis_id, record in sorted(records.items(), key=lambda item: item[1].get('timestamp', '')):
+        if analysis_id in store:
+            counts['skipped'] += 1
+            continue
+        store.put(dict(record, id=analysis_id))
+        counts['migrated'] += 1
+
+    if delete:
+        for path in migrated_files + ([history_file] if history_file.exists() else []):
+            path.unlink()
+            counts['deleted'] += 1
+    return counts
+
+def directory_size(path):
+    return sum(p.stat().st_size for p in Path(path).rglob('*') if p.is_file())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Maintain the analysis result store',
+        epilog='Safe to run while the server is up: compaction holds the store lock, and '
+               'running servers reload their index when the generation changes.')
+    parser.add_argument('command', choices=['compact'])
+    parser.add_argument('--data-dir', default=str(DATA_DIR))
+    parser.add_argument('--delete', action='store_true',
+                        help='Delete the legacy files once they are in the store')
+    args = parser.parse_args(argv)
+
+    analysis_dir = Path(args.data_dir) / 'analysis'
+    size_before = directory_size(analysis_dir) if analysis_dir.exists() else 0
+    store = ResultStore(analysis_dir)
+    counts = migrate_legacy(store, analysis_dir, args.delete)
+    log_before, log_after = store.compact()
+    print(f"Migrated {counts['migrated']} records ({counts['skipped']} already stored, "
+          f"{counts['deleted']} legacy files deleted)")
+    print(f"Log compacted from {log_before} to {log_after} bytes; "
+          f"analysis directory {size_before} -> {directory_size(analysis_dir)} bytes")
+
+if __name__ == '__main__':
+    main()
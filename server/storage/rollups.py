@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Downsampled rollup tiers of the canonical telemetry, for long-range views.
+
+Each dataset keeps three tiers, each aggregated from the one below it:
+
+    1m  ->  1h  ->  1d
+
+Every tier bucket holds, per numeric column, the ``min``, ``max``, ``sum``,
+``count`` (non-missing readings) and ``last`` value of the readings in it;
+``mean`` is ``sum / count``. All five combine exactly, so the tiers are
+updated incrementally on ingest: only the new rows are aggregated and
+merged into the last (possibly partial) bucket of each tier.
+
+Tiers are stored columnar, one flat binary file per column and statistic
+under ``data/rollups/<dataset>/<tier>/``:
+
+    timestamp.i8            bucket start, int64 ns since the epoch
+    <column>.<stat>.f8      float64 values (``count`` is int64, ``.i8``)
+    meta.json               row count, columns and the ingest watermark
+
+Appends rewrite only the last bucket and add new ones; ``meta.json`` is
+replaced last, so readers never see rows past its count. A query reads just
+the slice of each requested column that covers its time range.
+
+``plan_tier()`` picks the coarsest tier whose buckets are no wider than the
+requested resolution, so a year-long query at daily resolution reads a few
+hundred rows.
+
+Usage (from the server directory), to rebuild every tier from the
+canonical files:
+    python -m storage.rollups
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from .schema import CANONICAL_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(os.environ.get('AQUAPONICS_DATA_DIR', Path(__file__).parent.parent / 'data'))
+
+MINUTE_NS = 60 * 10**9
+
+# Tier name -> bucket width in ns, finest first
+TIERS = {'1m': MINUTE_NS, '1h': 60 * MINUTE_NS, '1d': 24 * 60 * MINUTE_NS}
+
+STATS = ('min', 'max', 'sum', 'count', 'last')
+
+# Canonical readings that get rollups (derived feature columns do not)
+ROLLUP_COLUMNS = [column for column in CANONICAL_COLUMNS if column != 'timestamp']
+
+def stat_dtype(stat):
+    return np.int64 if stat == 'count' else np.float64
+
+def point_stats(frame, columns):
+    """Per-reading statistics of raw rows: each row is a bucket of one."""
+    stats = {}
+    for column in columns:
+        values = frame[column].to_numpy(dtype=np.float64)
+        valid = ~np.isnan(values)
+        stats[column] = {
+            'min': values, 'max': values, 'last': values,
+            'sum': np.where(valid, values, 0.0),
+            'count': valid.astype(np.int64),
+        }
+    return stats
+
+def rollup(timestamps, stats, width):
+    """
+    Aggregate rows (raw readings or finer buckets) into ``width``-ns buckets.
+
+    Args:
+        timestamps (ndarray): Sorted int64 ns timestamps (or bucket starts)
+        stats (dict): {column: {stat: ndarray}} aligned with ``timestamps``
+        width (int): Bucket width in ns; buckets are aligned to the epoch
+
+    Returns:
+        tuple: (bucket start timestamps, {column: {stat: ndarray}})
+    """
+    buckets = timestamps - timestamps % width
+    if len(buckets) == 0:
+        return buckets, {column: {stat: np.empty(0, stat_dtype(stat)) for stat in STATS} for column in stats}
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+
+    rolled = {}
+    for column, values in stats.items():
+        count = values['count']
+        # Position of the last row with a reading in each bucket (-1 if none)
+        last_index = np.maximum.reduceat(np.where(count > 0, np.arange(len(count)), -1), starts)
+        rolled[column] = {
+            'min': np.fmin.reduceat(values['min'], starts),
+            'max': np.fmax.reduceat(values['max'], starts),
+            'sum': np.add.reduceat(values['sum'], starts),
+            'count': np.add.reduceat(count, starts),
+            'last': np.where(last_index >= 0, values['last'][np.maximum(last_index, 0)], np.nan),
+        }
+    return buckets[starts], rolled
+
+def plan_tier(resolution_ns):
+    """
+    The coarsest tier whose buckets are no wider than ``resolution_ns``.
+
+    Returns:
+        str | None: tier name, or None if only raw readings are fine enough
+    """
+    planned = None
+    for tier, width in TIERS.items():
+        if width <= resolution_ns:
+            planned = tier
+    return planned
+
+class RollupTier:
+    """One tier of one dataset: flat column files plus ``meta.json``."""
+
+    def __init__(self, directory, width):
+        self.directory = Path(directory)
+        self.width = width
+        self.meta_path = self.directory / 'meta.json'
+        self.meta = self._read_meta()
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {'rows': 0, 'columns': [], 'watermark': None}
+
+    def _column_path(self, column, stat):
+        suffix = 'i8' if stat == 'count' else 'f8'
+        return self.directory / f'{column}.{stat}.{suffix}'
+
+    def _read(self, path, dtype, first, stop):
+        itemsize = np.dtype(dtype).itemsize
+        with open(path, 'rb') as f:
+            f.seek(first * itemsize)
+            return np.fromfile(f, dtype=dtype, count=stop - first)
+
+    def _write(self, path, array, position):
+        with open(path, 'r+b' if path.exists() else 'wb') as f:
+            f.seek(position * array.dtype.itemsize)
+            f.write(np.ascontiguousarray(array).tobytes())
+            f.truncate()
+
+    def merge(self, buckets, stats, watermark):
+        """
+        Merge aggregated buckets that are all at or after the tier's last one.
+
+        The first new bucket is combined with the stored last bucket when
+        they are the same bucket (a partial bucket that gained readings).
+        """
+        rows = self.meta['rows']
+        position = rows
+        if rows and len(buckets):
+            last_bucket = int(self._read(self.directory / 'timestamp.i8', np.int64, rows - 1, rows)[0])
+            if buckets[0] < last_bucket:
+                raise ValueError(f"Rollup update for {self.directory} is older than its last bucket")
+            if buckets[0] == last_bucket:
+                position = rows - 1
+                for column, values in stats.items():
+                    stored = {stat: self._read(self._column_path(column, stat), stat_dtype(stat), position, rows)
+                              for stat in STATS}
+                    values['min'][0] = np.fmin(stored['min'][0], values['min'][0])
+                    values['max'][0] = np.fmax(stored['max'][0], values['max'][0])
+                    values['sum'][0] += stored['sum'][0]
+                    if values['count'][0] == 0:
+                        values['last'][0] = stored['last'][0]
+                    values['count'][0] += stored['count'][0]
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._write(self.directory / 'timestamp.i8', buckets.astype(np.int64), position)
+        for column, values in stats.items():
+            for stat in STATS:
+                self._write(self._column_path(column, stat), values[stat].astype(stat_dtype(stat)), position)
+
+        self.meta = {'rows': position + len(buckets), 'columns': list(stats), 'watermark': watermark}
+        tmp_path = self.meta_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def query(self, start=None, end=None, columns=None):
+        """
+        Buckets between ``start`` and ``end`` (int64 ns, inclusive).
+
+        Returns:
+            tuple: (bucket start timestamps, {column: {stat: ndarray}})
+        """
+        rows = self.meta['rows']
+        columns = self.meta['columns'] if columns is None else [c for c in columns if c in self.meta['columns']]
+        if not rows:
+            return np.empty(0, np.int64), {column: {stat: np.empty(0, stat_dtype(stat)) for stat in STATS}
+                                           for column in columns}
+        # Binary search on the memory-mapped bucket column: only a few pages are read
+        timestamps = np.memmap(self.directory / 'timestamp.i8', dtype=np.int64, mode='r', shape=(rows,))
+        first = 0 if start is None else int(np.searchsorted(timestamps, start - start % self.width, 'left'))
+        stop = rows if end is None else int(np.searchsorted(timestamps, end, 'right'))
+        buckets = np.array(timestamps[first:stop])
+        del timestamps
+        return buckets, {column: {stat: self._read(self._column_path(column, stat), stat_dtype(stat), first, stop)
+                                  for stat in STATS}
+                         for column in columns}
+
+class RollupStore:
+    """The rollup tiers of one dataset."""
+
+    def __init__(self, dataset_type, data_dir=DATA_DIR):
+        self.directory = Path(data_dir) / 'rollups' / dataset_type
+        self.tiers = {tier: RollupTier(self.directory / tier, width) for tier, width in TIERS.items()}
+
+    @property
+    def columns(self):
+        return self.tiers['1m'].meta['columns']
+
+    @property
+    def watermark(self):
+        """Timestamp (int64 ns) of the newest reading in the tiers, or None."""
+        return self.tiers['1m'].meta['watermark']
+
+    def time_range(self):
+        """(first, last) reading timestamps in int64 ns, or (None, None) if empty."""
+        tier = self.tiers['1m']
+        if not tier.meta['rows']:
+            return None, None
+        return int(tier.query(columns=[])[0][0]), self.watermark
+
+    def version_paths(self):
+        """Files whose modification marks a change to the tiers."""
+        return [tier.meta_path for tier in self.tiers.values()]
+
+    def update(self, frame):
+        """
+        Fold canonical rows (``timestamp`` as int64 ns) into every tier.
+
+        Rows at or before the watermark are already included and skipped.
+
+        Returns:
+            int: Number of rows added, or -1 if the columns no longer match
+                 the stored tiers (they need a ``rebuild()``)
+        """
+        if frame.empty:
+            return 0
+        columns = [column for column in ROLLUP_COLUMNS if column in frame.columns]
+        if self.watermark is not None:
+            if columns != self.columns:
+                return -1
+            frame = frame[frame['timestamp'] > self.watermark]
+            if frame.empty:
+                return 0
+
+        timestamps = frame['timestamp'].to_numpy(dtype=np.int64)
+        watermark = int(timestamps[-1])
+        # Cascade: new readings -> 1m buckets -> 1h -> 1d, merging each level
+        buckets, stats = timestamps, point_stats(frame, columns)
+        for tier in self.tiers.values():
+            buckets, stats = rollup(buckets, stats, tier.width)
+            tier.merge(buckets, {column: {stat: values.copy() for stat, values in column_stats.items()}
+                                 for column, column_stats in stats.items()}, watermark)
+        return len(frame)
+
+    def clear(self):
+        """Discard the tiers (``update`` then starts them afresh)."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.tiers = {tier: RollupTier(self.directory / tier, width) for tier, width in TIERS.items()}
+
+    def rebuild(self, frame):
+        """Discard the tiers and build them from all of ``frame``."""
+        self.clear()
+        return self.update(frame)
+
+    def query(self, start=None, end=None, resolution=None, columns=None):
+        """
+        Read ``[start, end]`` at the coarsest tier that satisfies ``resolution``.
+
+        Buckets of the chosen tier are aggregated further to ``resolution``
+        when it is coarser than the tier.
+
+        Returns:
+            tuple: (tier name or None if raw readings are needed, bucket
+                    timestamps, {column: {stat: ndarray}})
+        """
+        tier = plan_tier(resolution or 0)
+        if tier is None or self.watermark is None:
+            return None, None, None
+        buckets, stats = self.tiers[tier].query(start, end, columns)
+        if resolution and resolution > TIERS[tier]:
+            buckets, stats = rollup(buckets, stats, resolution)
+        return tier, buckets, stats
+
+def main(argv=None):
+    from .ingest import SOURCES, rebuild_rollups
+    from .loader import canonical_path
+
+    parser = argparse.ArgumentParser(description='Rebuild the telemetry rollup tiers')
+    parser.add_argument('--data-dir', default=str(DATA_DIR))
+    args = parser.parse_args(argv)
+
+    for dataset_type in SOURCES:
+        path = canonical_path(dataset_type, args.data_dir)
+        if not path.exists():
+            continue
+        rows = rebuild_rollups(RollupStore(dataset_type, args.data_dir), path)
+        print(f"{dataset_type}: {rows} rows rolled up")
+
+if __name__ == '__main__':
+    main()
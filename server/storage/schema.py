@@ -0,0 +1,85 @@
+"""
+Canonical telemetry schema and the alias table for raw sensor exports.
+
+Raw exports name the same reading differently (``Water pH``, ``pH``...) and
+sometimes in different units (``EC Values(uS/cm``). Every source header is
+normalized, looked up here, and mapped to one canonical column in canonical
+units, so everything downstream of ingestion sees a single layout.
+"""
+import re
+
+# Canonical columns written to the store, in order, with their units
+CANONICAL_COLUMNS = {
+    'timestamp': None,
+    # Fish tank
+    'pH': None,
+    'temperature': '°C',
+    'ammonia': 'ppm',
+    'ec': 'mS/cm',
+    'tds': 'mg/L',
+    'turbidity': 'NTU',
+    # Plant bed
+    'height': 'cm',
+    'growth_rate': 'cm/day',
+    'plant_temperature': '°C',
+    'humidity': '%RH',
+    'pressure': 'Pa',
+}
+
+# Normalized source header -> (canonical column, multiplier into canonical units)
+COLUMN_ALIASES = {
+    'timestamp': ('timestamp', None),
+    'time': ('timestamp', None),
+    'date': ('timestamp', None),
+    'datetime': ('timestamp', None),
+    # Fish tank exports
+    'water ph': ('pH', 1.0),
+    'ph': ('pH', 1.0),
+    'water temperature(°c)': ('temperature', 1.0),
+    'water temperature': ('temperature', 1.0),
+    'temperature': ('temperature', 1.0),
+    'ammonia': ('ammonia', 1.0),
+    'ammonia(ppm)': ('ammonia', 1.0),
+    'ec values(us/cm': ('ec', 0.001),   # header is missing its closing bracket in the exports
+    'ec values(us/cm)': ('ec', 0.001),
+    'ec(us/cm)': ('ec', 0.001),
+    'ec values(ms/cm)': ('ec', 1.0),
+    'ec(ms/cm)': ('ec', 1.0),
+    'ec': ('ec', 1.0),
+    'tds(mg/l)': ('tds', 1.0),
+    'tds': ('tds', 1.0),
+    'turbidity(ntu)': ('turbidity', 1.0),
+    'turbidity': ('turbidity', 1.0),
+    # Plant bed exports
+    'height of the plant(cm)': ('height', 1.0),
+    'height': ('height', 1.0),
+    'growth_rate': ('growth_rate', 1.0),
+    'growth rate(cm/day)': ('growth_rate', 1.0),
+    'plant temperature(°c)': ('plant_temperature', 1.0),
+    'plant_temperature': ('plant_temperature', 1.0),
+    'humidity(rh)': ('humidity', 1.0),
+    'humidity': ('humidity', 1.0),
+    'pressure(pa)': ('pressure', 1.0),
+    'pressure': ('pressure', 1.0),
+}
+
+# Explicit timestamp formats tried in order (no per-row format inference)
+TIMESTAMP_FORMATS = ['%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d']
+
+# Format used for timestamps written to the canonical store
+CANONICAL_TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_header(header):
+    """Normalize a raw CSV header for alias lookup (BOM, case, whitespace)."""
+    return _WHITESPACE.sub(' ', header.replace('\ufeff', '')).strip().lower()
+
+def resolve_column(header):
+    """
+    Map a raw header to its canonical column.
+
+    Returns:
+        tuple: (canonical_name, multiplier), or (None, None) for unknown headers
+    """
+    return COLUMN_ALIASES.get(normalize_header(header), (None, None))
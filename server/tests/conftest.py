@@ -0,0 +1,45 @@
+"""Shared fixtures: data directories holding copies of the bundled raw exports, and the app."""
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVER_DIR))
+
+# Modules read their configuration at import: point everything the app
+# writes at a scratch directory, and use the models' built-in mock responses
+APP_DATA_DIR = Path(tempfile.mkdtemp(prefix='aquaponics-tests-'))
+os.environ['AQUAPONICS_DATA_DIR'] = str(APP_DATA_DIR)
+os.environ['LOG_DIR'] = str(APP_DATA_DIR / 'logs')
+for key in ('O1_API_KEY', 'DEEPSEEK_API_KEY'):
+    os.environ.pop(key, None)
+
+from storage.ingest import SOURCES  # noqa: E402
+
+def copy_raw_exports(directory):
+    for names in SOURCES.values():
+        for name in names.values():
+            shutil.copy(SERVER_DIR / 'data' / name, Path(directory) / name)
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """A fresh data directory with the raw fish and plant exports, not yet ingested."""
+    copy_raw_exports(tmp_path)
+    return tmp_path
+
+@pytest.fixture(scope='session')
+def app():
+    """The Flask app over the raw exports, ingested into the scratch data directory."""
+    copy_raw_exports(APP_DATA_DIR)
+    from app import app as flask_app
+    flask_app.config['TESTING'] = True
+    yield flask_app
+    shutil.rmtree(APP_DATA_DIR, ignore_errors=True)
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,23 @@
+def records(count, **values):
+    return [dict(values) for _ in range(count)]
+
+def test_predict_accepts_records_without_timestamps(client):
+    response = client.post('/api/ai/predict', json={
+        'initialData': {'fish': records(5, pH=7.0, temperature=24), 'plant': records(5, height=20)},
+        'validationData': {'fish': records(5, pH=6.9, temperature=25), 'plant': records(5, height=22)},
+        'modelType': 'deepseek-r1',
+    })
+
+    assert response.status_code == 200
+    assert response.get_json()['data_quality'] == {'initial': {}, 'validation': {}}
+
+def test_predict_blanks_sensor_faults(client):
+    fish = [{'timestamp': f'2024-06-01 {hour:02d}:00', 'pH': 7.0 + 0.01 * (hour % 3)} for hour in range(20)]
+    fish[15]['pH'] = 20.0  # impossible
+
+    response = client.post('/api/ai/predict', json={
+        'initialData': {'fish': fish}, 'validationData': {}, 'modelType': 'deepseek-r1',
+    })
+
+    assert response.status_code == 200
+    assert response.get_json()['data_quality']['initial']['fish']['pH']['range'] == 1
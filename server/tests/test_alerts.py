@@ -0,0 +1,85 @@
+import os
+
+import pytest
+
+from storage.alerts import HOUR_NS, AlertManager
+
+RULES = {
+    'pH': {
+        'component': 'fish', 'severity': 'warning', 'min': 6.5, 'max': 7.5, 'band': 0.1,
+        'open_after': HOUR_NS, 'clear_after': HOUR_NS, 'message': 'pH is {value}',
+    },
+}
+
+def write_readings(path, readings):
+    """Append (time of day, pH) readings for 2024-06-01 to a canonical file."""
+    new = not path.exists()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a') as f:
+        if new:
+            f.write('timestamp,pH\n')
+        for time, value in readings:
+            f.write(f'2024-06-01T{time},{value}\n')
+
+@pytest.fixture
+def source(tmp_path):
+    return tmp_path / 'telemetry' / 'validation.csv'
+
+def transitions(manager):
+    events, _ = manager.log.query(limit=100)
+    return [(event['state'], event['time'][11:16]) for event in reversed(events)]
+
+def test_breach_opens_after_open_after_and_resolves_after_clear_after(tmp_path, source):
+    write_readings(source, [
+        ('00:00:00', 7.0),
+        ('01:00:00', 7.8),   # breach starts
+        ('01:30:00', 7.9),   # held for 30 minutes only
+        ('01:45:00', 7.45),  # inside the band: the pending breach keeps its start
+        ('02:10:00', 7.7),   # held for 70 minutes
+    ])
+    manager = AlertManager(RULES, tmp_path)
+    assert [alert['state'] for alert in manager.active()] == ['open']
+    assert transitions(manager) == [('open', '02:10')]
+
+    write_readings(source, [
+        ('03:00:00', 7.45),  # back in range but not past the band: still open
+        ('04:00:00', 7.2),   # clear starts
+        ('04:30:00', 7.3),
+        ('05:00:00', 7.1),   # clear held for an hour
+    ])
+    assert manager.active() == []
+    assert transitions(manager) == [('open', '02:10'), ('resolved', '05:00')]
+
+def test_short_breach_does_not_open(tmp_path, source):
+    write_readings(source, [
+        ('00:00:00', 7.8),
+        ('00:30:00', 7.0),  # cleared before open_after
+        ('00:45:00', 7.8),
+        ('01:30:00', 7.9),  # 45 minutes since the breach restarted
+    ])
+    manager = AlertManager(RULES, tmp_path)
+    assert manager.active() == []
+    assert transitions(manager) == []
+
+def test_state_is_shared_through_the_checkpoint(tmp_path, source):
+    write_readings(source, [('00:00:00', 7.8), ('01:00:00', 7.8)])
+    first = AlertManager(RULES, tmp_path)
+    assert len(first.active()) == 1
+
+    # Another process picks up the open alert instead of opening it again
+    write_readings(source, [('02:00:00', 7.9)])
+    second = AlertManager(RULES, tmp_path)
+    assert [alert['id'] for alert in second.active()] == [alert['id'] for alert in first.active()]
+    assert transitions(second) == [('open', '01:00')]
+
+def test_touch_without_new_rows(tmp_path, source):
+    write_readings(source, [('00:00:00', 7.8), ('01:00:00', 7.8)])
+    manager = AlertManager(RULES, tmp_path)
+    active = manager.active()
+
+    # What an ingest with nothing new does
+    stat = source.stat()
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    assert manager.active() == active
+    assert len(manager.log) == 1
@@ -0,0 +1,117 @@
+import threading
+import time
+
+import pytest
+from flask import Blueprint, Flask
+
+from routes.bulkhead import Bulkhead, Rejected
+
+def bulkhead(**pools):
+    return Bulkhead(pools=pools, capacity=4, reserve=1)
+
+def eventually(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+def test_full_queue_is_rejected_with_429():
+    pools = bulkhead(analysis=(2, 1, 0, 1.0))
+    pools.acquire('analysis')
+
+    with pytest.raises(Rejected) as rejected:
+        pools.acquire('analysis')
+    assert (rejected.value.status, rejected.value.reason) == (429, 'queue_full')
+    assert rejected.value.retry_after >= 1
+
+def test_wait_past_max_wait_is_rejected_with_503():
+    pools = bulkhead(analysis=(2, 1, 1, 0.05))
+    pools.acquire('analysis')
+
+    started = time.monotonic()
+    with pytest.raises(Rejected) as rejected:
+        pools.acquire('analysis')
+    assert (rejected.value.status, rejected.value.reason) == (503, 'timeout')
+    assert time.monotonic() - started >= 0.05
+    assert pools.pools['analysis'].waiting == 0
+
+def test_waiter_gets_the_released_slot():
+    pools = bulkhead(chat=(1, 1, 1, 2.0))
+    pools.acquire('chat')
+    threading.Timer(0.05, pools.release, ('chat', 0.05)).start()
+
+    assert pools.acquire('chat') >= 0.04
+    assert pools.pools['chat'].in_flight == 1
+
+def test_retry_after_follows_the_request_time():
+    pools = bulkhead(analysis=(2, 1, 0, 1.0))
+    pools.acquire('analysis')
+    pools.release('analysis', 6.0)
+    pools.acquire('analysis')
+
+    with pytest.raises(Rejected) as rejected:
+        pools.acquire('analysis')
+    assert rejected.value.retry_after == 6
+
+def test_reserved_threads_are_kept_for_telemetry():
+    pools = bulkhead(telemetry=(0, 4, 0, 1.0), analysis=(2, 4, 0, 1.0))
+    for _ in range(3):
+        pools.acquire('analysis')
+
+    with pytest.raises(Rejected):
+        pools.acquire('analysis')
+    pools.acquire('telemetry')
+    assert pools.in_flight == 4
+
+def test_higher_priority_waiters_are_admitted_first():
+    pools = Bulkhead(pools={'telemetry': (0, 1, 1, 2.0), 'chat': (1, 1, 1, 2.0)}, capacity=1, reserve=0)
+    pools.acquire('chat')
+    admitted = []
+
+    def wait_for(name):
+        pools.acquire(name)
+        admitted.append(name)
+
+    waiters = [threading.Thread(target=wait_for, args=('chat',))]
+    waiters[0].start()
+    eventually(lambda: pools.pools['chat'].waiting == 1)
+    waiters.append(threading.Thread(target=wait_for, args=('telemetry',)))
+    waiters[1].start()
+    eventually(lambda: pools.pools['telemetry'].waiting == 1)
+
+    pools.release('chat', 0.05)
+    eventually(lambda: admitted)
+    assert admitted == ['telemetry']
+    pools.release('telemetry', 0.05)
+    for waiter in waiters:
+        waiter.join(1)
+    assert admitted == ['telemetry', 'chat']
+
+def test_guarded_blueprint_answers_429_with_retry_after():
+    pools = bulkhead(analysis=(2, 1, 0, 1.0))
+    running, finish = threading.Event(), threading.Event()
+    blueprint = Blueprint('slow', __name__)
+
+    @blueprint.route('/slow')
+    def slow():
+        running.set()
+        finish.wait(2)
+        return 'done'
+
+    pools.guard(blueprint, 'analysis')
+    test_app = Flask(__name__)
+    test_app.register_blueprint(blueprint)
+    first = threading.Thread(target=lambda: test_app.test_client().get('/slow'))
+    first.start()
+    assert running.wait(2)
+
+    response = test_app.test_client().get('/slow')
+    finish.set()
+    first.join(2)
+
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == str(response.get_json()['retry_after'])
+    assert response.get_json()['error'] == 'Too Many Requests'
+    # The slot is freed when the first request ends
+    assert pools.in_flight == 0
+    assert test_app.test_client().get('/slow').status_code == 200
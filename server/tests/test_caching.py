@@ -0,0 +1,96 @@
+import pytest
+from flask import Flask, jsonify
+
+from routes.caching import ResponseCache, file_version
+
+@pytest.fixture
+def cached_app():
+    """A view over ``state['items']`` cached until ``state['version']`` changes."""
+    cache = ResponseCache(max_entries=2)
+    state = {'version': 1, 'calls': 0, 'items': ['a']}
+    test_app = Flask(__name__)
+
+    @test_app.route('/items')
+    @cache.cached(lambda: state['version'])
+    def items():
+        state['calls'] += 1
+        return jsonify(state['items'])
+
+    @test_app.route('/broken')
+    @cache.cached(lambda: state['version'])
+    def broken():
+        state['calls'] += 1
+        return jsonify({'error': 'Failed', 'message': 'broken'}), 500
+
+    return test_app.test_client(), state
+
+def test_repeat_requests_are_served_from_the_cache(cached_app):
+    client, state = cached_app
+    first = client.get('/items')
+    second = client.get('/items')
+
+    assert state['calls'] == 1
+    assert second.get_json() == ['a']
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert second.headers['Cache-Control'] == 'no-cache'
+
+def test_matching_etag_is_not_modified(cached_app):
+    client, state = cached_app
+    etag = client.get('/items').headers['ETag']
+
+    response = client.get('/items', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert state['calls'] == 1
+
+def test_version_change_invalidates(cached_app):
+    client, state = cached_app
+    etag = client.get('/items').headers['ETag']
+    state['items'], state['version'] = ['a', 'b'], 2
+
+    revalidated = client.get('/items', headers={'If-None-Match': etag})
+
+    assert revalidated.status_code == 200
+    assert revalidated.get_json() == ['a', 'b']
+    assert revalidated.headers['ETag'] != etag
+    assert state['calls'] == 2
+
+def test_query_strings_are_cached_separately(cached_app):
+    client, state = cached_app
+    client.get('/items?limit=1')
+    client.get('/items?limit=2')
+    client.get('/items?limit=1')
+    assert state['calls'] == 2
+
+def test_least_recently_used_entry_is_evicted(cached_app):
+    client, state = cached_app
+    for query in ('a', 'b', 'a', 'c', 'a', 'b'):
+        client.get(f'/items?q={query}')
+    # b was evicted by c, a stayed cached because it was used
+    assert state['calls'] == 4
+
+def test_errors_are_not_cached(cached_app):
+    client, state = cached_app
+    assert client.get('/broken').status_code == 500
+    assert client.get('/broken').status_code == 500
+    assert state['calls'] == 2
+
+def test_file_version_follows_writes(tmp_path):
+    path = tmp_path / 'data.csv'
+    assert file_version(path) == (None,)
+    path.write_text('timestamp\n')
+    version = file_version(path)
+    path.write_text('timestamp\n2024-06-01T00:00:00\n')
+    assert file_version(path) != version
+
+def test_history_etag_changes_when_an_analysis_is_stored(client):
+    from routes.ai_analysis import result_store
+
+    etag = client.get('/api/ai/history').headers['ETag']
+    assert client.get('/api/ai/history', headers={'If-None-Match': etag}).status_code == 304
+
+    result_store.put({'id': 'cache-test', 'timestamp': '2024-06-01T00:00:00', 'results': {}})
+
+    response = client.get('/api/ai/history', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'cache-test' in response.get_data(as_text=True)
@@ -0,0 +1,72 @@
+from ai import conversation as conversation_module
+from ai.conversation import CHAT_RECENT_TURNS, Conversation
+
+INSTRUCTIONS = 'You are an aquaponics assistant.\nAnswer using the latest telemetry.'
+
+def chat(exchanges, instructions=INSTRUCTIONS):
+    """A conversation of ``exchanges`` question/answer pairs plus a pending question."""
+    conversation = Conversation(instructions)
+    for n in range(exchanges):
+        conversation.append({'role': 'user', 'content': f'Question {n}? More detail {n}.'})
+        conversation.append({'role': 'assistant', 'content': f'Answer {n}. Explanation {n}.'})
+    conversation.append({'role': 'user', 'content': 'Latest question?'})
+    return conversation
+
+def test_new_session_has_no_context():
+    assert chat(0).build_context() == ('', 0)
+
+def test_recent_turns_are_verbatim_without_the_latest_message():
+    context, verbatim = chat(2).build_context()
+
+    assert verbatim == 4
+    assert context == ('Recent conversation:\n'
+                       'User: Question 0? More detail 0.\nAssistant: Answer 0. Explanation 0.\n'
+                       'User: Question 1? More detail 1.\nAssistant: Answer 1. Explanation 1.')
+
+def test_budget_keeps_the_newest_turns():
+    context, verbatim = chat(5).build_context(budget=30)
+
+    assert 0 < verbatim < 10
+    assert 'Answer 4. Explanation 4.' in context
+    assert 'Question 0?' not in context
+
+def test_older_turns_are_folded_into_the_summary():
+    conversation = chat(CHAT_RECENT_TURNS + 2)
+    conversation._summarize()
+
+    # Two exchanges left the recent window; the pending question keeps one
+    # more message after it
+    assert conversation.summarized == 4
+    assert conversation.summary_lines == ['- Q: Question 0? A: Answer 0.', '- Q: Question 1? A: Answer 1.']
+    context, verbatim = conversation.build_context()
+    assert context.startswith('Summary of earlier conversation:\n- Q: Question 0? A: Answer 0.')
+    assert 'More detail 1.' not in context
+    assert 'More detail 2.' in context
+    assert verbatim == len(conversation.messages) - 4 - 1
+
+def test_summary_is_capped(monkeypatch):
+    monkeypatch.setattr(conversation_module, 'CHAT_SUMMARY_TOKENS', 12)
+    conversation = chat(CHAT_RECENT_TURNS + 3)
+    conversation._summarize()
+
+    assert len(conversation.summary_lines) < 3
+    assert conversation.omitted == 3 - len(conversation.summary_lines)
+    assert conversation.summary().startswith(
+        f'Summary of earlier conversation ({conversation.omitted} older exchanges omitted):')
+
+def test_repeated_lines_are_sent_once():
+    conversation = Conversation(INSTRUCTIONS)
+    fallback = 'Sorry, I could not reach the analysis service right now.'
+    for question in ('Is the pH ok?', 'And ammonia?'):
+        conversation.append({'role': 'user', 'content': question})
+        conversation.append({'role': 'assistant',
+                             'content': f'{fallback}\nAnswer using the latest telemetry.'})
+    conversation.append({'role': 'user', 'content': 'Thanks'})
+
+    context, _ = conversation.build_context()
+
+    assert context.count(fallback) == 1
+    assert 'Answer using the latest telemetry.' not in context
+    # The newest copy is the one kept
+    assert context.endswith(f'Assistant: {fallback}')
+    assert 'Assistant: [repeated]' in context
@@ -0,0 +1,46 @@
+import numpy as np
+
+from storage.correlations import MIN_OVERLAP, MIN_PAIRS, lagged_correlations
+
+def brute_force(x, y, lag):
+    """Pearson r and pair count of x[t] with y[t + lag] over the buckets where both exist."""
+    n = len(x)
+    t = np.arange(max(0, -lag), min(n, n - lag))
+    a, b = x[t], y[t + lag]
+    both = ~np.isnan(a) & ~np.isnan(b)
+    if both.sum() < 2:
+        return np.nan, int(both.sum())
+    return np.corrcoef(a[both], b[both])[0, 1], int(both.sum())
+
+def test_matches_brute_force_pearson():
+    rng = np.random.default_rng(2)
+    n, max_lag = 200, 30
+    drivers = rng.normal(size=(2, n)).cumsum(axis=1)
+    # The first response follows the first driver 5 buckets later
+    responses = np.vstack([np.roll(drivers[0], 5) + rng.normal(0, 0.3, n), rng.normal(size=n) * 100 + 50])
+    drivers[rng.random(drivers.shape) < 0.15] = np.nan
+    responses[rng.random(responses.shape) < 0.15] = np.nan
+    responses[1, 120:160] = np.nan  # a long gap
+
+    lags, r, pairs = lagged_correlations(drivers, responses, max_lag)
+
+    assert list(lags) == list(range(-max_lag, max_lag + 1))
+    for i in range(2):
+        for j in range(2):
+            expected = [brute_force(drivers[i], responses[j], lag) for lag in lags]
+            expected_pairs = np.array([count for _, count in expected])
+            np.testing.assert_array_equal(pairs[i, j], expected_pairs)
+            enough = (expected_pairs >= MIN_PAIRS) & (expected_pairs >= MIN_OVERLAP * expected_pairs.max())
+            expected_r = np.where(enough, [value for value, _ in expected], np.nan)
+            np.testing.assert_allclose(r[i, j], expected_r, atol=1e-9)
+    assert lags[np.nanargmax(r[0, 0])] == 5
+
+def test_too_few_pairs_is_nan():
+    drivers = np.full((1, 50), np.nan)
+    drivers[0, :MIN_PAIRS - 1] = np.arange(MIN_PAIRS - 1)
+    responses = np.arange(50, dtype=np.float64)[None, :]
+
+    _, r, pairs = lagged_correlations(drivers, responses, 3)
+
+    assert pairs[0, 0, 3] == MIN_PAIRS - 1
+    assert np.isnan(r).all()
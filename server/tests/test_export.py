@@ -0,0 +1,72 @@
+import gzip
+
+import pytest
+
+URL = '/api/telemetry/download/validation'
+
+@pytest.fixture
+def full(client):
+    response = client.get(URL)
+    assert response.status_code == 200
+    return response
+
+def test_unfiltered_export_is_the_canonical_file(full):
+    assert full.headers['Content-Length'] == str(len(full.data))
+    assert full.headers['Accept-Ranges'] == 'bytes'
+    assert 'Content-Encoding' not in full.headers
+    assert full.data.startswith(b'timestamp,')
+
+def test_time_range_and_columns(client):
+    response = client.get(f'{URL}?start=2024-06-01&end=2024-06-02&columns=pH')
+    lines = response.data.decode('utf-8').splitlines()
+
+    assert lines[0] == 'timestamp,pH'
+    assert len(lines) > 1
+    # end is a date, so it includes the whole of June 2nd
+    assert all('2024-06-01' <= line[:10] <= '2024-06-02' for line in lines[1:])
+
+def test_unknown_column_is_rejected(client):
+    response = client.get(f'{URL}?columns=pH,salinity')
+    assert response.status_code == 400
+    assert 'salinity' in response.get_json()['message']
+
+def test_gzip_encoding(client, full):
+    response = client.get(URL, headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['ETag'] != full.headers['ETag']
+    assert gzip.decompress(response.data) == full.data
+
+def test_matching_etag_is_not_modified(client, full):
+    response = client.get(URL, headers={'If-None-Match': full.headers['ETag']})
+    assert response.status_code == 304
+    assert response.data == b''
+
+def test_byte_range_resumes_a_download(client, full):
+    response = client.get(URL, headers={'Range': 'bytes=100-199'})
+
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes 100-199/{len(full.data)}'
+    assert response.data == full.data[100:200]
+
+def test_byte_range_of_a_compressed_export(client):
+    encoded = client.get(URL, headers={'Accept-Encoding': 'gzip'}).data
+    response = client.get(URL, headers={'Accept-Encoding': 'gzip', 'Range': f'bytes={len(encoded) - 50}-'})
+
+    assert response.status_code == 206
+    assert response.data == encoded[-50:]
+
+def test_if_range_with_a_stale_etag_sends_everything(client, full):
+    response = client.get(URL, headers={'Range': 'bytes=100-199', 'If-Range': '"stale"'})
+    assert response.status_code == 200
+    assert response.data == full.data
+
+def test_if_range_with_the_current_etag_sends_the_range(client, full):
+    response = client.get(URL, headers={'Range': 'bytes=100-199', 'If-Range': full.headers['ETag']})
+    assert response.status_code == 206
+    assert response.data == full.data[100:200]
+
+def test_unsatisfiable_range(client, full):
+    response = client.get(URL, headers={'Range': f'bytes={len(full.data)}-'})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(full.data)}'
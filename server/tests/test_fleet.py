@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from storage.fleet import FleetAggregator
+
+RANGES = {'pH': {'min': 6.5, 'max': 7.5}, 'temperature': {'min': 18, 'max': 24}}
+
+def write_tank(fleet_dir, tank_id, rows, mode='w'):
+    """Write (or append) (time of day on 2024-06-01, pH, temperature, qc_pH) rows."""
+    fleet_dir.mkdir(exist_ok=True)
+    path = fleet_dir / f'{tank_id}.csv'
+    with open(path, mode) as f:
+        if mode == 'w':
+            f.write('timestamp,pH,temperature,qc_pH\n')
+        for time, ph, temperature, flag in rows:
+            f.write(f'2024-06-01T{time},{ph},{temperature},{flag}\n')
+    return path
+
+@pytest.fixture
+def fleet_dir(tmp_path):
+    fleet_dir = tmp_path / 'fleet'
+    write_tank(fleet_dir, 'tank-a', [('00:00:00', 7.0, 20.0, 0), ('01:00:00', 7.2, 21.0, 0),
+                                     ('02:00:00', 7.8, 22.0, 0)])
+    write_tank(fleet_dir, 'tank-b', [('00:30:00', 6.8, 19.0, 0), ('01:30:00', 3.0, 19.5, 1),
+                                     ('02:30:00', 6.9, '', 0)])
+    return fleet_dir
+
+def aggregator(fleet_dir, **kwargs):
+    fleet = FleetAggregator(RANGES, fleet_dir, workers=1, **kwargs)
+    fleet.refresh()
+    return fleet
+
+def test_history_combines_every_tank(fleet_dir):
+    history = aggregator(fleet_dir).summary()['history']
+
+    # The flagged pH reading of tank-b is left out
+    ph = np.array([7.0, 7.2, 7.8, 6.8, 6.9])
+    assert history['pH']['count'] == 5
+    assert history['pH']['mean'] == pytest.approx(ph.mean(), abs=1e-4)
+    assert history['pH']['std'] == pytest.approx(ph.std(ddof=1), abs=1e-4)
+    assert (history['pH']['min'], history['pH']['max']) == (6.8, 7.8)
+    assert history['pH']['out_of_range_readings'] == 1
+    assert history['temperature']['count'] == 5
+    assert 6.8 <= history['pH']['p50'] <= 7.8
+
+def test_now_uses_each_tanks_latest_reading(fleet_dir):
+    summary = aggregator(fleet_dir).summary()
+
+    assert (summary['tanks'], summary['current_tanks'], summary['stale_tanks']) == (2, 2, 0)
+    assert summary['newest_reading'].startswith('2024-06-01T02:30:00')
+    assert summary['now']['pH']['tanks'] == 2
+    assert (summary['now']['pH']['above'], summary['now']['pH']['below']) == (1, 0)
+    assert summary['tanks_out_of_range'] == 1
+    # tank-b's last temperature is missing, so its previous one is its latest
+    assert summary['now']['temperature']['min'] == 19.5
+
+def test_appended_rows_are_read_incrementally(fleet_dir):
+    fleet = aggregator(fleet_dir)
+    write_tank(fleet_dir, 'tank-a', [('03:00:00', 7.1, 23.0, 0)], mode='a')
+
+    assert fleet.refresh() == {'full': 0, 'incremental': 1, 'failed': 0}
+    assert fleet.refresh() == {'full': 0, 'incremental': 0, 'failed': 0}
+    assert fleet.summary() == aggregator(fleet_dir).summary()
+    assert fleet.tank('tank-a')['latest']['pH']['value'] == 7.1
+    assert fleet.tank('tank-a')['rows'] == 4
+
+def test_rewritten_file_is_read_in_full(fleet_dir):
+    fleet = aggregator(fleet_dir)
+    write_tank(fleet_dir, 'tank-a', [('00:00:00', 6.6, 20.0, 0)])
+
+    assert fleet.refresh()['full'] == 1
+    assert fleet.tank('tank-a')['rows'] == 1
+    assert fleet.summary()['history']['pH']['count'] == 3
+
+def test_removed_tank_leaves_the_fleet(fleet_dir):
+    fleet = aggregator(fleet_dir)
+    (fleet_dir / 'tank-b.csv').unlink()
+    fleet.refresh()
+
+    assert [row['tank'] for row in fleet.tank_list()] == ['tank-a']
+    assert fleet.summary()['history']['pH']['count'] == 3
+
+def test_stale_tanks_are_left_out_of_now(fleet_dir):
+    write_tank(fleet_dir, 'tank-c', [('00:00:00', 5.0, 30.0, 0)])
+    summary = aggregator(fleet_dir, stale_seconds=3600).summary()
+
+    assert (summary['tanks'], summary['stale_tanks']) == (3, 1)
+    assert summary['now']['pH']['tanks'] == 2
+    assert summary['history']['pH']['count'] == 6
+
+def test_process_pool_partitions_match_a_single_pass(fleet_dir):
+    for n in range(3):
+        write_tank(fleet_dir, f'tank-{n}', [('00:00:00', 7.0 + n / 10, 20.0 + n, 0)])
+    pooled = FleetAggregator(RANGES, fleet_dir, workers=2, partition_tanks=2)
+
+    assert pooled.refresh() == {'full': 5, 'incremental': 0, 'failed': 0}
+    assert pooled.summary() == aggregator(fleet_dir).summary()
+    pooled._executor.shutdown()
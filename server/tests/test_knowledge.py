@@ -0,0 +1,66 @@
+import pytest
+
+from ai.knowledge import PLAYBOOKS, KnowledgeBase
+
+RANGES = {'pH': {'min': 6.5, 'max': 7.5}, 'temperature': {'min': 18, 'max': 24},
+          'ammonia': {'min': 0, 'max': 0.5}, 'ec': {'min': 1.2, 'max': 2.0}}
+
+@pytest.fixture(scope='module')
+def knowledge_base():
+    return KnowledgeBase(ranges=RANGES)
+
+@pytest.mark.parametrize('question, playbook', [
+    ('My pH is 6.3, what do I do?', 'ph-low'),
+    ('pH is 8.1', 'ph-high'),
+    ('How do I raise the pH?', 'ph-low'),
+    ('How do I lower the pH?', 'ph-high'),
+    ('My spearmint leaves are yellow', 'yellow-leaves'),
+    ('Aphids on my mint', 'pests'),
+])
+def test_playbook_questions_are_answered_directly(knowledge_base, question, playbook):
+    outcome, matches = knowledge_base.lookup(question)
+    assert outcome == 'direct'
+    assert matches[0][1]['id'] == playbook
+
+def test_related_questions_are_grounded(knowledge_base):
+    outcome, matches = knowledge_base.lookup('Ammonia spike, fish gasping')
+    assert outcome == 'grounded'
+    assert matches[0][1]['id'] == 'ammonia-high'
+
+def test_unrelated_questions_miss(knowledge_base):
+    assert knowledge_base.lookup('What is the weather in Paris?') == ('miss', [])
+
+def test_confidence_is_below_one(knowledge_base):
+    for passage in PLAYBOOKS:
+        for confidence, _ in knowledge_base.search(passage['title'] + ' ' + passage['keywords']):
+            assert 0 < confidence < 1
+
+@pytest.fixture
+def llm_calls(monkeypatch):
+    import routes.chatbot
+    calls = []
+
+    def call_o1_api(messages):
+        calls.append(messages)
+        return 'LLM reply'
+    monkeypatch.setattr(routes.chatbot, 'call_o1_api', call_o1_api)
+    return calls
+
+def test_direct_answer_skips_the_llm(client, llm_calls):
+    response = client.post('/api/chatbot/send', json={'message': 'My pH is 6.3, what do I do?'})
+    message = response.get_json()['message']
+
+    assert llm_calls == []
+    assert message['source'] == 'knowledge_base'
+    assert message['promptTokens'] == 0
+    assert message['content'].startswith('Keep pH between 6.5 and 7.5. If pH drops below 6.5:')
+    assert 'Current readings' in message['content']
+
+def test_grounded_question_sends_the_playbooks_to_the_llm(client, llm_calls):
+    response = client.post('/api/chatbot/send', json={'message': 'Ammonia spike, fish gasping'})
+
+    assert response.get_json()['message']['content'] == 'LLM reply'
+    assert 'source' not in response.get_json()['message']
+    [messages] = llm_calls
+    assert any(item['content'].startswith('Relevant playbooks') and 'Ammonia above 0.5ppm' in item['content']
+               for item in messages)
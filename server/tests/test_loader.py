@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from storage.loader import ColumnSummary
+
+def summarize(values, chunk_rows, **kwargs):
+    summary = ColumnSummary(['pH'], **kwargs)
+    for first in range(0, len(values), chunk_rows):
+        summary.update(pd.DataFrame({'pH': values[first:first + chunk_rows]}))
+    return summary
+
+def test_matches_describe_below_the_sample_size():
+    values = np.random.default_rng(3).normal(7, 0.3, 5000).astype(np.float32)
+    values[::17] = np.nan
+
+    stats = summarize(values, 700).describe('pH')
+
+    expected = pd.Series(values).describe()
+    for key in ('count', '25%', '50%', '75%', 'min', 'max'):
+        assert stats[key] == np.float32(expected[key]), key
+    assert abs(stats['mean'] - expected['mean']) < 1e-6
+    assert abs(stats['std'] - expected['std']) < 1e-6
+
+def test_quartiles_are_sampled_beyond_the_sample_size():
+    values = np.random.default_rng(4).gamma(2, 1, 400_000).astype(np.float32)
+
+    summary = summarize(values, 50_000, sample_size=10_000)
+    stats = summary.describe('pH')
+
+    assert len(summary._sample['pH']) == 10_000
+    assert stats['count'] == len(values)
+    assert stats['max'] == values.max()
+    ordered = np.sort(values)
+    for quantile in (25, 50, 75):
+        rank = np.searchsorted(ordered, stats[f'{quantile}%']) / len(values) * 100
+        # Five standard deviations of the rank error
+        assert abs(rank - quantile) < 5 * 100 * np.sqrt(0.25 * 0.75 / 10_000)
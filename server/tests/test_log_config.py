@@ -0,0 +1,11 @@
+import logging
+
+from monitoring.log_config import resolve_level
+
+def test_level_names_and_numbers():
+    assert resolve_level('DEBUG', 'INFO', 'LOG_LEVEL') == logging.DEBUG
+    assert resolve_level('15', 'INFO', 'LOG_LEVEL') == 15
+
+def test_unknown_level_falls_back_with_a_warning(capsys):
+    assert resolve_level('VERBOSE', 'WARNING', 'LOG_CONSOLE_LEVEL') == logging.WARNING
+    assert "Unknown LOG_CONSOLE_LEVEL 'VERBOSE'; using WARNING" in capsys.readouterr().err
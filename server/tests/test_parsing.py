@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from ai.parsing import JsonObjectScanner, ResponseParseError, conform_analysis, extract_json, parse_analysis
+
+ANALYSIS = {
+    'Goldfish_Health': {
+        'pH_Trend': {'next_30d': 'stable', 'action': 'none'},
+        'Ammonia_Risk': {'probability': '20%', 'peak_day': 'day 12'},
+    },
+    'Spearmint_Growth': {
+        'Harvest_Readiness': {'optimal_date': '2024-07-01'},
+        'Nutrient_Deficit': {'nitrogen': 'low', 'fix': 'feed more'},
+    },
+    'System_Risk': {'pump': {'severity': 'high', 'impact': 'oxygen drop'}},
+}
+
+def test_clean_json():
+    assert extract_json(json.dumps(ANALYSIS)) == (ANALYSIS, 'clean')
+
+def test_object_is_extracted_from_prose_and_fences():
+    reply = f'Here is the analysis, e.g. {{"a": 1}}:\n```json\n{json.dumps(ANALYSIS)}\n```\nHope it helps!'
+    assert extract_json(reply) == (ANALYSIS, 'extracted')
+
+def test_quotes_trailing_commas_and_python_literals_are_repaired():
+    reply = "{'status': 'it\\'s fine', 'ok': True, 'value': None, 'items': [1, 2,], 'note': \"a, b\",}"
+    assert extract_json(reply) == (
+        {'status': "it's fine", 'ok': True, 'value': None, 'items': [1, 2], 'note': 'a, b'}, 'repaired')
+
+def test_truncated_object_is_closed():
+    reply = '{"summary": {"items": ["a", "b"], "trend": "ris'
+    assert extract_json(reply) == ({'summary': {'items': ['a', 'b'], 'trend': 'ris'}}, 'repaired')
+
+def test_truncated_object_drops_a_dangling_key():
+    data, outcome = extract_json('{"trend": "rising", "risk": {"level": "high", "impa')
+    assert data == {'trend': 'rising', 'risk': {'level': 'high'}}
+    assert outcome == 'repaired'
+
+def test_scanner_tracks_strings_across_chunks():
+    scanner = JsonObjectScanner()
+    text = 'noise {"a": "brace } and \\" quote", "b": {"c": [1]}} tail {"d": 2}'
+    objects = []
+    for first in range(0, len(text), 3):
+        objects += scanner.feed(text[first:first + 3])
+    assert [json.loads(obj) for obj in objects] == [{'a': 'brace } and " quote', 'b': {'c': [1]}}, {'d': 2}]
+    assert scanner.pending() is None
+
+def test_no_object_raises():
+    with pytest.raises(ResponseParseError):
+        extract_json('I could not analyse the data.')
+
+def test_schema_coerces_values_and_key_spellings():
+    data = json.loads(json.dumps(ANALYSIS))
+    data['goldfish health'] = data.pop('Goldfish_Health')
+    data['goldfish health']['Ammonia_Risk']['probability'] = 0.35
+    data['Spearmint_Growth']['Nutrient_Deficit']['nitrogen'] = 'Moderate'
+    data['System_Risk']['pump']['severity'] = 'OK'
+    data['confidence_score'] = '0.8'
+
+    result, problems = conform_analysis(data)
+
+    assert problems == []
+    assert result['Goldfish_Health']['Ammonia_Risk']['probability'] == '35%'
+    assert result['Spearmint_Growth']['Nutrient_Deficit']['nitrogen'] == 'medium'
+    assert result['System_Risk']['pump']['severity'] == 'adequate'
+    assert result['confidence_score'] == 0.8
+
+def test_missing_fields_are_unknown():
+    data = json.loads(json.dumps(ANALYSIS))
+    del data['Goldfish_Health']['pH_Trend']['action']
+    data['Spearmint_Growth']['Harvest_Readiness']['optimal_date'] = ['not', 'text']
+
+    result, problems = conform_analysis(data)
+
+    assert result['Goldfish_Health']['pH_Trend'] == {'next_30d': 'stable', 'action': 'Unknown'}
+    assert result['Spearmint_Growth']['Harvest_Readiness']['optimal_date'] == 'Unknown'
+    assert problems == ['Goldfish_Health.pH_Trend.action: missing',
+                        'Spearmint_Growth.Harvest_Readiness.optimal_date: expected text, got list']
+
+def test_missing_section_is_rejected():
+    data = dict(ANALYSIS)
+    del data['System_Risk']
+    with pytest.raises(ResponseParseError, match='System_Risk'):
+        parse_analysis(json.dumps(data))
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from storage.quality import FLAGS, HOUR_NS, flag_column, flag_readings
+
+def readings(count=600, seed=1):
+    """pH and temperature every 20 minutes with each kind of fault mixed in."""
+    rng = np.random.default_rng(seed)
+    timestamps = np.datetime64('2024-06-01T00:00', 'ns').astype(np.int64) + np.arange(count) * HOUR_NS // 3
+    ph = 7 + rng.normal(0, 0.05, count)
+    ph[100] = 9.5              # spike
+    ph[200:222] = 6.9          # stuck probe, about 7 hours
+    ph[300:] -= 0.8            # level shift (a water change), then steady
+    ph[400] = 15.0             # out of range
+    ph[rng.random(count) < 0.1] = np.nan
+    temperature = 24 + np.cumsum(rng.normal(0, 0.1, count))
+    temperature[450] += 12     # too fast
+    return pd.DataFrame({'timestamp': timestamps, 'pH': ph, 'temperature': temperature})
+
+def test_fixture_has_every_fault():
+    flags = flag_readings(readings())[flag_column('pH')].to_numpy()
+    for name in ('spike', 'flatline', 'range'):
+        assert (flags & FLAGS[name]).any(), name
+    assert (flag_readings(readings())[flag_column('temperature')].to_numpy() & FLAGS['rate']).any()
+
+@pytest.mark.parametrize('split', [1, 50, 101, 210, 301, 401, 599])
+def test_incremental_flags_match_full(split):
+    frame = readings()
+    full = flag_readings(frame)
+
+    incremental = flag_readings(frame.iloc[split:], context=frame.iloc[:split])
+
+    for param in ('pH', 'temperature'):
+        column = flag_column(param)
+        np.testing.assert_array_equal(incremental[column].to_numpy(), full[column].to_numpy()[split:],
+                                      err_msg=param)
@@ -0,0 +1,97 @@
+import json
+
+import pytest
+
+from storage.results import ResultStore, directory_size, main
+
+def record(analysis_id, timestamp, results):
+    return {
+        'id': analysis_id, 'timestamp': timestamp, 'modelUsed': 'o1-mini', 'confidence_score': 0.8,
+        'results': results, 'systemConfig': {'tank_volume': 1000},
+    }
+
+@pytest.fixture
+def store(tmp_path):
+    return ResultStore(tmp_path / 'analysis', codec='gzip')
+
+def test_put_get_and_list(store):
+    store.put(record('a', '2024-06-01T00:00:00', {'summary': 'first'}))
+    store.put(record('b', '2024-06-02T00:00:00', {'summary': 'second'}))
+
+    assert store.get('a') == record('a', '2024-06-01T00:00:00', {'summary': 'first'})
+    assert store.get('missing') is None
+    assert 'b' in store and 'missing' not in store
+    assert [entry['id'] for entry in store.list()] == ['b', 'a']
+    assert store.list()[0] == {'id': 'b', 'timestamp': '2024-06-02T00:00:00',
+                               'modelUsed': 'o1-mini', 'confidence_score': 0.8}
+
+def test_identical_fields_share_a_blob(store):
+    store.put(record('a', '2024-06-01T00:00:00', {'summary': 'same'}))
+    store.put(record('b', '2024-06-02T00:00:00', {'summary': 'same'}))
+
+    # One blob for the shared results, one for the shared config
+    assert len(list(store.blob_dir.rglob('*.gz'))) == 2
+    assert store.get('b')['results'] == {'summary': 'same'}
+
+def test_compaction_keeps_the_latest_frame(store):
+    store.put(record('a', '2024-06-01T00:00:00', {'summary': 'old'}))
+    store.put(record('a', '2024-06-01T00:00:00', {'summary': 'new'}))
+    store.put(record('b', '2024-06-02T00:00:00', {'summary': 'other'}))
+
+    before, after = store.compact()
+
+    assert after < before
+    assert store.get('a')['results'] == {'summary': 'new'}
+    assert store.get('b')['results'] == {'summary': 'other'}
+    assert len(store.index_path.read_text().splitlines()) == 2
+
+def test_other_stores_reload_after_compaction(store):
+    other = ResultStore(store.root, codec='gzip')
+    for n in range(3):
+        store.put(record('a', '2024-06-01T00:00:00', {'summary': f'version {n}'}))
+    store.put(record('b', '2024-06-02T00:00:00', {'summary': 'other'}))
+    assert other.get('b')['results'] == {'summary': 'other'}
+    version = other.version()
+
+    store.compact()
+
+    # Offsets cached before the compaction would now point past the log
+    assert other.get('b')['results'] == {'summary': 'other'}
+    assert other.get('a')['results'] == {'summary': 'version 2'}
+    assert other.version() > version
+    assert other.version() == store.version()
+
+    store.put(record('c', '2024-06-03T00:00:00', {'summary': 'after'}))
+    assert other.version() == store.version()
+    assert [entry['id'] for entry in other.list()] == ['c', 'b', 'a']
+
+def test_version_grows_across_compaction(store):
+    versions = [store.version()]
+    store.put(record('a', '2024-06-01T00:00:00', {'summary': 'old'}))
+    versions.append(store.version())
+    store.put(record('a', '2024-06-01T00:00:00', {'summary': 'new'}))
+    versions.append(store.version())
+    store.compact()
+    versions.append(store.version())
+
+    # The index shrinks, but the version must not repeat an earlier value
+    assert versions == sorted(versions)
+    assert len(set(versions)) == len(versions)
+
+def test_cli_migrates_legacy_files(tmp_path, capsys):
+    analysis_dir = tmp_path / 'analysis'
+    analysis_dir.mkdir()
+    legacy_id = '12345678-1234-1234-1234-123456789abc'
+    with open(analysis_dir / f'{legacy_id}.json', 'w') as f:
+        json.dump(record(legacy_id, '2024-06-01T00:00:00', {'summary': 'legacy'}), f)
+    with open(analysis_dir / 'history.json', 'w') as f:
+        json.dump({'other': record('other', '2024-05-01T00:00:00', {'summary': 'older'})}, f)
+
+    main(['compact', '--data-dir', str(tmp_path), '--delete'])
+
+    assert 'Migrated 2 records (0 already stored, 2 legacy files deleted)' in capsys.readouterr().out
+    store = ResultStore(analysis_dir)
+    assert store.get(legacy_id)['results'] == {'summary': 'legacy'}
+    assert [entry['id'] for entry in store.list()] == [legacy_id, 'other']
+    assert not (analysis_dir / 'history.json').exists()
+    assert directory_size(analysis_dir) > 0
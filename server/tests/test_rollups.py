@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from storage.ingest import ingest_dataset
+from storage.rollups import MINUTE_NS, TIERS, RollupStore, main
+
+def test_cli_reports_rows_rolled_up(data_dir, capsys):
+    target = ingest_dataset('validation', data_dir)
+    with open(target) as f:
+        rows = sum(1 for _ in f) - 1
+
+    main(['--data-dir', str(data_dir)])
+
+    assert capsys.readouterr().out.splitlines() == [f'validation: {rows} rows rolled up']
+
+def readings(count=3000, step=37 * 10**9, seed=0):
+    """Irregular readings over about a day and a half, with gaps in each column."""
+    rng = np.random.default_rng(seed)
+    start = np.datetime64('2024-06-01T23:20:00', 'ns').astype(np.int64)
+    timestamps = start + np.cumsum(rng.integers(1, step, count))
+    frame = pd.DataFrame({'timestamp': timestamps,
+                          'pH': 7 + rng.normal(0, 0.2, count),
+                          'temperature': 24 + rng.normal(0, 1, count)})
+    frame.loc[rng.random(count) < 0.2, 'pH'] = np.nan
+    # A whole minute with no temperature readings, so the last value carries over
+    frame.loc[(frame['timestamp'] // MINUTE_NS) == (frame['timestamp'].iloc[500] // MINUTE_NS), 'temperature'] = np.nan
+    return frame
+
+@pytest.mark.parametrize('splits', [[1], [500], [501, 502], [250, 1000, 2999]])
+def test_incremental_updates_match_a_full_rebuild(tmp_path, splits):
+    frame = readings()
+    full = RollupStore('validation', tmp_path / 'full')
+    full.rebuild(frame)
+
+    incremental = RollupStore('validation', tmp_path / 'incremental')
+    # Splits fall inside buckets of every tier, so each update merges a partial bucket
+    for first, stop in zip([0] + splits, splits + [len(frame)]):
+        chunk = frame.iloc[first:stop]
+        assert incremental.update(chunk) == len(chunk)
+    # Already included rows are skipped
+    assert incremental.update(frame) == 0
+
+    assert incremental.watermark == full.watermark
+    for tier in TIERS:
+        buckets, stats = incremental.tiers[tier].query()
+        expected_buckets, expected = full.tiers[tier].query()
+        np.testing.assert_array_equal(buckets, expected_buckets)
+        for column in ('pH', 'temperature'):
+            for stat in ('min', 'max', 'count', 'last'):
+                np.testing.assert_array_equal(stats[column][stat], expected[column][stat], err_msg=f'{tier} {stat}')
+            np.testing.assert_allclose(stats[column]['sum'], expected[column]['sum'], rtol=1e-12)
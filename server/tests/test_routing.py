@@ -0,0 +1,132 @@
+import time
+
+import pytest
+
+from ai import routing
+from ai.routing import HEDGE_DEFAULT, MIN_SAMPLES, LLMRouter, LLMUnavailableError
+
+@pytest.fixture
+def router(monkeypatch):
+    monkeypatch.setattr(routing, 'HEDGE_MIN', 0.01)
+    return LLMRouter(max_workers=4)
+
+def seed(router, name, latency, ok=True, samples=MIN_SAMPLES):
+    for _ in range(samples):
+        router.stats(name).record(latency, ok)
+
+def stalls(calls, name):
+    """A provider that hangs until its attempt is abandoned."""
+    def send(messages, cancel):
+        calls.append(name)
+        cancel.wait(5)
+        raise TimeoutError('cancelled')
+    return send
+
+def answers(calls, name, delay=0.0):
+    def send(messages, cancel):
+        calls.append(name)
+        time.sleep(delay)
+        return f'{name} reply'
+    return send
+
+def fails(calls, name):
+    def send(messages, cancel):
+        calls.append(name)
+        raise ConnectionError('503 Service Unavailable')
+    return send
+
+def test_hedge_delay_is_the_p95(router):
+    assert router.hedge_delay('new') == HEDGE_DEFAULT
+    for n in range(20):
+        router.stats('known').record(0.01 * (n + 1), True)
+    # p95 of 0.01 .. 0.20
+    assert router.hedge_delay('known') == pytest.approx(0.19)
+
+def test_slow_primary_is_hedged_after_its_p95(router):
+    calls = []
+    seed(router, 'primary', 0.1)
+    seed(router, 'alternate', 0.1)
+    router.register('primary', stalls(calls, 'primary'))
+    router.register('alternate', answers(calls, 'alternate'))
+
+    started = time.monotonic()
+    result = router.complete([], prefer='primary', with_provider=True)
+    elapsed = time.monotonic() - started
+
+    assert result == ('alternate', 'alternate reply')
+    assert calls == ['primary', 'alternate']
+    assert 0.1 <= elapsed < 2
+    # The abandoned attempt counts as latency, not as an error
+    assert router.stats('primary').snapshot()['error_rate'] == 0.0
+    assert router.stats('primary').snapshot()['samples'] == MIN_SAMPLES + 1
+
+def test_primary_within_its_p95_is_not_hedged(router):
+    calls = []
+    seed(router, 'primary', 0.5)
+    router.register('primary', answers(calls, 'primary', delay=0.01))
+    router.register('alternate', answers(calls, 'alternate'))
+
+    assert router.complete([], prefer='primary') == 'primary reply'
+    time.sleep(0.05)
+    assert calls == ['primary']
+
+def test_failure_fails_over_at_once(router):
+    calls = []
+    router.register('primary', fails(calls, 'primary'))
+    router.register('alternate', answers(calls, 'alternate'))
+
+    started = time.monotonic()
+    assert router.complete([], prefer='primary') == 'alternate reply'
+    # Without samples the hedge delay is HEDGE_DEFAULT; failover does not wait for it
+    assert time.monotonic() - started < 1
+    assert calls == ['primary', 'alternate']
+    assert router.stats('primary').snapshot()['error_rate'] == 1.0
+
+def test_invalid_reply_fails_over(router):
+    calls = []
+    router.register('primary', answers(calls, 'primary'))
+    router.register('alternate', answers(calls, 'alternate'))
+
+    def validate(reply):
+        if reply.startswith('primary'):
+            raise ValueError('no JSON object')
+        return reply.upper()
+
+    assert router.complete([], prefer='primary', validate=validate) == 'ALTERNATE REPLY'
+
+def test_every_provider_failing_raises(router):
+    calls = []
+    router.register('primary', fails(calls, 'primary'))
+    router.register('alternate', fails(calls, 'alternate'))
+
+    with pytest.raises(LLMUnavailableError) as raised:
+        router.complete([], prefer='primary')
+    assert set(raised.value.errors) == {'primary', 'alternate'}
+
+def test_excluded_provider_is_not_used(router):
+    calls = []
+    router.register('primary', fails(calls, 'primary'))
+    router.register('alternate', answers(calls, 'alternate'))
+
+    with pytest.raises(LLMUnavailableError):
+        router.complete([], prefer='primary', exclude=('alternate',))
+    assert calls == ['primary']
+
+def test_unhealthy_preferred_provider_loses_its_traffic(router):
+    seed(router, 'primary', 1.0)
+    seed(router, 'alternate', 1.0)
+    assert router.order(['primary', 'alternate'], prefer='primary') == ['primary', 'alternate']
+
+    # Within the margin the preference holds; errors push it past
+    seed(router, 'primary', 1.0, ok=False, samples=2)
+    assert router.order(['primary', 'alternate'], prefer='primary') == ['alternate', 'primary']
+
+def test_hedging_can_be_disabled(router, monkeypatch):
+    monkeypatch.setattr(routing, 'HEDGING_ENABLED', False)
+    calls = []
+    router.register('primary', fails(calls, 'primary'))
+    router.register('alternate', answers(calls, 'alternate'))
+
+    with pytest.raises(LLMUnavailableError):
+        router.complete([], prefer='primary')
+    assert calls == ['primary']
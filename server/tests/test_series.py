@@ -0,0 +1,33 @@
+import pytest
+
+def series(client, query):
+    return client.get(f'/api/telemetry/series/validation?{query}')
+
+def test_default_resolution_spreads_the_range_over_points(client):
+    body = series(client, 'start=2024-06-01&end=2024-06-30&columns=pH&points=30').get_json()
+
+    # The readings of June span about 30 days
+    assert 20 * 3600 < body['resolution_seconds'] <= 24 * 3600
+    assert 0 < len(body['timestamps']) <= 31
+    assert list(body['series']) == ['pH']
+
+def test_start_after_end_is_rejected(client):
+    response = series(client, 'start=2024-07-01&end=2024-06-01')
+
+    assert response.status_code == 400
+
+@pytest.mark.parametrize('query', ['start=2030-01-01', 'end=2020-01-01', 'start=2030-01-01&end=2030-01-02'])
+def test_range_outside_the_data_is_empty(client, query):
+    response = series(client, f'{query}&columns=pH')
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['timestamps'] == []
+    assert body['series']['pH']['count'] == []
+    assert body['resolution_seconds'] >= 0
+
+def test_single_reading_range_has_a_positive_resolution(client):
+    body = series(client, 'start=2024-06-01T00:15:00&end=2024-06-01T00:15:00&columns=pH').get_json()
+
+    assert body['resolution_seconds'] >= 1
+    assert body['timestamps'] == ['2024-06-01T00:15:00']